@@ -5,7 +5,7 @@ Location: agent/activity_logger.py
 Replaces results_logger with a unified system that:
 1. Streams to local Web UI via memory queue (real-time)
 2. Writes to activity-specific log files (local persistence)
-3. Batches logs to server on activity completion (scalable)
+3. Streams logs to server in rolling gzip NDJSON segments (scalable)
 
 Usage:
     from activity_logger import ActivityLogger
@@ -29,13 +29,15 @@ Usage:
     logger.warning("⚠️ Popup dismissed")
     logger.error("❌ Login failed")
     
-    # Complete session (triggers server upload)
+    # Complete session (flushes the last segment, uploads screenshots)
     logger.complete()
 """
 
 import os
 import threading
 import time
+import uuid
+import zlib
 import logging
 from datetime import datetime
 from typing import Optional, Dict, Any, List, Callable
@@ -269,10 +271,39 @@ class LocalFileWriter(LogSubscriber):
 # Server Batcher
 # ============================================================================
 
+class _LogSegment:
+    """One gzip NDJSON segment being built for the current session (compressed as it grows)."""
+
+    def __init__(self, meta: Dict[str, Any]):
+        self.meta = meta
+        self._compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31 = gzip container
+        self._chunks: List[bytes] = []
+        self.raw_bytes = 0
+        self.entries = 0
+        self.opened_at = time.monotonic()
+
+    def add(self, entry: LogEntry):
+        line = (json.dumps(entry.to_dict(), default=str) + '\n').encode('utf-8')
+        self._chunks.append(self._compressor.compress(line))
+        self.raw_bytes += len(line)
+        self.entries += 1
+
+    def seal(self) -> bytes:
+        self._chunks.append(self._compressor.flush())
+        return b''.join(self._chunks)
+
+
 class ServerBatcher(LogSubscriber):
     """
-    Collects log entries during activity execution and sends them
-    to the server in a single batch on completion.
+    Streams log entries to the server while the activity runs.
+
+    Entries go into a gzip NDJSON segment that is sealed every segment_max_bytes
+    (uncompressed) or segment_max_seconds, written to the local spool folder and
+    then POSTed to /api/activity-logs/logs/segment by a background thread.
+    Spooled segments survive crashes and offline periods and are retried (oldest
+    first) until the server acks them. Agent memory is bounded by one segment.
+
+    With streaming disabled, falls back to one S3 upload of all entries on completion.
     """
     
     def __init__(
@@ -281,7 +312,11 @@ class ServerBatcher(LogSubscriber):
         api_key: str = '',
         jwt_token: str = '',
         ssl_verify: bool = False,
-        max_retries: int = 3
+        max_retries: int = 3,
+        streaming: bool = True,
+        spool_folder: Optional[str] = None,
+        segment_max_bytes: int = 256 * 1024,
+        segment_max_seconds: float = 10.0
     ):
         self.api_url = api_url
         self.api_key = api_key
@@ -300,15 +335,34 @@ class ServerBatcher(LogSubscriber):
         self.upload_urls: Dict[str, str] = {}
         self.screenshots_folder: Optional[str] = None
         self.form_files_folder: Optional[str] = None
+
+        # Live streaming state
+        self.streaming = streaming and bool(spool_folder)
+        self.spool_folder = Path(spool_folder) if spool_folder else None
+        self.segment_max_bytes = segment_max_bytes
+        self.segment_max_seconds = segment_max_seconds
+        self._segment: Optional[_LogSegment] = None
+        self._stream_id: Optional[str] = None
+        self._seq = 0
+        self._upload_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._retry_delay = 0.0
+
+        if self.streaming:
+            self.spool_folder.mkdir(parents=True, exist_ok=True)
+            # Also drains segments spooled before a crash/restart
+            threading.Thread(target=self._uploader_loop, name='log-segment-uploader', daemon=True).start()
     
     def update_auth(self, api_key: str = '', jwt_token: str = ''):
         """Update authentication credentials (for JWT refresh)."""
         self.api_key = api_key
         self.jwt_token = jwt_token
+        self._wake.set()  # Segments may have been waiting on auth
     
     def on_session_start(self, activity_type: str, session_id: int, metadata: Dict):
         """Initialize for new session."""
         with self.lock:
+            self._seal_segment()  # Leftovers of a session that never completed
             self.entries = []
             self.activity_type = activity_type
             self.session_id = session_id
@@ -318,29 +372,149 @@ class ServerBatcher(LogSubscriber):
             self.upload_urls = metadata.get('upload_urls', {})
             self.screenshots_folder = metadata.get('screenshots_folder')
             self.form_files_folder = metadata.get('form_files_folder')
+            self._stream_id = uuid.uuid4().hex[:12]
+            self._seq = 0
     
     def on_log(self, entry: LogEntry):
-        """Collect entry for batch upload."""
+        """Add entry to the current segment (or the batch when not streaming)."""
         with self.lock:
-            self.entries.append(entry)
+            if not self.streaming:
+                self.entries.append(entry)
+                return
+            if self.session_id is None:
+                return
+            if self._segment is None:
+                self._segment = _LogSegment({
+                    'activity_type': self.activity_type,
+                    'session_id': self.session_id,
+                    'project_id': self.project_id,
+                    'company_id': self.company_id,
+                    'user_id': self.user_id,
+                    'stream_id': self._stream_id,
+                    'seq': self._seq
+                })
+                self._seq += 1
+            self._segment.add(entry)
+            if self._segment.raw_bytes >= self.segment_max_bytes:
+                self._seal_segment()
+                self._wake.set()
     
     def on_session_complete(self, summary: Optional[str] = None):
-        """Send batch to server."""
-        self._send_batch()
+        """Flush logs to server."""
+        self._flush_logs()
         if self.activity_type in ('mapping', 'test_run') and self.screenshots_folder:
             self._send_screenshots_to_s3()
         if self.activity_type == 'mapping' and self.form_files_folder:
             self._send_form_files_to_s3()
     
     def on_session_fail(self, error_message: str, error_code: Optional[str] = None):
-        """Send batch to server (even on failure)."""
-        self._send_batch()
+        """Flush logs to server (even on failure)."""
+        self._flush_logs()
         if self.activity_type in ('mapping', 'test_run') and self.screenshots_folder:
             self._send_screenshots_to_s3()
 
+    def _flush_logs(self):
+        if not self.streaming:
+            self._send_batch()
+            return
+        with self.lock:
+            self._seal_segment()
+        # Best effort now; whatever is left stays spooled for the background thread
+        self._upload_spooled(deadline=time.monotonic() + 30)
+
+    # ------------------------------------------------------------------
+    # Live segment streaming
+    # ------------------------------------------------------------------
+
+    def _seal_segment(self):
+        """Write the current segment to the spool folder. Caller holds self.lock."""
+        segment, self._segment = self._segment, None
+        if segment is None or not segment.entries:
+            return
+        meta = segment.meta
+        name = f"{meta['activity_type']}_{meta['session_id']}_{meta['stream_id']}_{meta['seq']:06d}"
+        try:
+            (self.spool_folder / f"{name}.json").write_text(json.dumps(meta), encoding='utf-8')
+            # Segment file appears atomically - the uploader never sees a partial one
+            tmp_path = self.spool_folder / f"{name}.tmp"
+            tmp_path.write_bytes(segment.seal())
+            os.replace(tmp_path, self.spool_folder / f"{name}.ndjson.gz")
+        except Exception as e:
+            print(f"[ActivityLogger] Could not spool log segment {name}: {e}")
+
+    def _uploader_loop(self):
+        while True:
+            self._wake.wait(timeout=max(self.segment_max_seconds, self._retry_delay))
+            self._wake.clear()
+            with self.lock:
+                if self._segment and time.monotonic() - self._segment.opened_at >= self.segment_max_seconds:
+                    self._seal_segment()
+            try:
+                self._upload_spooled()
+            except Exception as e:
+                print(f"[ActivityLogger] Segment uploader error: {e}")
+
+    def _upload_spooled(self, deadline: Optional[float] = None) -> bool:
+        """Send spooled segments oldest first. Returns True when the spool is empty."""
+        if not self.api_url:
+            return False
+        with self._upload_lock:
+            for seg_path in sorted(self.spool_folder.glob('*.ndjson.gz'), key=lambda p: p.stat().st_mtime):
+                if deadline and time.monotonic() > deadline:
+                    return False
+                outcome = self._post_segment(seg_path)
+                if outcome == 'retry':
+                    # Offline / server error - back off, keep the spool
+                    self._retry_delay = min(max(self._retry_delay * 2, 5.0), 300.0)
+                    return False
+                meta_path = seg_path.with_name(seg_path.name[:-len('.ndjson.gz')] + '.json')
+                if outcome == 'rejected':
+                    # Server will never accept it - keep for inspection, stop retrying
+                    seg_path.rename(seg_path.with_name(seg_path.name + '.rejected'))
+                else:
+                    seg_path.unlink(missing_ok=True)
+                meta_path.unlink(missing_ok=True)
+            self._retry_delay = 0.0
+            return True
+
+    def _post_segment(self, seg_path: Path) -> str:
+        """POST one segment. Returns 'ok', 'retry' or 'rejected'."""
+        meta_path = seg_path.with_name(seg_path.name[:-len('.ndjson.gz')] + '.json')
+        try:
+            meta = json.loads(meta_path.read_text(encoding='utf-8'))
+        except Exception:
+            return 'rejected'
+        params = {k: v for k, v in meta.items() if v is not None}
+
+        headers = {'Content-Type': 'application/x-ndjson', 'Content-Encoding': 'gzip'}
+        if self.api_key:
+            headers['X-Agent-API-Key'] = self.api_key
+        if self.jwt_token:
+            headers['Authorization'] = f'Bearer {self.jwt_token}'
+
+        try:
+            response = requests.post(
+                f"{self.api_url}/api/activity-logs/logs/segment",
+                params=params,
+                data=seg_path.read_bytes(),
+                headers=headers,
+                timeout=30,
+                verify=self.ssl_verify
+            )
+        except Exception as e:
+            print(f"[ActivityLogger] Segment upload failed (will retry): {e}")
+            return 'retry'
+
+        if response.status_code in (200, 201):
+            return 'ok'
+        if 400 <= response.status_code < 500 and response.status_code not in (401, 403, 408, 429):
+            print(f"[ActivityLogger] Segment {seg_path.name} rejected: {response.status_code} - {response.text[:200]}")
+            return 'rejected'
+        print(f"[ActivityLogger] Segment upload failed (will retry): {response.status_code}")
+        return 'retry'
 
     def _send_batch(self):
-        """Upload ALL logs to S3, then confirm with API."""
+        """Upload ALL logs to S3, then confirm with API (non-streaming mode)."""
         print(f"[ActivityLogger] _send_batch called")
 
         with self.lock:
@@ -669,6 +843,9 @@ class ActivityLogger:
         self.user_id: Optional[int] = None
         self.network_id: Optional[int] = None
         self.session_active = False
+
+        # Loggers of the session workers (multi-session agent) - get auth updates too
+        self.worker_loggers: List['WorkerActivityLogger'] = []
         
         # Initialize subscribers
         self._init_subscribers()
@@ -694,7 +871,7 @@ class ActivityLogger:
         self.file_writer = LocalFileWriter(log_folder=log_folder)
         self.subscribers.append(self.file_writer)
         
-        # 3. Server Batcher (batch upload on complete)
+        # 3. Server Batcher (live segment streaming, spooled under the log folder)
         api_url = getattr(self.config, 'api_url', '')
         api_key = getattr(self.config, 'api_key', '')
         ssl_verify = getattr(self.config, 'ssl_verify', False)
@@ -702,13 +879,19 @@ class ActivityLogger:
         self.server_batcher = ServerBatcher(
             api_url=api_url,
             api_key=api_key,
-            ssl_verify=ssl_verify
+            ssl_verify=ssl_verify,
+            streaming=getattr(self.config, 'log_streaming', True),
+            spool_folder=os.path.join(log_folder, 'upload_spool'),
+            segment_max_bytes=getattr(self.config, 'log_segment_max_bytes', 256 * 1024),
+            segment_max_seconds=getattr(self.config, 'log_segment_max_seconds', 10)
         )
         self.subscribers.append(self.server_batcher)
     
     def update_auth(self, api_key: str = '', jwt_token: str = ''):
         """Update authentication for server batcher (for JWT refresh)."""
         self.server_batcher.update_auth(api_key=api_key, jwt_token=jwt_token)
+        for worker_logger in self.worker_loggers:
+            worker_logger.update_auth(api_key=api_key, jwt_token=jwt_token)
     
     # ========================================================================
     # Session Management
@@ -765,7 +948,7 @@ class ActivityLogger:
     def complete(self, summary: Optional[str] = None):
         """
         Complete the current session.
-        Triggers ServerBatcher to upload logs to server.
+        Triggers ServerBatcher to flush the last log segment and upload screenshots.
         """
         if not self.session_active:
             return
@@ -857,6 +1040,46 @@ class ActivityLogger:
         return [e.to_sse_dict() for e in entries]
 
 
+class WorkerActivityLogger(ActivityLogger):
+    """
+    Activity logger of one session worker when the agent runs several sessions at once.
+    Shares the agent logger's Web UI queue and log files; has its own session state and
+    server stream, spooled in its own subfolder so the uploader threads never race.
+    """
+
+    def __new__(cls, parent: ActivityLogger, worker_index: int):
+        # Not the singleton - one per worker
+        instance = object.__new__(cls)
+        instance._initialized = False
+        return instance
+
+    def __init__(self, parent: ActivityLogger, worker_index: int):
+        self.parent = parent
+        self.worker_index = worker_index
+        super().__init__(parent.config)
+        parent.worker_loggers.append(self)
+
+    def _init_subscribers(self):
+        self.memory_queue = self.parent.memory_queue
+        self.file_writer = self.parent.file_writer
+        batcher = self.parent.server_batcher
+        spool_folder = batcher.spool_folder / f'worker_{self.worker_index}' if batcher.spool_folder else None
+        self.server_batcher = ServerBatcher(
+            api_url=batcher.api_url,
+            api_key=batcher.api_key,
+            jwt_token=batcher.jwt_token,
+            ssl_verify=batcher.ssl_verify,
+            streaming=batcher.streaming,
+            spool_folder=str(spool_folder) if spool_folder else None,
+            segment_max_bytes=batcher.segment_max_bytes,
+            segment_max_seconds=batcher.segment_max_seconds
+        )
+        self.subscribers.extend([self.memory_queue, self.file_writer, self.server_batcher])
+
+    def update_auth(self, api_key: str = '', jwt_token: str = ''):
+        self.server_batcher.update_auth(api_key=api_key, jwt_token=jwt_token)
+
+
 # ============================================================================
 # Global Instance Helper
 # ============================================================================
@@ -52,6 +52,10 @@ class AgentConfig:
         # Agent behavior settings
         self.poll_interval = int(os.getenv('POLL_INTERVAL', '30'))  # seconds
         self.heartbeat_interval = int(os.getenv('HEARTBEAT_INTERVAL', '30'))  # seconds
+        # Task delivery: server holds poll-task open up to POLL_WAIT seconds (0 = short polling)
+        self.poll_wait = int(os.getenv('POLL_WAIT', '20'))
+        # Receive tasks over the server-sent event stream (falls back to long-poll on error)
+        self.task_stream = os.getenv('TASK_STREAM', 'false').lower() == 'true'
         
         # Folder paths - Default: ~/Desktop/automation_files/
         # User can change base folder from web app (not yet implemented)
@@ -68,9 +72,29 @@ class AgentConfig:
         
         self.capture_traffic = os.getenv('CAPTURE_TRAFFIC', 'false').lower() == 'true'
 
+        # Activity logs: stream gzip NDJSON segments while a session runs (spooled to
+        # LOG_FOLDER/upload_spool when offline). false = one upload at session end.
+        self.log_streaming = os.getenv('LOG_STREAMING', 'true').lower() == 'true'
+        self.log_segment_max_bytes = int(os.getenv('LOG_SEGMENT_MAX_BYTES', str(256 * 1024)))
+        self.log_segment_max_seconds = int(os.getenv('LOG_SEGMENT_MAX_SECONDS', '10'))
+        # Upload Form Mapper screenshots to presigned S3 URLs instead of inlining base64
+        self.screenshot_direct_upload = os.getenv('SCREENSHOT_DIRECT_UPLOAD', 'true').lower() == 'true'
+        # Detect field changes after each step with an in-page MutationObserver instead of
+        # extracting and diffing the full DOM twice per step
+        self.field_tracker = os.getenv('FIELD_TRACKER', 'true').lower() == 'true'
+        # Page settle after actions: idle once no DOM/request activity for SETTLE_QUIET_MS
+        # (capped at SETTLE_TIMEOUT seconds). Network events need Chrome's performance log.
+        self.settle_quiet_ms = int(os.getenv('SETTLE_QUIET_MS', '250'))
+        self.settle_timeout = float(os.getenv('SETTLE_TIMEOUT', '3'))
+        self.settle_network_events = os.getenv('SETTLE_NETWORK_EVENTS', 'true').lower() == 'true'
+
         # Browser settings
         self.default_browser = os.getenv('DEFAULT_BROWSER', 'chrome')
         self.default_headless = os.getenv('DEFAULT_HEADLESS', 'false').lower() == 'true'
+        # Pre-launched Chrome instances kept warm for the next session (0 = cold start)
+        self.browser_pool_size = int(os.getenv('BROWSER_POOL_SIZE', '1'))
+        # Mapper/runner sessions run at once, one browser each (1 = one session at a time)
+        self.max_sessions = max(1, int(os.getenv('AGENT_MAX_SESSIONS', '1')))
         
         # Store path to .env for saving API key later
         self._env_path = env_path
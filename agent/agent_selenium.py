@@ -7,7 +7,9 @@ import time
 import tempfile
 import hashlib
 import base64
+import contextlib
 import logging
+from collections import deque
 from typing import Dict, Optional, Any, List
 from bs4 import BeautifulSoup
 
@@ -30,7 +32,9 @@ from selenium.common.exceptions import (
 from webdriver_manager.chrome import ChromeDriverManager
 from webdriver_manager.firefox import GeckoDriverManager
 from webdriver_manager.microsoft import EdgeChromiumDriverManager
-from chrome_manager import ChromeManager
+from chrome_manager import WarmBrowserPool
+from field_tracker import mark_fields, field_delta, classify_delta
+from page_settle import NetworkLogDrain, PageSettler
 
 try:
     from reportlab.pdfgen import canvas
@@ -60,10 +64,26 @@ class AgentSelenium:
     Handles all browser automation, DOM extraction, and step execution
     """
     
-    def __init__(self, screenshot_folder: Optional[str] = None, config=None):
+    def __init__(self, screenshot_folder: Optional[str] = None, config=None, browser_pool=None):
         self.driver = None
         self.shadow_root_context = None
         self.config = config  # Store config reference
+        # In-page MutationObserver field tracker for step change detection (False = full DOM diff)
+        self.field_tracker_enabled = getattr(config, 'field_tracker', True) if config else True
+        # Event-driven page settle instead of fixed sleeps after actions
+        self.page_settler = PageSettler(
+            quiet_ms=getattr(config, 'settle_quiet_ms', 250),
+            timeout=getattr(config, 'settle_timeout', 3.0),
+            network_events=getattr(config, 'settle_network_events', True)
+        )
+        self.settle_timings = deque(maxlen=500)  # (label, ms, settled, reason) per settle
+        # Pre-launched Chrome instances handed to sessions (0 = cold start every session).
+        # Session workers of a multi-session agent share the agent's pool.
+        if browser_pool is not None:
+            self.browser_pool = browser_pool
+        else:
+            self.browser_pool = WarmBrowserPool(size=getattr(config, 'browser_pool_size', 1) if config else 0)
+        self._driver_pooled = False
         
         # Screenshot folder configuration
         if config:
@@ -255,6 +275,7 @@ class AgentSelenium:
             Dict with success status and message
         """
         try:
+            self._driver_pooled = False
             if browser_type.lower() == "chrome_obsolete":
                 options = Options()
 
@@ -306,12 +327,14 @@ class AgentSelenium:
                     self.driver.set_page_load_timeout(40)
                     print("[WebDriver] ✅ Initialized successfully (alternative method)")
             elif browser_type.lower() == "chrome":
-                chrome_manager = ChromeManager()
-                self.driver = chrome_manager.initialize_driver(
+                self.driver = self.browser_pool.acquire(
                     headless=headless,
-                    download_dir=download_dir
+                    download_dir=download_dir,
+                    network_events=self.page_settler.network_events
                 )
-                print(f"[WebDriver] ✅ Chrome initialized (version: {chrome_manager.chrome_version or 'unknown'})")
+                self._driver_pooled = True
+                chrome_version = (self.driver.capabilities or {}).get('browserVersion') or 'unknown'
+                print(f"[WebDriver] ✅ Chrome initialized (version: {chrome_version})")
 
             elif browser_type.lower() == "firefox":
                 print("[WebDriver] Initializing Firefox browser...")
@@ -449,6 +472,7 @@ class AgentSelenium:
             
             self.driver.maximize_window()
             self.driver.set_page_load_timeout(30)
+            self.page_settler.prepare_driver(self.driver)
             
             self.info_logger.info(f"Browser initialized: {browser_type}, headless={headless}")
             
@@ -464,6 +488,27 @@ class AgentSelenium:
             self.info_logger.error(f"❌ BROWSER ERROR: {browser_type} failed to start - {str(e)}")
             return {"success": False, "error": str(e)}
     
+    def warm_browser_pool(self):
+        """Pre-launch Chrome for the default session options (agent start)"""
+        if not self.config or getattr(self.config, 'default_browser', 'chrome').lower() != 'chrome':
+            return
+        self.browser_pool.warm(headless=getattr(self.config, 'default_headless', False),
+                               network_events=self.page_settler.network_events)
+
+    def shutdown_browser_pool(self):
+        """Quit the idle pre-launched browsers (agent stop)"""
+        self.browser_pool.shutdown()
+
+    def take_browser(self, other: 'AgentSelenium'):
+        """Adopt another instance's open browser (a session worker's logged-in browser handed on)"""
+        if other is self or not other.driver:
+            return
+        self.close_browser()
+        self.driver, other.driver = other.driver, None
+        self._driver_pooled, other._driver_pooled = other._driver_pooled, False
+        self.shadow_root_context = other.shadow_root_context = None
+        self.page_settler.prepare_driver(self.driver)
+
     def navigate_to_url(self, url: str) -> Dict:
         """Navigate to URL"""
         try:
@@ -588,7 +633,8 @@ class AgentSelenium:
         except Exception as e:
             return {"success": False, "error": str(e)}
     
-    def capture_screenshot(self, scenario_description: str = "screenshot", encode_base64: bool = True, save_to_folder: bool = True) -> Dict:
+    def capture_screenshot(self, scenario_description: str = "screenshot", encode_base64: bool = True, save_to_folder: bool = True,
+                           profile=None) -> Dict:
         """
         Capture screenshot and optionally save to configured folder with timestamp
         
@@ -596,6 +642,8 @@ class AgentSelenium:
             scenario_description: Description of what was happening (e.g., "filling first name field")
             encode_base64: If True, also return base64 encoded string (for backward compatibility)
             save_to_folder: If True, save to disk folder. If False, only return base64 (for AI analysis)
+            profile: Optional encoding profile (name or dict, see screenshot_pipeline) applied to the
+                     returned screenshot only - the saved file stays a full-page PNG
             
         Returns:
             Dict with screenshot data and file path (if saved)
@@ -603,6 +651,10 @@ class AgentSelenium:
         try:
             from datetime import datetime
             import re
+            from screenshot_pipeline import resolve_profile, encode_screenshot, FORM_BOUNDING_BOX_JS
+
+            profile = resolve_profile(profile)
+            form_box = None
 
             # Get FULL PAGE screenshot using CDP (Chrome DevTools Protocol)
             import math
@@ -620,6 +672,13 @@ class AgentSelenium:
                     'mobile': False
                 })
 
+                # Form position in the full-page layout (page coords == image px at scale 1)
+                if profile and profile.get("crop_to_form"):
+                    try:
+                        form_box = self.driver.execute_script(FORM_BOUNDING_BOX_JS)
+                    except Exception:
+                        form_box = None
+
                 # Capture full page screenshot
                 screenshot_data = self.driver.execute_cdp_cmd('Page.captureScreenshot', {
                     'format': 'png',
@@ -635,7 +694,18 @@ class AgentSelenium:
             except Exception as cdp_error:
                 # Fallback to regular screenshot if CDP fails
                 print(f"[Agent] CDP full page screenshot failed, using fallback: {cdp_error}")
+                try:
+                    self.driver.execute_cdp_cmd('Emulation.clearDeviceMetricsOverride', {})
+                except Exception:
+                    pass
                 screenshot_png = self.driver.get_screenshot_as_png()
+                # Viewport-only image - the crop box must be in viewport pixels, not page coords
+                form_box = None
+                if profile and profile.get("crop_to_form"):
+                    try:
+                        form_box = self.driver.execute_script(FORM_BOUNDING_BOX_JS, "viewport")
+                    except Exception:
+                        form_box = None
             
             # Prepare response
             result = {
@@ -670,16 +740,27 @@ class AgentSelenium:
                 # Not saving to folder - just for AI analysis
                 result["format"] = "memory"
             
+            # Shrink the returned copy for its purpose (AI checks)
+            output_bytes = screenshot_png
+            if profile:
+                try:
+                    output_bytes, media_type = encode_screenshot(screenshot_png, profile, form_box)
+                    result["media_type"] = media_type
+                    print(f"[Agent] Screenshot encoded ({media_type}): {len(screenshot_png)} -> {len(output_bytes)} bytes")
+                except Exception as encode_error:
+                    print(f"[Agent] Screenshot encoding failed, sending PNG: {encode_error}")
+                    output_bytes = screenshot_png
+
             # Include base64 or binary
             if encode_base64:
-                screenshot_b64 = base64.b64encode(screenshot_png).decode('utf-8')
+                screenshot_b64 = base64.b64encode(output_bytes).decode('utf-8')
                 result["screenshot"] = screenshot_b64
                 if save_to_folder:
                     result["format"] = "file+base64"
                 else:
                     result["format"] = "base64"
             else:
-                result["screenshot"] = screenshot_png
+                result["screenshot"] = output_bytes
                 if save_to_folder:
                     result["format"] = "file+binary"
                 else:
@@ -833,7 +914,7 @@ class AgentSelenium:
                 return {"success": False, "error": f"File input not found: {selector}"}
             
             element.send_keys(filepath)
-            time.sleep(1)
+            self.settle("file_upload")
             
             print(f"[FileUpload] ✅ Uploaded: {filename}")
             return {
@@ -1150,6 +1231,37 @@ class AgentSelenium:
 
         return False
 
+    def _print_field_delta(self, delta: Dict, fields_changed_dom: bool, fields_changed_js: bool):
+        """Console summary of a field tracker delta (same style as the DOM diff output)"""
+        if not (fields_changed_dom or fields_changed_js):
+            print("[Agent] ℹ️  No field changes detected")
+            return
+
+        if delta.get("reset"):
+            print(f"\n[Agent] 🔍 New document - {len(delta.get('added', []))} fields on the page")
+            return
+
+        print("\n[Agent] 🔍 Field Changes Detected:")
+        for label, key in (("➕ New fields added", "added"), ("➖ Fields removed", "removed"),
+                           ("👁️  Became visible", "shown"), ("🙈 Became hidden", "hidden"),
+                           ("👁️  Markup visible", "declared_shown"), ("🙈 Markup hidden", "declared_hidden")):
+            fields = delta.get(key) or []
+            if not fields:
+                continue
+            print(f"   {label}: {len(fields)}")
+            for field in fields[:5]:
+                print(f"      - {field[:80]}")
+            if len(fields) > 5:
+                print(f"      ... and {len(fields) - 5} more")
+
+        for change in (delta.get("conditional") or [])[:5]:
+            print(f"   📊 Element '{change.get('key', '')[:60]}' {change.get('attr')}: "
+                  f"'{change.get('from')}' → '{change.get('to')}'")
+
+        before, after = delta.get("elements_before"), delta.get("elements_after")
+        if before and before != after:
+            print(f"   📊 Element count: {before} → {after}")
+
     def execute_step(self, step: Dict) -> Dict:
         """
         Execute a single test step
@@ -1210,12 +1322,56 @@ class AgentSelenium:
         self.info_logger.info(f"Executing step {step_number}: {action} | Selector: {step.get('selector', 'N/A')} | Value: {step.get('value', 'N/A')}")
         
         # STEP 1: Capture old DOM hash BEFORE action
-        dom_before = self.extract_dom()
-        old_dom_hash = dom_before.get("dom_hash", "") if dom_before.get("success") else ""
+        # In-page tracker: one small round trip instead of a full DOM copy + visibility scan
+        field_mark = mark_fields(self.driver) if self.field_tracker_enabled else None
+        if field_mark:
+            dom_before = None
+            fields_visibility_before = None
+            old_dom_hash = field_mark.get("hash", "")
+        else:
+            dom_before = self.extract_dom()
+            old_dom_hash = dom_before.get("dom_hash", "") if dom_before.get("success") else ""
+
+            # Capture field visibility via JS BEFORE action (for parallel check)
+            fields_visibility_before = self._get_fields_visibility_js()
+
+        def _detect_field_changes() -> Dict:
+            """New DOM hash and field-change flags after the action"""
+            if field_mark:
+                delta = field_delta(self.driver, field_mark)
+                if delta is not None:
+                    fields_changed_dom, fields_changed_js = classify_delta(delta)
+                    self._print_field_delta(delta, fields_changed_dom, fields_changed_js)
+                    return {
+                        "new_dom_hash": delta.get("hash", ""),
+                        "fields_changed": fields_changed_dom or fields_changed_js,
+                        "fields_changed_dom": fields_changed_dom,
+                        "fields_changed_js": fields_changed_js,
+                        "field_delta": {key: delta.get(key) for key in (
+                            "added", "removed", "shown", "hidden", "hash_changed", "reset")}
+                    }
+                # Tracker failed after the action - nothing to diff against, report a change
+                # (the server falls back to a fresh DOM + regenerate, like a failed extraction)
+                dom_after = self.extract_dom()
+                return {
+                    "new_dom_hash": dom_after.get("dom_hash", "") if dom_after.get("success") else "",
+                    "fields_changed": True,
+                    "fields_changed_dom": True,
+                    "fields_changed_js": False
+                }
+
+            dom_after = self.extract_dom()
+            fields_changed_dom = self._compare_dom_fields(dom_before, dom_after)
+            fields_visibility_after = self._get_fields_visibility_js()
+            fields_changed_js = self._compare_fields_visibility_js(fields_visibility_before,
+                                                                   fields_visibility_after)
+            return {
+                "new_dom_hash": dom_after.get("dom_hash", "") if dom_after.get("success") else "",
+                "fields_changed": fields_changed_dom or fields_changed_js,
+                "fields_changed_dom": fields_changed_dom,
+                "fields_changed_js": fields_changed_js
+            }
 
-        # Capture field visibility via JS BEFORE action (for parallel check)
-        fields_visibility_before = self._get_fields_visibility_js()
-        
         def _finalize_success_result(base_result: Dict) -> Dict:
             """
             Helper to add alert check and DOM hash to successful action results
@@ -1244,19 +1400,12 @@ class AgentSelenium:
                     print(f"[Agent] Warning: Could not accept alert: {e}")
                 
                 # Get new DOM hash after alert is accepted
-                # Wait briefly for JavaScript to finish
-                time.sleep(0.5)
-                self.wait_for_stable_dom(timeout=3, stability_time=0.3)
-                dom_after = self.extract_dom()
-                new_dom_hash = dom_after.get("dom_hash", "") if dom_after.get("success") else ""
-                
+                # Wait for JavaScript / requests triggered by the alert to finish
+                settle = self.settle(f"step {step_number} alert")
+
                 # Check if fields changed (both methods in parallel)
-                fields_changed_dom = self._compare_dom_fields(dom_before, dom_after)
-                fields_visibility_after = self._get_fields_visibility_js()
-                fields_changed_js = self._compare_fields_visibility_js(fields_visibility_before,
-                                                                       fields_visibility_after)
-                fields_changed = fields_changed_dom or fields_changed_js
-                
+                field_changes = _detect_field_changes()
+
                 # Return with alert info
                 return {
                     **base_result,
@@ -1264,25 +1413,16 @@ class AgentSelenium:
                     "alert_present": True,
                     "alert_type": alert_info.get("alert_type"),
                     "alert_text": alert_info.get("alert_text"),
-                    "new_dom_hash": new_dom_hash,
-                    "fields_changed": fields_changed,
-                    "fields_changed_dom": fields_changed_dom,
-                    "fields_changed_js": fields_changed_js
+                    "settle_ms": settle["ms"],
+                    **field_changes
                 }
             
             # No alert - get new DOM hash
-            # Wait briefly for JavaScript to finish (especially for conditional field visibility changes)
-            time.sleep(0.5)
-            self.wait_for_stable_dom(timeout=3, stability_time=0.3)
-            dom_after = self.extract_dom()
-            new_dom_hash = dom_after.get("dom_hash", "") if dom_after.get("success") else ""
-            
-            # Check if fields changed
+            # Wait for JavaScript to finish (especially for conditional field visibility changes)
+            settle = self.settle(f"step {step_number}")
+
             # Check if fields changed (both methods in parallel)
-            fields_changed_dom = self._compare_dom_fields(dom_before, dom_after)
-            fields_visibility_after = self._get_fields_visibility_js()
-            fields_changed_js = self._compare_fields_visibility_js(fields_visibility_before, fields_visibility_after)
-            fields_changed = fields_changed_dom or fields_changed_js
+            field_changes = _detect_field_changes()
 
 
             # DEBUG: Save screenshot when fields change
@@ -1297,10 +1437,8 @@ class AgentSelenium:
                 **base_result,
                 "old_dom_hash": old_dom_hash,
                 "alert_present": False,
-                "new_dom_hash": new_dom_hash,
-                "fields_changed": fields_changed,
-                "fields_changed_dom": fields_changed_dom,
-                "fields_changed_js": fields_changed_js
+                "settle_ms": settle["ms"],
+                **field_changes
             }
         
         try:
@@ -1339,8 +1477,8 @@ class AgentSelenium:
                 element.send_keys(Keys.DELETE)
                 element.send_keys(value)
 
-                # Wait for DOM to stabilize
-                self.wait_for_stable_dom(timeout=5, stability_time=2.0)
+                # Wait for the suggestions - longer quiet window covers input debounce timers
+                self.settle("autocomplete", timeout=5, quiet_ms=800)
 
                 return _finalize_success_result({
                     "success": True,
@@ -1472,7 +1610,7 @@ class AgentSelenium:
                 
                 actions = ActionChains(self.driver)
                 actions.move_to_element(element).perform()
-                time.sleep(1)  # Wait for hover effects
+                self.settle("hover")  # Wait for hover effects
                 
                 return _finalize_success_result({
                     "success": True,
@@ -1728,7 +1866,7 @@ class AgentSelenium:
             # REFRESH ACTION
             elif action == "refresh":
                 self.driver.refresh()
-                time.sleep(1)  # Wait for page to start reloading
+                self.settle("refresh", timeout=10)
                 
                 return _finalize_success_result({
                     "success": True,
@@ -1877,7 +2015,6 @@ class AgentSelenium:
                         WebDriverWait(self.driver, 10).until(
                             lambda d: d.execute_script("return document.readyState") == "complete"
                         )
-                        time.sleep(0.5)  # Extra buffer for JS to finish
                         return _finalize_success_result({"success": True, "action": "wait_dom_ready"})
                     except Exception as e:
                         return {"success": False, "error": f"Wait for DOM ready failed: {str(e)}"}
@@ -2365,12 +2502,16 @@ class AgentSelenium:
             return {"success": False, "error": str(e)}
 
     def close_browser(self) -> Dict:
-        """Close browser and cleanup"""
+        """Close browser and cleanup (pooled Chrome is reset and kept warm for the next session)"""
         try:
             if self.driver:
-                self.driver.quit()
-                self.driver = None
+                driver, self.driver = self.driver, None
                 self.shadow_root_context = None
+                if self._driver_pooled:
+                    self.browser_pool.release(driver)
+                else:
+                    driver.quit()
+                self._driver_pooled = False
             return {"success": True}
         except Exception as e:
             return {"success": False, "error": str(e)}
@@ -2395,53 +2536,51 @@ class AgentSelenium:
         except Exception as e:
             return {"success": False, "error": str(e)}
 
+    def settle(self, label: str = "settle", timeout: Optional[float] = None, quiet_ms: Optional[int] = None,
+               strict: bool = False, paint: bool = True, network: bool = True) -> Dict:
+        """
+        Wait until the page is idle (see page_settle.py) and record how long it took.
+
+        Returns:
+            Dict with settled, reason, first_reason, ms
+        """
+        if not self.driver:
+            return {"settled": False, "reason": "no browser", "first_reason": None, "ms": 0}
+        result = self.page_settler.settle(self.driver, timeout=timeout, quiet_ms=quiet_ms,
+                                          strict=strict, paint=paint, network=network)
+        self.settle_timings.append((label, result["ms"], result["settled"], result["reason"]))
+        status = "" if result["settled"] else f" - still busy: {result['reason']}"
+        print(f"[TIMING] settle ({label}) took {result['ms']}ms{status}")
+        return result
+
+    def network_log_drain(self):
+        """
+        Context manager for work that doesn't settle (discovery crawl): keeps the
+        performance log the settler enabled from piling up Network events meanwhile.
+        """
+        if not self.driver or not self.page_settler.network_events:
+            return contextlib.nullcontext()
+        return NetworkLogDrain(self.driver)
+
+    def settle_stats(self) -> Dict:
+        """Summary of the recent settle timings"""
+        if not self.settle_timings:
+            return {"count": 0}
+        durations = sorted(ms for _, ms, _, _ in self.settle_timings)
+        return {
+            "count": len(durations),
+            "avg_ms": int(sum(durations) / len(durations)),
+            "p95_ms": durations[min(len(durations) - 1, int(len(durations) * 0.95))],
+            "max_ms": durations[-1],
+            "timeouts": sum(1 for _, _, settled, _ in self.settle_timings if not settled),
+        }
+
     def wait_for_stable_dom(self, timeout=3, stability_time=0.3):
         """
         Wait until DOM stops changing for stability_time seconds.
         Returns True if stable, False if timeout.
         """
-        script = """
-        return new Promise((resolve) => {
-            let lastChange = Date.now();
-            const stabilityMs = %d;
-            const timeoutMs = %d;
-
-            const observer = new MutationObserver(() => {
-                lastChange = Date.now();
-            });
-
-            observer.observe(document.body, {
-                childList: true,
-                subtree: true,
-                attributes: true
-            });
-
-            const startTime = Date.now();
-
-            const checkStable = setInterval(() => {
-                const now = Date.now();
-                // Stable: no changes for stabilityMs
-                if (now - lastChange >= stabilityMs) {
-                    clearInterval(checkStable);
-                    observer.disconnect();
-                    resolve(true);
-                }
-                // Timeout
-                if (now - startTime >= timeoutMs) {
-                    clearInterval(checkStable);
-                    observer.disconnect();
-                    resolve(false);
-                }
-            }, 50);
-        });
-        """ % (int(stability_time * 1000), int(timeout * 1000))
-
-        try:
-            result = self.driver.execute_script(script)
-            return result
-        except Exception as e:
-            print(f"[Agent] wait_for_stable_dom error: {e}")
-            return False
+        return self.settle("stable_dom", timeout=timeout, quiet_ms=int(stability_time * 1000))["settled"]
 
     def _wait_for_new_elements(self, timeout=1.0):
         """
@@ -2500,52 +2639,22 @@ class AgentSelenium:
 
     def _wait_if_page_loading(self, timeout=60):
         """If page is loading, wait for it to finish. If not loading, return immediately."""
-        import time
-
-        check_script = """
-        // 1. Document still loading
-        if (document.readyState !== 'complete') return 'document-loading';
-
-        // 2. jQuery AJAX in progress
-        if (typeof jQuery !== 'undefined' && jQuery.active > 0) return 'jquery-ajax';
-
-        // 3. Check for aria-busy (accessibility standard for loading)
-        if (document.querySelector('[aria-busy="true"]')) return 'aria-busy';
-
-        // 4. Check for visible progressbar
-        var prog = document.querySelector('[role="progressbar"]');
-        if (prog && prog.offsetParent !== null) return 'progressbar';
-
-        return false;
-        """
-
-        try:
-            start_time = time.time()
-
-            # Quick check - if not loading, return immediately
-            is_loading = self.driver.execute_script(check_script)
-            if not is_loading:
-                return {'waited': 0, 'was_loading': False}
-
-            print(f"[Agent] ⏳ Page loading detected ({is_loading}), waiting...")
-
-            # Poll until loading finishes
-            while is_loading and (time.time() - start_time) < timeout:
-                time.sleep(0.2)
-                is_loading = self.driver.execute_script(check_script)
+        # Loading = document loading, requests / jQuery AJAX pending, aria-busy or a visible
+        # progressbar. No quiet window: returns on the first idle check.
+        result = self.settle("page_loading", timeout=timeout, quiet_ms=0, strict=True, paint=False, network=False)
+        if result.get("reason") == "alert":
+            return {'waited': 0, 'was_loading': False}
 
-            waited = int((time.time() - start_time) * 1000)
+        if not result.get("first_reason"):
+            return {'waited': 0, 'was_loading': False}
 
-            if is_loading:
-                print(f"[Agent] ⚠️ Loading timeout after {waited}ms")
-                return {'waited': waited, 'was_loading': True, 'timeout': True}
-            else:
-                print(f"[Agent] ✅ Loading finished after {waited}ms")
-                return {'waited': waited, 'was_loading': True}
+        waited = result["ms"]
+        if not result["settled"]:
+            print(f"[Agent] ⚠️ Loading timeout after {waited}ms ({result['reason']})")
+            return {'waited': waited, 'was_loading': True, 'timeout': True}
+        print(f"[Agent] ✅ Loading ({result['first_reason']}) finished after {waited}ms")
+        return {'waited': waited, 'was_loading': True}
 
-        except Exception as e:
-            print(f"[Agent] _wait_if_page_loading error: {e}")
-            return {'waited': 0, 'was_loading': False}
 
     def _check_selector_unique(self, selector: str) -> Dict:
         """Check if selector matches more than one element. Returns error only if not unique (>1)."""
@@ -1,21 +1,39 @@
 # chrome_manager.py
 # Robust cross-platform Chrome/ChromeDriver management
 # Handles version detection, driver download, permissions, and profile isolation
+# SCALABLE: resolved driver paths are cached per Chrome version and a small warm pool of
+# pre-launched browsers hides Chrome start-up from sessions
 
 import os
+import json
 import stat
+import time
+import atexit
 import tempfile
 import platform
 import subprocess
+import threading
 import re
 import shutil
-from typing import Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
 from webdriver_manager.chrome import ChromeDriverManager
 
+# Chrome version -> chromedriver path. Lives in the webdriver_manager cache dir so
+# clear_driver_cache() drops it together with the drivers it points to.
+DRIVER_CACHE_FILE = os.path.join(os.path.expanduser('~'), '.wdm', 'quattera_driver_cache.json')
+
+# Re-detect the installed Chrome version at most this often (Chrome auto-updates)
+CHROME_VERSION_TTL = 3600
+
+POOL_PROFILE_PREFIX = "quattera-selenium-profile-"
+
+_cache_lock = threading.Lock()
+_detected_version: Dict[str, object] = {"version": None, "at": 0.0}
+
 
 class ChromeManager:
     """
@@ -151,6 +169,62 @@ class ChromeManager:
         
         return None
     
+    def get_chrome_version_cached(self, refresh: bool = False) -> Optional[str]:
+        """Installed Chrome version, detected at most once per CHROME_VERSION_TTL"""
+        with _cache_lock:
+            fresh = time.time() - _detected_version["at"] < CHROME_VERSION_TTL
+            if fresh and not refresh and _detected_version["version"]:
+                return _detected_version["version"]
+        version = self.get_installed_chrome_version()
+        with _cache_lock:
+            _detected_version.update(version=version, at=time.time())
+        return version
+
+    def _load_driver_cache(self) -> Dict[str, str]:
+        try:
+            with open(DRIVER_CACHE_FILE, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def get_cached_driver_path(self, chrome_version: Optional[str]) -> Optional[str]:
+        """Previously resolved chromedriver for this Chrome version, if it's still there"""
+        if not chrome_version:
+            return None
+        with _cache_lock:
+            path = self._load_driver_cache().get(chrome_version)
+        if path and os.path.isfile(path):
+            return path
+        return None
+
+    def remember_driver_path(self, chrome_version: Optional[str], driver_path: Optional[str]):
+        """Store the chromedriver that worked for this Chrome version"""
+        if not chrome_version or not driver_path:
+            return
+        with _cache_lock:
+            cache = self._load_driver_cache()
+            if cache.get(chrome_version) == driver_path:
+                return
+            cache[chrome_version] = driver_path
+            try:
+                os.makedirs(os.path.dirname(DRIVER_CACHE_FILE), exist_ok=True)
+                with open(DRIVER_CACHE_FILE, 'w') as f:
+                    json.dump(cache, f)
+            except OSError as e:
+                print(f"[ChromeManager] Could not save driver cache: {e}")
+
+    def forget_driver_path(self, chrome_version: Optional[str]):
+        """Drop a cached chromedriver that failed to start"""
+        with _cache_lock:
+            cache = self._load_driver_cache()
+            if cache.pop(chrome_version, None) is None:
+                return
+            try:
+                with open(DRIVER_CACHE_FILE, 'w') as f:
+                    json.dump(cache, f)
+            except OSError:
+                pass
+
     def get_major_version(self, full_version: str) -> str:
         """Extract major version from full version string"""
         if full_version:
@@ -246,8 +320,9 @@ class ChromeManager:
         os.makedirs(profile_dir, exist_ok=True)
         return profile_dir
     
-    def create_chrome_options(self, headless: bool = False, download_dir: Optional[str] = None) -> Options:
-        """Create Chrome options with all necessary settings"""
+    def create_chrome_options(self, headless: bool = False, download_dir: Optional[str] = None,
+                              network_events: bool = False, profile_dir: Optional[str] = None) -> Options:
+        """Create Chrome options with all necessary settings (profile_dir: own isolated profile)"""
         options = Options()
         
         if headless:
@@ -262,7 +337,7 @@ class ChromeManager:
         options.add_experimental_option('useAutomationExtension', False)
         
         # Use isolated profile - CRITICAL for not interfering with user's Chrome
-        profile_dir = self.get_isolated_profile_dir()
+        profile_dir = profile_dir or self.get_isolated_profile_dir()
         options.add_argument(f"--user-data-dir={profile_dir}")
         print(f"[ChromeManager] Using isolated profile: {profile_dir}")
         
@@ -273,12 +348,24 @@ class ChromeManager:
                 "download.directory_upgrade": True,
             }
             options.add_experimental_option("prefs", prefs)
+
+        if network_events:
+            # DevTools Network events in the performance log - page settle detection reads them.
+            # Chromedriver buffers them until read: code that drives the browser without
+            # settling (discovery crawl) runs under AgentSelenium.network_log_drain()
+            options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+            options.add_experimental_option('perfLoggingPrefs', {'enableNetwork': True, 'enablePage': False})
         
         return options
     
-    def initialize_driver(self, headless: bool = False, download_dir: Optional[str] = None) -> webdriver.Chrome:
+    def initialize_driver(self, headless: bool = False, download_dir: Optional[str] = None,
+                          network_events: bool = False, profile_dir: Optional[str] = None) -> webdriver.Chrome:
         """
         Initialize Chrome WebDriver with robust fallback methods.
+
+        Args:
+            network_events: Record DevTools Network events in the performance log
+            profile_dir: Isolated profile directory (default: the shared agent profile)
         
         Returns:
             webdriver.Chrome instance
@@ -286,18 +373,39 @@ class ChromeManager:
         Raises:
             Exception if all methods fail
         """
-        options = self.create_chrome_options(headless=headless, download_dir=download_dir)
+        options = self.create_chrome_options(headless=headless, download_dir=download_dir,
+                                             network_events=network_events, profile_dir=profile_dir)
         
         driver_initialized = False
         last_error = None
         driver = None
         
         # Detect Chrome version first
-        self.chrome_version = self.get_installed_chrome_version()
+        self.chrome_version = self.get_chrome_version_cached()
         major_version = self.get_major_version(self.chrome_version) if self.chrome_version else None
+
+        # Method 0: chromedriver already resolved for this Chrome version - no
+        # webdriver_manager lookup on the hot path
+        cached_path = self.get_cached_driver_path(self.chrome_version)
+        if cached_path:
+            try:
+                self.fix_permissions(cached_path)
+                service = Service(executable_path=cached_path)
+                driver = webdriver.Chrome(service=service, options=options)
+                driver.set_page_load_timeout(40)
+                self.driver_path = cached_path
+                driver_initialized = True
+                print(f"[ChromeManager] ✅ Initialized successfully (cached driver: {cached_path})")
+            except Exception as e:
+                last_error = e
+                print(f"[ChromeManager] Cached driver failed: {e}")
+                # Chrome may have auto-updated - resolve again from scratch
+                self.forget_driver_path(self.chrome_version)
+                self.chrome_version = self.get_chrome_version_cached(refresh=True)
+                major_version = self.get_major_version(self.chrome_version) if self.chrome_version else None
         
         # Method 1: ChromeDriverManager with exact version match
-        if self.chrome_version:
+        if self.chrome_version and not driver_initialized:
             try:
                 print(f"[ChromeManager] Method 1: Exact version match for Chrome {self.chrome_version}...")
                 downloaded_path = ChromeDriverManager(driver_version=self.chrome_version).install()
@@ -395,7 +503,7 @@ class ChromeManager:
                 self.clear_driver_cache()
                 
                 # Re-detect Chrome version
-                self.chrome_version = self.get_installed_chrome_version()
+                self.chrome_version = self.get_chrome_version_cached(refresh=True)
                 
                 if self.chrome_version:
                     downloaded_path = ChromeDriverManager(driver_version=self.chrome_version).install()
@@ -421,6 +529,11 @@ class ChromeManager:
                 last_error = e
                 print(f"[ChromeManager] Method 5 failed: {e}")
         
+        if driver_initialized:
+            # Ask the service which binary actually runs (Method 3 lets Selenium find it)
+            driver_path = getattr(getattr(driver, 'service', None), 'path', None) or self.driver_path
+            self.remember_driver_path(self.chrome_version, driver_path)
+
         if not driver_initialized:
             error_msg = (
                 f"All Chrome initialization methods failed.\n"
@@ -434,6 +547,223 @@ class ChromeManager:
         return driver
 
 
+class WarmBrowserPool:
+    """
+    Pre-launched Chrome instances, each with its own isolated profile.
+
+    acquire() hands out a warm browser matching the launch options (or starts one
+    cold), then refills the pool in the background. release() resets the browser -
+    all tabs replaced by one fresh blank tab, cookies / cache / storage of visited
+    origins cleared - and keeps it for the next session. size=0 disables pooling:
+    acquire() is a plain cold start and release() quits.
+    """
+
+    def __init__(self, size: int = 1):
+        self.size = max(0, size)
+        self._idle: List[Tuple[tuple, webdriver.Chrome]] = []
+        self._launched: Dict[str, Tuple[str, tuple]] = {}  # driver session_id -> (profile dir, launch key)
+        self._key: Optional[tuple] = None     # launch options the pool keeps warm
+        self._warming = 0
+        self._closed = False
+        self._lock = threading.Lock()
+        if self.size:
+            self._cleanup_stale_profiles()
+            atexit.register(self.shutdown)
+
+    def warm(self, headless: bool = False, download_dir: Optional[str] = None, network_events: bool = False):
+        """Start pre-launching browsers for these options in the background"""
+        if not self.size:
+            return
+        with self._lock:
+            self._key = (headless, download_dir, network_events)
+        self._refill_async()
+
+    def acquire(self, headless: bool = False, download_dir: Optional[str] = None,
+                network_events: bool = False) -> webdriver.Chrome:
+        """A ready browser for a session: warm when one matches, else a cold start"""
+        key = (headless, download_dir, network_events)
+        if not self.size:
+            return ChromeManager().initialize_driver(headless=headless, download_dir=download_dir,
+                                                     network_events=network_events)
+        driver = None
+        with self._lock:
+            self._key = key
+        while driver is None:
+            with self._lock:
+                index = next((i for i, (k, _) in enumerate(self._idle) if k == key), None)
+                if index is None:
+                    break
+                _, candidate = self._idle.pop(index)
+            if self._is_alive(candidate):
+                driver = candidate
+                print("[BrowserPool] ✅ Using warm browser")
+
+        if driver is None:
+            print("[BrowserPool] No warm browser - starting one now")
+            driver = self._launch(key)
+        else:
+            try:
+                driver.maximize_window()
+            except Exception:
+                pass
+        self._refill_async()
+        return driver
+
+    def release(self, driver: webdriver.Chrome):
+        """Session is done with the browser: reset it for reuse in the background, or quit"""
+        if driver.session_id not in self._launched or not self.size or self._closed:
+            self._discard(driver)
+            return
+        threading.Thread(target=self._recycle, args=(driver,), daemon=True,
+                         name="browser-pool-reset").start()
+
+    def shutdown(self):
+        """Quit all idle browsers (agent exit)"""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for _, driver in idle:
+            self._discard(driver)
+
+    # ----- internals -----
+
+    def _launch(self, key: tuple) -> webdriver.Chrome:
+        headless, download_dir, network_events = key
+        profile_dir = tempfile.mkdtemp(prefix=POOL_PROFILE_PREFIX)
+        try:
+            driver = ChromeManager().initialize_driver(headless=headless, download_dir=download_dir,
+                                                       network_events=network_events, profile_dir=profile_dir)
+        except Exception:
+            shutil.rmtree(profile_dir, ignore_errors=True)
+            raise
+        with self._lock:
+            self._launched[driver.session_id] = (profile_dir, key)
+        return driver
+
+    def _refill_async(self):
+        with self._lock:
+            if self._closed or self._key is None:
+                return
+            # Sessions now want other launch options - idle browsers for the old ones go
+            stale = [d for k, d in self._idle if k != self._key]
+            self._idle = [(k, d) for k, d in self._idle if k == self._key]
+        for driver in stale:
+            self._discard(driver)
+        with self._lock:
+            missing = self.size - sum(1 for k, _ in self._idle if k == self._key) - self._warming
+            if missing <= 0:
+                return
+            self._warming += missing
+            key = self._key
+        for _ in range(missing):
+            threading.Thread(target=self._warm_one, args=(key,), daemon=True, name="browser-pool-warm").start()
+
+    def _warm_one(self, key: tuple):
+        try:
+            driver = self._launch(key)
+        except Exception as e:
+            print(f"[BrowserPool] ⚠️ Could not pre-launch browser: {e}")
+            with self._lock:
+                self._warming -= 1
+            return
+        self._park(driver)
+        with self._lock:
+            self._warming -= 1
+            keep = not self._closed and key == self._key
+            if keep:
+                self._idle.append((key, driver))
+        if keep:
+            print(f"[BrowserPool] 🔥 Browser warmed ({len(self._idle)} idle)")
+        else:
+            self._discard(driver)
+
+    def _recycle(self, driver: webdriver.Chrome):
+        if not self._reset(driver):
+            self._discard(driver)
+            return
+        self._park(driver)
+        with self._lock:
+            _, key = self._launched.get(driver.session_id, (None, None))
+            keep = (not self._closed and key == self._key
+                    and sum(1 for k, _ in self._idle if k == key) < self.size)
+            if keep:
+                self._idle.append((key, driver))
+        if not keep:
+            self._discard(driver)
+
+    def _reset(self, driver: webdriver.Chrome) -> bool:
+        """Wipe everything the last session left behind; False if the browser is unusable"""
+        try:
+            origins = set()
+            handles = driver.window_handles
+            for handle in handles:
+                driver.switch_to.window(handle)
+                history = driver.execute_cdp_cmd('Page.getNavigationHistory', {})
+                for entry in history.get('entries', []):
+                    match = re.match(r'^(https?://[^/?#]+)', entry.get('url', ''))
+                    if match:
+                        origins.add(match.group(1))
+            # Fresh tab, old ones closed - sessionStorage (clearDataForOrigin leaves it) and
+            # history live in the tab
+            driver.switch_to.new_window('tab')
+            fresh = driver.current_window_handle
+            for handle in handles:
+                driver.switch_to.window(handle)
+                driver.close()
+            driver.switch_to.window(fresh)
+
+            driver.execute_cdp_cmd('Network.clearBrowserCookies', {})
+            driver.execute_cdp_cmd('Network.clearBrowserCache', {})
+            for origin in origins:
+                driver.execute_cdp_cmd('Storage.clearDataForOrigin', {'origin': origin, 'storageTypes': 'all'})
+            try:
+                driver.get_log('performance')  # Drop the last session's network events
+            except Exception:
+                pass
+            return True
+        except Exception as e:
+            print(f"[BrowserPool] Browser reset failed, discarding it: {e}")
+            return False
+
+    def _park(self, driver: webdriver.Chrome):
+        """Keep idle visible browsers out of the user's way"""
+        try:
+            driver.minimize_window()
+        except Exception:
+            pass
+
+    def _is_alive(self, driver: webdriver.Chrome) -> bool:
+        try:
+            _ = driver.current_url
+            return True
+        except Exception:
+            self._discard(driver)
+            return False
+
+    def _discard(self, driver: webdriver.Chrome):
+        session_id = getattr(driver, 'session_id', None)
+        try:
+            driver.quit()
+        except Exception:
+            pass
+        with self._lock:
+            profile_dir, _ = self._launched.pop(session_id, (None, None))
+        if profile_dir:
+            shutil.rmtree(profile_dir, ignore_errors=True)
+
+    def _cleanup_stale_profiles(self):
+        """Profiles left behind by a crashed agent (older than a day)"""
+        tmp = tempfile.gettempdir()
+        one_day_ago = time.time() - 24 * 60 * 60
+        try:
+            for name in os.listdir(tmp):
+                path = os.path.join(tmp, name)
+                if name.startswith(POOL_PROFILE_PREFIX) and os.path.getmtime(path) < one_day_ago:
+                    shutil.rmtree(path, ignore_errors=True)
+        except OSError:
+            pass
+
+
 # Convenience function for simple usage
 def get_chrome_driver(headless: bool = False, download_dir: Optional[str] = None) -> webdriver.Chrome:
     """
@@ -0,0 +1,235 @@
+# clickable_harvester.py
+# Single-pass in-page harvest of the crawler's clickable candidates
+#
+# One execute_script call finds, filters and describes every candidate clickable
+# (visibility, bounding box, text, table / dropdown membership, XPath selector) and
+# returns it as compact JSON with the element references - instead of find_elements
+# per selector, a marking script per table and several WebDriver calls per element.
+# Same rules as the per-element scan in FormPagesCrawler._find_all_clickables_webdriver.
+
+from typing import Any, Dict, Iterable, List, Optional
+
+HARVEST_CLICKABLES_JS = """
+var opts = arguments[0];
+var blacklist = opts.blacklist || [];
+var baseDomain = opts.base_domain || '';
+var navItems = new Set(opts.nav_items || []);
+var seenLocators = new Set(opts.seen_locators || []);
+
+var PAGINATION = ['1', '2', '3', '4', '5', '6', '7', '8', '9', '0',
+                  '\\u00ab', '\\u00bb', '\\u2039', '\\u203a', '<', '>', 'next', 'prev', 'previous'];
+var TABLE_SELECTOR = "table, [role='table'], [role='grid'], .oxd-table, [class$='table'], [class^='data-table']";
+var DROPDOWN_SELECTOR = ".dropdown-menu, [role='menu'], [role='listbox'], [class*='dropdown']";
+var SELECTORS = ["a", "button", "[onclick]", "[role='button']", "[role='tab']", "[role='menuitem']", "li",
+                 ".dropdown-toggle", ".tab", ".menu-item", "[class*='button']", "[class*='link']",
+                 "[class*='nav']", "[class*='menu']", "[class*='tab']"];
+
+function hrefOf(el) {
+    if (typeof el.href === 'string') return el.href;
+    return el.getAttribute('href') || '';
+}
+
+function classOf(el) {
+    return el.getAttribute('class') || '';
+}
+
+function textOf(el) {
+    var text = el.innerText !== undefined ? el.innerText : el.textContent;
+    return (text || '').trim();
+}
+
+// Selenium's is_displayed, close enough: rendered, not hidden / transparent, and it (or a child) has a size
+function isShown(el) {
+    if (!el.isConnected) return false;
+    if (el.checkVisibility && !el.checkVisibility({opacityProperty: true, visibilityProperty: true})) return false;
+    var style = window.getComputedStyle(el);
+    if (style.display === 'none' || style.visibility === 'hidden' || style.visibility === 'collapse' ||
+        parseFloat(style.opacity) === 0) return false;
+    var rect = el.getBoundingClientRect();
+    if (rect.width > 0 && rect.height > 0) return true;
+    for (var i = 0; i < el.children.length; i++) {
+        var r = el.children[i].getBoundingClientRect();
+        if (r.width > 0 && r.height > 0) return true;
+    }
+    return false;
+}
+
+// Blacklisted text, downloads and external links (_should_skip_element)
+function isBlocked(el, text) {
+    var lower = text.toLowerCase();
+    var i;
+    if (lower.indexOf('\\n') !== -1) {
+        var words = lower.split(/\\s+/);
+        for (i = 0; i < words.length; i++) {
+            if (words[i] && blacklist.indexOf(words[i]) !== -1) return true;
+        }
+        return false;
+    }
+    for (i = 0; i < blacklist.length; i++) {
+        if (lower.indexOf(blacklist[i]) !== -1) return true;
+    }
+    var href = hrefOf(el);
+    if (href) {
+        var hrefLower = href.toLowerCase();
+        if (hrefLower.indexOf('.pdf') !== -1 || hrefLower.indexOf('.zip') !== -1 ||
+            hrefLower.indexOf('.exe') !== -1) return true;
+        if (href.indexOf('http') === 0) {
+            var domain = '';
+            try { domain = new URL(href).host; } catch (e) {}
+            if (domain && domain !== baseDomain) return true;
+        }
+    }
+    return false;
+}
+
+// Full XPath from the root, same as _get_unique_selector
+function xpathOf(el) {
+    if (el === document.body) return '/html/body';
+    var parent = el.parentNode;
+    if (!parent || parent.nodeType !== 1) return null;
+    var ix = 0, siblings = parent.childNodes;
+    for (var i = 0; i < siblings.length; i++) {
+        var sibling = siblings[i];
+        if (sibling === el) {
+            var base = xpathOf(parent);
+            return base === null ? null : base + '/' + el.tagName + '[' + (ix + 1) + ']';
+        }
+        if (sibling.nodeType === 1 && sibling.tagName === el.tagName) ix++;
+    }
+    return null;
+}
+
+// _get_selector_for_element (used when there is no XPath)
+function cssOf(el) {
+    var tag = el.tagName.toLowerCase();
+    if (el.id) return '#' + el.id;
+    var classes = classOf(el).split(/\\s+/).filter(function(c) { return c && c.length < 30; });
+    return classes.length ? tag + '.' + classes.join('.') : tag;
+}
+
+function selectorOf(el) {
+    var xpath = xpathOf(el);
+    return xpath === null ? cssOf(el) : 'xpath=' + xpath.toLowerCase();
+}
+
+// Generic cursor:pointer elements the selectors miss (not form controls, not in tables) - first 50
+function pointerCandidates() {
+    var results = [];
+    var all = document.querySelectorAll('div, span, li, article, section');
+    for (var i = 0; i < all.length && results.length < 50; i++) {
+        var el = all[i];
+        var role = el.getAttribute('role') || '';
+        if (role === 'combobox' || role === 'listbox' || role === 'textbox' || role === 'searchbox' ||
+            role === 'spinbutton' || role === 'slider' || role === 'option') continue;
+        var cls = classOf(el).toLowerCase();
+        if (cls.includes('input') || cls.includes('select') || cls.includes('dropdown') ||
+            cls.includes('picker') || cls.includes('autocomplete') || cls.includes('combobox') ||
+            cls.includes('field') || cls.includes('search-box')) continue;
+        if (el.closest('form, [role="search"], [role="form"], ' +
+                       '[class*="filter"], [class*="search-form"], [class*="form-group"], ' +
+                       '[class*="input-group"], [class*="field-wrapper"], [class*="input-wrapper"]')) continue;
+        if (el.parentElement && el.parentElement.querySelector('input, select, textarea')) continue;
+        if (el.parentElement && el.parentElement.closest(
+                "table, tbody, tr, td, th, [role='table'], [role='grid'], [role='row'], [role='gridcell']")) continue;
+        if (window.getComputedStyle(el).cursor !== 'pointer') continue;
+        var rect = el.getBoundingClientRect();
+        if (rect.width > 30 && rect.height > 20 && rect.top < window.innerHeight) results.push(el);
+    }
+    return results;
+}
+
+var processed = new Set();
+var seenKeys = new Set();
+var items = [];
+var stats = {candidates: 0, skipped_seen: 0};
+
+function consider(el, source) {
+    if (processed.has(el)) return;  // Same element from another selector - same outcome
+    processed.add(el);
+    stats.candidates++;
+    if (!isShown(el)) return;
+
+    var text = textOf(el);
+    if (isBlocked(el, text)) return;
+    if (text && navItems.has(text.toLowerCase())) return;
+    if (PAGINATION.indexOf(text) !== -1) return;
+
+    var selector = selectorOf(el);
+    if (seenLocators.has(text + '|' + selector)) { stats.skipped_seen++; return; }
+    if (!text || text.length > 100) return;
+    if (text.indexOf('\\n') !== -1) {
+        var lines = text.split('\\n').map(function(l) { return l.trim(); })
+                        .filter(function(l) { return l.length > 1; });
+        text = lines.length ? lines[0] : '';
+        if (!text) return;
+    }
+
+    var tag = el.tagName.toLowerCase();
+    var href = hrefOf(el), onclick = el.getAttribute('onclick') || '', cls = classOf(el);
+    if (source === 'selector') {
+        var cursor = window.getComputedStyle(el).cursor;
+        var clickable = tag === 'a' || tag === 'button' || href || onclick ||
+                        cursor === 'pointer' || cursor === 'hand' || cls.toLowerCase().indexOf('click') !== -1;
+        if (!clickable) return;
+    }
+
+    var key = JSON.stringify([text.toLowerCase(), href, onclick]);
+    if (seenKeys.has(key)) return;
+    seenKeys.add(key);
+
+    var rect = el.getBoundingClientRect();
+    items.push({
+        element: el, text: text, selector: selector, tag: tag, href: href, onclick: onclick, classes: cls,
+        x: Math.round(rect.left + window.scrollX), y: Math.round(rect.top + window.scrollY),
+        width: Math.round(rect.width), height: Math.round(rect.height),
+        in_table: !!el.closest(TABLE_SELECTOR), in_dropdown: !!el.closest(DROPDOWN_SELECTOR),
+        source: source
+    });
+}
+
+SELECTORS.forEach(function(selector) {
+    var found;
+    try { found = document.querySelectorAll(selector); } catch (e) { return; }
+    for (var i = 0; i < found.length; i++) {
+        if (found[i].closest(TABLE_SELECTOR)) continue;  // Table rows/cells are data, not navigation
+        consider(found[i], 'selector');
+    }
+});
+pointerCandidates().forEach(function(el) { consider(el, 'pointer'); });
+
+return {items: items, viewport_width: window.innerWidth, stats: stats};
+"""
+
+
+def harvest_clickables(driver, blacklist: Iterable[str], base_domain: str, nav_items: Iterable[str],
+                       seen_locators: Iterable[str]) -> Optional[Dict[str, Any]]:
+    """
+    Run the harvest script on the current page.
+
+    Returns:
+        {items: [{element, text, selector, tag, href, onclick, classes, x, y, width, height,
+        in_table, in_dropdown, source ('selector' | 'pointer')}], viewport_width, stats}
+        in discovery order, or None when the script fails (caller falls back)
+    """
+    try:
+        result = driver.execute_script(HARVEST_CLICKABLES_JS, {
+            "blacklist": list(blacklist),
+            "base_domain": base_domain or "",
+            "nav_items": list(nav_items),
+            "seen_locators": list(seen_locators),
+        })
+    except Exception as e:
+        print(f"    [Harvest] ⚠️ Clickable harvest failed: {e}")
+        return None
+    if not isinstance(result, dict) or not isinstance(result.get("items"), list):
+        return None
+    return result
+
+
+def is_ai_target(text: str, ai_clickables: List[str]) -> bool:
+    """True when the text matches one of the AI-identified navigation targets"""
+    text_lower = text.lower().strip()
+    return any(
+        ai_name.lower().strip() in text_lower or text_lower in ai_name.lower().strip()
+        for ai_name in ai_clickables
+    )
@@ -17,6 +17,7 @@ from .form_pages_utils import (
     wait_dom_ready, safe_click, page_has_form_fields, sanitize_filename, visible_text,
     dismiss_all_popups_and_overlays,
 )
+from .clickable_harvester import harvest_clickables, is_ai_target
 from activity_logger import get_activity_logger
 import logging
 
@@ -1157,12 +1158,16 @@ class FormPagesCrawler:
             text = clickable.get('text', '').lower()
 
             # User dropdowns are typically in top-right corner
-            location = element.location
-            x = location.get('x', 0)
-            y = location.get('y', 0)
-
-            # Get viewport width
-            viewport_width = self.driver.execute_script("return window.innerWidth;")
+            # (harvested clickables carry position, classes and viewport width - no round trips)
+            if 'viewport_width' in clickable:
+                x = clickable.get('pos_x', 0)
+                y = clickable.get('pos_y', 0)
+                viewport_width = clickable['viewport_width']
+            else:
+                location = element.location
+                x = location.get('x', 0)
+                y = location.get('y', 0)
+                viewport_width = self.driver.execute_script("return window.innerWidth;")
 
             # Check if in top-right area (right 30% of screen, top 200px)
             is_top_right = x > (viewport_width * 0.7) and y < 200
@@ -1171,7 +1176,7 @@ class FormPagesCrawler:
             has_user_keyword = 'user' in text
 
             # Check if element has user-related classes
-            classes = element.get_attribute('class') or ''
+            classes = clickable['classes'] if 'classes' in clickable else (element.get_attribute('class') or '')
             has_user_class = 'user' in classes.lower()
 
             return is_top_right and (has_user_keyword or has_user_class)
@@ -1549,10 +1554,7 @@ class FormPagesCrawler:
         return buttons
 
     def _find_all_clickables(self) -> List[Dict[str, Any]]:
-        """Find ALL clickable elements"""
-        clickables = []
-        seen = set()
-        
+        """Find ALL clickable elements - one in-page harvest (see clickable_harvester.py)"""
         # ═══════════════════════════════════════════════════════════════════════
         # AI VISION: Ask AI what clickables are relevant navigation targets
         # ═══════════════════════════════════════════════════════════════════════
@@ -1572,6 +1574,46 @@ class FormPagesCrawler:
         except Exception as e:
             print(f"    [AI Vision] ⚠️ Error: {e} - falling back to all clickables")
 
+        harvest = harvest_clickables(self.driver, self.button_blacklist, self.base_domain,
+                                     self.global_navigation_items, self.global_locators)
+        if harvest is None:
+            print("    [Harvest] ⚠️ Falling back to per-element WebDriver scan")
+            return self._find_all_clickables_webdriver(ai_clickables)
+
+        stats = harvest.get('stats') or {}
+        print(f"    [Harvest] {len(harvest['items'])} clickables from {stats.get('candidates', 0)} candidates "
+              f"({stats.get('skipped_seen', 0)} already-seen selectors skipped)")
+
+        clickables = []
+        viewport_width = harvest.get('viewport_width') or 0
+        for item in harvest['items']:
+            text = item['text']
+
+            # AI VISION FILTER: Only include if AI identified as navigation
+            if ai_clickables and not is_ai_target(text, ai_clickables):
+                continue
+
+            prefix = 'pointer' if item.get('source') == 'pointer' else item['tag']
+            clickables.append({
+                'element': item['element'],
+                'text': text,
+                'selector': item['selector'],
+                'tag': item['tag'],
+                'id': f"{prefix}_{text[:20]}_{len(clickables)}",
+                'pos_y': item.get('y', 0),
+                'pos_x': item.get('x', 0),
+                'classes': item.get('classes', ''),
+                'viewport_width': viewport_width,
+            })
+            print(f"    🔘 Found clickable: '{text[:40]}'")
+
+        return self._finalize_clickables(clickables)
+
+    def _find_all_clickables_webdriver(self, ai_clickables: List[str]) -> List[Dict[str, Any]]:
+        """Find ALL clickable elements element by element (fallback when the harvest script fails)"""
+        clickables = []
+        seen = set()
+
         # ✅ Step 1: Pre-identify ALL table containers
         print("    [Performance] Pre-scanning for table containers...")
         table_containers = []
@@ -1932,11 +1974,6 @@ class FormPagesCrawler:
         except Exception as e:
             print(f"    [Catch-all] Error: {e}")
 
-
-
-
-        clickables.sort(key=lambda c: (c.get('pos_y', 0), c.get('pos_x', 0)))
-
         # ✅ Step 4: Clean up - remove temporary attributes
         if table_containers:
             try:
@@ -1950,6 +1987,12 @@ class FormPagesCrawler:
             except:
                 pass
 
+        return self._finalize_clickables(clickables)
+
+    def _finalize_clickables(self, clickables: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Sort by position, drop parent/child duplicates with the same text, cap at 50"""
+        clickables.sort(key=lambda c: (c.get('pos_y', 0), c.get('pos_x', 0)))
+
         filtered_clickables = []
         for clickable in clickables:
             selector = clickable.get('selector', '')
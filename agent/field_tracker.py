@@ -0,0 +1,255 @@
+"""
+Field Tracker - in-browser incremental form-field change detection for step execution
+Location: agent/field_tracker.py
+
+A MutationObserver injected into the page keeps a live registry of form fields
+(input/select/textarea) and a structural hash of the document. Around each step the
+agent asks it for a mark (before) and a compact delta (after) - one small round trip
+each, instead of serializing the whole document twice and diffing it in Python.
+
+Delta fields:
+    hash / hash_changed              structural hash of the document (tags, attributes, text)
+    added / removed                  field keys that appeared / disappeared
+    shown / hidden                   fields whose rendered (computed style) visibility flipped
+    declared_shown / declared_hidden fields whose markup visibility flipped (hidden attribute,
+                                     aria-hidden, display:none style, *hidden* class on the
+                                     field or an ancestor)
+    conditional                      conditional attributes / toggle classes that changed
+                                     (ng-show, data-toggle, v-if, 'd-none' ...)
+    elements_before / elements_after element counts
+    reset                            the tracker was (re)installed since the mark - new
+                                     document (navigation) or different frame
+
+Field keys are the same as the agent's visibility check: id, name, data-field or the
+first 80 chars of the outerHTML.
+"""
+
+from typing import Dict, Optional, Tuple
+
+# Lists in the delta are capped - the decision only needs to know they're non-empty
+DELTA_LIST_LIMIT = 50
+
+# Element count change that counts as a structural change (same as the old HTML diff)
+STRUCTURE_CHANGE_PERCENT = 30
+
+_TRACKER_JS = """
+if (!window.__qaFieldTracker) {
+    (function() {
+        var FIELD_SELECTOR = 'input, select, textarea';
+        var CONDITIONAL_ATTRS = ['data-conditional', 'data-visible', 'data-hidden', 'data-show', 'data-hide',
+                                 'ng-show', 'ng-hide', 'ng-if', 'v-show', 'v-if', '*ngIf',
+                                 'data-bind', 'data-toggle'];
+        var TOGGLE_CLASSES = ['show', 'hide', 'hidden', 'visible', 'active', 'open', 'closed',
+                              'collapsed', 'expanded', 'd-none', 'd-block'];
+        var LIMIT = %(limit)d;
+
+        var t = {
+            token: Date.now().toString(36) + Math.random().toString(36).slice(2, 8),
+            fields: new Set(),
+            dirty: true,
+            hash: '',
+            mutations: 0,
+            conditional: [],
+            baseline: null
+        };
+
+        function addFieldsIn(node) {
+            if (!node || node.nodeType !== 1) return;
+            if (node.matches(FIELD_SELECTOR)) t.fields.add(node);
+            node.querySelectorAll(FIELD_SELECTOR).forEach(function(f) { t.fields.add(f); });
+        }
+
+        function fieldKey(el) {
+            return el.id || el.name || el.getAttribute('data-field') || el.outerHTML.substring(0, 80);
+        }
+
+        function renderedHidden(el) {
+            var style = window.getComputedStyle(el);
+            return style.display === 'none' || style.visibility === 'hidden' || style.opacity === '0' ||
+                   el.offsetParent === null || el.offsetWidth === 0 || el.offsetHeight === 0;
+        }
+
+        function markupHidden(el) {
+            if (el.tagName === 'INPUT' && (el.getAttribute('type') || '').toLowerCase() === 'hidden') return true;
+            for (var node = el; node && node !== document.body && node.nodeType === 1; node = node.parentElement) {
+                var style = (node.getAttribute('style') || '').replace(/\\s/g, '');
+                if (style.indexOf('display:none') !== -1 || style.indexOf('visibility:hidden') !== -1) return true;
+                if (node.hasAttribute('hidden') || node.getAttribute('aria-hidden') === 'true') return true;
+                var cls = node.getAttribute('class');
+                if (cls && cls.toLowerCase().indexOf('hidden') !== -1) return true;
+            }
+            return false;
+        }
+
+        // key -> [rendered hidden, markup hidden]; drops detached fields from the registry
+        function snapshotFields() {
+            var snap = {};
+            t.fields.forEach(function(el) {
+                if (!el.isConnected) { t.fields.delete(el); return; }
+                if (el.closest('[role="listbox"], [role="menu"]')) return;
+                snap[fieldKey(el)] = [renderedHidden(el) ? 1 : 0, markupHidden(el) ? 1 : 0];
+            });
+            return snap;
+        }
+
+        // FNV-1a over tags, attributes and text (svg internals skipped, like extract_dom) -
+        // recomputed only when something mutated since the last time
+        function structuralHash() {
+            if (!t.dirty) return t.hash;
+            var h1 = 0x811c9dc5, h2 = 0x01000193 ^ 0x5bd1e995;
+            function feed(s) {
+                for (var i = 0; i < s.length; i++) {
+                    var c = s.charCodeAt(i);
+                    h1 = Math.imul(h1 ^ c, 16777619);
+                    h2 = Math.imul(h2 ^ c, 2246822519);
+                }
+            }
+            var walker = document.createTreeWalker(document.documentElement, NodeFilter.SHOW_ELEMENT | NodeFilter.SHOW_TEXT, {
+                acceptNode: function(node) {
+                    var parent = node.parentNode;
+                    if (parent && parent.nodeType === 1 && parent.closest('svg')) return NodeFilter.FILTER_REJECT;
+                    return NodeFilter.FILTER_ACCEPT;
+                }
+            });
+            for (var node = walker.currentNode; node; node = walker.nextNode()) {
+                if (node.nodeType === 3) { feed(node.data); continue; }
+                feed('<' + node.tagName);
+                for (var a = 0; a < node.attributes.length; a++) {
+                    feed(' ' + node.attributes[a].name + '=' + node.attributes[a].value);
+                }
+                feed('>');
+            }
+            t.hash = ('00000000' + (h1 >>> 0).toString(16)).slice(-8) + ('00000000' + (h2 >>> 0).toString(16)).slice(-8);
+            t.dirty = false;
+            return t.hash;
+        }
+
+        function toggleClasses(value) {
+            var classes = (value || '').split(/\\s+/);
+            return TOGGLE_CLASSES.filter(function(c) { return classes.indexOf(c) !== -1; }).join(' ');
+        }
+
+        function hasConditionalAttr(el) {
+            for (var i = 0; i < CONDITIONAL_ATTRS.length; i++) {
+                if (el.hasAttribute(CONDITIONAL_ATTRS[i])) return true;
+            }
+            return false;
+        }
+
+        function noteConditional(record) {
+            var el = record.target, attr = record.attributeName;
+            if (t.conditional.length >= LIMIT || el.nodeType !== 1) return;
+            var now = el.getAttribute(attr);
+            if (CONDITIONAL_ATTRS.indexOf(attr) !== -1) {
+                if (now !== record.oldValue) t.conditional.push({key: fieldKey(el), attr: attr, from: record.oldValue, to: now});
+            } else if (attr === 'class' && hasConditionalAttr(el)) {
+                var before = toggleClasses(record.oldValue), after = toggleClasses(now);
+                if (before !== after) t.conditional.push({key: fieldKey(el), attr: 'class', from: before, to: after});
+            }
+        }
+
+        addFieldsIn(document.documentElement);
+        new MutationObserver(function(records) {
+            t.dirty = true;
+            t.mutations += records.length;
+            records.forEach(function(record) {
+                if (record.type === 'childList') {
+                    record.addedNodes.forEach(addFieldsIn);
+                } else if (record.type === 'attributes') {
+                    noteConditional(record);
+                }
+            });
+        }).observe(document.documentElement, {
+            childList: true, subtree: true, attributes: true, attributeOldValue: true, characterData: true
+        });
+
+        t.mark = function() {
+            t.baseline = {fields: snapshotFields(), hash: structuralHash(),
+                          elements: document.getElementsByTagName('*').length};
+            t.conditional = [];
+            t.mutations = 0;
+            return {token: t.token, hash: t.baseline.hash, fields: Object.keys(t.baseline.fields).length,
+                    elements: t.baseline.elements};
+        };
+
+        t.delta = function(token) {
+            var now = snapshotFields(), hash = structuralHash();
+            var elements = document.getElementsByTagName('*').length;
+            var out = {token: t.token, hash: hash, mutations: t.mutations, elements_after: elements,
+                       added: [], removed: [], shown: [], hidden: [], declared_shown: [], declared_hidden: [],
+                       conditional: t.conditional.slice(0, LIMIT)};
+            function push(list, key) { if (out[list].length < LIMIT) out[list].push(key); }
+
+            if (token !== t.token || !t.baseline) {
+                // Document (or frame) is not the one the mark was taken in
+                out.reset = true;
+                out.hash_changed = true;
+                out.elements_before = null;
+                Object.keys(now).forEach(function(key) { push('added', key); });
+                return out;
+            }
+            var before = t.baseline.fields;
+            out.reset = false;
+            out.hash_changed = hash !== t.baseline.hash;
+            out.elements_before = t.baseline.elements;
+            Object.keys(now).forEach(function(key) {
+                var was = before[key], is = now[key];
+                if (!was) { push('added', key); return; }
+                if (was[0] && !is[0]) push('shown', key);
+                if (!was[0] && is[0]) push('hidden', key);
+                if (was[1] && !is[1]) push('declared_shown', key);
+                if (!was[1] && is[1]) push('declared_hidden', key);
+            });
+            Object.keys(before).forEach(function(key) { if (!(key in now)) push('removed', key); });
+            return out;
+        };
+
+        window.__qaFieldTracker = t;
+    })();
+}
+""" % {"limit": DELTA_LIST_LIMIT}
+
+
+def mark_fields(driver) -> Optional[Dict]:
+    """
+    Install the tracker if needed and take the baseline before a step.
+
+    Returns:
+        {token, hash, fields, elements}, or None when the page can't run it
+    """
+    try:
+        return driver.execute_script(_TRACKER_JS + "return window.__qaFieldTracker.mark();")
+    except Exception as e:
+        print(f"[Agent] ⚠️ Field tracker mark failed: {e}")
+        return None
+
+
+def field_delta(driver, mark: Dict) -> Optional[Dict]:
+    """Changes since `mark` (see module docstring), or None when the page can't run it"""
+    try:
+        return driver.execute_script(_TRACKER_JS + "return window.__qaFieldTracker.delta(arguments[0]);",
+                                     mark.get("token", ""))
+    except Exception as e:
+        print(f"[Agent] ⚠️ Field tracker delta failed: {e}")
+        return None
+
+
+def classify_delta(delta: Dict) -> Tuple[bool, bool]:
+    """
+    (fields_changed_dom, fields_changed_js) for a delta - the two signals the
+    server's regenerate decision reads.
+
+    dom: fields added, markup visibility flipped, conditional toggles or a large
+         element count change
+    js:  fields added or rendered visibility flipped
+    """
+    if delta.get("reset"):
+        return True, True
+    added = bool(delta.get("added"))
+    changed_js = added or bool(delta.get("shown") or delta.get("hidden"))
+    changed_dom = added or bool(delta.get("declared_shown") or delta.get("declared_hidden")
+                                or delta.get("conditional"))
+    before, after = delta.get("elements_before") or 0, delta.get("elements_after") or 0
+    if not changed_dom and before:
+        changed_dom = abs(after - before) / before * 100 > STRUCTURE_CHANGE_PERCENT
+    return changed_dom, changed_js
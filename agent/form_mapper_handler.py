@@ -30,6 +30,7 @@ class FormMapperTaskHandler:
     - form_mapper_init: Initialize browser and navigate to form
     - form_mapper_extract_dom: Extract DOM HTML
     - form_mapper_exec_step: Execute a single test step
+    - form_mapper_exec_steps: Execute a run of steps, stop at the first event
     - form_mapper_screenshot: Capture screenshot
     - form_mapper_navigate: Navigate to URL
     - form_mapper_close: Close browser
@@ -142,6 +143,7 @@ class FormMapperTaskHandler:
             "form_mapper_init": self._handle_init,
             "form_mapper_extract_dom": self._handle_extract_dom,
             "form_mapper_exec_step": self._handle_exec_step,
+            "form_mapper_exec_steps": self._handle_exec_steps,
             "form_mapper_screenshot": self._handle_screenshot,
             "form_mapper_navigate": self._handle_navigate,
             "form_mapper_close": self._handle_close,
@@ -251,7 +253,7 @@ class FormMapperTaskHandler:
         }
         
         # Wait for page to stabilize
-        time.sleep(1)
+        self.selenium.settle("session_start", timeout=10)
         
         return {
             "success": True,
@@ -277,7 +279,7 @@ class FormMapperTaskHandler:
                 self.selenium.initialize_browser(browser_type=browser_type, headless=headless)
             self.selenium.navigate_to_url(base_url)
             self.active_sessions[session_id] = {"url": base_url, "started_at": time.time()}
-            time.sleep(2)  # Let page load
+            self.selenium.settle("navigate", timeout=10)  # Let page load
 
         use_full_dom = payload.get("use_full_dom", True)
 
@@ -387,7 +389,7 @@ class FormMapperTaskHandler:
 
         action = step.get("action", "")
         selector = step.get("selector", "")
-        wait_seconds = step.get("wait_seconds", 0.5)
+        wait_seconds = step.get("wait_seconds")
 
         logger.info(f"[FormMapper] Executing step {step_index}: {action} on {selector[:50] if selector else 'N/A'}")
 
@@ -473,9 +475,10 @@ class FormMapperTaskHandler:
                     print(f"[Handler]    - No full_xpath in step")
                 if not is_locator_error:
                     print(f"[Handler]    - Not a locator error (content mismatch - fallback won't help)")
-        # Wait as specified
-        if wait_seconds:
-            time.sleep(wait_seconds)
+        # execute_step already settled the page; the step's wait_seconds is only an upper
+        # bound for anything still running (returns at once on an idle page)
+        if wait_seconds and result.get("success"):
+            self.selenium.settle("step_wait", timeout=float(wait_seconds))
 
         # Add step_index to result
         result["step_index"] = step_index
@@ -492,6 +495,50 @@ class FormMapperTaskHandler:
 
         return result
 
+    def _handle_exec_steps(self, session_id: int, payload: Dict) -> Dict:
+        """
+        Execute a run of consecutive steps locally and report them in one result.
+
+        The server only batches plain steps (no junction / verify / AI-assisted step inside).
+        Stops at the first step that fails, raises an alert, changes fields or changes
+        the DOM - the server takes over from that step exactly as for a single step.
+
+        Payload:
+            steps: List of step dicts
+            start_index: Index of the first step
+            current_dom_hash: DOM hash the server has for the page
+        """
+        steps = payload.get("steps", [])
+        start_index = payload.get("start_index", 0)
+        dom_hash = payload.get("current_dom_hash", "")
+
+        logger.info(f"[FormMapper] Executing batch of {len(steps)} steps from {start_index}")
+
+        step_results = []
+        for offset, step in enumerate(steps):
+            try:
+                if int(session_id) in self.closed_sessions:
+                    break
+            except (ValueError, TypeError):
+                pass
+            result = self._handle_exec_step(session_id, {"step": step, "step_index": start_index + offset})
+            step_results.append(result)
+
+            new_hash = result.get("new_dom_hash", "")
+            if (not result.get("success")
+                    or result.get("alert_present") or result.get("alert_detected")
+                    or result.get("fields_changed")
+                    or (new_hash and new_hash != dom_hash)):
+                break
+
+        last = step_results[-1] if step_results else {}
+        return {
+            "success": bool(step_results) and bool(last.get("success")),
+            "step_results": step_results,
+            "steps_executed": len(step_results),
+            "error": last.get("error") if step_results else "No steps executed",
+        }
+
     def _handle_fill_autocomplete(self, session_id: int, step: Dict) -> Dict:
         selector = step.get("selector", "")
         value = step.get("value", "a")
@@ -658,7 +705,7 @@ class FormMapperTaskHandler:
         
         try:
             self.selenium.navigate_to_url(url)
-            time.sleep(1)  # Wait for page load
+            self.selenium.settle("navigate", timeout=10)  # Wait for page load
             
             return {
                 "success": True,
@@ -682,6 +729,7 @@ class FormMapperTaskHandler:
                 print(f"!!!!!!! [DEBUG CANCEL TASK] got cancel request, Session {session_id} in closed sessions, skipping(wont close browser)")
                 return {"success": True, "skipped": True, "reason": "already_closed"}
 
+            logger.info(f"[FormMapper] Session {session_id} page settle timings: {self.selenium.settle_stats()}")
 
             # Send bulk logs to server if requested
             if payload.get("complete_logging") and self.activity_logger:
@@ -1170,11 +1218,13 @@ class FormMapperTaskHandler:
         
         Payload:
             scenario: Description of when screenshot was taken
+            screenshot_profile: Optional encoding profile (see screenshot_pipeline)
         """
         scenario = payload.get("scenario", "")
 
         try:
-            screenshot_result = self.selenium.capture_screenshot(scenario_description=scenario, save_to_folder=False)
+            screenshot_result = self.selenium.capture_screenshot(scenario_description=scenario, save_to_folder=False,
+                                                                 profile=payload.get("screenshot_profile"))
 
             #### FOR DEBUG ####
             #self.selenium.capture_screenshot("_handle_get_screenshot_debug")
@@ -1223,34 +1273,21 @@ class FormMapperTaskHandler:
             # Capture screenshot if requested
             if capture_screenshot:
                 try:
+                    # Saved copy (if requested) stays a full-page PNG; the returned one follows the profile
                     screenshot_result = self.selenium.capture_screenshot(scenario_description=scenario_description,
-                                                                         save_to_folder=False)
+                                                                         save_to_folder=bool(save_screenshot),
+                                                                         profile=payload.get("screenshot_profile"))
 
                     #### FOR DEBUG ####
                     #self.selenium.capture_screenshot("_handle_extract_dom_for_recovery_debug")
 
                     screenshot_b64 = screenshot_result.get("screenshot", "") if screenshot_result.get("success") else ""
                     result["screenshot_base64"] = screenshot_b64
-                    
-                    # Save to file if requested
-                    if save_screenshot and hasattr(self.selenium, 'config'):
-                        import os
-                        from datetime import datetime
-                        
-                        screenshot_folder = getattr(self.selenium, 'screenshots_path', None)
-                        if screenshot_folder:
-                            os.makedirs(screenshot_folder, exist_ok=True)
-                            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                            safe_scenario = "".join(c if c.isalnum() or c in "_-" else "_" for c in scenario_description)
-                            filepath = os.path.join(screenshot_folder, f"{safe_scenario}_{timestamp}.png")
-                            
-                            screenshot_bytes = base64.b64decode(screenshot_b64)
-                            with open(filepath, 'wb') as f:
-                                f.write(screenshot_bytes)
-                            
-                            result["screenshot_path"] = filepath
-                            logger.info(f"[FormMapper] Screenshot saved: {filepath}")
-                            
+
+                    if screenshot_result.get("filepath"):
+                        result["screenshot_path"] = screenshot_result["filepath"]
+                        logger.info(f"[FormMapper] Screenshot saved: {screenshot_result['filepath']}")
+
                 except Exception as e:
                     logger.warning(f"[FormMapper] Screenshot capture failed: {e}")
                     result["screenshot_error"] = str(e)
@@ -1501,7 +1538,7 @@ class FormMapperTaskHandler:
             element = self._find_element(selector, timeout=5)
             if element:
                 element.click()
-                time.sleep(0.5)
+                self.selenium.settle("navigation_step")
     
     def _create_test_image(self, filepath: str, content: str):
         """Create a simple test PNG image."""
@@ -1564,12 +1601,9 @@ class FormMapperTaskHandler:
 
     def _action_wait_dom_ready(self, selector: str, value: str, step: Dict) -> bool:
         """Wait for DOM to stabilize after page load."""
-        import time
         try:
-            time.sleep(2)  # Initial wait
-            # Wait for page to be ready
-            self.selenium.driver.execute_script("return document.readyState") == "complete"
-            time.sleep(1)
+            # Ready state, pending requests and DOM quiet window
+            self.selenium.settle("wait_dom_ready", timeout=10)
             return True
         except Exception as e:
             logger.error(f"[FormMapper] Wait DOM ready failed: {e}")
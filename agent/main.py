@@ -18,6 +18,7 @@ UPDATED: Added Form Mapper task handling
 import os
 import sys
 import time
+import json
 import logging
 import requests
 import urllib3
@@ -35,6 +36,8 @@ from crawler import FormPagesCrawler, FormPagesAPIClient
 from crawler.form_pages_utils import detect_page_error, PageErrorCode, get_error_message
 from form_mapper_handler import FormMapperTaskHandler
 from activity_logger import init_activity_logger, get_activity_logger
+from screenshot_uploader import ScreenshotUploader
+from session_scheduler import SessionScheduler
 
 # Suppress SSL warnings for self-signed certificates in development
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -54,12 +57,16 @@ class FormDiscovererAgent:
         self.activity_logger = init_activity_logger(self.config)
         self._setup_logging()
         self.selenium_agent = AgentSelenium(config=self.config)  # Uses default Desktop path
+        self.selenium_agent.warm_browser_pool()
         self.is_running = False
         self.current_task_id = None
         self.current_crawl_session_id = None  # Track current crawl session for cancel
         self.heartbeat_thread = None
         self.tray_icon = None
         self.cancel_requested = False  # Set by heartbeat when server requests cancellation
+        # Several sessions at once, one browser worker each (created on start when AGENT_MAX_SESSIONS > 1)
+        self.max_concurrent_sessions = 1
+        self.session_scheduler: Optional[SessionScheduler] = None
         
         # Initialize Form Mapper handler
         self.form_mapper_handler = FormMapperTaskHandler(self.selenium_agent, self.activity_logger, api_client=self)
@@ -74,6 +81,14 @@ class FormDiscovererAgent:
         # Level 3: JWT Token for session access (short-lived)
         self.jwt_token = None
         self.jwt_expires_at = None
+
+        # Form Mapper screenshots go straight to S3; results carry only a reference
+        self.screenshot_uploader = ScreenshotUploader(
+            api_url=self.config.api_url,
+            get_headers=self._get_headers,
+            ssl_verify=self.ssl_verify,
+            enabled=getattr(self.config, 'screenshot_direct_upload', True)
+        )
         
         # Initialize traffic capture if enabled
         if getattr(self.config, 'capture_traffic', False):
@@ -223,7 +238,8 @@ class FormDiscovererAgent:
                 "user_id": self.config.user_id,
                 "hostname": os.environ.get('COMPUTERNAME', os.environ.get('HOSTNAME', 'unknown')),
                 "platform": sys.platform,
-                "version": "2.0.0"
+                "version": "2.0.0",
+                "max_concurrent_sessions": getattr(self.config, 'max_sessions', 1)
             }
             
             response = requests.post(url, json=payload, headers=headers, timeout=30, verify=self.ssl_verify)
@@ -244,6 +260,9 @@ class FormDiscovererAgent:
                     self.jwt_expires_at = datetime.utcnow() + timedelta(seconds=expires_in)
                     self.logger.info(f"✅ JWT token received (expires in {expires_in}s)")
                     self.activity_logger.update_auth(api_key=self.api_key, jwt_token=self.jwt_token)
+
+                # Concurrency the server accepted (servers without session subqueues don't send it)
+                self.max_concurrent_sessions = max(1, int(result.get('max_concurrent_sessions') or 1))
                 
                 self.logger.info(f"✅ Connected successfully")
                 
@@ -273,10 +292,13 @@ class FormDiscovererAgent:
         while self.is_running:
             try:
                 url = f"{self.config.api_url}/api/agent/heartbeat"
+                current_task_id = self.current_task_id
+                if not current_task_id and self.session_scheduler:
+                    current_task_id = self.session_scheduler.current_task_id()
                 payload = {
                     "agent_id": self.config.agent_id,
-                    "status": "idle" if not self.current_task_id else "busy",
-                    "current_task_id": self.current_task_id,
+                    "status": "idle" if not current_task_id else "busy",
+                    "current_task_id": current_task_id,
                     "current_crawl_session_id": self.current_crawl_session_id
                 }
                 
@@ -326,36 +348,86 @@ class FormDiscovererAgent:
             
             time.sleep(30)
     
+    def _handle_idle(self):
+        """No task pending - honour a cancel requested while idle."""
+        if self.current_task_id:
+            return  # Multi-session: a task is running on the agent's browser - it checks the flag itself
+        if self.cancel_requested:
+            self.logger.info("⏹ Cancel requested - closing browser")
+            self.cancel_requested = False
+            # Mark all active sessions as closed
+            if hasattr(self, 'form_mapper_handler') and self.form_mapper_handler:
+                self.form_mapper_handler.closed_sessions.update(
+                    self.form_mapper_handler.active_sessions.keys())
+
+            if self.selenium_agent.driver:
+                self.selenium_agent.close_browser()
+
+    def _stream_tasks(self) -> bool:
+        """
+        Receive tasks over the server-sent event stream until the server closes it.
+        Returns False if the stream is unavailable (caller falls back to polling).
+        """
+        url = f"{self.config.api_url}/api/agent/task-stream?agent_id={self.config.agent_id}&company_id={self.config.company_id}"
+        try:
+            with requests.get(url, headers=self._get_headers(), stream=True,
+                              timeout=(10, 60), verify=self.ssl_verify) as response:
+                if response.status_code != 200:
+                    self.logger.warning(f"Task stream unavailable (status {response.status_code}), polling")
+                    return False
+                event = None
+                for line in response.iter_lines(decode_unicode=True):
+                    if not self.is_running:
+                        break
+                    if line is None:
+                        continue
+                    if line.startswith(':'):
+                        # Keepalive
+                        self._handle_idle()
+                    elif line.startswith('event:'):
+                        event = line[len('event:'):].strip()
+                    elif line.startswith('data:'):
+                        data = json.loads(line[len('data:'):].strip())
+                        if event == 'task' and data.get('task_id'):
+                            self.logger.info(f"📥 Received task: {data.get('task_id')}")
+                            self._run_task(data)
+                        elif event == 'error':
+                            self.logger.warning(f"Task stream error: {data.get('detail')}")
+                    elif line == '':
+                        event = None
+            return True
+        except requests.exceptions.RequestException as e:
+            self.logger.warning(f"Task stream error: {str(e)}")
+            return False
+
     def poll_for_tasks(self):
-        """Poll server for tasks to execute."""
+        """Poll server for tasks to execute (long-poll, or the task stream if enabled)."""
         self.logger.info("📡 Polling for tasks...")
         consecutive_errors = 0
+        poll_wait = max(0, min(self.config.poll_wait, 25))  # server caps long-poll at 25s
         
         while self.is_running:
+            if self.config.task_stream and self._stream_tasks():
+                continue
             try:
-                url = f"{self.config.api_url}/api/agent/poll-task?agent_id={self.config.agent_id}&company_id={self.config.company_id}"
-                response = requests.get(url, headers=self._get_headers(), timeout=35, verify=self.ssl_verify)
+                url = f"{self.config.api_url}/api/agent/poll-task?agent_id={self.config.agent_id}&company_id={self.config.company_id}&wait={poll_wait}"
+                poll_started = time.time()
+                response = requests.get(url, headers=self._get_headers(), timeout=max(35, poll_wait + 15), verify=self.ssl_verify)
                 
                 if response.status_code == 200:
                     task = response.json()
                     consecutive_errors = 0
                     if task and task.get('task_id'):
                         self.logger.info(f"📥 Received task: {task.get('task_id')}")
-                        self.execute_task(task)
+                        self._run_task(task)
                 elif response.status_code == 204:
                     consecutive_errors = 0
                     # Check if cancel was requested while idle
-                    if self.cancel_requested:
-                        self.logger.info("⏹ Cancel requested - closing browser")
-                        self.cancel_requested = False
-                        # Mark all active sessions as closed
-                        if hasattr(self, 'form_mapper_handler') and self.form_mapper_handler:
-                            self.form_mapper_handler.closed_sessions.update(
-                                self.form_mapper_handler.active_sessions.keys())
-
-                        if self.selenium_agent.driver:
-                            self.selenium_agent.close_browser()
-                    time.sleep(1)
+                    self._handle_idle()
+                    # Long-poll already waited server-side; sleep only if it returned
+                    # immediately (short polling, or a server without long-poll support)
+                    if time.time() - poll_started < 1:
+                        time.sleep(1)
                 elif response.status_code == 401:
                     error_detail = ""
                     try:
@@ -394,6 +466,34 @@ class FormDiscovererAgent:
                 self.logger.warning(f"Multiple errors, waiting {wait_time}s...")
                 time.sleep(wait_time)
     
+    def _run_task(self, task: dict):
+        """Execute inline, or hand to the session scheduler (multi-session mode)."""
+        if self.session_scheduler:
+            self.session_scheduler.dispatch(task)
+        else:
+            self.execute_task(task)
+
+    def execute_session_task(self, task: dict, worker):
+        """Execute a form_mapper_* / forms_runner_* task on a session worker's own browser."""
+        task_id = task.get('task_id')
+        task_type = task.get('task_type')
+        self.logger.info(f"▶️ Worker {worker.index} executing: {task_type} (session {task.get('session_id')})")
+        try:
+            self._update_task_status(task_id, 'running')
+            result = worker.handler.handle_task(task)
+            self._report_form_mapper_result(result)
+
+            if result.get('success'):
+                self._update_task_status(task_id, 'completed', result=result)
+                self.logger.info(f"✅ Worker {worker.index} task completed: {task_type}")
+            else:
+                self._update_task_status(task_id, 'failed', error=result.get('error'))
+                self.logger.error(f"❌ Worker {worker.index} task failed: {result.get('error')}")
+        except Exception as e:
+            self.logger.exception(f"Task error: {str(e)}")
+            self._update_task_status(task_id, 'failed', error=str(e))
+            worker.activity_logger.error(f"❌ TASK ERROR: {str(e)}")
+
     def execute_task(self, task: dict):
         """Execute a received task."""
         task_id = task.get('task_id')
@@ -528,6 +628,8 @@ class FormDiscovererAgent:
         """Report Form Mapper task result back to server."""
         try:
             url = f"{self.config.api_url}/api/form-mapper/agent/task-result"
+
+            result = self.screenshot_uploader.offload(result)
             
             payload = {
                 "session_id": result.get("session_id"),
@@ -852,7 +954,8 @@ class FormDiscovererAgent:
                     form_agent=self  # Pass FormAgent for cancel_requested check
                 )
 
-                crawler.crawl()
+                with self.selenium_agent.network_log_drain():
+                    crawler.crawl()
             else:
                 self.logger.info("⏭️ Skipping form crawl (login/logout only mode)")
                 self.activity_logger.info("⏭️ Skipping form crawl - dynamic content project")
@@ -1047,7 +1150,8 @@ class FormDiscovererAgent:
                     form_agent=self
                 )
 
-                crawler.crawl()
+                with self.selenium_agent.network_log_drain():
+                    crawler.crawl()
             else:
                 self.logger.info("⏭️ Skipping form crawl (login/logout only mode)")
                 self.activity_logger.info("⏭️ Skipping form crawl - dynamic content project")
@@ -1207,6 +1311,10 @@ class FormDiscovererAgent:
                 return False
             
             self.is_running = True
+            max_sessions = min(getattr(self.config, 'max_sessions', 1), self.max_concurrent_sessions)
+            if max_sessions > 1:
+                self.session_scheduler = SessionScheduler(self, max_sessions)
+                self.logger.info(f"✓ Multi-session mode: up to {max_sessions} sessions at once")
             self.heartbeat_thread = threading.Thread(target=self.send_heartbeat, daemon=True)
             self.heartbeat_thread.start()
             self.logger.info("💓 Heartbeat started")
@@ -1225,6 +1333,10 @@ class FormDiscovererAgent:
         """Stop the agent."""
         self.logger.info("Stopping...")
         self.is_running = False
+        # Pool first, so the session browsers are quit instead of recycled
+        self.selenium_agent.shutdown_browser_pool()
+        if self.session_scheduler:
+            self.session_scheduler.shutdown()
         if self.selenium_agent.driver:
             self.selenium_agent.close_browser()
         if self.tray_icon:
@@ -0,0 +1,321 @@
+"""
+Page Settle - event-driven "page is idle" detection for the step loop
+Location: agent/page_settle.py
+
+Replaces the fixed sleeps around actions and navigations. A page counts as settled
+once all of these hold for a quiet window:
+    - document.readyState is 'complete'
+    - no fetch / XHR pending (in-page counters; requests older than long_request_ms are
+      ignored - long polls, analytics beacons)
+    - no DOM mutation, user input event or request completion
+    - no finite CSS / Web animation running (infinite spinners don't count)
+    - no jQuery.active
+    - Chromium only: no request in flight according to the DevTools Network events in
+      the driver's performance log (catches scripts, images, fonts, iframes)
+then two animation frames pass so the last change is painted.
+
+The quiet window is measured from the last activity, not from the call - an action's
+own click/input event counts as activity, so an instant page settles in about one
+quiet window, and a page that has been idle for a while settles immediately.
+
+Strict mode (used before each step) also treats aria-busy and a visible progressbar
+as loading, like the old _wait_if_page_loading poll.
+"""
+
+import re
+import threading
+import time
+from typing import Dict, Optional
+
+# Longest single in-browser wait - stays under the default WebDriver script timeout (30s)
+MAX_SCRIPT_WAIT = 10.0
+# Consecutive script failures before giving up (a navigation mid-wait recovers in one or two)
+MAX_SCRIPT_ERRORS = 5
+# How often NetworkLogDrain empties the performance log
+NETWORK_LOG_DRAIN_INTERVAL = 15.0
+
+# Installed once per document (and via CDP before page scripts run on Chromium)
+SETTLE_INSTALL_JS = """
+if (!window.__qaSettle) {
+    (function() {
+        var s = {pending: {}, nextId: 0, lastActivity: Date.now()};
+        function touch() { s.lastActivity = Date.now(); }
+        function begin() { var id = ++s.nextId; s.pending[id] = Date.now(); touch(); return id; }
+        function end(id) { delete s.pending[id]; touch(); }
+
+        if (window.fetch) {
+            var origFetch = window.fetch;
+            window.fetch = function() {
+                var id = begin(), p;
+                try {
+                    p = origFetch.apply(this, arguments);
+                } catch (e) {
+                    end(id);
+                    throw e;
+                }
+                p.then(function() { end(id); }, function() { end(id); });
+                return p;
+            };
+        }
+        if (window.XMLHttpRequest) {
+            var origSend = XMLHttpRequest.prototype.send;
+            XMLHttpRequest.prototype.send = function() {
+                var id = begin();
+                this.addEventListener('loadend', function() { end(id); });
+                try {
+                    return origSend.apply(this, arguments);
+                } catch (e) {
+                    end(id);
+                    throw e;
+                }
+            };
+        }
+
+        new MutationObserver(touch).observe(document, {
+            childList: true, subtree: true, attributes: true, characterData: true
+        });
+        ['click', 'input', 'change', 'keydown', 'submit', 'focusin'].forEach(function(type) {
+            document.addEventListener(type, touch, true);
+        });
+
+        // '' when idle, else what the page is busy with
+        s.busy = function(longRequestMs, strict) {
+            if (document.readyState !== 'complete') return 'document-loading';
+            var now = Date.now();
+            for (var id in s.pending) {
+                if (now - s.pending[id] < longRequestMs) return 'request-pending';
+            }
+            if (typeof jQuery !== 'undefined' && jQuery.active > 0) return 'jquery-ajax';
+            if (strict) {
+                if (document.querySelector('[aria-busy="true"]')) return 'aria-busy';
+                var prog = document.querySelector('[role="progressbar"]');
+                if (prog && prog.offsetParent !== null) return 'progressbar';
+            }
+            if (document.getAnimations) {
+                var animations = document.getAnimations();
+                for (var i = 0; i < animations.length; i++) {
+                    var a = animations[i];
+                    if (a.playState === 'running' && a.effect &&
+                        a.effect.getComputedTiming().endTime !== Infinity) return 'animation';
+                }
+            }
+            return '';
+        };
+        window.__qaSettle = s;
+    })();
+}
+"""
+
+_SETTLE_WAIT_JS = SETTLE_INSTALL_JS + """
+var done = arguments[arguments.length - 1];
+var quietMs = arguments[0], timeoutMs = arguments[1], longRequestMs = arguments[2],
+    strict = arguments[3], paint = arguments[4];
+var s = window.__qaSettle, start = Date.now(), firstReason = null;
+
+function finish(settled, reason) {
+    var out = {settled: settled, reason: reason, first_reason: firstReason, waited_ms: Date.now() - start};
+    if (!settled || !paint) { done(out); return; }
+    // Two frames so the last change is painted (timer fallback: rAF stalls in hidden windows)
+    var fired = false;
+    function once() { if (!fired) { fired = true; out.waited_ms = Date.now() - start; done(out); } }
+    requestAnimationFrame(function() { requestAnimationFrame(once); });
+    setTimeout(once, 100);
+}
+
+(function check() {
+    var now = Date.now();
+    var reason = s.busy(longRequestMs, strict);
+    var quietFor = now - s.lastActivity;
+    if (firstReason === null) firstReason = reason || (quietFor < quietMs ? 'dom-activity' : '');
+    if (!reason && quietFor >= quietMs) { finish(true, ''); return; }
+    if (now - start >= timeoutMs) { finish(false, reason || 'dom-activity'); return; }
+    setTimeout(check, reason ? 50 : Math.max(10, Math.min(50, quietMs - quietFor)));
+})();
+"""
+
+_NETWORK_EVENT = re.compile(r'"method":"Network\.(requestWillBeSent|loadingFinished|loadingFailed)"')
+_REQUEST_ID = re.compile(r'"requestId":"([^"]+)"')
+
+
+class _NetworkEvents:
+    """In-flight requests from the DevTools Network events in the performance log"""
+
+    def __init__(self):
+        self.available = True
+        self.inflight: Dict[str, float] = {}  # requestId -> first seen (epoch seconds)
+
+    def reset(self):
+        self.available = True
+        self.inflight.clear()
+
+    def pending(self, driver, long_request_s: float) -> Optional[int]:
+        """Requests in flight (None when the driver has no performance log)"""
+        if not self.available:
+            return None
+        try:
+            entries = driver.get_log('performance')
+        except Exception:
+            self.available = False
+            return None
+        for entry in entries:
+            message = entry.get('message', '')
+            # Regex instead of json.loads - requestWillBeSent carries all the headers
+            event = _NETWORK_EVENT.search(message)
+            if not event:
+                continue
+            request_id = _REQUEST_ID.search(message)
+            if not request_id:
+                continue
+            if event.group(1) == 'requestWillBeSent':
+                self.inflight.setdefault(request_id.group(1), entry.get('timestamp', 0) / 1000.0)
+            else:
+                self.inflight.pop(request_id.group(1), None)
+        cutoff = time.time() - long_request_s
+        for request_id in [r for r, seen in self.inflight.items() if seen < cutoff]:
+            del self.inflight[request_id]
+        return len(self.inflight)
+
+
+class NetworkLogDrain:
+    """
+    Empties the performance log in the background while the browser is driven by code
+    that never settles (discovery crawl) - chromedriver buffers every Network event
+    until someone reads the log. Stops by itself when the driver has no performance log.
+
+    WebDriver instances aren't thread-safe: while the drain is active every command of
+    the driver (the crawler's and the drain's) goes through one lock, so a drain never
+    runs in the middle of a crawler command.
+    """
+
+    _MISSING = object()
+
+    def __init__(self, driver, interval: float = NETWORK_LOG_DRAIN_INTERVAL):
+        self.driver = driver
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.RLock()
+        self._own_execute = self._MISSING
+
+    def __enter__(self):
+        # Every WebDriver command (get_log included) goes through driver.execute
+        self._own_execute = vars(self.driver).get('execute', self._MISSING)
+        execute = self.driver.execute
+        lock = self._lock
+
+        def locked_execute(*args, **kwargs):
+            with lock:
+                return execute(*args, **kwargs)
+
+        self.driver.execute = locked_execute
+        self._thread = threading.Thread(target=self._run, name='network-log-drain', daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join(timeout=5)
+        self._drain()
+        with self._lock:
+            if self._own_execute is self._MISSING:
+                del self.driver.execute
+            else:
+                self.driver.execute = self._own_execute
+        return False
+
+    def _drain(self) -> bool:
+        try:
+            self.driver.get_log('performance')
+            return True
+        except Exception:
+            return False
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if not self._drain():
+                return
+
+
+class PageSettler:
+    """Waits until the page is idle; every settle reports how long it actually took."""
+
+    def __init__(self, quiet_ms: int = 250, timeout: float = 3.0, long_request_ms: int = 5000,
+                 network_events: bool = True):
+        self.quiet_ms = quiet_ms
+        self.timeout = timeout
+        self.long_request_ms = long_request_ms
+        self.network_events = network_events
+        self._network = _NetworkEvents()
+        self._prepared_sessions = set()
+
+    def prepare_driver(self, driver):
+        """New browser: install the counters before page scripts run (Chromium) and reset state"""
+        self._network.reset()
+        if not self.network_events:
+            self._network.available = False
+        # The script is registered per tab - a pooled browser comes back with a fresh tab
+        try:
+            target = (driver.session_id, driver.current_window_handle)
+        except Exception:
+            target = (driver.session_id, None)
+        if target in self._prepared_sessions:
+            return  # Same tab as before (browser handed over) - the script is still registered
+        self._prepared_sessions.add(target)
+        try:
+            driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {'source': SETTLE_INSTALL_JS})
+        except Exception:
+            pass  # Not Chromium - counters get installed on the first settle of each page
+
+    def settle(self, driver, timeout: Optional[float] = None, quiet_ms: Optional[int] = None,
+               strict: bool = False, paint: bool = True, network: bool = True) -> Dict:
+        """
+        Wait until the page is idle (or timeout).
+
+        Returns:
+            {settled, reason, first_reason, ms} - reason says what was still busy on
+            timeout, first_reason what was busy when the wait started ('' = idle already)
+        """
+        timeout = self.timeout if timeout is None else timeout
+        quiet_ms = self.quiet_ms if quiet_ms is None else quiet_ms
+        started = time.monotonic()
+        result: Dict = {"settled": False, "reason": "", "first_reason": None}
+        script_errors = 0
+
+        while True:
+            remaining = timeout - (time.monotonic() - started)
+            chunk_ms = int(max(0.05, min(remaining, MAX_SCRIPT_WAIT)) * 1000)
+            try:
+                waited = driver.execute_async_script(_SETTLE_WAIT_JS, quiet_ms, chunk_ms,
+                                                     self.long_request_ms, strict, paint) or {}
+            except Exception as e:
+                name = e.__class__.__name__
+                if 'Alert' in name:
+                    # An open alert blocks scripts - the caller deals with it
+                    result.update(settled=False, reason="alert")
+                    break
+                # Navigation mid-wait / page not scriptable yet - retry on the new document
+                script_errors += 1
+                result.update(settled=False, reason=f"script-error: {name}")
+                if script_errors >= MAX_SCRIPT_ERRORS:
+                    break
+                time.sleep(0.05)
+                continue
+            script_errors = 0
+            if result["first_reason"] is None and "first_reason" in waited:
+                result["first_reason"] = waited["first_reason"]
+            result.update(settled=bool(waited.get("settled")), reason=waited.get("reason", ""))
+
+            if result["settled"] and network and self.network_events:
+                inflight = self._network.pending(driver, self.long_request_ms / 1000.0)
+                if inflight:
+                    result.update(settled=False, reason=f"network ({inflight} in flight)")
+                    if result["first_reason"] == "":
+                        result["first_reason"] = "network"
+
+            if result["settled"] or time.monotonic() - started >= timeout:
+                break
+            if result["reason"].startswith("network"):
+                time.sleep(0.05)  # Events accumulate in the log - poll it, the page is quiet
+
+        result["ms"] = int((time.monotonic() - started) * 1000)
+        return result
@@ -0,0 +1,125 @@
+"""
+Screenshot Pipeline - per-purpose encoding of screenshots sent to the server for AI checks
+Location: agent/screenshot_pipeline.py
+
+A profile says how to shrink a full-page PNG before it leaves the agent:
+    max_dimension   downscale so the long edge is at most this many px (None = keep)
+    crop_to_form    crop to the form's bounding box (+ padding) when one is found
+    format          'png' (lossless), 'jpeg' or 'webp' (lossy)
+    quality         1-100 for lossy formats
+
+The orchestrator picks the profile per request ("screenshot_profile" in the task
+payload) - either a name from SCREENSHOT_PROFILES or a full dict.
+Screenshots saved to the screenshots folder are never re-encoded.
+"""
+
+import io
+from typing import Dict, Optional, Tuple, Union
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# Same names as api-server services/screenshot_profiles.py
+SCREENSHOT_PROFILES: Dict[str, Dict] = {
+    "full": {"max_dimension": None, "crop_to_form": False, "format": "png"},
+    "visual_verify": {"max_dimension": 1568, "crop_to_form": False, "format": "webp", "quality": 85},
+    "junction": {"max_dimension": 1280, "crop_to_form": True, "format": "jpeg", "quality": 75},
+    "form_focus": {"max_dimension": 1568, "crop_to_form": True, "format": "webp", "quality": 80},
+}
+
+FORM_CROP_PADDING = 40  # px around the form, keeps nearby error messages/labels
+
+_MEDIA_TYPES = {"png": "image/png", "jpeg": "image/jpeg", "webp": "image/webp"}
+
+# Bounding box of the main form: the visible <form> holding the most visible fields
+# (largest on a tie), else the union of all visible fields. Returns null when nothing
+# form-like is on the page. Page coordinates by default; pass 'viewport' for viewport
+# coordinates in device pixels (what a viewport-only screenshot shows).
+FORM_BOUNDING_BOX_JS = """
+var viewport = arguments[0] === 'viewport';
+var scale = viewport ? (window.devicePixelRatio || 1) : 1;
+var offsetX = viewport ? 0 : window.scrollX, offsetY = viewport ? 0 : window.scrollY;
+function visible(el) {
+    var r = el.getBoundingClientRect();
+    return r.width > 0 && r.height > 0;
+}
+function box(r) {
+    return {x: (r.left + offsetX) * scale, y: (r.top + offsetY) * scale, w: r.width * scale, h: r.height * scale};
+}
+var fields = Array.prototype.filter.call(
+    document.querySelectorAll('input:not([type=hidden]), select, textarea'), visible);
+var best = null, bestCount = 0, bestArea = 0;
+document.querySelectorAll('form').forEach(function(f) {
+    if (!visible(f)) return;
+    var count = fields.filter(function(el) { return f.contains(el); }).length;
+    var r = f.getBoundingClientRect();
+    var area = r.width * r.height;
+    if (count > bestCount || (count === bestCount && count > 0 && area > bestArea)) {
+        best = box(r); bestCount = count; bestArea = area;
+    }
+});
+if (best) return best;
+if (!fields.length) return null;
+var minX = Infinity, minY = Infinity, maxX = -Infinity, maxY = -Infinity;
+fields.forEach(function(el) {
+    var b = box(el.getBoundingClientRect());
+    minX = Math.min(minX, b.x); minY = Math.min(minY, b.y);
+    maxX = Math.max(maxX, b.x + b.w); maxY = Math.max(maxY, b.y + b.h);
+});
+return {x: minX, y: minY, w: maxX - minX, h: maxY - minY};
+"""
+
+
+def resolve_profile(profile: Union[str, Dict, None]) -> Optional[Dict]:
+    """Profile dict from a name or dict (unknown names -> None = legacy full PNG)"""
+    if not profile:
+        return None
+    if isinstance(profile, str):
+        return SCREENSHOT_PROFILES.get(profile)
+    base = SCREENSHOT_PROFILES.get(profile.get("name", ""), {})
+    return {**base, **profile}
+
+
+def encode_screenshot(png_bytes: bytes, profile: Dict, form_box: Optional[Dict] = None) -> Tuple[bytes, str]:
+    """
+    Apply a profile to a PNG screenshot.
+
+    Returns:
+        (encoded bytes, media type). The input PNG when Pillow is missing or the
+        profile asks for nothing.
+    """
+    fmt = (profile.get("format") or "png").lower()
+    if fmt not in _MEDIA_TYPES:
+        fmt = "png"
+    max_dimension = profile.get("max_dimension")
+    crop = profile.get("crop_to_form") and form_box
+
+    if Image is None or (fmt == "png" and not max_dimension and not crop):
+        return png_bytes, "image/png"
+
+    image = Image.open(io.BytesIO(png_bytes))
+    image.load()
+
+    if crop:
+        left = max(0, int(form_box["x"]) - FORM_CROP_PADDING)
+        top = max(0, int(form_box["y"]) - FORM_CROP_PADDING)
+        right = min(image.width, int(form_box["x"] + form_box["w"]) + FORM_CROP_PADDING)
+        bottom = min(image.height, int(form_box["y"] + form_box["h"]) + FORM_CROP_PADDING)
+        if right - left > 1 and bottom - top > 1:
+            image = image.crop((left, top, right, bottom))
+
+    if max_dimension and max(image.size) > max_dimension:
+        scale = max_dimension / float(max(image.size))
+        image = image.resize((max(1, int(image.width * scale)), max(1, int(image.height * scale))),
+                             Image.LANCZOS)
+
+    out = io.BytesIO()
+    if fmt == "jpeg":
+        image.convert("RGB").save(out, "JPEG", quality=int(profile.get("quality", 75)), optimize=True)
+    elif fmt == "webp":
+        image.save(out, "WEBP", quality=int(profile.get("quality", 80)), method=4)
+    else:
+        image.save(out, "PNG", optimize=True)
+    return out.getvalue(), _MEDIA_TYPES[fmt]
@@ -0,0 +1,113 @@
+"""
+Screenshot Uploader - direct-to-S3 screenshot transfer for Form Mapper results
+Location: agent/screenshot_uploader.py
+
+Instead of sending screenshots as base64 inside the task-result JSON, the agent PUTs
+the PNG bytes to presigned URLs handed out by the server and reports only
+{s3_key, sha256, size}. The server fetches the bytes only when a verifier needs them.
+
+Falls back to inline base64 whenever no URL is available or an upload fails.
+"""
+
+import base64
+import binascii
+import hashlib
+import logging
+import threading
+from collections import OrderedDict, deque
+from typing import Callable, Dict, Optional
+
+import requests
+
+logger = logging.getLogger('ScreenshotUploader')
+
+# Inline result field -> reference field (must match api-server services/screenshot_refs.py)
+SCREENSHOT_RESULT_FIELDS = {
+    "screenshot_base64": "screenshot_ref",
+    "alert_screenshot_base64": "alert_screenshot_ref",
+}
+
+URL_BATCH_SIZE = 10
+MAX_TRACKED_SESSIONS = 8
+
+
+class ScreenshotUploader:
+    """Keeps a small pool of presigned URLs per mapper session and offloads result screenshots."""
+
+    def __init__(self, api_url: str, get_headers: Callable[[], Dict[str, str]], ssl_verify: bool = False,
+                 enabled: bool = True):
+        self.api_url = api_url
+        self.get_headers = get_headers
+        self.ssl_verify = ssl_verify
+        self.enabled = enabled
+        # session_id -> deque of {s3_key, url}; None = server can't issue URLs for it
+        self._pools: "OrderedDict[str, Optional[deque]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def offload(self, result: Dict) -> Dict:
+        """Upload the result's screenshots and swap them for references (in place)."""
+        session_id = result.get("session_id")
+        if not self.enabled or not session_id:
+            return result
+        for inline_field, ref_field in SCREENSHOT_RESULT_FIELDS.items():
+            screenshot_b64 = result.get(inline_field)
+            if not screenshot_b64 or not isinstance(screenshot_b64, str):
+                continue
+            ref = self._upload(str(session_id), screenshot_b64)
+            if ref:
+                result.pop(inline_field)
+                result[ref_field] = ref
+        return result
+
+    def _upload(self, session_id: str, screenshot_b64: str) -> Optional[Dict]:
+        target = self._next_url(session_id)
+        if not target:
+            return None
+        try:
+            data = base64.b64decode(screenshot_b64, validate=True)
+        except (binascii.Error, ValueError):
+            return None
+        try:
+            response = requests.put(target['url'], data=data, headers={'Content-Type': 'image/png'}, timeout=30)
+            if response.status_code not in (200, 201):
+                logger.warning(f"Screenshot upload failed: {response.status_code} - sending inline")
+                return None
+        except Exception as e:
+            logger.warning(f"Screenshot upload error: {e} - sending inline")
+            return None
+        return {"s3_key": target['s3_key'], "sha256": hashlib.sha256(data).hexdigest(), "size": len(data)}
+
+    def _next_url(self, session_id: str) -> Optional[Dict]:
+        with self._lock:
+            if session_id in self._pools:
+                pool = self._pools[session_id]
+                if pool is None:
+                    return None
+                if pool:
+                    return pool.popleft()
+
+        pool = self._fetch_urls(session_id)
+        with self._lock:
+            self._pools[session_id] = pool
+            self._pools.move_to_end(session_id)
+            while len(self._pools) > MAX_TRACKED_SESSIONS:
+                self._pools.popitem(last=False)
+            return pool.popleft() if pool else None
+
+    def _fetch_urls(self, session_id: str) -> Optional[deque]:
+        try:
+            response = requests.post(
+                f"{self.api_url}/api/form-mapper/agent/screenshot-upload-urls",
+                json={"session_id": session_id, "count": URL_BATCH_SIZE},
+                headers=self.get_headers(),
+                timeout=15,
+                verify=self.ssl_verify
+            )
+        except Exception as e:
+            logger.warning(f"Could not get screenshot upload URLs: {e}")
+            return deque()  # Transient - try again on the next screenshot
+        if response.status_code != 200:
+            # 404/503: server can't issue URLs for this session - stay inline
+            logger.info(f"Screenshot upload URLs unavailable ({response.status_code}) - sending inline")
+            return None
+        return deque(response.json().get("urls", []))
@@ -0,0 +1,290 @@
+"""
+Session Scheduler - runs several mapper / runner sessions at once, one browser each
+Location: agent/session_scheduler.py
+
+With AGENT_MAX_SESSIONS > 1 the agent keeps up to that many SessionWorkers. A worker
+owns an AgentSelenium (its own Chrome), a FormMapperTaskHandler and an activity logger,
+and is bound to one session id at a time:
+    - every task the agent receives goes through dispatch(): tasks of a bound session go
+      to its worker, a new session gets a free worker (or waits in the backlog while all
+      workers are busy)
+    - a bound worker long-polls its session's subqueue on the server
+      (poll-task?session_id=...), which makes the server route that session's tasks
+      there instead of the agent's main queue
+    - a worker is released after form_mapper_close, or after SESSION_IDLE_TIMEOUT without
+      a task (forms runner sessions send no close); the server moves anything left in
+      the subqueue back to the main queue
+
+Tasks without a session (discovery crawls, legacy tasks) run one at a time on the
+agent's own browser. A discovery that follows a login mapping arrives with the login
+session's id - the worker hands its logged-in browser over to the agent first.
+"""
+
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional
+
+import requests
+
+from activity_logger import WorkerActivityLogger
+from agent_selenium import AgentSelenium
+from form_mapper_handler import FormMapperTaskHandler
+
+logger = logging.getLogger('SessionScheduler')
+
+# A bound session without a task for this long gives its worker back
+SESSION_IDLE_TIMEOUT = 300
+# Server-side wait of a worker's subqueue long-poll (server caps it at 25s)
+SUBQUEUE_POLL_WAIT = 20
+# Closed sessions remembered so their late tasks are dropped instead of opening a browser
+MAX_CLOSED_SESSIONS = 200
+
+SESSION_TASK_PREFIXES = ('form_mapper_', 'forms_runner_')
+
+
+def is_session_task(task: Dict) -> bool:
+    return (task.get('task_type') or '').startswith(SESSION_TASK_PREFIXES)
+
+
+def _session_key(task: Dict) -> Optional[str]:
+    session_id = task.get('session_id')
+    return str(session_id) if session_id not in (None, '') else None
+
+
+class SessionWorker:
+    """One browser + handler + activity logger, bound to at most one session at a time"""
+
+    def __init__(self, index: int, scheduler: 'SessionScheduler'):
+        agent = scheduler.agent
+        self.index = index
+        self.scheduler = scheduler
+        self.selenium = AgentSelenium(config=agent.config, browser_pool=agent.selenium_agent.browser_pool)
+        self.activity_logger = WorkerActivityLogger(agent.activity_logger, index)
+        self.handler = FormMapperTaskHandler(self.selenium, self.activity_logger, api_client=agent)
+        self.session_id: Optional[str] = None
+        self.bind_generation = 0
+        self.current_task_id: Optional[str] = None
+        self.last_task_at = time.monotonic()
+        self.tasks: "queue.Queue[Dict]" = queue.Queue()
+        threading.Thread(target=self._run, name=f'session-worker-{index}', daemon=True).start()
+
+    def _run(self):
+        while self.scheduler.running:
+            try:
+                task = self.tasks.get(timeout=5)
+            except queue.Empty:
+                self.scheduler.release_if_idle(self)
+                continue
+
+            if not is_session_task(task):
+                # Follow-up task of this session - the agent takes over the browser
+                # (current_task_id keeps the idle check off until the handover is done)
+                self.current_task_id = task.get('task_id')
+                self.scheduler.run_on_agent(task, handover_from=self)
+                continue
+
+            self.current_task_id = task.get('task_id')
+            try:
+                self.scheduler.agent.execute_session_task(task, self)
+            except Exception as e:
+                logger.exception(f"[Worker {self.index}] Task error: {e}")
+            finally:
+                self.current_task_id = None
+                self.last_task_at = time.monotonic()
+
+            if task.get('task_type') == 'form_mapper_close' and \
+                    not (task.get('payload') or {}).get('keep_browser_open'):
+                self.scheduler.release(self, session_closed=True)
+
+    def close_session(self):
+        """Drop the session's browser and finish its logging (idle timeout / shutdown)"""
+        if self.activity_logger.session_active:
+            self.activity_logger.complete()
+        self.handler.active_sessions.clear()
+        if self.selenium.driver:
+            self.selenium.close_browser()
+
+
+class SessionScheduler:
+    """Routes tasks to session workers by session id (see module docstring)"""
+
+    def __init__(self, agent, max_sessions: int):
+        self.agent = agent
+        self.max_sessions = max_sessions
+        self.running = True
+        self.workers: List[SessionWorker] = []
+        self.by_session: Dict[str, SessionWorker] = {}
+        self.backlog: deque = deque()      # tasks of new sessions while every worker is busy
+        self.closed: "OrderedDict[str, None]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Session-less tasks: one at a time on the agent's own browser
+        self._agent_tasks: "queue.Queue[tuple]" = queue.Queue()
+        threading.Thread(target=self._run_agent_tasks, name='agent-tasks', daemon=True).start()
+
+    # ----- routing -----
+
+    def dispatch(self, task: Dict):
+        """Hand a received task to the worker of its session (binding one if needed)"""
+        session_id = _session_key(task)
+        task_type = task.get('task_type')
+        with self._lock:
+            worker = self.by_session.get(session_id) if session_id else None
+            if worker:
+                worker.tasks.put(task)
+                return
+            if not is_session_task(task):
+                self._agent_tasks.put((task, None))
+                return
+            if not session_id:
+                logger.warning(f"[Scheduler] {task_type} without session_id - dropped")
+                return
+            if any(_session_key(t) == session_id for t in self.backlog):
+                self.backlog.append(task)
+                return
+            if task_type == 'form_mapper_close' or session_id in self.closed:
+                # Late task of a session that is gone - nothing to run it on
+                logger.info(f"[Scheduler] Dropping {task_type} for closed session {session_id}")
+                return
+            worker = self._free_worker() if not self.backlog else None
+            if worker is None:
+                self.backlog.append(task)
+                logger.info(f"[Scheduler] All {self.max_sessions} workers busy - session {session_id} waits "
+                            f"({len(self.backlog)} tasks in backlog)")
+                return
+            self._bind(worker, session_id)
+            worker.tasks.put(task)
+
+    def run_on_agent(self, task: Dict, handover_from: Optional[SessionWorker] = None):
+        self._agent_tasks.put((task, handover_from))
+
+    def current_task_id(self) -> Optional[str]:
+        return next((w.current_task_id for w in self.workers if w.current_task_id), None)
+
+    # ----- worker lifecycle -----
+
+    def release(self, worker: SessionWorker, session_closed: bool):
+        """Worker is done with its session: give it the next backlogged session, if any"""
+        with self._lock:
+            self._unbind(worker, session_closed)
+            self._assign_backlog(worker)
+
+    def release_if_idle(self, worker: SessionWorker):
+        """Worker thread, nothing queued: give up a session that went quiet"""
+        with self._lock:
+            if not worker.session_id or worker.current_task_id or not worker.tasks.empty() or \
+                    time.monotonic() - worker.last_task_at < SESSION_IDLE_TIMEOUT:
+                return
+            session_id = self._unbind(worker, session_closed=False)
+        logger.info(f"[Scheduler] Session {session_id} idle for {SESSION_IDLE_TIMEOUT}s - closing its browser")
+        worker.close_session()
+        with self._lock:
+            if worker.session_id is None:  # Not picked up by dispatch() meanwhile
+                self._assign_backlog(worker)
+
+    def shutdown(self):
+        """Agent stop: close every worker's browser"""
+        self.running = False
+        for worker in self.workers:
+            try:
+                worker.close_session()
+            except Exception as e:
+                logger.warning(f"[Scheduler] Worker {worker.index} shutdown error: {e}")
+
+    # ----- internals (caller holds self._lock) -----
+
+    def _free_worker(self) -> Optional[SessionWorker]:
+        worker = next((w for w in self.workers if w.session_id is None), None)
+        if worker is None and len(self.workers) < self.max_sessions:
+            worker = SessionWorker(len(self.workers) + 1, self)
+            self.workers.append(worker)
+        return worker
+
+    def _unbind(self, worker: SessionWorker, session_closed: bool) -> Optional[str]:
+        session_id, worker.session_id = worker.session_id, None
+        worker.bind_generation += 1  # Stops the subqueue poller
+        if not session_id:
+            return None
+        if self.by_session.get(session_id) is worker:
+            del self.by_session[session_id]
+        if session_closed:
+            self.closed[session_id] = None
+            while len(self.closed) > MAX_CLOSED_SESSIONS:
+                self.closed.popitem(last=False)
+        logger.info(f"[Scheduler] Worker {worker.index} released session {session_id}")
+        return session_id
+
+    def _bind(self, worker: SessionWorker, session_id: str):
+        worker.session_id = session_id
+        worker.bind_generation += 1
+        worker.last_task_at = time.monotonic()
+        self.by_session[session_id] = worker
+        logger.info(f"[Scheduler] Worker {worker.index} bound to session {session_id}")
+        threading.Thread(target=self._poll_subqueue, args=(worker, session_id, worker.bind_generation),
+                         name=f'session-poll-{session_id}', daemon=True).start()
+
+    def _assign_backlog(self, worker: SessionWorker):
+        if not self.backlog:
+            return
+        session_id = _session_key(self.backlog[0])
+        self._bind(worker, session_id)
+        waiting = [t for t in self.backlog if _session_key(t) == session_id]
+        self.backlog = deque(t for t in self.backlog if _session_key(t) != session_id)
+        for task in waiting:
+            worker.tasks.put(task)
+
+    # ----- threads -----
+
+    def _poll_subqueue(self, worker: SessionWorker, session_id: str, generation: int):
+        """Long-poll the session's subqueue while the worker stays bound, then unbind it"""
+        agent = self.agent
+        base_url = f"{agent.config.api_url}/api/agent"
+        while self.running and agent.is_running and worker.bind_generation == generation:
+            try:
+                response = requests.get(
+                    f"{base_url}/poll-task",
+                    params={"agent_id": agent.config.agent_id, "company_id": agent.config.company_id,
+                            "wait": SUBQUEUE_POLL_WAIT, "session_id": session_id},
+                    headers=agent._get_headers(), timeout=SUBQUEUE_POLL_WAIT + 15, verify=agent.ssl_verify)
+                if response.status_code == 200:
+                    task = response.json()
+                    if task and task.get('task_id'):
+                        logger.info(f"[Scheduler] 📥 Session {session_id} task: {task.get('task_id')}")
+                        self.dispatch(task)
+                elif response.status_code != 204:
+                    # Auth problems are handled by the main poll loop
+                    time.sleep(5)
+            except requests.exceptions.Timeout:
+                pass
+            except Exception as e:
+                logger.warning(f"[Scheduler] Session {session_id} poll error: {e}")
+                time.sleep(5)
+
+        # Same thread as the last poll - no poll can re-bind after this
+        try:
+            requests.post(f"{base_url}/session-unbind", json={"session_id": session_id},
+                          headers=agent._get_headers(), timeout=15, verify=agent.ssl_verify)
+        except Exception as e:
+            logger.warning(f"[Scheduler] Session {session_id} unbind failed: {e}")
+
+    def _run_agent_tasks(self):
+        while self.running:
+            try:
+                task, handover_from = self._agent_tasks.get(timeout=5)
+            except queue.Empty:
+                continue
+            if handover_from is not None:
+                logger.info(f"[Scheduler] Worker {handover_from.index} hands session "
+                            f"{handover_from.session_id} browser to {task.get('task_type')}")
+                self.agent.selenium_agent.take_browser(handover_from.selenium)
+                if handover_from.activity_logger.session_active:
+                    handover_from.activity_logger.complete()
+                handover_from.handler.active_sessions.clear()
+                handover_from.current_task_id = None
+                self.release(handover_from, session_closed=True)
+            try:
+                self.agent.execute_task(task)
+            except Exception as e:
+                logger.exception(f"[Scheduler] Task error: {e}")
@@ -5,7 +5,7 @@ from typing import Dict, Any
 
 import logging
 
-from celery.signals import setup_logging
+from celery.signals import setup_logging, task_prerun
 
 @setup_logging.connect
 def on_celery_setup_logging(**kwargs):
@@ -14,6 +14,13 @@ def on_celery_setup_logging(**kwargs):
     return True  # Prevent Celery from overriding our logging
 
 
+@task_prerun.connect
+def on_task_prerun(**kwargs):
+    # Prefork workers reuse one context - don't let the previous task's AI company leak
+    from services.ai_gateway import reset_ai_scope
+    reset_ai_scope()
+
+
 # Configure logging for Celery workers
 logging.basicConfig(
     level=logging.DEBUG,
@@ -34,7 +41,7 @@ celery = Celery(
     "form_discoverer",
     broker=CELERY_BROKER_URL,
     backend=REDIS_STATE_URL,
-    include=['tasks.form_mapper_tasks', 'tasks.forms_runner_tasks', 'tasks.form_pages_tasks', 'tasks.user_requirements_tasks', 'tasks.pom_generator_tasks', 'tasks.spec_compliance_tasks', 'tasks.s3_tasks', 'tasks.test_page_verification_assets_tasks', 'tasks.email_tasks']
+    include=['tasks.form_mapper_tasks', 'tasks.forms_runner_tasks', 'tasks.form_pages_tasks', 'tasks.user_requirements_tasks', 'tasks.pom_generator_tasks', 'tasks.spec_compliance_tasks', 'tasks.s3_tasks', 'tasks.test_page_verification_assets_tasks', 'tasks.email_tasks', 'tasks.agent_tasks']
 )
 
 # Celery configuration
@@ -77,6 +84,14 @@ celery.conf.beat_schedule = {
         'task': 'tasks.detect_stuck_mapper_sessions',
         'schedule': 60.0,  # Every 60 seconds
     },
+    'flush-agent-heartbeats': {
+        'task': 'tasks.flush_agent_heartbeats',
+        'schedule': 30.0,  # Same cadence as agent heartbeats
+    },
+    'settle-ai-usage-ledger': {
+        'task': 'tasks.settle_ai_usage_ledger',
+        'schedule': 30.0,
+    },
 }
 
 @celery.task
@@ -0,0 +1,8 @@
+-- Migration 007 DOWN: Remove ledger_entry_id from api_usage
+-- Date: 2026-10-16
+-- Description: Rollback - drops the usage ledger dedupe column and its index
+
+DROP INDEX IF EXISTS api_usage_ledger_entry_id_key;
+
+ALTER TABLE api_usage
+DROP COLUMN IF EXISTS ledger_entry_id;
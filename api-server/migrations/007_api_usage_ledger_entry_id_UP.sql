@@ -0,0 +1,9 @@
+-- Migration 007: Add ledger_entry_id to api_usage
+-- Date: 2026-10-16
+-- Description: Id of the Redis usage ledger entry a row was settled from, so a batch
+-- handed out again after a crash is not charged twice (NULL for synchronous records)
+
+ALTER TABLE api_usage
+ADD COLUMN IF NOT EXISTS ledger_entry_id VARCHAR(32);
+
+CREATE UNIQUE INDEX IF NOT EXISTS api_usage_ledger_entry_id_key ON api_usage (ledger_entry_id);
@@ -32,6 +32,8 @@ class Agent(Base):
     hostname = Column(String(255))
     platform = Column(String(50))
     version = Column(String(20))
+    # Sessions the agent runs at once (one browser each), reported at registration
+    max_concurrent_sessions = Column(Integer, nullable=False, default=1)
     
     # Status
     status = Column(String(20), default='offline')
@@ -51,6 +53,7 @@ class Agent(Base):
             'hostname': self.hostname,
             'platform': self.platform,
             'version': self.version,
+            'max_concurrent_sessions': self.max_concurrent_sessions or 1,
             'status': self.status,
             'last_heartbeat': self.last_heartbeat.isoformat() if self.last_heartbeat else None,
             'created_at': self.created_at.isoformat() if self.created_at else None
@@ -278,7 +278,10 @@ class ApiUsage(Base):
     crawl_session_id = Column(Integer, ForeignKey("crawl_sessions.id"))
     operation_type = Column(String)
     tokens_used = Column(Integer)
+    cache_creation_tokens = Column(Integer, default=0)  # Prompt tokens written to the Anthropic cache
+    cache_read_tokens = Column(Integer, default=0)  # Prompt tokens served from the Anthropic cache
     api_cost = Column(Float)
+    ledger_entry_id = Column(String(32), unique=True)  # Usage ledger entry id - settlement dedupe
     created_at = Column(DateTime, default=datetime.utcnow)
 
 class Screenshot(Base):
@@ -353,6 +356,28 @@ class ActivityLogEntry(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
 
 
+class ActivitySessionRollup(Base):
+    """
+    Per-session counters over activity_log_entries, maintained at ingestion time
+    (services/activity_session_rollups.py) so session listings never COUNT(*) the log table.
+    """
+    __tablename__ = "activity_session_rollups"
+
+    id = Column(Integer, primary_key=True)
+    activity_type = Column(String(50), nullable=False)  # 'discovery', 'mapping', 'test_run'
+    session_id = Column(Integer, nullable=False)  # crawl_session_id / mapper_session_id / test_run_id
+    company_id = Column(Integer, ForeignKey("companies.id"), nullable=False)
+    project_id = Column(Integer, ForeignKey("projects.id"), nullable=False)
+    entry_count = Column(Integer, nullable=False, default=0)
+    error_count = Column(Integer, nullable=False, default=0)
+    last_entry_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        Index('uq_activity_session_rollups_session', 'activity_type', 'session_id', unique=True),
+    )
+
+
 # ============================================================================
 # S3 File Tracking Tables
 # ============================================================================
@@ -8,16 +8,17 @@ Includes screenshot management and download functionality.
 
 import json
 import io
+import base64
 import zipfile
 from fastapi import APIRouter, Depends, HTTPException, Query, Header, Request
 from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy import desc, select, union_all, literal, cast, func, and_, tuple_, String, DateTime
 from typing import List, Optional
 from datetime import datetime, timedelta
 from pydantic import BaseModel
 
-from models.database import get_db, ActivityLogEntry, CrawlSession, ActivityScreenshot, Company
+from models.database import get_db, ActivityLogEntry, ActivitySessionRollup, CrawlSession, ActivityScreenshot, Company
 from models.form_mapper_models import FormMapperSession
 from services.s3_storage import (
     generate_presigned_put_url,
@@ -29,6 +30,7 @@ from services.s3_storage import (
 )
 
 from celery_app import celery
+from services.activity_session_rollups import delete_session_rollup
 from utils.auth_helpers import get_current_user_from_request
 
 router = APIRouter(prefix="/api/activity-logs", tags=["Activity Logs"])
@@ -36,6 +38,9 @@ router = APIRouter(prefix="/api/activity-logs", tags=["Activity Logs"])
 # Log size threshold for S3 upload (50KB)
 LOG_SIZE_THRESHOLD_BYTES = 50 * 1024
 
+# Max compressed size of one live log segment (agent rolls segments well below this)
+LOG_SEGMENT_MAX_BYTES = 1024 * 1024
+
 
 # ============================================================================
 # Pydantic Models
@@ -92,6 +97,7 @@ class ActivityLogsListResponse(BaseModel):
     total: int
     page: int
     page_size: int
+    next_cursor: Optional[str] = None  # Pass back as ?cursor= for the next page
 
 
 class ActivityLogDetailResponse(BaseModel):
@@ -303,6 +309,60 @@ async def confirm_log_upload(
         raise HTTPException(status_code=500, detail=f"Failed to queue log processing: {str(e)}")
 
 
+# ============================================================================
+# Live Log Segments - streamed by the agent while the session runs
+# ============================================================================
+
+@router.post("/logs/segment")
+async def receive_log_segment(
+        request: Request,
+        activity_type: str,
+        session_id: int,
+        project_id: int,
+        company_id: int,
+        stream_id: str,
+        seq: int,
+        user_id: Optional[int] = None
+):
+    """
+    Receive one gzip-compressed NDJSON log segment.
+    Segments are ingested as they arrive, so dashboards show progress mid-session.
+    The agent retries until a 2xx - (stream_id, seq) makes retries idempotent.
+    """
+    if activity_type not in ("discovery", "mapping", "test_run"):
+        raise HTTPException(status_code=400, detail=f"Unknown activity type: {activity_type}")
+
+    body = await request.body()
+    if len(body) > LOG_SEGMENT_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"Segment exceeds {LOG_SEGMENT_MAX_BYTES} bytes")
+    if body[:2] != b"\x1f\x8b":
+        raise HTTPException(status_code=400, detail="Segment must be gzip-compressed NDJSON")
+
+    try:
+        celery.send_task(
+            'tasks.process_activity_log_segment',
+            kwargs={
+                'segment_b64': base64.b64encode(body).decode(),
+                'activity_type': activity_type,
+                'session_id': session_id,
+                'project_id': project_id,
+                'company_id': company_id,
+                'user_id': user_id,
+                'stream_id': stream_id,
+                'seq': seq
+            }
+        )
+
+        return {
+            "success": True,
+            "queued": True,
+            "seq": seq
+        }
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to queue log segment: {str(e)}")
+
+
 # ============================================================================
 # Screenshot Upload - Pre-signed URLs
 # ============================================================================
@@ -706,6 +766,30 @@ async def download_session_logs(
 # GET Endpoints - Retrieve logs for frontend (unchanged)
 # ============================================================================
 
+def _encode_session_cursor(sort_at: datetime, activity_type: str, session_id: int) -> str:
+    raw = f"{sort_at.isoformat()}|{activity_type}|{session_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_session_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        sort_at, activity_type, session_id = raw.split("|")
+        return datetime.fromisoformat(sort_at), activity_type, int(session_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _mapping_summary(ms) -> str:
+    if ms.status == "completed":
+        return f"{ms.total_paths_discovered or 0} paths mapped"
+    if ms.status == "cancelled":
+        return "Cancelled"
+    if ms.status == "failed":
+        return ms.last_error or "Failed"
+    return ms.status or "In progress"
+
+
 @router.get("")
 async def list_activity_sessions(
         project_id: int,
@@ -715,114 +799,143 @@ async def list_activity_sessions(
         has_errors: Optional[bool] = None,
         page: int = Query(default=1, ge=1),
         limit: int = Query(default=20, le=100),
+        cursor: Optional[str] = None,
         db: Session = Depends(get_db)
 ):
     """
     List activity sessions for a project.
+
+    One query: discovery and mapping sessions UNION ALL'd, joined to their
+    activity_session_rollups counters, filtered/ordered/paginated in SQL.
+    Pass the returned next_cursor back as `cursor` for keyset paging (page is
+    still honoured as an OFFSET when no cursor is given).
     """
+    from models.database import FormPageRoute
 
     current_user = get_current_user_from_request(request)
     company_id = current_user["company_id"]
 
     cutoff_date = datetime.utcnow() - timedelta(days=days)
-    sessions = []
+    sort_type = DateTime(timezone=True)
 
-    # Get discovery sessions
+    parts = []
     if activity_type is None or activity_type == "discovery":
-        discovery_query = db.query(CrawlSession).filter(
-            CrawlSession.project_id == project_id,
-            CrawlSession.created_at >= cutoff_date
-        ).order_by(desc(CrawlSession.created_at))
-
-        for cs in discovery_query.limit(limit).all():
-            entry_count = db.query(ActivityLogEntry).filter(
-                ActivityLogEntry.crawl_session_id == cs.id
-            ).count()
-
-            error_count = db.query(ActivityLogEntry).filter(
-                ActivityLogEntry.crawl_session_id == cs.id,
-                ActivityLogEntry.level == 'error'
-            ).count()
-
-            if has_errors is not None:
-                if has_errors and error_count == 0:
-                    continue
-                if not has_errors and error_count > 0:
-                    continue
+        rollup = aliased(ActivitySessionRollup)
+        parts.append(
+            select(
+                literal("discovery").label("activity_type"),
+                CrawlSession.id.label("session_id"),
+                cast(CrawlSession.created_at, sort_type).label("sort_at"),
+                func.coalesce(rollup.entry_count, 0).label("entry_count"),
+                func.coalesce(rollup.error_count, 0).label("error_count"),
+                cast(literal(None), String).label("form_name"),
+            ).outerjoin(rollup, and_(
+                rollup.activity_type == "discovery",
+                rollup.session_id == CrawlSession.id
+            )).where(
+                CrawlSession.project_id == project_id,
+                CrawlSession.created_at >= cutoff_date
+            )
+        )
+    if activity_type is None or activity_type == "mapping":
+        rollup = aliased(ActivitySessionRollup)
+        parts.append(
+            select(
+                literal("mapping").label("activity_type"),
+                FormMapperSession.id.label("session_id"),
+                cast(FormMapperSession.created_at, sort_type).label("sort_at"),
+                func.coalesce(rollup.entry_count, 0).label("entry_count"),
+                func.coalesce(rollup.error_count, 0).label("error_count"),
+                cast(FormPageRoute.form_name, String).label("form_name"),
+            ).join(
+                FormPageRoute, FormMapperSession.form_page_route_id == FormPageRoute.id
+            ).outerjoin(rollup, and_(
+                rollup.activity_type == "mapping",
+                rollup.session_id == FormMapperSession.id
+            )).where(
+                FormPageRoute.project_id == project_id,
+                FormMapperSession.created_at >= cutoff_date
+            )
+        )
+
+    if not parts:
+        return ActivityLogsListResponse(sessions=[], total=0, page=page, page_size=limit)
+
+    combined = (union_all(*parts) if len(parts) > 1 else parts[0]).subquery()
+    filtered = select(combined)
+    if has_errors is True:
+        filtered = filtered.where(combined.c.error_count > 0)
+    elif has_errors is False:
+        filtered = filtered.where(combined.c.error_count == 0)
+    # Window total is computed before the keyset filter, so it stays the full match count
+    counted = select(*filtered.subquery().c, func.count().over().label("total")).subquery()
+
+    order_key = tuple_(counted.c.sort_at, counted.c.activity_type, counted.c.session_id)
+    query = select(counted).order_by(
+        desc(counted.c.sort_at), desc(counted.c.activity_type), desc(counted.c.session_id)
+    ).limit(limit)
+    if cursor:
+        query = query.where(order_key < tuple_(*(literal(v) for v in _decode_session_cursor(cursor))))
+    else:
+        query = query.offset((page - 1) * limit)
 
+    rows = db.execute(query).all()
+    if rows:
+        total = rows[0].total
+    else:
+        total = db.execute(select(func.count()).select_from(filtered.subquery())).scalar() or 0
+
+    # Page rows only - one lookup per session table
+    crawl_ids = [r.session_id for r in rows if r.activity_type == "discovery"]
+    mapper_ids = [r.session_id for r in rows if r.activity_type == "mapping"]
+    crawl_sessions = {cs.id: cs for cs in db.query(CrawlSession).filter(
+        CrawlSession.id.in_(crawl_ids)).all()} if crawl_ids else {}
+    mapper_sessions = {ms.id: ms for ms in db.query(FormMapperSession).filter(
+        FormMapperSession.id.in_(mapper_ids)).all()} if mapper_ids else {}
+
+    sessions = []
+    for r in rows:
+        if r.activity_type == "discovery":
+            cs = crawl_sessions.get(r.session_id)
+            if cs is None:
+                continue
             sessions.append(SessionSummary(
                 session_id=cs.id,
                 activity_type="discovery",
                 status=cs.status or "unknown",
                 started_at=cs.started_at.isoformat() if cs.started_at else None,
                 completed_at=cs.completed_at.isoformat() if cs.completed_at else None,
-                entry_count=entry_count,
-                has_errors=error_count > 0,
+                entry_count=r.entry_count,
+                has_errors=r.error_count > 0,
                 summary=f"{cs.forms_found or 0} forms found" if cs.status == "completed" else cs.error_message
             ))
+        else:
+            ms = mapper_sessions.get(r.session_id)
+            if ms is None:
+                continue
+            sessions.append(SessionSummary(
+                session_id=ms.id,
+                activity_type="mapping",
+                status=ms.status or "unknown",
+                started_at=ms.created_at.isoformat() if ms.created_at else None,
+                completed_at=ms.completed_at.isoformat() if ms.completed_at else None,
+                entry_count=r.entry_count,
+                has_errors=r.error_count > 0,
+                summary=_mapping_summary(ms),
+                form_name=r.form_name
+            ))
 
-    # Get mapping sessions
-    if activity_type is None or activity_type == "mapping":
-        try:
-            from models.database import FormPageRoute
-
-            mapping_query = db.query(FormMapperSession, FormPageRoute.form_name).join(
-                FormPageRoute, FormMapperSession.form_page_route_id == FormPageRoute.id
-            ).filter(
-                FormPageRoute.project_id == project_id,
-                FormMapperSession.created_at >= cutoff_date
-            ).order_by(desc(FormMapperSession.created_at))
-
-            for ms, form_name in mapping_query.limit(limit).all():
-                entry_count = db.query(ActivityLogEntry).filter(
-                    ActivityLogEntry.mapper_session_id == ms.id
-                ).count()
-
-                error_count = db.query(ActivityLogEntry).filter(
-                    ActivityLogEntry.mapper_session_id == ms.id,
-                    ActivityLogEntry.level == 'error'
-                ).count()
-
-                if has_errors is not None:
-                    if has_errors and error_count == 0:
-                        continue
-                    if not has_errors and error_count > 0:
-                        continue
-
-                if ms.status == "completed":
-                    summary = f"{ms.total_paths_discovered or 0} paths mapped"
-                elif ms.status == "cancelled":
-                    summary = "Cancelled"
-                elif ms.status == "failed":
-                    summary = ms.last_error or "Failed"
-                else:
-                    summary = ms.status or "In progress"
-
-                sessions.append(SessionSummary(
-                    session_id=ms.id,
-                    activity_type="mapping",
-                    status=ms.status or "unknown",
-                    started_at=ms.created_at.isoformat() if ms.created_at else None,
-                    completed_at=ms.completed_at.isoformat() if hasattr(ms,
-                                                                        'completed_at') and ms.completed_at else None,
-                    entry_count=entry_count,
-                    has_errors=error_count > 0,
-                    summary=summary,
-                    form_name=form_name
-                ))
-        except Exception as e:
-            print(f"Warning: Could not load mapping sessions: {e}")
-
-    sessions.sort(key=lambda x: x.started_at or "", reverse=True)
-
-    offset = (page - 1) * limit
-    paginated_sessions = sessions[offset:offset + limit]
+    next_cursor = None
+    if len(rows) == limit:
+        last = rows[-1]
+        next_cursor = _encode_session_cursor(last.sort_at, last.activity_type, last.session_id)
 
     return ActivityLogsListResponse(
-        sessions=paginated_sessions,
-        total=len(sessions),
+        sessions=sessions,
+        total=total,
         page=page,
-        page_size=limit
+        page_size=limit,
+        next_cursor=next_cursor
     )
 
 
@@ -863,6 +976,8 @@ async def delete_session_logs(
         else:
             raise HTTPException(status_code=400, detail=f"Unknown activity type: {activity_type}")
 
+        delete_session_rollup(db, activity_type, session_id)
+
         # Get screenshots for S3 cleanup
         screenshots = db.query(ActivityScreenshot).filter(
             ActivityScreenshot.activity_type == activity_type,
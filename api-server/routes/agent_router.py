@@ -10,20 +10,32 @@
 # - Each user can only have ONE active agent
 # - Registering a new agent generates NEW API key (invalidates previous agent)
 # - JWT session_id must match DB to prevent old agents from reconnecting
+#
+# Multi-session agents:
+# - The agent reports max_concurrent_sessions at registration (one browser worker per session)
+# - Workers poll /poll-task?session_id=... for their session's subqueue (services/agent_task_queue.py)
 
 from fastapi import APIRouter, Depends, HTTPException, Header, Query, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from typing import Optional
-from datetime import datetime, timedelta
+from datetime import datetime
 import redis
+import redis.asyncio as aioredis
 import json
 import os
+import time
 import uuid
 import secrets
+import hashlib
 
-from models.database import get_db, CrawlSession
+from models.database import get_db, SessionLocal
 from models.agent_models import Agent, AgentTask
 from services.agent_service import AgentService
+from services.agent_presence import record_heartbeat, pop_agent_cancel
+from services.agent_task_queue import (
+    agent_queue_key, session_queue_key, set_agent_concurrency, bind_session, unbind_session
+)
 from utils.agent_jwt_utils import create_jwt_token, decode_jwt_token, get_token_expiry_seconds
 from jose import JWTError
 from utils.auth_helpers import get_current_user_from_request
@@ -35,6 +47,23 @@ REDIS_URL = os.getenv('REDIS_URL', 'redis://redis:6379/0')
 _agent_router_redis_pool = redis.ConnectionPool.from_url(REDIS_URL, max_connections=20)
 redis_client = redis.Redis(connection_pool=_agent_router_redis_pool)
 
+# Async pool for long-poll / task stream. Every waiting agent holds one connection
+# while blocked in BLPOP, so it is sized separately from the request pool above.
+_agent_longpoll_redis_pool = aioredis.ConnectionPool.from_url(
+    REDIS_URL, max_connections=int(os.getenv('AGENT_LONGPOLL_MAX_CONNECTIONS', 1000))
+)
+async_redis_client = aioredis.Redis(connection_pool=_agent_longpoll_redis_pool)
+
+# Long-poll limits (agent HTTP timeout must stay above MAX_POLL_WAIT_SECONDS)
+MAX_POLL_WAIT_SECONDS = 25
+# Task stream: keepalive comment interval, and max stream lifetime before the agent reconnects
+# (re-validates JWT/session on every reconnect)
+TASK_STREAM_KEEPALIVE_SECONDS = 15
+TASK_STREAM_MAX_SECONDS = 300
+
+# Hot-path agent auth cache lifetime (also bounds staleness if an invalidation is missed)
+AGENT_AUTH_CACHE_TTL = 60
+
 
 # ============================================================================
 # SECURITY UTILITIES
@@ -75,19 +104,8 @@ def validate_api_key_only(
     return agent
 
 
-def validate_jwt_and_session(
-    authorization: Optional[str] = Header(None),
-    x_agent_api_key: Optional[str] = Header(None),
-    db: Session = Depends(get_db)
-) -> Agent:
-    """
-    Level 2+3: Full validation - API key AND JWT with session check.
-    
-    This ensures:
-    1. API key is valid
-    2. JWT token is valid and not expired
-    3. Session ID in JWT matches current session in DB (single agent enforcement)
-    """
+def _decode_agent_jwt(authorization: Optional[str], x_agent_api_key: Optional[str]) -> dict:
+    """Level 2+3 header checks: API key present, JWT valid and issued for that API key"""
     # Check API key header
     if not x_agent_api_key:
         raise HTTPException(
@@ -131,6 +149,24 @@ def validate_jwt_and_session(
             status_code=401,
             detail="API key mismatch. Token was issued for a different API key."
         )
+
+    return payload
+
+
+def validate_jwt_and_session(
+    authorization: Optional[str] = Header(None),
+    x_agent_api_key: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+) -> Agent:
+    """
+    Level 2+3: Full validation - API key AND JWT with session check.
+    
+    This ensures:
+    1. API key is valid
+    2. JWT token is valid and not expired
+    3. Session ID in JWT matches current session in DB (single agent enforcement)
+    """
+    payload = _decode_agent_jwt(authorization, x_agent_api_key)
     
     # Get agent from DB
     agent = db.query(Agent).filter(Agent.api_key == x_agent_api_key).first()
@@ -151,6 +187,83 @@ def validate_jwt_and_session(
     return agent
 
 
+
+class CachedAgent:
+    """Agent identity read from the auth cache (not an ORM object - read-only)"""
+
+    __slots__ = ("id", "agent_id", "company_id", "user_id", "current_session_id")
+
+    def __init__(self, id, agent_id, company_id, user_id, current_session_id):
+        self.id = id
+        self.agent_id = agent_id
+        self.company_id = company_id
+        self.user_id = user_id
+        self.current_session_id = current_session_id
+
+
+def _agent_auth_cache_key(api_key: str) -> str:
+    return f"agent_auth:{hashlib.sha256(api_key.encode()).hexdigest()}"
+
+
+def invalidate_agent_auth_cache(api_key: Optional[str]) -> None:
+    """Drop the cached identity for an API key - call before the key/session is regenerated"""
+    if not api_key:
+        return
+    try:
+        redis_client.delete(_agent_auth_cache_key(api_key))
+    except redis.RedisError:
+        pass
+
+
+def validate_agent_cached(
+    authorization: Optional[str] = Header(None),
+    x_agent_api_key: Optional[str] = Header(None),
+) -> CachedAgent:
+    """
+    Same checks as validate_jwt_and_session, for the per-step hot paths (task-result,
+    heartbeat, poll-task). The agent row is cached in Redis for AGENT_AUTH_CACHE_TTL
+    seconds, so a request normally touches no DB connection at all. Re-registration /
+    API key regeneration invalidate the cache entry.
+    """
+    payload = _decode_agent_jwt(authorization, x_agent_api_key)
+
+    cache_key = _agent_auth_cache_key(x_agent_api_key)
+    cached = None
+    try:
+        cached = redis_client.get(cache_key)
+    except redis.RedisError:
+        pass
+
+    if cached:
+        agent = CachedAgent(**json.loads(cached))
+    else:
+        db = SessionLocal()
+        try:
+            row = db.query(Agent).filter(Agent.api_key == x_agent_api_key).first()
+            if not row:
+                raise HTTPException(
+                    status_code=401,
+                    detail="Invalid API key. Agent may have been replaced by another registration."
+                )
+            agent = CachedAgent(row.id, row.agent_id, row.company_id, row.user_id, row.current_session_id)
+        finally:
+            db.close()
+        try:
+            redis_client.setex(cache_key, AGENT_AUTH_CACHE_TTL, json.dumps(
+                {name: getattr(agent, name) for name in CachedAgent.__slots__}))
+        except redis.RedisError:
+            pass
+
+    # CHECK SESSION MATCHES - This kills old agents!
+    if agent.current_session_id != payload.get('session_id'):
+        raise HTTPException(
+            status_code=401,
+            detail="Session invalidated. Another agent has connected for this user. This agent is now disabled."
+        )
+
+    return agent
+
+
 # ============================================================================
 # PUBLIC ENDPOINTS (No authentication required)
 # ============================================================================
@@ -173,8 +286,12 @@ async def register_agent(
         "api_key": "new-api-key...",
         "jwt": "eyJ...",
         "expires_in": 1800,
-        "agent_id": "agent-test-001"
+        "agent_id": "agent-test-001",
+        "max_concurrent_sessions": 1
     }
+
+    max_concurrent_sessions (optional, default 1) is capped at AGENT_MAX_CONCURRENT_SESSIONS;
+    the accepted value is returned.
     """
     agent_id = agent_data.get('agent_id')
     company_id = agent_data.get('company_id')
@@ -187,12 +304,17 @@ async def register_agent(
         raise HTTPException(status_code=400, detail="user_id is required")
     if not agent_id:
         raise HTTPException(status_code=400, detail="agent_id is required")
+
+    # Routing reads it from Redis; the column is for the dashboard
+    max_concurrent_sessions = set_agent_concurrency(
+        redis_client, user_id, agent_data.get('max_concurrent_sessions', 1))
     
     # Check if user already has an agent (by user_id, not agent_id)
     existing_agent = db.query(Agent).filter(Agent.user_id == user_id).first()
     
     if existing_agent:
         # User already has an agent - REGENERATE API KEY to invalidate old agent!
+        old_api_key = existing_agent.api_key
         existing_agent.api_key = generate_api_key()
         existing_agent.current_session_id = generate_session_id()
         existing_agent.agent_id = agent_id
@@ -200,10 +322,13 @@ async def register_agent(
         existing_agent.hostname = hostname
         existing_agent.platform = platform
         existing_agent.version = version
+        existing_agent.max_concurrent_sessions = max_concurrent_sessions
         existing_agent.status = "online"
         existing_agent.last_heartbeat = datetime.utcnow()
         existing_agent.updated_at = datetime.utcnow()
         db.commit()
+        # After the commit - a request with the old key before it would re-cache the old row
+        invalidate_agent_auth_cache(old_api_key)
         db.refresh(existing_agent)
         
         # Create JWT token
@@ -220,6 +345,7 @@ async def register_agent(
             "api_key": existing_agent.api_key,
             "jwt": jwt_token,
             "expires_in": get_token_expiry_seconds(),
+            "max_concurrent_sessions": max_concurrent_sessions,
             "message": "Registration successful. Previous agent has been invalidated."
         }
     else:
@@ -234,6 +360,7 @@ async def register_agent(
             hostname=hostname,
             platform=platform,
             version=version,
+            max_concurrent_sessions=max_concurrent_sessions,
             status="online",
             api_key=api_key,
             current_session_id=session_id,
@@ -257,6 +384,7 @@ async def register_agent(
             "api_key": api_key,
             "jwt": jwt_token,
             "expires_in": get_token_expiry_seconds(),
+            "max_concurrent_sessions": max_concurrent_sessions,
             "message": "Agent registered. Store credentials securely."
         }
 
@@ -299,66 +427,100 @@ async def refresh_token(
 @router.post("/heartbeat")
 async def agent_heartbeat(
     heartbeat_data: dict,
-    agent: Agent = Depends(validate_jwt_and_session),
-    db: Session = Depends(get_db)
+    agent: CachedAgent = Depends(validate_agent_cached),
 ):
     """
     Receive heartbeat from authenticated agent.
     Requires X-Agent-API-Key AND Authorization: Bearer <jwt> headers.
-    Returns cancel_requested if agent has a cancelled running session.
-    """
-    agent.status = heartbeat_data.get('status', 'idle')
-    agent.current_task_id = heartbeat_data.get('current_task_id')
-    agent.last_heartbeat = datetime.utcnow()
-    db.commit()
-    
-    # Check for recently cancelled session (last 5 minutes)
-    # Simple approach: no session ID tracking needed
-    cancel_requested = False
-    cancel_threshold = datetime.utcnow() - timedelta(minutes=5)
-    cancelled_session = db.query(CrawlSession).filter(
-        CrawlSession.user_id == agent.user_id,
-        CrawlSession.status == 'cancelled',
-        CrawlSession.completed_at >= cancel_threshold
-    ).first()
+    Returns cancel_requested if the user's session was cancelled since the last beat.
 
-    if cancelled_session:
-        cancel_requested = True
-        # Mark as acknowledged so we don't keep sending cancel
-        cancelled_session.status = 'cancelled_ack'
-        db.commit()
+    Heartbeat/status are written to Redis only; tasks.flush_agent_heartbeats syncs
+    them to the agents table in bulk.
+    """
+    record_heartbeat(agent.id, heartbeat_data.get('status', 'idle'),
+                     heartbeat_data.get('current_task_id'), redis_client)
 
-    # Check FormMapperSession (Form Mapper)
-    #from models.database import FormMapperSession
-    #ended_mapper = db.query(FormMapperSession).filter(
-    #    FormMapperSession.user_id == agent.user_id,
-    #    FormMapperSession.status.in_(['cancelled', 'completed', 'failed']),
-    #    FormMapperSession.updated_at >= cancel_threshold
-    #).first()
-
-    #if ended_mapper:
-    #    cancel_requested = True
-    #    if ended_mapper.status == 'cancelled':
-    #       ended_mapper.status = 'cancelled_ack'
-    #    elif ended_mapper.status == 'completed':
-    #       ended_mapper.status = 'completed_ack'
-    #    elif ended_mapper.status == 'failed':
-    #        ended_mapper.status = 'failed_ack'
-    #    db.commit()
+    # Cancel flag set by the cancel endpoints (consumed once, expires after 5 minutes)
+    cancel_requested = pop_agent_cancel(agent.user_id, redis_client)
 
     return {"success": True, "cancel_requested": cancel_requested}
 
 
+def _is_redis_only_task(task_msg: dict) -> bool:
+    """forms_runner_* / form_mapper_* tasks live only in Redis (no AgentTask row)"""
+    task_type = task_msg.get('task_type') or ''
+    return task_type.startswith('forms_runner_') or task_type.startswith('form_mapper_')
+
+
+def _build_task_response(task_msg: dict, agent_id: str, db: Session) -> dict:
+    """Shape a popped queue message into the payload returned to the agent"""
+    task_id = task_msg.get('task_id')
+
+    # Return directly for forms_runner tasks (Redis-only for scale)
+    if _is_redis_only_task(task_msg):
+        return {
+            'task_id': task_id,
+            'task_type': task_msg.get('task_type'),
+            'payload': task_msg.get('payload', {}),
+            'session_id': task_msg.get('session_id')
+        }
+
+    # Get full task details from database
+    agent_service = AgentService(db)
+    db_task = agent_service.get_celery_task(task_id)
+
+    if not db_task:
+        raise HTTPException(status_code=404, detail=f"Task {task_id} not found in database")
+
+    # Mark task as assigned to this agent
+    agent_service.assign_celery_task_to_agent(task_id=task_id, agent_id=agent_id)
+
+    response = {
+        "task_id": task_id,
+        "task_type": db_task.task_type,
+        "parameters": db_task.parameters
+    }
+    # Follow-up of a session (discovery after login mapping) - runs in that session's browser
+    if task_msg.get('session_id'):
+        response['session_id'] = task_msg['session_id']
+    return response
+
+
+async def _blocking_pop(queue_name: str, wait: int, request: Request) -> Optional[bytes]:
+    """
+    BLPOP the agent queue for up to `wait` seconds (same end as the LPOP it replaces).
+    If the agent hung up while we were blocked, the task is pushed back so it isn't lost.
+    """
+    popped = await async_redis_client.blpop([queue_name], timeout=wait)
+    if not popped:
+        return None
+    task_data = popped[1]
+    if await request.is_disconnected():
+        await async_redis_client.lpush(queue_name, task_data)
+        return None
+    return task_data
+
+
 @router.get("/poll-task")
 async def poll_task(
+    request: Request,
     agent_id: str,
     company_id: int,
-    agent: Agent = Depends(validate_jwt_and_session),
+    wait: int = Query(0, ge=0, le=MAX_POLL_WAIT_SECONDS),
+    session_id: Optional[str] = Query(None, max_length=64),
+    agent: CachedAgent = Depends(validate_agent_cached),
     db: Session = Depends(get_db)
 ):
     """
     Agent polls for tasks from their user-specific Redis queue.
     Requires X-Agent-API-Key AND Authorization: Bearer <jwt> headers.
+
+    wait > 0 enables long-poll: the request blocks server-side (async BLPOP) until a
+    task is queued or `wait` seconds pass, so tasks are delivered as soon as
+    _push_agent_task enqueues them. wait=0 keeps the original non-blocking LPOP.
+
+    session_id (multi-session agents): poll that session's subqueue instead. Each poll
+    (re)binds the session, so its tasks are routed to the subqueue while a worker polls it.
     """
     # Verify agent_id matches the authenticated agent
     if agent.agent_id != agent_id:
@@ -368,9 +530,18 @@ async def poll_task(
         )
     
     try:
-        # Pop task from user-specific Redis queue
-        queue_name = f'agent:{agent.user_id}'
-        task_data = redis_client.lpop(queue_name)
+        # Pop task from user-specific Redis queue (or the session's subqueue)
+        if session_id:
+            bind_session(redis_client, agent.user_id, session_id)
+            queue_name = session_queue_key(agent.user_id, session_id)
+        else:
+            queue_name = agent_queue_key(agent.user_id)
+        if wait:
+            # Don't hold a DB connection while blocked
+            db.close()
+            task_data = await _blocking_pop(queue_name, wait, request)
+        else:
+            task_data = redis_client.lpop(queue_name)
         
         if not task_data:
             raise HTTPException(status_code=204, detail="No tasks available")
@@ -379,33 +550,7 @@ async def poll_task(
         if isinstance(task_data, bytes):
             task_data = task_data.decode('utf-8')
         
-        task_msg = json.loads(task_data)
-        task_id = task_msg.get('task_id')
-
-        # Return directly for forms_runner tasks (Redis-only for scale)
-        if task_msg.get('task_type') and (task_msg.get('task_type').startswith('forms_runner_') or task_msg.get('task_type').startswith('form_mapper_')):
-            return {
-                'task_id': task_id,
-                'task_type': task_msg.get('task_type'),
-                'payload': task_msg.get('payload', {}),
-                'session_id': task_msg.get('session_id')
-            }
-        
-        # Get full task details from database
-        agent_service = AgentService(db)
-        db_task = agent_service.get_celery_task(task_id)
-        
-        if not db_task:
-            raise HTTPException(status_code=404, detail=f"Task {task_id} not found in database")
-        
-        # Mark task as assigned to this agent
-        agent_service.assign_celery_task_to_agent(task_id=task_id, agent_id=agent_id)
-
-        return {
-            "task_id": task_id,
-            "task_type": db_task.task_type,
-            "parameters": db_task.parameters
-        }
+        return _build_task_response(json.loads(task_data), agent_id, db)
         
     except HTTPException:
         raise
@@ -413,6 +558,86 @@ async def poll_task(
         raise HTTPException(status_code=500, detail=f"Redis error: {str(e)}")
 
 
+@router.get("/task-stream")
+async def task_stream(
+    request: Request,
+    agent_id: str,
+    company_id: int,
+    agent: CachedAgent = Depends(validate_agent_cached),
+):
+    """
+    Server-Sent Events channel: pushes queued tasks to the agent as they are enqueued.
+    Events: "task" (data = same JSON as /poll-task), keepalive comments while idle.
+    The stream closes after TASK_STREAM_MAX_SECONDS; the agent reconnects (auth re-checked).
+    Requires X-Agent-API-Key AND Authorization: Bearer <jwt> headers.
+    """
+    if agent.agent_id != agent_id:
+        raise HTTPException(
+            status_code=403,
+            detail="Agent ID mismatch. You can only stream tasks for your own agent."
+        )
+
+    queue_name = agent_queue_key(agent.user_id)
+
+    async def event_stream():
+        deadline = time.monotonic() + TASK_STREAM_MAX_SECONDS
+        while time.monotonic() < deadline:
+            if await request.is_disconnected():
+                break
+            try:
+                task_data = await _blocking_pop(queue_name, TASK_STREAM_KEEPALIVE_SECONDS, request)
+            except redis.RedisError as e:
+                yield f"event: error\ndata: {json.dumps({'detail': f'Redis error: {e}'})}\n\n"
+                break
+            if not task_data:
+                yield ": keepalive\n\n"
+                continue
+
+            if isinstance(task_data, bytes):
+                task_data = task_data.decode('utf-8')
+            task_msg = json.loads(task_data)
+            if _is_redis_only_task(task_msg):
+                task = _build_task_response(task_msg, agent_id, None)
+            else:
+                # Legacy DB-backed task - short-lived session, not held for the stream lifetime
+                db = SessionLocal()
+                try:
+                    task = _build_task_response(task_msg, agent_id, db)
+                except HTTPException as e:
+                    yield f"event: error\ndata: {json.dumps({'detail': e.detail})}\n\n"
+                    continue
+                finally:
+                    db.close()
+            yield f"event: task\ndata: {json.dumps(task)}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/session-unbind")
+async def session_unbind(
+    data: dict,
+    agent: CachedAgent = Depends(validate_agent_cached),
+):
+    """
+    A multi-session agent worker is done with a session (closed or idle).
+    Stops routing the session's tasks to its subqueue; anything still queued there goes
+    back to the main queue for the agent to pick up.
+    Requires X-Agent-API-Key AND Authorization: Bearer <jwt> headers.
+    """
+    session_id = data.get('session_id')
+    if not session_id:
+        raise HTTPException(status_code=400, detail="session_id is required")
+    try:
+        moved = unbind_session(redis_client, agent.user_id, str(session_id)[:64])
+    except redis.RedisError as e:
+        raise HTTPException(status_code=500, detail=f"Redis error: {str(e)}")
+    return {"success": True, "requeued": moved}
+
+
 @router.post("/task-result")
 async def update_task_result(
     result_data: dict,
@@ -504,7 +729,8 @@ async def list_agents(request: Request, db: Session = Depends(get_db)):
                 "status": agent.status,
                 "last_heartbeat": agent.last_heartbeat.isoformat() if agent.last_heartbeat else None,
                 "platform": agent.platform,
-                "hostname": agent.hostname
+                "hostname": agent.hostname,
+                "max_concurrent_sessions": agent.max_concurrent_sessions or 1
             }
             for agent in agents
         ]
@@ -649,9 +875,12 @@ async def regenerate_api_key_endpoint(
         raise HTTPException(status_code=403, detail="Access denied")
     
     # Regenerate both API key and session
+    old_api_key = agent.api_key
     agent.api_key = generate_api_key()
     agent.current_session_id = generate_session_id()
     db.commit()
+    # After the commit - a request with the old key before it would re-cache the old row
+    invalidate_agent_auth_cache(old_api_key)
     
     return {
         "success": True,
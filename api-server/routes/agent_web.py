@@ -2,6 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException, Header, Request
 from sqlalchemy.orm import Session
 from models.database import get_db, User
 from models.agent_models import Agent
+from services.agent_presence import effective_last_heartbeat
 from datetime import datetime, timedelta
 import secrets
 from utils.auth_helpers import get_current_user_from_request
@@ -36,13 +37,14 @@ async def get_agent_status(request: Request, db: Session = Depends(get_db)):
     
     # Check if agent is online (heartbeat within timeout)
     is_online = False
-    if agent.last_heartbeat:
+    last_heartbeat = effective_last_heartbeat(agent)
+    if last_heartbeat:
         timeout_threshold = datetime.utcnow() - timedelta(seconds=HEARTBEAT_TIMEOUT_SECONDS)
-        is_online = agent.last_heartbeat > timeout_threshold
+        is_online = last_heartbeat > timeout_threshold
     
     return {
         "status": "online" if is_online else "offline",
-        "last_heartbeat": agent.last_heartbeat.isoformat() if agent.last_heartbeat else None
+        "last_heartbeat": last_heartbeat.isoformat() if last_heartbeat else None
     }
 
 @router.post("/generate-token")
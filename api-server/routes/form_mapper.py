@@ -19,6 +19,8 @@ from sqlalchemy.orm import Session
 from models.database import get_db, FormPageRoute, Network
 from models.form_mapper_models import FormMapperSession, FormMapResult, FormMapperSessionLog
 from services.form_mapper_orchestrator import FormMapperOrchestrator, SessionStatus
+from services.mapper_event_stream import stream_mode_enabled, enqueue_event, EVENT_AGENT_RESULT
+from services.screenshot_refs import issue_upload_urls, normalize_result_screenshots
 from celery.result import AsyncResult
 from celery_app import celery
 import os
@@ -38,7 +40,7 @@ from sqlalchemy.orm.attributes import flag_modified
 from celery_app import celery
 from utils.auth_helpers import get_current_user_from_request
 
-from routes.agent_router import validate_jwt_and_session
+from routes.agent_router import validate_agent_cached, CachedAgent
 from models.agent_models import Agent
 
 logger = logging.getLogger(__name__)
@@ -114,6 +116,12 @@ class AgentTaskResultResponse(BaseModel):
     next_action: Optional[str] = None
     message: Optional[str] = None
 
+
+class ScreenshotUploadUrlsRequest(BaseModel):
+    """Agent asks for presigned PUT URLs for its next screenshots"""
+    session_id: str
+    count: int = 10
+
 # ============================================================================
 # Completed Paths Response Models
 # ============================================================================
@@ -810,7 +818,7 @@ async def list_results(
 @router.post("/agent/task-result", response_model=AgentTaskResultResponse)
 async def agent_task_result(
     body: AgentTaskResultRequest,
-    agent: Agent = Depends(validate_jwt_and_session),
+    agent: CachedAgent = Depends(validate_agent_cached),
     db: Session = Depends(get_db)
 ):
     """
@@ -819,19 +827,19 @@ async def agent_task_result(
     This endpoint is called by the desktop agent after completing
     a task. The orchestrator processes the result and determines
     the next action.
+
+    Hot path (once per executed step): agent auth comes from the Redis auth cache and
+    ownership from the live mapper_session hash, so Postgres is only touched on a miss.
     """
 
     session_id = body.session_id
     
-    # Verify session exists
-    session = db.query(FormMapperSession).filter(
-        FormMapperSession.id == session_id
-    ).first()
+    # Verify session exists and this agent's user owns it
+    session = _get_session_owner(session_id, db)
     
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
 
-    # Verify this agent's user owns this session
     if session.user_id != agent.user_id:
         raise HTTPException(status_code=403, detail="Access denied")
 
@@ -842,6 +850,8 @@ async def agent_task_result(
         "error": body.error,
         **body.payload
     }
+    # Screenshots uploaded straight to S3 arrive as {s3_key, sha256} - keep them as references
+    normalize_result_screenshots(result, session.company_id, session_id)
     logger.info(
         f"[API] AGENT_TASK_RESULT: session={session_id}, task_type={body.task_type}, success={body.success}, payload_keys={list(body.payload.keys())}")
     orchestrator = FormMapperOrchestrator(db)
@@ -851,6 +861,11 @@ async def agent_task_result(
     result_key = f"runner_step_result:{session_id}"
     api_redis.setex(result_key, 300, json_lib.dumps(result))
     logger.info(f"[API] Wrote result to Redis: {result_key}")
+
+    # Partitioned mode: hand the result to the session's partition consumer and return
+    if stream_mode_enabled():
+        enqueue_event(session_id, EVENT_AGENT_RESULT, body.task_type, result)
+        return AgentTaskResultResponse(status="queued", next_action=None, message=None)
     
     try:
         response = orchestrator.process_agent_result(session_id, result)
@@ -889,6 +904,63 @@ async def agent_task_result(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/agent/screenshot-upload-urls")
+async def agent_screenshot_upload_urls(
+    body: ScreenshotUploadUrlsRequest,
+    agent: CachedAgent = Depends(validate_agent_cached),
+    db: Session = Depends(get_db)
+):
+    """
+    Presigned PUT URLs the agent uploads screenshots to before reporting a task result.
+    The agent fetches them in batches and falls back to inline base64 when this fails.
+    """
+    session = _get_session_owner(body.session_id, db)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    if session.user_id != agent.user_id:
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    from models.database import Company
+    company = db.query(Company).filter(Company.id == session.company_id).first()
+    try:
+        urls = issue_upload_urls(session.company_id, body.session_id, body.count,
+                                 kms_key_arn=company.kms_key_arn if company else None)
+    except Exception as e:
+        # S3 not configured - agent keeps sending inline screenshots
+        raise HTTPException(status_code=503, detail=f"Screenshot upload unavailable: {e}")
+    return {"success": True, "urls": urls}
+
+
+class _SessionOwner:
+    """Ownership fields of a mapper session (company_id / user_id)"""
+
+    __slots__ = ("company_id", "user_id")
+
+    def __init__(self, company_id, user_id):
+        self.company_id = company_id
+        self.user_id = user_id
+
+
+def _get_session_owner(session_id: str, db: Session) -> Optional[_SessionOwner]:
+    """
+    Ownership of a mapper session. Read from the orchestrator's mapper_session hash
+    (exists for the whole life of a running session, deleted on cleanup); falls back
+    to the DB row when the hash is gone.
+    """
+    try:
+        api_redis = redis_lib.Redis(connection_pool=_api_redis_pool)
+        company_id, user_id = api_redis.hmget(f"mapper_session:{session_id}", ["company_id", "user_id"])
+        if user_id:
+            return _SessionOwner(int(company_id or 0), int(user_id))
+    except (redis_lib.RedisError, ValueError):
+        pass
+
+    session = db.query(FormMapperSession).filter(
+        FormMapperSession.id == session_id
+    ).first()
+    return _SessionOwner(session.company_id, session.user_id) if session else None
+
+
 def _trigger_celery_task(task_name: str, celery_args: dict):
     """
     Trigger the appropriate Celery task based on task name.
@@ -20,6 +20,7 @@ from services.encryption_service import mask_credential
 
 from models.database import get_db, FormPageRoute, CrawlSession, Network
 from models.agent_models import Agent, AgentTask
+from services.agent_presence import effective_last_heartbeat, request_agent_cancel
 from utils.auth_helpers import get_current_user_from_request
 from routes.agent_router import validate_jwt_and_session
 
@@ -126,9 +127,10 @@ async def locate_form_pages(
     ).first()
     
     # Also check heartbeat is recent (within last 2 minutes)
-    if agent and agent.last_heartbeat:
+    last_heartbeat = effective_last_heartbeat(agent)
+    if agent and last_heartbeat:
         heartbeat_timeout = datetime.utcnow() - timedelta(minutes=2)
-        if agent.last_heartbeat < heartbeat_timeout:
+        if last_heartbeat < heartbeat_timeout:
             agent = None  # Agent is stale
     
     if not agent:
@@ -376,9 +378,10 @@ async def get_discovery_status(session_id: int, request: Request, db: Session =
         agent = db.query(Agent).filter(Agent.user_id == session.user_id).first()
         
         agent_offline = True
-        if agent and agent.last_heartbeat:
+        last_heartbeat = effective_last_heartbeat(agent)
+        if last_heartbeat:
             timeout_threshold = datetime.utcnow() - timedelta(seconds=HEARTBEAT_TIMEOUT_SECONDS)
-            agent_offline = agent.last_heartbeat < timeout_threshold
+            agent_offline = last_heartbeat < timeout_threshold
         
         if agent_offline:
             # Mark session as failed
@@ -407,6 +410,7 @@ async def get_discovery_status(session_id: int, request: Request, db: Session =
                 session.error_message = 'Login mapping was cancelled'
                 session.completed_at = datetime.utcnow()
                 db.commit()
+                request_agent_cancel(session.user_id)
 
     # Get discovered forms for this session
     forms = db.query(FormPageRoute).filter(
@@ -442,7 +446,8 @@ async def get_discovery_status(session_id: int, request: Request, db: Session =
 async def cancel_discovery_session(session_id: int, request: Request, db: Session = Depends(get_db)):
     """
     Cancel a running discovery session.
-    Updates DB status so heartbeat returns cancel_requested to agent.
+    Updates DB status and sets the user's Redis cancel flag so heartbeat returns
+    cancel_requested to agent.
     """
     # Get crawl session
     session = db.query(CrawlSession).filter(CrawlSession.id == session_id).first()
@@ -462,6 +467,7 @@ async def cancel_discovery_session(session_id: int, request: Request, db: Sessio
     session.error_message = 'Cancelled by user'
     session.completed_at = datetime.utcnow()
     db.commit()
+    request_agent_cancel(session.user_id)
 
     # If there's a linked login mapper session, cancel it too
     if session.mapper_session_id:
@@ -506,9 +512,10 @@ async def get_active_sessions(project_id: int, request: Request, db: Session = D
         if s.status == 'running':
             agent = db.query(Agent).filter(Agent.user_id == s.user_id).first()
             agent_offline = True
-            if agent and agent.last_heartbeat:
+            last_heartbeat = effective_last_heartbeat(agent)
+            if last_heartbeat:
                 timeout_threshold = datetime.utcnow() - timedelta(seconds=HEARTBEAT_TIMEOUT_SECONDS)
-                agent_offline = agent.last_heartbeat < timeout_threshold
+                agent_offline = last_heartbeat < timeout_threshold
             if agent_offline:
                 s.status = 'failed'
                 s.error_code = 'AGENT_DISCONNECTED'
@@ -429,6 +429,37 @@ async def enable_company(
     }
 
 
+@router.get("/ai-step-cache-stats")
+async def get_ai_step_cache_stats(request: Request):
+    """AI step-generation cache hit/miss counters and size."""
+    import os
+    import redis
+    from services.ai_step_cache import AIStepCache
+
+    current_user = get_current_user_from_request(request)
+    if current_user["type"] != "super_admin":
+        raise HTTPException(status_code=403, detail="Super admin access required")
+
+    redis_client = redis.Redis(
+        host=os.getenv("REDIS_HOST", "redis"),
+        port=int(os.getenv("REDIS_PORT", 6379)),
+        db=0
+    )
+    return AIStepCache(redis_client).stats()
+
+
+@router.get("/ai-gateway-stats")
+async def get_ai_gateway_stats(request: Request):
+    """AI gateway queue depth, in-flight requests, latency and retry counters."""
+    from services.ai_gateway import get_ai_gateway
+
+    current_user = get_current_user_from_request(request)
+    if current_user["type"] != "super_admin":
+        raise HTTPException(status_code=403, detail="Super admin access required")
+
+    return get_ai_gateway().stats()
+
+
 @router.get("/audit-logs")
 async def get_audit_logs(
         request: Request,
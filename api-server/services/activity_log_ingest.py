@@ -0,0 +1,235 @@
+# activity_log_ingest.py
+# Bulk ingestion of agent activity logs (JSON array uploads, live NDJSON segments)
+# SCALABLE: the uploaded JSON array is decoded incrementally and written with Postgres
+# COPY in bounded chunks (no ORM object per row), so a 50K-entry mapping log takes one
+# connection for seconds instead of holding a worker through 50K flushes.
+
+import io
+import os
+import re
+import gzip
+import json
+import time
+import codecs
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from sqlalchemy import insert
+
+from models.database import ActivityLogEntry
+from services.activity_session_rollups import add_to_session_rollup
+
+logger = logging.getLogger(__name__)
+
+# "copy" (default) or "executemany" (multi-row INSERT, for poolers/proxies without COPY)
+ACTIVITY_LOG_INGEST_MODE = os.getenv("ACTIVITY_LOG_INGEST_MODE", "copy")
+ACTIVITY_LOG_INGEST_CHUNK = int(os.getenv("ACTIVITY_LOG_INGEST_CHUNK", 5000))
+
+_COPY_COLUMNS = (
+    "company_id", "project_id", "user_id", "activity_type",
+    "crawl_session_id", "mapper_session_id", "test_run_id",
+    "timestamp", "level", "category", "message", "extra_data", "created_at",
+)
+_COPY_SQL = f"COPY activity_log_entries ({', '.join(_COPY_COLUMNS)}) FROM STDIN"
+
+# Agent timestamps are ISO-8601 (datetime.isoformat() / JS toISOString()). Postgres parses
+# these itself; anything else falls back to ingestion time like the old per-row path did.
+_ISO_TIMESTAMP = re.compile(r"^\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(\.\d{1,6})?(Z|[+-]\d{2}:?\d{2})?$")
+
+_SESSION_COLUMN = {
+    "discovery": "crawl_session_id",
+    "mapping": "mapper_session_id",
+    "test_run": "test_run_id",
+}
+
+
+# ============================================================
+# STREAMING JSON
+# ============================================================
+
+def iter_json_array(chunks: Iterable[str]) -> Iterator:
+    """
+    Yield the items of a top-level JSON array from text chunks without building the list.
+    Only the current (partial) item is buffered.
+    """
+    decoder = json.JSONDecoder()
+    buf = ""
+    pos = 0
+    started = False
+    for chunk in chunks:
+        buf = buf[pos:] + chunk
+        pos = 0
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= len(buf):
+                break
+            if not started:
+                if buf[pos] != "[":
+                    raise ValueError("Activity log upload is not a JSON array")
+                started = True
+                pos += 1
+                continue
+            if buf[pos] == "]":
+                return
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                break  # Item continues in the next chunk
+            yield item
+            pos = end
+    if buf[pos:].strip():
+        raise ValueError("Truncated activity log upload")
+
+
+def iter_s3_json_array(s3_key: str, chunk_size: int = 256 * 1024) -> Iterator:
+    """Items of a JSON array stored in S3, decoded while the body downloads"""
+    from services.s3_storage import get_s3_file_stream
+
+    body = get_s3_file_stream(s3_key)
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    try:
+        yield from iter_json_array(decoder.decode(chunk) for chunk in body.iter_chunks(chunk_size))
+    finally:
+        body.close()
+
+
+def iter_ndjson_gzip(data: bytes) -> Iterator:
+    """Items of a gzip-compressed NDJSON segment (agent live log streaming)"""
+    with gzip.GzipFile(fileobj=io.BytesIO(data)) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+# ============================================================
+# BULK INSERT
+# ============================================================
+
+def _copy_value(value) -> str:
+    """One field in COPY text format"""
+    if value is None:
+        return "\\N"
+    return (str(value).replace("\\", "\\\\").replace("\t", "\\t")
+            .replace("\n", "\\n").replace("\r", "\\r"))
+
+
+def _copy_rows(db, rows: List[Dict]) -> None:
+    buf = io.StringIO()
+    for row in rows:
+        fields = []
+        for col in _COPY_COLUMNS:
+            value = row[col]
+            if col == "extra_data" and value is not None:
+                value = json.dumps(value, default=str)
+            fields.append(_copy_value(value))
+        buf.write("\t".join(fields))
+        buf.write("\n")
+    buf.seek(0)
+    # Raw DBAPI cursor on the session's connection - same transaction as the rollup upsert
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(_COPY_SQL, buf)
+    finally:
+        cursor.close()
+
+
+def _insert_rows(db, rows: List[Dict]) -> None:
+    db.execute(insert(ActivityLogEntry), rows)
+
+
+def ingest_activity_log_entries(
+        db,
+        entries: Iterable[Dict],
+        activity_type: str,
+        session_id: int,
+        project_id: int,
+        company_id: int,
+        user_id: Optional[int] = None,
+        chunk_size: Optional[int] = None
+) -> Dict:
+    """
+    Insert an upload's entries in chunks and bump the session rollup. Caller commits,
+    so entries and counters land (or roll back) together.
+
+    Returns:
+        {"entries_created", "chunks", "seconds", "rows_per_second"}
+    """
+    chunk_size = chunk_size or ACTIVITY_LOG_INGEST_CHUNK
+    write_chunk = _copy_rows if ACTIVITY_LOG_INGEST_MODE == "copy" else _insert_rows
+    session_column = _SESSION_COLUMN.get(activity_type)
+
+    base = {col: None for col in _COPY_COLUMNS}
+    base.update(company_id=company_id, project_id=project_id, user_id=user_id,
+                activity_type=activity_type, created_at=datetime.utcnow())
+    if session_column:
+        base[session_column] = session_id
+
+    started = time.monotonic()
+    total = errors = chunks = 0
+    last_entry_at = None
+    rows = []
+    for entry_data in entries:
+        timestamp = entry_data.get('timestamp')
+        if not isinstance(timestamp, str) or not _ISO_TIMESTAMP.match(timestamp):
+            timestamp = datetime.utcnow().isoformat()
+        # Compare as datetimes - strings with different offsets / precision don't order lexicographically
+        entry_at = _parse_timestamp(timestamp)
+        if entry_at is not None and (last_entry_at is None or entry_at > last_entry_at):
+            last_entry_at = entry_at
+
+        level = entry_data.get('level', 'info')
+        if level == 'error':
+            errors += 1
+
+        row = dict(base)
+        row.update(
+            timestamp=timestamp,
+            level=level,
+            category=entry_data.get('category', 'milestone'),
+            message=entry_data.get('message', ''),
+            # Agent LogEntry.to_dict() sends 'metadata'
+            extra_data=entry_data.get('extra_data', entry_data.get('metadata')) or None,
+        )
+        rows.append(row)
+        if len(rows) >= chunk_size:
+            write_chunk(db, rows)
+            total += len(rows)
+            chunks += 1
+            rows = []
+
+    if rows:
+        write_chunk(db, rows)
+        total += len(rows)
+        chunks += 1
+
+    if total:
+        add_to_session_rollup(db, activity_type, session_id, company_id, project_id,
+                              entry_count=total, error_count=errors,
+                              last_entry_at=last_entry_at)
+
+    seconds = time.monotonic() - started
+    rate = round(total / seconds) if seconds > 0 else total
+    logger.info(f"[LogIngest] {activity_type} session {session_id}: {total} entries in {chunks} chunk(s), "
+                f"{seconds:.2f}s ({rate} rows/s, {ACTIVITY_LOG_INGEST_MODE})")
+    return {
+        "entries_created": total,
+        "chunks": chunks,
+        "seconds": round(seconds, 3),
+        "rows_per_second": rate,
+    }
+
+
+def _parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        # Naive UTC, like the timestamp column itself
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc)
+    return parsed.replace(tzinfo=None)
@@ -0,0 +1,70 @@
+# activity_session_rollups.py
+# Per-session activity log counters (entry count, error count, last entry time)
+# SCALABLE: bumped in the same transaction that inserts the log entries, so the
+# activity listing reads one row per session instead of counting the log table
+
+from datetime import datetime
+from typing import Iterable, Optional
+
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+
+from models.database import ActivitySessionRollup
+
+
+def add_to_session_rollup(
+        db,
+        activity_type: str,
+        session_id: int,
+        company_id: int,
+        project_id: int,
+        entry_count: int,
+        error_count: int,
+        last_entry_at: Optional[datetime]
+) -> None:
+    """Upsert-increment one session's counters. Caller commits."""
+    if not session_id or not entry_count:
+        return
+    stmt = insert(ActivitySessionRollup).values(
+        activity_type=activity_type,
+        session_id=session_id,
+        company_id=company_id,
+        project_id=project_id,
+        entry_count=entry_count,
+        error_count=error_count,
+        last_entry_at=last_entry_at,
+        updated_at=datetime.utcnow(),
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["activity_type", "session_id"],
+        set_={
+            "entry_count": ActivitySessionRollup.entry_count + stmt.excluded.entry_count,
+            "error_count": ActivitySessionRollup.error_count + stmt.excluded.error_count,
+            # GREATEST ignores NULLs
+            "last_entry_at": func.greatest(ActivitySessionRollup.last_entry_at, stmt.excluded.last_entry_at),
+            "updated_at": stmt.excluded.updated_at,
+        }
+    )
+    db.execute(stmt)
+
+
+def add_entries_to_session_rollup(db, activity_type: str, session_id: int, company_id: int,
+                                  project_id: int, entries: Iterable) -> None:
+    """Rollup for a batch of ActivityLogEntry objects (before commit)"""
+    entries = list(entries)
+    if not entries:
+        return
+    add_to_session_rollup(
+        db, activity_type, session_id, company_id, project_id,
+        entry_count=len(entries),
+        error_count=sum(1 for e in entries if e.level == "error"),
+        last_entry_at=max((e.timestamp for e in entries if e.timestamp), default=None,
+                          key=lambda ts: ts.replace(tzinfo=None)),
+    )
+
+
+def delete_session_rollup(db, activity_type: str, session_id: int) -> None:
+    db.query(ActivitySessionRollup).filter(
+        ActivitySessionRollup.activity_type == activity_type,
+        ActivitySessionRollup.session_id == session_id
+    ).delete()
@@ -0,0 +1,155 @@
+# agent_presence.py
+# Agent heartbeat / status and cancel flags kept in Redis
+# SCALABLE: heartbeats never write to Postgres directly - flush_agent_heartbeats
+# syncs last_heartbeat/status for all agents that beat since the last run in one bulk UPDATE
+
+import os
+import logging
+from datetime import datetime
+from typing import Dict, Optional
+
+import redis
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv('REDIS_URL', 'redis://redis:6379/0')
+_presence_redis_pool = redis.ConnectionPool.from_url(REDIS_URL, max_connections=20)
+
+# Heartbeat hash outlives several missed beats so online checks can still read it
+HEARTBEAT_TTL = 600  # 10 min
+# Agents that beat since the last DB flush
+HEARTBEAT_DIRTY_KEY = "agent_heartbeat_dirty"
+# Same window the old DB query used for "recently cancelled" sessions
+CANCEL_FLAG_TTL = 300  # 5 min
+
+
+def get_presence_redis():
+    return redis.Redis(connection_pool=_presence_redis_pool)
+
+
+def _heartbeat_key(agent_pk: int) -> str:
+    return f"agent_heartbeat:{agent_pk}"
+
+
+def _cancel_key(user_id: int) -> str:
+    return f"agent_cancel:{user_id}"
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+# ========== HEARTBEAT ==========
+
+def record_heartbeat(agent_pk: int, status: str, current_task_id: Optional[str],
+                     redis_client=None) -> None:
+    """Store the latest heartbeat in Redis and mark the agent for the next DB flush"""
+    r = redis_client or get_presence_redis()
+    key = _heartbeat_key(agent_pk)
+    pipe = r.pipeline()
+    pipe.hset(key, mapping={
+        "status": status or "idle",
+        "current_task_id": current_task_id or "",
+        "last_heartbeat": datetime.utcnow().isoformat(),
+    })
+    pipe.expire(key, HEARTBEAT_TTL)
+    pipe.sadd(HEARTBEAT_DIRTY_KEY, agent_pk)
+    pipe.execute()
+
+
+def get_heartbeat(agent_pk: int, redis_client=None) -> Optional[Dict]:
+    """Latest heartbeat from Redis: {status, current_task_id, last_heartbeat (datetime)} or None"""
+    r = redis_client or get_presence_redis()
+    try:
+        raw = r.hgetall(_heartbeat_key(agent_pk))
+    except redis.RedisError as e:
+        logger.warning(f"[AgentPresence] Heartbeat read failed for agent {agent_pk}: {e}")
+        return None
+    if not raw:
+        return None
+    data = {_decode(k): _decode(v) for k, v in raw.items()}
+    try:
+        data["last_heartbeat"] = datetime.fromisoformat(data["last_heartbeat"])
+    except (KeyError, ValueError):
+        return None
+    data["current_task_id"] = data.get("current_task_id") or None
+    return data
+
+
+def effective_last_heartbeat(agent, redis_client=None) -> Optional[datetime]:
+    """
+    Most recent heartbeat for an Agent row - Redis first (the DB copy lags by up to
+    one flush interval), DB column as fallback.
+    """
+    if agent is None:
+        return None
+    hb = get_heartbeat(agent.id, redis_client)
+    if hb and (agent.last_heartbeat is None or hb["last_heartbeat"] > agent.last_heartbeat):
+        return hb["last_heartbeat"]
+    return agent.last_heartbeat
+
+
+def flush_heartbeats(db, redis_client=None, batch_size: int = 1000) -> int:
+    """Bulk-sync dirty heartbeats to the agents table. Returns number of rows updated."""
+    from models.agent_models import Agent
+
+    r = redis_client or get_presence_redis()
+    flushed = 0
+    while True:
+        agent_pks = [int(_decode(pk)) for pk in (r.spop(HEARTBEAT_DIRTY_KEY, batch_size) or [])]
+        if not agent_pks:
+            break
+
+        pipe = r.pipeline()
+        for pk in agent_pks:
+            pipe.hgetall(_heartbeat_key(pk))
+        rows = []
+        for pk, raw in zip(agent_pks, pipe.execute()):
+            if not raw:
+                continue  # Expired - nothing newer than the DB has
+            data = {_decode(k): _decode(v) for k, v in raw.items()}
+            try:
+                last_heartbeat = datetime.fromisoformat(data["last_heartbeat"])
+            except (KeyError, ValueError):
+                continue
+            rows.append({
+                "id": pk,
+                "status": data.get("status") or "idle",
+                "current_task_id": data.get("current_task_id") or None,
+                "last_heartbeat": last_heartbeat,
+            })
+
+        if rows:
+            try:
+                db.bulk_update_mappings(Agent, rows)
+                db.commit()
+                flushed += len(rows)
+            except Exception:
+                db.rollback()
+                # Put them back so the next run retries
+                r.sadd(HEARTBEAT_DIRTY_KEY, *[row["id"] for row in rows])
+                raise
+
+        if len(agent_pks) < batch_size:
+            break
+    return flushed
+
+
+# ========== CANCEL FLAGS ==========
+
+def request_agent_cancel(user_id: int, redis_client=None) -> None:
+    """Ask the user's agent to stop - delivered on its next heartbeat"""
+    if not user_id:
+        return
+    r = redis_client or get_presence_redis()
+    r.setex(_cancel_key(user_id), CANCEL_FLAG_TTL, "1")
+
+
+def pop_agent_cancel(user_id: int, redis_client=None) -> bool:
+    """Consume the cancel flag (acknowledged once, like the old cancelled_ack status)"""
+    r = redis_client or get_presence_redis()
+    pipe = r.pipeline()
+    pipe.get(_cancel_key(user_id))
+    pipe.delete(_cancel_key(user_id))
+    flag, _ = pipe.execute()
+    return bool(flag)
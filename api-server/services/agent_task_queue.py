@@ -0,0 +1,167 @@
+# agent_task_queue.py
+# Agent task queues in Redis: the per-user queue plus per-session subqueues
+# SCALABLE: an agent running several browser workers (AGENT_MAX_SESSIONS > 1 on the agent)
+# gets one subqueue per session a worker is bound to - each worker long-polls only its
+# own session's tasks, and flushing one session's tasks leaves the other sessions alone.
+#
+# Keys:
+#   agent:{user_id}                       main queue - every task of single-session agents,
+#                                         plus tasks of sessions no worker is bound to yet
+#   agent:{user_id}:session:{sid}         subqueue of a session bound to a worker
+#   agent_session_bound:{user_id}:{sid}   binding - refreshed by every subqueue poll (TTL)
+#   agent_concurrency:{user_id}           max concurrent sessions reported at registration
+#
+# Binding/concurrency keys must not start with "agent:" - queue stats scan agent:* and LLEN every key.
+
+import os
+import json
+import logging
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Queue cap (same as the old per-site ltrim)
+AGENT_QUEUE_MAX_TASKS = 50
+# Upper bound for the concurrency an agent may report
+AGENT_MAX_CONCURRENT_SESSIONS = int(os.getenv("AGENT_MAX_CONCURRENT_SESSIONS", 8))
+# Binding outlives a few subqueue long-polls (agent polls every <= 25s)
+SESSION_BINDING_TTL = 60
+# Orphaned subqueues (agent crashed mid-session) expire on their own
+SESSION_QUEUE_TTL = 3600
+
+# Route + push in one step: an unbind between a separate binding check and the push would
+# strand the task in a subqueue nobody polls any more.
+# KEYS: binding, main queue, session subqueue. ARGV: task json, tail (1/0), queue cap, subqueue TTL.
+# Returns the queue name.
+_PUSH_SCRIPT = """
+local queue = KEYS[2]
+if KEYS[1] ~= '' and redis.call('EXISTS', KEYS[1]) == 1 then
+    queue = KEYS[3]
+end
+if ARGV[2] == '1' then
+    redis.call('RPUSH', queue, ARGV[1])
+else
+    redis.call('LPUSH', queue, ARGV[1])
+end
+redis.call('LTRIM', queue, 0, tonumber(ARGV[3]) - 1)
+if queue ~= KEYS[2] then
+    redis.call('EXPIRE', queue, ARGV[4])
+end
+return queue
+"""
+
+
+def agent_queue_key(user_id) -> str:
+    return f"agent:{user_id}"
+
+
+def session_queue_key(user_id, session_id) -> str:
+    return f"agent:{user_id}:session:{session_id}"
+
+
+def _binding_key(user_id, session_id) -> str:
+    return f"agent_session_bound:{user_id}:{session_id}"
+
+
+def _concurrency_key(user_id) -> str:
+    return f"agent_concurrency:{user_id}"
+
+
+# ========== CONCURRENCY ==========
+
+def set_agent_concurrency(redis_client, user_id, max_sessions) -> int:
+    """Store the concurrency reported at registration (clamped). Returns the accepted value."""
+    try:
+        max_sessions = int(max_sessions or 1)
+    except (TypeError, ValueError):
+        max_sessions = 1
+    max_sessions = max(1, min(max_sessions, AGENT_MAX_CONCURRENT_SESSIONS))
+    if max_sessions > 1:
+        redis_client.set(_concurrency_key(user_id), max_sessions)
+    else:
+        redis_client.delete(_concurrency_key(user_id))
+    return max_sessions
+
+
+def get_agent_concurrency(redis_client, user_id) -> int:
+    value = redis_client.get(_concurrency_key(user_id))
+    try:
+        return int(value) if value else 1
+    except (TypeError, ValueError):
+        return 1
+
+
+# ========== SESSION BINDING ==========
+
+def bind_session(redis_client, user_id, session_id) -> None:
+    """A worker polls this session's subqueue - route its tasks there for the next TTL"""
+    redis_client.setex(_binding_key(user_id, session_id), SESSION_BINDING_TTL, "1")
+
+
+def unbind_session(redis_client, user_id, session_id) -> int:
+    """
+    Worker is done with the session: stop routing to its subqueue and move anything
+    still queued there back to the main queue. Returns the number of tasks moved.
+    """
+    redis_client.delete(_binding_key(user_id, session_id))
+    sub_queue, main_queue = session_queue_key(user_id, session_id), agent_queue_key(user_id)
+    moved = 0
+    # Oldest first (tail) onto the head of the main queue - keeps their push order
+    while moved < AGENT_QUEUE_MAX_TASKS and redis_client.rpoplpush(sub_queue, main_queue):
+        moved += 1
+    redis_client.delete(sub_queue)
+    return moved
+
+
+# ========== PUSH / FLUSH ==========
+
+def push_agent_task(redis_client, user_id, task: Dict, pipe=None, tail: bool = False) -> Optional[str]:
+    """
+    Queue a task for the user's agent: the session's subqueue when a worker is bound
+    to it, else the main queue. Pushes to the head (LPUSH) unless tail=True.
+
+    The routing decision and the push are one atomic script call. With `pipe`, that call
+    is added to the pipeline (caller executes it; its result there is the queue name,
+    see pushed_queue_name) and None is returned. Otherwise returns the queue name.
+    """
+    session_id = task.get("session_id")
+    keys = [_binding_key(user_id, session_id) if session_id else "",
+            agent_queue_key(user_id),
+            session_queue_key(user_id, session_id) if session_id else ""]
+    args = [json.dumps(task), "1" if tail else "0", AGENT_QUEUE_MAX_TASKS, SESSION_QUEUE_TTL]
+    push = redis_client.register_script(_PUSH_SCRIPT)
+    if pipe is not None:
+        push(keys=keys, args=args, client=pipe)
+        return None
+    return pushed_queue_name(push(keys=keys, args=args))
+
+
+def pushed_queue_name(result) -> str:
+    """Queue name returned by the push script (bytes without decode_responses)"""
+    return result.decode() if isinstance(result, bytes) else str(result)
+
+
+def flush_agent_tasks(redis_client, user_id, session_id: Optional[str] = None) -> None:
+    """
+    Drop queued tasks when a session starts/ends.
+
+    Single-session agents: the whole main queue (nothing else can be running).
+    Multi-session agents: only this session's subqueue and its tasks in the main queue.
+    """
+    main_queue = agent_queue_key(user_id)
+    if session_id:
+        redis_client.delete(session_queue_key(user_id, session_id))
+    if not session_id or get_agent_concurrency(redis_client, user_id) <= 1:
+        redis_client.delete(main_queue)
+        return
+
+    removed = 0
+    for raw in redis_client.lrange(main_queue, 0, -1):
+        try:
+            task_session = json.loads(raw).get("session_id")
+        except (ValueError, AttributeError):
+            continue
+        if task_session is not None and str(task_session) == str(session_id):
+            removed += redis_client.lrem(main_queue, 1, raw)
+    if removed:
+        logger.info(f"[AgentQueue] Flushed {removed} queued tasks of session {session_id} for user {user_id}")
@@ -1,8 +1,13 @@
 # ai_budget_service.py
 # AI Token Budget Service - tracks usage and enforces limits
 # Designed for high concurrency with hundreds of thousands of users
+# SCALABLE: usage is charged to a Redis ledger (INCRBYFLOAT per company/day or month);
+# settle_ai_usage_ledger moves it to api_usage + the budget counters in bulk, so the
+# per-call path takes no row lock and makes no DB writes
 
 import os
+import json
+import uuid
 import logging
 from datetime import datetime, timedelta
 from typing import Dict, Optional, Tuple
@@ -12,6 +17,63 @@ from enum import Enum
 
 logger = logging.getLogger(__name__)
 
+AI_USAGE_LEDGER_ENABLED = os.getenv("AI_USAGE_LEDGER_ENABLED", "true").lower() == "true"
+# Entries settled per DB transaction
+AI_USAGE_SETTLE_BATCH = int(os.getenv("AI_USAGE_SETTLE_BATCH", 1000))
+# Times a failing batch is handed out again before it is moved to the dead-letter list
+AI_USAGE_SETTLE_MAX_ATTEMPTS = int(os.getenv("AI_USAGE_SETTLE_MAX_ATTEMPTS", 5))
+
+USAGE_QUEUE_KEY = "ai_usage_ledger:queue"            # LIST of unsettled usage entries (JSON)
+USAGE_PROCESSING_KEY = "ai_usage_ledger:processing"  # LIST batch being settled right now
+USAGE_ATTEMPTS_KEY = "ai_usage_ledger:attempts"      # Redeliveries of the processing batch
+USAGE_DEAD_LETTER_KEY = "ai_usage_ledger:dead"       # LIST batches that kept failing (inspect by hand)
+USAGE_SETTLE_LOCK_KEY = "ai_usage_ledger:settle_lock"
+
+SCOPE_MONTH = "month"  # Charged to company_product_subscriptions.claude_used_this_month
+SCOPE_DAY = "day"      # Charged to companies.ai_used_today (Early Access)
+
+# Pending counters outlive their period long enough for late settlement
+_PENDING_TTL = {SCOPE_DAY: 2 * 86400, SCOPE_MONTH: 62 * 86400}
+
+# Move the next batch to the processing list. An existing processing list means the
+# last settlement died before acknowledging it - hand that batch out again first, up to
+# ARGV[2] times, then dead-letter it so one poison batch can't block the queue.
+# Returns {dead-lettered count, batch}.
+_TAKE_BATCH_SCRIPT = """
+local dead = 0
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    local stuck = redis.call('LRANGE', KEYS[2], 0, -1)
+    if redis.call('INCR', KEYS[3]) <= tonumber(ARGV[2]) then
+        return {0, stuck}
+    end
+    redis.call('RPUSH', KEYS[4], unpack(stuck))
+    redis.call('DEL', KEYS[2])
+    dead = #stuck
+end
+redis.call('DEL', KEYS[3])
+local items = redis.call('LRANGE', KEYS[1], 0, tonumber(ARGV[1]) - 1)
+if #items > 0 then
+    redis.call('RPUSH', KEYS[2], unpack(items))
+    redis.call('LTRIM', KEYS[1], #items, -1)
+end
+return {dead, items}
+"""
+
+
+def _ledger_period(scope: str, at: datetime) -> str:
+    return at.strftime("%Y%m%d") if scope == SCOPE_DAY else at.strftime("%Y%m")
+
+
+def _pending_key(scope: str, company_id: int, product_id: int, at: Optional[datetime] = None) -> str:
+    """
+    Unsettled spend on top of the DB counter, per period (UTC day / month of `at`,
+    default now) - spend left over from the last period never counts against this one.
+    """
+    period = _ledger_period(scope, at or datetime.utcnow())
+    if scope == SCOPE_DAY:
+        return f"ai_usage_ledger:pending:day:{company_id}:{period}"
+    return f"ai_usage_ledger:pending:month:{company_id}:{product_id}:{period}"
+
 class AccessDeniedError(Exception):
     """Raised when AI access is denied (not a budget issue)"""
     def __init__(self, reason: str, code: str):
@@ -63,6 +125,9 @@ class AIBudgetService:
     # Cost per 1M tokens (approximate, adjust as needed)
     COST_PER_1M_INPUT_TOKENS = 3.00   # Claude Sonnet input
     COST_PER_1M_OUTPUT_TOKENS = 15.00  # Claude Sonnet output
+    # Prompt caching: writes cost 1.25x input, reads 0.1x input
+    COST_PER_1M_CACHE_WRITE_TOKENS = 3.75
+    COST_PER_1M_CACHE_READ_TOKENS = 0.30
     
     # Cache TTL for budget info (seconds)
     BUDGET_CACHE_TTL = 60
@@ -117,6 +182,7 @@ class AIBudgetService:
         cached = self._get_cached_budget(company_id, product_id)
         if cached:
             budget, used = cached
+            used += self._pending_usage(SCOPE_MONTH, company_id, product_id)
             remaining = budget - used
             
             if estimated_cost > 0 and remaining < estimated_cost:
@@ -143,11 +209,13 @@ class AIBudgetService:
         
         budget = subscription.monthly_claude_budget or 0.0
         used = subscription.claude_used_this_month or 0.0
-        remaining = budget - used
         
-        # Cache the result
+        # Cache the settled (DB) figure - unsettled ledger spend is added on every read
         self._cache_budget(company_id, product_id, budget, used)
         
+        used += self._pending_usage(SCOPE_MONTH, company_id, product_id)
+        remaining = budget - used
+        
         if estimated_cost > 0 and remaining < estimated_cost:
             raise BudgetExceededError(company_id, budget, used)
         
@@ -308,6 +376,7 @@ class AIBudgetService:
                 if cached:
                     daily_budget = float(cached.get(b"budget", cached.get("budget", 10.0)))
                     used_today = float(cached.get(b"used", cached.get("used", 0.0)))
+                    used_today += self._pending_usage(SCOPE_DAY, company_id, None)
                     remaining = daily_budget - used_today
 
                     if estimated_cost > 0 and remaining < estimated_cost:
@@ -328,7 +397,6 @@ class AIBudgetService:
 
         daily_budget = getattr(company, 'daily_ai_budget', None) or 10.0
         used_today = getattr(company, 'ai_used_today', None) or 0.0
-        remaining = daily_budget - used_today
 
         # Cache it
         if self.redis:
@@ -338,6 +406,9 @@ class AIBudgetService:
             except:
                 pass
 
+        used_today += self._pending_usage(SCOPE_DAY, company_id, None)
+        remaining = daily_budget - used_today
+
         if estimated_cost > 0 and remaining < estimated_cost:
             raise BudgetExceededError(company_id, daily_budget, used_today)
 
@@ -381,13 +452,16 @@ class AIBudgetService:
         input_tokens: int,
         output_tokens: int,
         session_id: Optional[str] = None,
-        mapper_session_id: Optional[int] = None
+        mapper_session_id: Optional[int] = None,
+        cache_creation_input_tokens: int = 0,
+        cache_read_input_tokens: int = 0
     ) -> Dict:
         """
         Record AI usage and update budget atomically.
         
-        Uses row-level locking to ensure accurate budget tracking
-        under high concurrency.
+        Charged to the Redis ledger (settled to the DB in bulk by settle_usage_ledger).
+        Falls back to the synchronous row-locked update when the ledger is disabled
+        or Redis is unavailable.
         
         Args:
             db: Database session
@@ -395,10 +469,12 @@ class AIBudgetService:
             product_id: Product ID
             user_id: User who triggered the operation
             operation_type: Type of AI operation
-            input_tokens: Input tokens used
+            input_tokens: Input tokens used (uncached part of the prompt)
             output_tokens: Output tokens used
             session_id: Optional crawl/mapper session ID (string)
             mapper_session_id: Optional form mapper session ID (int)
+            cache_creation_input_tokens: Prompt tokens written to the prompt cache
+            cache_read_input_tokens: Prompt tokens served from the prompt cache
             
         Returns:
             Dict with usage details and updated budget
@@ -406,8 +482,20 @@ class AIBudgetService:
         from models.database import CompanyProductSubscription, ApiUsage
         
         # Calculate cost
-        total_tokens = input_tokens + output_tokens
-        cost = self._calculate_cost(input_tokens, output_tokens)
+        cache_creation_input_tokens = cache_creation_input_tokens or 0
+        cache_read_input_tokens = cache_read_input_tokens or 0
+        total_tokens = input_tokens + output_tokens + cache_creation_input_tokens + cache_read_input_tokens
+        cost = self._calculate_cost(input_tokens, output_tokens,
+                                    cache_creation_input_tokens, cache_read_input_tokens)
+
+        if AI_USAGE_LEDGER_ENABLED and self.redis is not None:
+            try:
+                return self._charge_ledger(
+                    db, company_id, product_id, user_id, operation_type, total_tokens, cost,
+                    cache_creation_input_tokens, cache_read_input_tokens
+                )
+            except Exception as e:
+                logger.warning(f"[AIBudget] Usage ledger unavailable, recording synchronously: {e}")
         
         try:
             # Get subscription with row lock for atomic update
@@ -444,6 +532,8 @@ class AIBudgetService:
                 crawl_session_id=None,  # Use mapper_session_id for form mapper
                 operation_type=operation_type.value,
                 tokens_used=total_tokens,
+                cache_creation_tokens=cache_creation_input_tokens,
+                cache_read_tokens=cache_read_input_tokens,
                 api_cost=cost
             )
             db.add(usage_record)
@@ -456,13 +546,16 @@ class AIBudgetService:
             
             logger.info(
                 f"[AIBudget] Recorded {operation_type.value}: "
-                f"tokens={total_tokens}, cost=${cost:.4f}, "
+                f"tokens={total_tokens} (cache read={cache_read_input_tokens}, "
+                f"write={cache_creation_input_tokens}), cost=${cost:.4f}, "
                 f"remaining=${remaining:.2f} for company {company_id}"
             )
             
             return {
                 "success": True,
                 "tokens_used": total_tokens,
+                "cache_creation_tokens": cache_creation_input_tokens,
+                "cache_read_tokens": cache_read_input_tokens,
                 "cost": cost,
                 "remaining_budget": remaining,
                 "usage_id": usage_record.id
@@ -473,11 +566,142 @@ class AIBudgetService:
             logger.error(f"[AIBudget] Failed to record usage: {e}")
             return {"success": False, "error": str(e)}
     
-    def _calculate_cost(self, input_tokens: int, output_tokens: int) -> float:
-        """Calculate cost based on token counts"""
+    def _charge_ledger(
+        self,
+        db: Session,
+        company_id: int,
+        product_id: int,
+        user_id: int,
+        operation_type: AIOperationType,
+        total_tokens: int,
+        cost: float,
+        cache_creation_input_tokens: int,
+        cache_read_input_tokens: int
+    ) -> Dict:
+        """Queue the usage entry and add its cost to the pending counter in one MULTI"""
+        scope = self._charge_scope(db, company_id, product_id)
+        now = datetime.utcnow()
+        entry = {
+            "id": uuid.uuid4().hex,  # Settlement skips ids already in api_usage
+            "company_id": company_id,
+            "product_id": product_id,
+            "user_id": user_id,
+            "operation_type": operation_type.value if isinstance(operation_type, AIOperationType) else operation_type,
+            "tokens_used": total_tokens,
+            "cache_creation_input_tokens": cache_creation_input_tokens,
+            "cache_read_input_tokens": cache_read_input_tokens,
+            "cost": cost,
+            "scope": scope,
+            "created_at": now.isoformat(),
+        }
+        pending_key = _pending_key(scope, company_id, product_id, now)
+        pipe = self.redis.pipeline()
+        pipe.rpush(USAGE_QUEUE_KEY, json.dumps(entry))
+        pipe.incrbyfloat(pending_key, cost)
+        pipe.expire(pending_key, _PENDING_TTL[scope])
+        pipe.execute()
+
+        logger.info(
+            f"[AIBudget] Charged {entry['operation_type']} to ledger ({scope}): "
+            f"tokens={total_tokens}, cost=${cost:.4f} for company {company_id}"
+        )
+        return {
+            "success": True,
+            "tokens_used": total_tokens,
+            "cache_creation_tokens": cache_creation_input_tokens,
+            "cache_read_tokens": cache_read_input_tokens,
+            "cost": cost,
+            "scope": scope,
+            "queued": True
+        }
+
+    def _charge_scope(self, db: Session, company_id: int, product_id: int) -> str:
+        """Which counter a company's spend goes to - same rule as the synchronous path"""
+        try:
+            access_info = self._check_access_status(db, company_id, product_id)
+        except AccessDeniedError:
+            return SCOPE_MONTH
+        return SCOPE_DAY if access_info.get("mode") == "early_access" else SCOPE_MONTH
+
+    def _pending_usage(self, scope: str, company_id: int, product_id: Optional[int]) -> float:
+        """Spend charged to the ledger but not yet settled to the DB"""
+        if not self.redis:
+            return 0.0
+        try:
+            return max(0.0, float(self.redis.get(_pending_key(scope, company_id, product_id)) or 0.0))
+        except Exception as e:
+            logger.warning(f"[AIBudget] Ledger read error: {e}")
+            return 0.0
+
+    def settle_usage_ledger(self, db: Session, batch_size: int = AI_USAGE_SETTLE_BATCH) -> int:
+        """
+        Move queued ledger entries into api_usage and the budget counters, one
+        record_usage_batch transaction per batch, then release the settled amounts
+        from the pending counters. Returns the number of entries settled.
+
+        A crash after the DB commit but before the batch is acknowledged hands the batch
+        out again; entries whose id is already in api_usage only release their pending
+        amount. A batch that fails AI_USAGE_SETTLE_MAX_ATTEMPTS more times is moved to
+        the dead-letter list.
+        """
+        if not self.redis:
+            return 0
+        if not self.redis.set(USAGE_SETTLE_LOCK_KEY, "1", nx=True, ex=300):
+            return 0  # Another settlement is running
+
+        take_batch = self.redis.register_script(_TAKE_BATCH_SCRIPT)
+        settled_count = 0
+        try:
+            while True:
+                dead, raw_entries = take_batch(
+                    keys=[USAGE_QUEUE_KEY, USAGE_PROCESSING_KEY, USAGE_ATTEMPTS_KEY, USAGE_DEAD_LETTER_KEY],
+                    args=[batch_size, AI_USAGE_SETTLE_MAX_ATTEMPTS]
+                )
+                if dead:
+                    logger.error(f"[AIBudget] Ledger batch failed {AI_USAGE_SETTLE_MAX_ATTEMPTS + 1} times, "
+                                 f"moved {dead} entries to {USAGE_DEAD_LETTER_KEY}")
+                if not raw_entries:
+                    break
+
+                usages = []
+                for raw in raw_entries:
+                    try:
+                        usages.append(json.loads(raw))
+                    except ValueError:
+                        logger.error(f"[AIBudget] Dropping malformed ledger entry: {raw[:200]!r}")
+
+                result = self.record_usage_batch(db, usages)
+                if not result.get("success"):
+                    # Batch stays in the processing list and is retried next run
+                    raise RuntimeError(f"Ledger settlement failed: {result.get('error')}")
+
+                # Release pending only after the commit (a check in between over-counts, never under-counts),
+                # and drop cached DB figures so they are re-read with the settled amounts
+                pipe = self.redis.pipeline()
+                for item in result.get("settled", []):
+                    if item["amount"]:
+                        pipe.incrbyfloat(_pending_key(item["scope"], item["company_id"], item["product_id"],
+                                                      item["at"]), -item["amount"])
+                        pipe.delete(self._get_cache_key(item["company_id"], item["product_id"]),
+                                    f"ai_daily_budget:{item['company_id']}")
+                pipe.delete(USAGE_PROCESSING_KEY, USAGE_ATTEMPTS_KEY)
+                pipe.execute()
+
+                settled_count += len(usages)
+                if len(raw_entries) < batch_size:
+                    break
+        finally:
+            self.redis.delete(USAGE_SETTLE_LOCK_KEY)
+        return settled_count
+
+    def _calculate_cost(self, input_tokens: int, output_tokens: int,
+                        cache_creation_input_tokens: int = 0, cache_read_input_tokens: int = 0) -> float:
+        """Calculate cost based on token counts (cache writes/reads billed at their own rates)"""
         input_cost = (input_tokens / 1_000_000) * self.COST_PER_1M_INPUT_TOKENS
         output_cost = (output_tokens / 1_000_000) * self.COST_PER_1M_OUTPUT_TOKENS
-        return round(input_cost + output_cost, 6)
+        cache_cost = ((cache_creation_input_tokens / 1_000_000) * self.COST_PER_1M_CACHE_WRITE_TOKENS +
+                      (cache_read_input_tokens / 1_000_000) * self.COST_PER_1M_CACHE_READ_TOKENS)
+        return round(input_cost + output_cost + cache_cost, 6)
 
     def record_daily_usage(self, db: Session, company_id: int, cost: float) -> None:
         """Record daily usage with Redis atomic increment + async DB sync"""
@@ -570,16 +794,29 @@ class AIBudgetService:
             usages: List of usage dicts with keys:
                 company_id, product_id, user_id, operation_type,
                 input_tokens, output_tokens
+                (optional) cache_creation_input_tokens, cache_read_input_tokens
+                (ledger entries) id, tokens_used, cost, scope ("month"/"day"), created_at
                 
         Returns:
-            Dict with batch results
+            Dict with batch results; "settled" lists the amount per scope/company/product/period
+            ("at" = a datetime in the period) to release from the pending counters - ledger
+            entries without a subscription are dropped and ids already in api_usage are not
+            charged again, their amounts are included
         """
-        from models.database import CompanyProductSubscription, ApiUsage
+        from models.database import CompanyProductSubscription, ApiUsage, Company
         
         if not usages:
             return {"success": True, "recorded": 0}
         
         try:
+            # Ledger entries handed out again after a crash - already committed
+            entry_ids = [u["id"] for u in usages if u.get("id")]
+            already_settled = set()
+            if entry_ids:
+                already_settled = {row[0] for row in db.query(ApiUsage.ledger_entry_id).filter(
+                    ApiUsage.ledger_entry_id.in_(entry_ids)
+                )}
+
             # Group by company+product for efficient updates
             grouped = {}
             for u in usages:
@@ -589,8 +826,14 @@ class AIBudgetService:
                 grouped[key].append(u)
             
             total_recorded = 0
+            settled = []
             
             for (company_id, product_id), company_usages in grouped.items():
+                month_cost = 0.0
+                day_cost = 0.0
+                records = []
+                released: Dict[Tuple[str, str], Dict] = {}
+                
                 # Get subscription with lock
                 subscription = db.query(CompanyProductSubscription).filter(
                     and_(
@@ -599,15 +842,30 @@ class AIBudgetService:
                     )
                 ).with_for_update().first()
                 
-                if not subscription:
-                    continue
-                
-                total_cost = 0.0
-                records = []
-                
                 for u in company_usages:
-                    cost = self._calculate_cost(u["input_tokens"], u["output_tokens"])
-                    total_cost += cost
+                    cache_write = u.get("cache_creation_input_tokens", 0) or 0
+                    cache_read = u.get("cache_read_input_tokens", 0) or 0
+                    if "cost" in u:
+                        cost = u["cost"]
+                        tokens_used = u.get("tokens_used", 0)
+                    else:
+                        cost = self._calculate_cost(u["input_tokens"], u["output_tokens"], cache_write, cache_read)
+                        tokens_used = u["input_tokens"] + u["output_tokens"] + cache_write + cache_read
+                    scope = SCOPE_DAY if u.get("scope") == SCOPE_DAY else SCOPE_MONTH
+                    created_at = datetime.fromisoformat(u["created_at"]) if u.get("created_at") else datetime.utcnow()
+                    if u.get("id"):
+                        # Entries without an id predate per-period pending keys - nothing to release
+                        item = released.setdefault((scope, _ledger_period(scope, created_at)), {
+                            "scope": scope, "company_id": company_id, "product_id": product_id,
+                            "at": created_at, "amount": 0.0
+                        })
+                        item["amount"] += cost
+                    if not subscription or u.get("id") in already_settled:
+                        continue
+                    if scope == SCOPE_DAY:
+                        day_cost += cost
+                    else:
+                        month_cost += cost
                     
                     records.append(ApiUsage(
                         company_id=company_id,
@@ -615,15 +873,36 @@ class AIBudgetService:
                         subscription_id=subscription.id,
                         user_id=u["user_id"],
                         operation_type=u["operation_type"].value if isinstance(u["operation_type"], AIOperationType) else u["operation_type"],
-                        tokens_used=u["input_tokens"] + u["output_tokens"],
-                        api_cost=cost
+                        tokens_used=tokens_used,
+                        cache_creation_tokens=cache_write,
+                        cache_read_tokens=cache_read,
+                        api_cost=cost,
+                        ledger_entry_id=u.get("id"),
+                        created_at=created_at
                     ))
                 
+                settled.extend(released.values())
+                
+                if not subscription:
+                    logger.error(f"[AIBudget] No subscription for company {company_id}, "
+                                 f"dropping {len(company_usages)} usage entries")
+                    continue
+                
                 # Bulk insert
                 db.bulk_save_objects(records)
                 
-                # Update subscription
-                subscription.claude_used_this_month = (subscription.claude_used_this_month or 0.0) + total_cost
+                # Update subscription (one locked UPDATE per company per batch)
+                if month_cost:
+                    subscription.claude_used_this_month = (subscription.claude_used_this_month or 0.0) + month_cost
+                if day_cost:
+                    company = db.query(Company).filter(Company.id == company_id).with_for_update().first()
+                    if company:
+                        company.ai_used_today = (company.ai_used_today or 0.0) + day_cost
+                        if self.redis:
+                            try:
+                                self.redis.delete(f"ai_daily_budget:{company_id}")
+                            except Exception:
+                                pass
                 
                 total_recorded += len(records)
                 
@@ -632,7 +911,7 @@ class AIBudgetService:
             
             db.commit()
             
-            return {"success": True, "recorded": total_recorded}
+            return {"success": True, "recorded": total_recorded, "settled": settled}
             
         except Exception as e:
             db.rollback()
@@ -688,11 +967,15 @@ class AIBudgetService:
             )
         ).group_by(ApiUsage.operation_type).all()
         
+        pending = self._pending_usage(SCOPE_MONTH, company_id, product_id)
+        used_this_month = (subscription.claude_used_this_month or 0) + pending
+        
         return {
             "company_id": company_id,
             "monthly_budget": subscription.monthly_claude_budget,
-            "used_this_month": subscription.claude_used_this_month,
-            "remaining": (subscription.monthly_claude_budget or 0) - (subscription.claude_used_this_month or 0),
+            "used_this_month": used_this_month,
+            "pending_settlement": pending,
+            "remaining": (subscription.monthly_claude_budget or 0) - used_this_month,
             "budget_reset_date": subscription.budget_reset_date.isoformat() if subscription.budget_reset_date else None,
             "breakdown": [
                 {
@@ -729,7 +1012,7 @@ class AIBudgetService:
             if company:
                 self._reset_daily_budget_if_needed(db, company)
                 return {
-                    "used": int(company.ai_used_today or 0),
+                    "used": int((company.ai_used_today or 0) + self._pending_usage(SCOPE_DAY, company_id, None)),
                     "budget": int(company.daily_ai_budget or 10),
                     "is_byok": False
                 }
@@ -742,7 +1025,8 @@ class AIBudgetService:
 
         if subscription:
             return {
-                "used": int(subscription.claude_used_this_month or 0),
+                "used": int((subscription.claude_used_this_month or 0) +
+                            self._pending_usage(SCOPE_MONTH, company_id, product_id)),
                 "budget": int(subscription.monthly_claude_budget or 0),
                 "is_byok": False
             }
@@ -3,12 +3,10 @@
 # Simpler than form mapper - no junctions, no force_regenerate
 
 import json
-import time
 import logging
-import anthropic
-import random
 from typing import Dict, List, Optional, Any
-from anthropic._exceptions import OverloadedError, APIError
+from anthropic._exceptions import APIError
+from services.ai_gateway import ai_gateway_client, AIRetryLater
 
 logger = logging.getLogger(__name__)
 
@@ -19,56 +17,38 @@ class DynamicContentAIHelper:
     def __init__(self, api_key: str, session_logger=None):
         if not api_key:
             raise ValueError("API key is required for AI functionality")
-        self.client = anthropic.Anthropic(api_key=api_key)
+        self.client = ai_gateway_client(api_key)
         self.model = "claude-sonnet-4-5-20250929"
         self.session_logger = session_logger
 
-    def _call_api_with_retry_multimodal(self, content: list, max_tokens: int = 8000, max_retries: int = 3) -> Optional[str]:
-        """Call Claude API with retry logic for multimodal content"""
-        delay = 2
-
-        for attempt in range(max_retries):
-            try:
-                print(f"[DynamicContentAI] Calling Claude API (attempt {attempt + 1}/{max_retries})...")
-
-                message = self.client.messages.create(
-                    model=self.model,
-                    max_tokens=max_tokens,
-                    messages=[{"role": "user", "content": content}]
-                )
-
-                response_text = message.content[0].text
-                print(f"[DynamicContentAI] ✅ API call successful ({len(response_text)} chars)")
-                return response_text
-
-            except OverloadedError as e:
-                if attempt == max_retries - 1:
-                    print(f"[DynamicContentAI] ❌ API Overloaded after {max_retries} attempts")
-                    logger.error(f"[DynamicContentAI] API Overloaded: {e}")
-                    return None
-
-                jitter = random.uniform(0, delay * 0.5)
-                wait_time = delay + jitter
-                print(f"[DynamicContentAI] ⚠️ API Overloaded. Retrying in {wait_time:.1f}s...")
-                time.sleep(wait_time)
-                delay *= 2
-
-            except APIError as e:
-                if attempt == max_retries - 1:
-                    print(f"[DynamicContentAI] ❌ API Error: {e}")
-                    logger.error(f"[DynamicContentAI] API Error: {e}")
-                    return None
-
-                print(f"[DynamicContentAI] ⚠️ API Error. Retrying...")
-                time.sleep(delay)
-                delay *= 2
-
-            except Exception as e:
-                print(f"[DynamicContentAI] ❌ Unexpected error: {e}")
-                logger.error(f"[DynamicContentAI] Unexpected error: {e}")
-                return None
-
-        return None
+    def _call_api_with_retry_multimodal(self, content: list, max_tokens: int = 8000) -> Optional[str]:
+        """Call Claude API through the shared AI gateway (multimodal content)"""
+        try:
+            print(f"[DynamicContentAI] Calling Claude API...")
+            message = self.client.messages.create(
+                model=self.model,
+                max_tokens=max_tokens,
+                messages=[{"role": "user", "content": content}]
+            )
+            response_text = message.content[0].text
+            print(f"[DynamicContentAI] ✅ API call successful ({len(response_text)} chars)")
+            return response_text
+
+        except AIRetryLater as e:
+            # Overloaded / rate limited - the gateway re-queues the task, don't sleep here
+            print(f"[DynamicContentAI] ⚠️ Claude API busy, deferring: {e}")
+            logger.warning(f"[DynamicContentAI] Claude API busy, deferring: {e}")
+            raise
+
+        except APIError as e:
+            print(f"[DynamicContentAI] ❌ API Error: {e}")
+            logger.error(f"[DynamicContentAI] API Error: {e}")
+            return None
+
+        except Exception as e:
+            print(f"[DynamicContentAI] ❌ Unexpected error: {e}")
+            logger.error(f"[DynamicContentAI] Unexpected error: {e}")
+            return None
 
     def generate_test_steps(
             self,
@@ -4,12 +4,10 @@
 # Supports reference images and verification instructions from user
 
 import json
-import time
 import logging
-import anthropic
-import random
 from typing import Optional, Dict, List
-from anthropic._exceptions import OverloadedError, APIError
+from anthropic._exceptions import APIError
+from services.ai_gateway import ai_gateway_client, AIRetryLater
 
 logger = logging.getLogger(__name__)
 
@@ -20,58 +18,40 @@ class DynamicContentVerifyHelper:
     def __init__(self, api_key: str, session_logger=None):
         if not api_key:
             raise ValueError("API key is required for AI functionality")
-        self.client = anthropic.Anthropic(api_key=api_key)
+        self.client = ai_gateway_client(api_key)
         #self.model = "claude-haiku-4-5-20251001"
         self.model = "claude-sonnet-4-5-20250929"
         self.session_logger = session_logger
 
-    def _call_api_with_retry_multimodal(self, content: list, max_tokens: int = 1000, max_retries: int = 3) -> Optional[
+    def _call_api_with_retry_multimodal(self, content: list, max_tokens: int = 1000) -> Optional[
         str]:
-        """Call Claude API with retry logic"""
-        delay = 2
-
-        for attempt in range(max_retries):
-            try:
-                print(f"[DynamicContentVerify] Calling Claude API (attempt {attempt + 1}/{max_retries})...")
-
-                message = self.client.messages.create(
-                    model=self.model,
-                    max_tokens=max_tokens,
-                    messages=[{"role": "user", "content": content}]
-                )
-
-                response_text = message.content[0].text
-                print(f"[DynamicContentVerify] ✅ API call successful ({len(response_text)} chars)")
-                return response_text
-
-            except OverloadedError as e:
-                if attempt == max_retries - 1:
-                    print(f"[DynamicContentVerify] ❌ API Overloaded after {max_retries} attempts")
-                    logger.error(f"[DynamicContentVerify] API Overloaded: {e}")
-                    return None
-
-                jitter = random.uniform(0, delay * 0.5)
-                wait_time = delay + jitter
-                print(f"[DynamicContentVerify] ⚠️ Retrying in {wait_time:.1f}s...")
-                time.sleep(wait_time)
-                delay *= 2
-
-            except APIError as e:
-                if attempt == max_retries - 1:
-                    print(f"[DynamicContentVerify] ❌ API Error: {e}")
-                    logger.error(f"[DynamicContentVerify] API Error: {e}")
-                    return None
-
-                print(f"[DynamicContentVerify] ⚠️ API Error. Retrying...")
-                time.sleep(delay)
-                delay *= 2
-
-            except Exception as e:
-                print(f"[DynamicContentVerify] ❌ Unexpected error: {e}")
-                logger.error(f"[DynamicContentVerify] Unexpected error: {e}")
-                return None
-
-        return None
+        """Call Claude API through the shared AI gateway"""
+        try:
+            print(f"[DynamicContentVerify] Calling Claude API...")
+            message = self.client.messages.create(
+                model=self.model,
+                max_tokens=max_tokens,
+                messages=[{"role": "user", "content": content}]
+            )
+            response_text = message.content[0].text
+            print(f"[DynamicContentVerify] ✅ API call successful ({len(response_text)} chars)")
+            return response_text
+
+        except AIRetryLater as e:
+            # Overloaded / rate limited - the gateway re-queues the task, don't sleep here
+            print(f"[DynamicContentVerify] ⚠️ Claude API busy, deferring: {e}")
+            logger.warning(f"[DynamicContentVerify] Claude API busy, deferring: {e}")
+            raise
+
+        except APIError as e:
+            print(f"[DynamicContentVerify] ❌ API Error: {e}")
+            logger.error(f"[DynamicContentVerify] API Error: {e}")
+            return None
+
+        except Exception as e:
+            print(f"[DynamicContentVerify] ❌ Unexpected error: {e}")
+            logger.error(f"[DynamicContentVerify] Unexpected error: {e}")
+            return None
 
     def _log_bug(self, bug: Dict, step_description: str):
         """Log a bug found during verification"""
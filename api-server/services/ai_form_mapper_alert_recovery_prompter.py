@@ -2,13 +2,11 @@
 # AI-Powered Error Recovery and Alert Handling using Claude API
 
 import json
-import time
 import logging
-import anthropic
-import random
 import re
 from typing import List, Dict, Optional, Any
-from anthropic._exceptions import OverloadedError, APIError
+from anthropic._exceptions import APIError
+from services.ai_gateway import ai_gateway_client, AIRetryLater
 
 logger = logging.getLogger('init_logger.form_page_test')
 result_logger_gui = logging.getLogger('init_result_logger_gui.form_page_test')
@@ -20,147 +18,85 @@ class AIErrorRecovery:
     def __init__(self, api_key: str, session_logger=None):
         if not api_key:
             raise ValueError("API key is required for AI functionality")
-        self.client = anthropic.Anthropic(api_key=api_key)
+        self.client = ai_gateway_client(api_key)
         self.model = "claude-sonnet-4-5-20250929"
         self.session_logger = session_logger  # For debug mode logging
     
-    def _call_api_with_retry(self, prompt: str, max_tokens: int = 4000, max_retries: int = 3) -> Optional[str]:
+    def _call_api_with_retry(self, prompt: str, max_tokens: int = 4000) -> Optional[str]:
         """
-        Call Claude API with retry logic for handling overload errors
+        Call Claude API through the shared AI gateway
         
         Args:
             prompt: The prompt to send
             max_tokens: Maximum tokens for response
-            max_retries: Number of retry attempts (default: 3)
             
         Returns:
-            Response text or None if all retries fail
+            Response text (None on a non-retryable API error)
         """
-        delay = 2  # Start with 2 second delay
-        
-        for attempt in range(max_retries):
-            try:
-                print(f"[AIErrorRecovery] Calling Claude API (attempt {attempt + 1}/{max_retries})...")
-                result_logger_gui.info(f"[AIErrorRecovery] Calling Claude API (attempt {attempt + 1}/{max_retries})...")
-                
-                message = self.client.messages.create(
-                    model=self.model,
-                    max_tokens=max_tokens,
-                    messages=[
-                        {
-                            "role": "user",
-                            "content": prompt
-                        }
-                    ]
-                )
-                
-                response_text = message.content[0].text
-                print(f"[AIErrorRecovery] ✅ API call successful ({len(response_text)} chars)")
-                return response_text
-                
-            except OverloadedError as e:
-                if attempt == max_retries - 1:
-                    # Last attempt failed
-                    print(f"[AIErrorRecovery] ❌ API Overloaded after {max_retries} attempts. Giving up.")
-                    logger.error(f"[AIErrorRecovery] API Overloaded after {max_retries} attempts: {e}")
-                    return None
-                
-                # Add jitter to prevent thundering herd
-                jitter = random.uniform(0, delay * 0.5)
-                wait_time = delay + jitter
-                
-                print(f"[AIErrorRecovery] ⚠️  API Overloaded (529). Retrying in {wait_time:.1f}s... ({attempt + 1}/{max_retries})")
-                logger.warning(f"[AIErrorRecovery] API Overloaded. Retry {attempt + 1}/{max_retries} after {wait_time:.1f}s")
-                
-                time.sleep(wait_time)
-                delay *= 2  # Exponential backoff
-                
-            except APIError as e:
-                if attempt == max_retries - 1:
-                    print(f"[AIErrorRecovery] ❌ API Error after {max_retries} attempts: {e}")
-                    logger.error(f"[AIErrorRecovery] API Error after {max_retries} attempts: {e}")
-                    return None
-                
-                print(f"[AIErrorRecovery] ⚠️  API Error: {e}. Retrying in {delay}s... ({attempt + 1}/{max_retries})")
-                logger.warning(f"[AIErrorRecovery] API Error. Retry {attempt + 1}/{max_retries} after {delay}s")
-                
-                time.sleep(delay)
-                delay *= 2
-                
-            except Exception as e:
-                print(f"[AIErrorRecovery] ❌ Unexpected error: {e}")
-                logger.error(f"[AIErrorRecovery] Unexpected error: {e}")
-                return None
-        
-        return None
-    
-    def _call_api_with_retry_multimodal(self, content: list, max_tokens: int = 4000, max_retries: int = 3) -> Optional[str]:
+        try:
+            print(f"[AIErrorRecovery] Calling Claude API...")
+            message = self.client.messages.create(
+                model=self.model,
+                max_tokens=max_tokens,
+                messages=[{"role": "user", "content": prompt}]
+            )
+            response_text = message.content[0].text
+            print(f"[AIErrorRecovery] ✅ API call successful ({len(response_text)} chars)")
+            return response_text
+
+        except AIRetryLater as e:
+            # Overloaded / rate limited - the gateway re-queues the task, don't sleep here
+            print(f"[AIErrorRecovery] ⚠️ Claude API busy, deferring: {e}")
+            logger.warning(f"[AIErrorRecovery] Claude API busy, deferring: {e}")
+            raise
+
+        except APIError as e:
+            print(f"[AIErrorRecovery] ❌ API Error: {e}")
+            logger.error(f"[AIErrorRecovery] API Error: {e}")
+            return None
+
+        except Exception as e:
+            print(f"[AIErrorRecovery] ❌ Unexpected error: {e}")
+            logger.error(f"[AIErrorRecovery] Unexpected error: {e}")
+            return None
+
+    def _call_api_with_retry_multimodal(self, content: list, max_tokens: int = 4000) -> Optional[str]:
         """
-        Call Claude API with retry logic for multimodal content (images + text)
+        Call Claude API through the shared AI gateway (multimodal content)
         
         Args:
             content: List of content blocks (can include images and text)
             max_tokens: Maximum tokens for response
-            max_retries: Number of retry attempts (default: 3)
             
         Returns:
-            Response text or None if all retries fail
+            Response text (None on a non-retryable API error)
         """
-        delay = 2  # Start with 2 second delay
-        
-        for attempt in range(max_retries):
-            try:
-                print(f"[AIErrorRecovery] Calling Claude API with vision (attempt {attempt + 1}/{max_retries})...")
-                result_logger_gui.info(f"[AIErrorRecovery] Calling Claude API with vision (attempt {attempt + 1}/{max_retries})...")
-                
-                message = self.client.messages.create(
-                    model=self.model,
-                    max_tokens=max_tokens,
-                    messages=[
-                        {
-                            "role": "user",
-                            "content": content
-                        }
-                    ]
-                )
-                
-                response_text = message.content[0].text
-                print(f"[AIErrorRecovery] ✅ API call successful ({len(response_text)} chars)")
-                return response_text
-                
-            except OverloadedError as e:
-                if attempt == max_retries - 1:
-                    print(f"[AIErrorRecovery] ❌ API Overloaded after {max_retries} attempts. Giving up.")
-                    logger.error(f"[AIErrorRecovery] API Overloaded after {max_retries} attempts: {e}")
-                    return None
-                
-                jitter = random.uniform(0, delay * 0.5)
-                wait_time = delay + jitter
-                
-                print(f"[AIErrorRecovery] ⚠️  API Overloaded (529). Retrying in {wait_time:.1f}s... ({attempt + 1}/{max_retries})")
-                logger.warning(f"[AIErrorRecovery] API Overloaded. Retry {attempt + 1}/{max_retries} after {wait_time:.1f}s")
-                
-                time.sleep(wait_time)
-                delay *= 2
-                
-            except APIError as e:
-                if attempt == max_retries - 1:
-                    print(f"[AIErrorRecovery] ❌ API Error after {max_retries} attempts: {e}")
-                    logger.error(f"[AIErrorRecovery] API Error after {max_retries} attempts: {e}")
-                    return None
-                
-                print(f"[AIErrorRecovery] ⚠️  API Error: {e}. Retrying in {delay}s... ({attempt + 1}/{max_retries})")
-                logger.warning(f"[AIErrorRecovery] API Error. Retry {attempt + 1}/{max_retries} after {delay}s")
-                
-                time.sleep(delay)
-                delay *= 2
-                
-            except Exception as e:
-                print(f"[AIErrorRecovery] ❌ Unexpected error: {e}")
-                logger.error(f"[AIErrorRecovery] Unexpected error: {e}")
-                return None
-        
-        return None
+        try:
+            print(f"[AIErrorRecovery] Calling Claude API...")
+            message = self.client.messages.create(
+                model=self.model,
+                max_tokens=max_tokens,
+                messages=[{"role": "user", "content": content}]
+            )
+            response_text = message.content[0].text
+            print(f"[AIErrorRecovery] ✅ API call successful ({len(response_text)} chars)")
+            return response_text
+
+        except AIRetryLater as e:
+            # Overloaded / rate limited - the gateway re-queues the task, don't sleep here
+            print(f"[AIErrorRecovery] ⚠️ Claude API busy, deferring: {e}")
+            logger.warning(f"[AIErrorRecovery] Claude API busy, deferring: {e}")
+            raise
+
+        except APIError as e:
+            print(f"[AIErrorRecovery] ❌ API Error: {e}")
+            logger.error(f"[AIErrorRecovery] API Error: {e}")
+            return None
+
+        except Exception as e:
+            print(f"[AIErrorRecovery] ❌ Unexpected error: {e}")
+            logger.error(f"[AIErrorRecovery] Unexpected error: {e}")
+            return None
 
     def analyze_error(
         self,
@@ -230,9 +166,9 @@ class AIErrorRecovery:
                 self.session_logger.ai_call("analyze_error", prompt_size=len(prompt), prompt=prompt_for_log)
 
             if screenshot_base64:
-                response_text = self._call_api_with_retry_multimodal(message_content, max_tokens=4000, max_retries=3)
+                response_text = self._call_api_with_retry_multimodal(message_content, max_tokens=4000)
             else:
-                response_text = self._call_api_with_retry(prompt, max_tokens=4000, max_retries=3)
+                response_text = self._call_api_with_retry(prompt, max_tokens=4000)
             
             if response_text is None:
                 print("[AIErrorRecovery] ❌ Failed to get error analysis response after retries")
@@ -298,6 +234,8 @@ class AIErrorRecovery:
                 logger.warning("[AIErrorRecovery] No JSON object found in response")
                 return {"scenario": "B", "issue_type": "parse_error", "explanation": "No JSON in response"}
                 
+        except AIRetryLater:
+            raise
         except Exception as e:
             print(f"[AIErrorRecovery] Error analyzing error: {e}")
             logger.error(f"[AIErrorRecovery] Error analyzing error: {e}")
@@ -522,10 +460,9 @@ Return ONLY the JSON object.
                 self.session_logger.ai_call("analyze_validation_errors", prompt_size=len(prompt), prompt=prompt_for_log)
 
             if screenshot_base64:
-                response_text = self._call_api_with_retry_multimodal(message_content, max_tokens=4000,
-                                                                     max_retries=3)
+                response_text = self._call_api_with_retry_multimodal(message_content, max_tokens=4000)
             else:
-                response_text = self._call_api_with_retry(prompt, max_tokens=4000, max_retries=3)
+                response_text = self._call_api_with_retry(prompt, max_tokens=4000)
 
             if response_text is None:
                 print("[AIErrorRecovery] ❌ Failed to get validation error analysis response after retries")
@@ -583,6 +520,8 @@ Return ONLY the JSON object.
                 logger.warning("[AIErrorRecovery] No JSON object found in response")
                 return {"scenario": "B", "issue_type": "parse_error", "explanation": "No JSON in response"}
 
+        except AIRetryLater:
+            raise
         except Exception as e:
             print(f"[AIErrorRecovery] Error analyzing validation errors: {e}")
             logger.error(f"[AIErrorRecovery] Error analyzing validation errors: {e}")
@@ -2,14 +2,14 @@
 # Assign test cases to stages after test completion
 
 import json
-import anthropic
 from typing import List, Dict
+from services.ai_gateway import ai_gateway_client
 
 class AIFormPageEndPrompter:
     """Assigns test_case field to completed stages"""
     
     def __init__(self, api_key: str):
-        self.client = anthropic.Anthropic(api_key=api_key)
+        self.client = ai_gateway_client(api_key)
         self.model = "claude-sonnet-4-5-20250929"
     
     def organize_stages(self, stages: List[Dict], test_cases: List[Dict]) -> List[Dict]:
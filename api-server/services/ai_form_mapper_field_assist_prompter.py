@@ -6,9 +6,9 @@
 # ============================================================================
 
 import logging
-import anthropic
 from typing import Dict, Any, Optional
 import json
+from services.ai_gateway import ai_gateway_client, AIRetryLater
 logger = logging.getLogger(__name__)
 
 
@@ -19,7 +19,7 @@ class AIFieldAssist:
     """
 
     def __init__(self, api_key: str):
-        self.client = anthropic.Anthropic(api_key=api_key)
+        self.client = ai_gateway_client(api_key)
         self.model = "claude-sonnet-4-20250514"
 
     def check_dropdown_visible(self, screenshot_base64: str, step: Dict) -> Dict[str, Any]:
@@ -90,6 +90,8 @@ REASON: (brief explanation - what do you see?)"""
                 "raw_response": response_text
             }
 
+        except AIRetryLater:
+            raise
         except Exception as e:
             logger.error(f"[AIFieldAssist] check_dropdown_visible failed: {e}")
             return {
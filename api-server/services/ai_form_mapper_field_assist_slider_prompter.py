@@ -7,8 +7,8 @@
 
 import logging
 import json
-import anthropic
 from typing import Dict, Any
+from services.ai_gateway import ai_gateway_client, AIRetryLater
 
 logger = logging.getLogger(__name__)
 
@@ -19,7 +19,7 @@ class AIFieldAssistSliderPrompter:
     """
 
     def __init__(self, api_key: str):
-        self.client = anthropic.Anthropic(api_key=api_key)
+        self.client = ai_gateway_client(api_key)
         self.model = "claude-sonnet-4-5-20250929"
 
     def generate_click_points(
@@ -83,6 +83,8 @@ Respond with ONLY valid JSON (no markdown, no explanation):
             result["success"] = True
             return result
 
+        except AIRetryLater:
+            raise
         except Exception as e:
             logger.error(f"[AIFieldAssistSlider] generate_click_points failed: {e}")
             return {"success": False, "error": str(e)}
@@ -151,6 +153,8 @@ Respond with ONLY JSON (no markdown):
             result["success"] = True
             return result
 
+        except AIRetryLater:
+            raise
         except Exception as e:
             logger.error(f"[AIFieldAssistSlider] read_value failed: {e}")
             if action_type == "range_slider":
@@ -2,12 +2,11 @@
 # AI-Powered Test Step Generation using Claude API
 
 import json
-import time
 import logging
-import anthropic
-import random
-from typing import List, Dict, Optional, Any
-from anthropic._exceptions import OverloadedError, APIError
+from typing import List, Dict, Optional, Any, Tuple
+from anthropic._exceptions import APIError
+from services.ai_gateway import ai_gateway_client, AIRetryLater
+from services.ai_prompt_cache import build_cached_request, flatten_request
 
 class AIParseError(Exception):
     """Raised when AI response cannot be parsed after all retries"""
@@ -23,148 +22,92 @@ class AIHelper:
     def __init__(self, api_key: str, session_logger=None):
         if not api_key:
             raise ValueError("API key is required for AI functionality")
-        self.client = anthropic.Anthropic(api_key=api_key)
+        self.client = ai_gateway_client(api_key)
         #self.model = "claude-sonnet-4-5-20250929"
         self.model = "claude-haiku-4-5-20251001"
         self.session_logger = session_logger  # For debug mode logging
     
-    def _call_api_with_retry(self, prompt: str, max_tokens: int = 16000, max_retries: int = 3) -> Optional[str]:
+    def _call_api_with_retry(self, prompt: str, max_tokens: int = 16000,
+                             system: Optional[list] = None) -> Optional[str]:
         """
-        Call Claude API with retry logic for handling overload errors
+        Call Claude API through the shared AI gateway
         
         Args:
             prompt: The prompt to send
             max_tokens: Maximum tokens for response
-            max_retries: Number of retry attempts (default: 3)
+            system: Optional system blocks (cached instruction prefix)
             
         Returns:
-            Response text or None if all retries fail
+            Response text
         """
-        delay = 2  # Start with 2 second delay
-        
-        for attempt in range(max_retries):
-            try:
-                print(f"[AIHelper] Calling Claude API (attempt {attempt + 1}/{max_retries})...")
-                result_logger_gui.info(f"[AIHelper] Calling Claude API (attempt {attempt + 1}/{max_retries})...")
-                
-                message = self.client.messages.create(
-                    model=self.model,
-                    max_tokens=max_tokens,
-                    messages=[
-                        {
-                            "role": "user",
-                            "content": prompt
-                        }
-                    ]
-                )
-                
-                response_text = message.content[0].text
-                print(f"[AIHelper] ✅ API call successful ({len(response_text)} chars)")
-                return response_text
-                
-            except OverloadedError as e:
-                if attempt == max_retries - 1:
-                    # Last attempt failed
-                    print(f"[AIHelper] ❌ API Overloaded after {max_retries} attempts. Giving up.")
-                    logger.error(f"[AIHelper] API Overloaded after {max_retries} attempts: {e}")
-                    raise AIParseError(f"API Overloaded after {max_retries} attempts: {e}")
-                
-                # Add jitter to prevent thundering herd
-                jitter = random.uniform(0, delay * 0.5)
-                wait_time = delay + jitter
-                
-                print(f"[AIHelper] ⚠️  API Overloaded (529). Retrying in {wait_time:.1f}s... ({attempt + 1}/{max_retries})")
-                logger.warning(f"[AIHelper] API Overloaded. Retry {attempt + 1}/{max_retries} after {wait_time:.1f}s")
-                
-                time.sleep(wait_time)
-                delay *= 2  # Exponential backoff
-                
-            except APIError as e:
-                if attempt == max_retries - 1:
-                    print(f"[AIHelper] ❌ API Error after {max_retries} attempts: {e}")
-                    logger.error(f"[AIHelper] API Error after {max_retries} attempts: {e}")
-                    raise AIParseError(f"API Error after {max_retries} attempts: {e}")
-                
-                print(f"[AIHelper] ⚠️  API Error: {e}. Retrying in {delay}s... ({attempt + 1}/{max_retries})")
-                logger.warning(f"[AIHelper] API Error. Retry {attempt + 1}/{max_retries} after {delay}s")
-                
-                time.sleep(delay)
-                delay *= 2
-                
-            except Exception as e:
-                print(f"[AIHelper] ❌ Unexpected error: {e}")
-                logger.error(f"[AIHelper] Unexpected error: {e}")
-                raise AIParseError(f"Unexpected API error: {e}")
-        
-        raise AIParseError("API call failed after all retries")
-    
-    def _call_api_with_retry_multimodal(self, content: list, max_tokens: int = 16000, max_retries: int = 3) -> Optional[str]:
+        try:
+            print(f"[AIHelper] Calling Claude API...")
+            message = self.client.messages.create(
+                model=self.model,
+                max_tokens=max_tokens,
+                messages=[{"role": "user", "content": prompt}],
+                **({"system": system} if system else {})
+            )
+            response_text = message.content[0].text
+            print(f"[AIHelper] ✅ API call successful ({len(response_text)} chars)")
+            return response_text
+
+        except AIRetryLater as e:
+            # Overloaded / rate limited - the gateway re-queues the task, don't sleep here
+            print(f"[AIHelper] ⚠️ Claude API busy, deferring: {e}")
+            logger.warning(f"[AIHelper] Claude API busy, deferring: {e}")
+            raise
+
+        except APIError as e:
+            print(f"[AIHelper] ❌ API Error: {e}")
+            logger.error(f"[AIHelper] API Error: {e}")
+            raise AIParseError(f"API Error: {e}")
+
+        except Exception as e:
+            print(f"[AIHelper] ❌ Unexpected error: {e}")
+            logger.error(f"[AIHelper] Unexpected error: {e}")
+            raise AIParseError(f"Unexpected API error: {e}")
+
+    def _call_api_with_retry_multimodal(self, content: list, max_tokens: int = 16000,
+                                        system: Optional[list] = None) -> Optional[str]:
         """
-        Call Claude API with retry logic for multimodal content (images + text)
+        Call Claude API through the shared AI gateway (multimodal content)
         
         Args:
             content: List of content blocks (can include images and text)
             max_tokens: Maximum tokens for response
-            max_retries: Number of retry attempts (default: 3)
+            system: Optional system blocks (cached instruction prefix)
             
         Returns:
-            Response text or None if all retries fail
+            Response text
         """
-        delay = 2  # Start with 2 second delay
-        
-        for attempt in range(max_retries):
-            try:
-                print(f"[AIHelper] Calling Claude API with vision for steps generation (attempt {attempt + 1}/{max_retries})...")
-                result_logger_gui.info(f"[AIHelper] Calling Claude API with vision for steps generation (attempt {attempt + 1}/{max_retries})...")
-                
-                message = self.client.messages.create(
-                    model=self.model,
-                    max_tokens=max_tokens,
-                    messages=[
-                        {
-                            "role": "user",
-                            "content": content
-                        }
-                    ]
-                )
-                
-                response_text = message.content[0].text
-                print(f"[AIHelper] ✅ API call successful ({len(response_text)} chars)")
-                return response_text
-                
-            except OverloadedError as e:
-                if attempt == max_retries - 1:
-                    print(f"[AIHelper] ❌ API Overloaded after {max_retries} attempts. Giving up.")
-                    logger.error(f"[AIHelper] API Overloaded after {max_retries} attempts: {e}")
-                    raise AIParseError(f"API Overloaded after {max_retries} attempts: {e}")
-                
-                jitter = random.uniform(0, delay * 0.5)
-                wait_time = delay + jitter
-                
-                print(f"[AIHelper] ⚠️  API Overloaded (529). Retrying in {wait_time:.1f}s... ({attempt + 1}/{max_retries})")
-                logger.warning(f"[AIHelper] API Overloaded. Retry {attempt + 1}/{max_retries} after {wait_time:.1f}s")
-                
-                time.sleep(wait_time)
-                delay *= 2
-                
-            except APIError as e:
-                if attempt == max_retries - 1:
-                    print(f"[AIHelper] ❌ API Error after {max_retries} attempts: {e}")
-                    logger.error(f"[AIHelper] API Error after {max_retries} attempts: {e}")
-                    raise AIParseError(f"API Error after {max_retries} attempts: {e}")
-                
-                print(f"[AIHelper] ⚠️  API Error: {e}. Retrying in {delay}s... ({attempt + 1}/{max_retries})")
-                logger.warning(f"[AIHelper] API Error. Retry {attempt + 1}/{max_retries} after {delay}s")
-                
-                time.sleep(delay)
-                delay *= 2
-                
-            except Exception as e:
-                print(f"[AIHelper] ❌ Unexpected error: {e}")
-                logger.error(f"[AIHelper] Unexpected error: {e}")
-                raise AIParseError(f"Unexpected API error: {e}")
-        
-        raise AIParseError("API call failed after all retries")
+        try:
+            print(f"[AIHelper] Calling Claude API...")
+            message = self.client.messages.create(
+                model=self.model,
+                max_tokens=max_tokens,
+                messages=[{"role": "user", "content": content}],
+                **({"system": system} if system else {})
+            )
+            response_text = message.content[0].text
+            print(f"[AIHelper] ✅ API call successful ({len(response_text)} chars)")
+            return response_text
+
+        except AIRetryLater as e:
+            # Overloaded / rate limited - the gateway re-queues the task, don't sleep here
+            print(f"[AIHelper] ⚠️ Claude API busy, deferring: {e}")
+            logger.warning(f"[AIHelper] Claude API busy, deferring: {e}")
+            raise
+
+        except APIError as e:
+            print(f"[AIHelper] ❌ API Error: {e}")
+            logger.error(f"[AIHelper] API Error: {e}")
+            raise AIParseError(f"API Error: {e}")
+
+        except Exception as e:
+            print(f"[AIHelper] ❌ Unexpected error: {e}")
+            logger.error(f"[AIHelper] Unexpected error: {e}")
+            raise AIParseError(f"Unexpected API error: {e}")
 
     def generate_test_steps(
             self,
@@ -303,11 +246,9 @@ Use these field values when filling the form:
 
             """
 
-        prompt = f"""{ui_task_section}
-{hints_section}{screenshot_section}
-{critical_fields_section}
-{route_planning_section}
-{user_inputs_section}
+        # Static instructions - identical on every call, sent as the cached system prefix.
+        # Per-call data goes in dom_context / tail below, never in here.
+        instructions = f"""{ui_task_section}
         === SELECTOR GUIDELINES ===
         
         **CRITICAL THE LOCATOR MUST SUCCEED - IF IN DOUBT → USE XPATH **
@@ -886,9 +827,7 @@ Use these field values when filling the form:
 
         Analyze the DOM, understand the field's structure, and generate appropriate atomic steps.
         
-        === CURRENT PAGE DOM ===
-
-        {dom_html}
+        The CURRENT PAGE DOM and the TEST CASES TO IMPLEMENT are provided in the user message.
 
 
         === TEST CASES TO IMPLEMENT ===
@@ -906,8 +845,6 @@ Use these field values when filling the form:
         
         **After form submission in TEST_1, the page will navigate automatically. Continue generating steps for TEST_2 and TEST_3 on the new page!**
 
-        {json.dumps(test_cases, indent=2)}
-
         **CRITICAL: Generate complete steps for current test case + 2-4 steps from next test case. This ensures execution continues after save/submit.**
 
         
@@ -1211,28 +1148,28 @@ Use these field values when filling the form:
 
         Return ONLY the JSON object, no other text.
         """
+
+        # DOM is reused by every call on this page - cached separately from the per-call tail
+        dom_context = f"=== CURRENT PAGE DOM ===\n\n{dom_html}\n"
+        tail = f"""{hints_section}{screenshot_section}
+{critical_fields_section}
+{route_planning_section}
+{user_inputs_section}
+=== TEST CASES TO IMPLEMENT ===
+
+{json.dumps(test_cases, indent=2)}
+
+Return ONLY the JSON object, no other text.
+"""
+        system, content = build_cached_request(instructions, dom_context, tail, screenshot_base64)
+        prompt = flatten_request(system, content)
         
         try:
             logger.info("[AIHelper] Sending request to Claude API...")
             print("[AIHelper] Sending request to Claude API...")
 
-            # Use retry wrapper (with or without screenshot)
+            # Use retry wrapper (content carries the screenshot when there is one)
             if screenshot_base64:
-                # Use multimodal API with screenshot
-                message_content = [
-                    {
-                        "type": "image",
-                        "source": {
-                            "type": "base64",
-                            "media_type": "image/png",
-                            "data": screenshot_base64
-                        }
-                    },
-                    {
-                        "type": "text",
-                        "text": prompt
-                    }
-                ]
                 #print("\n" + "!" * 80)
                 #print("!!!!!!!!!!!!! GENERATE_TEST_STEPS - (WITH IMAGE) FINAL PROMPT TO AI !!!!")
                 #print("!" * 80)
@@ -1248,7 +1185,7 @@ Use these field values when filling the form:
                                             '## Current Page DOM:\n[DOM TRUNCATED FOR LOG]\n\n', prompt,
                                             flags=re.DOTALL)
                     self.session_logger.ai_call("generate_steps", prompt_size=len(prompt), prompt=prompt_for_log)
-                response_text = self._call_api_with_retry_multimodal(message_content, max_tokens=16000, max_retries=3)
+                response_text = self._call_api_with_retry_multimodal(content, max_tokens=16000, system=system)
             else:
                 # Text-only API (backward compatibility)
                 #print("\n" + "!" * 80)
@@ -1258,7 +1195,7 @@ Use these field values when filling the form:
                 #prompt_no_dom = re.sub(r'## Current Page DOM:.*?(?=\n[A-Z=\*#])', '## Current Page DOM:\n[DOM REMOVED FOR LOGGING]\n\n', prompt, flags=re.DOTALL)
                 #print(prompt_no_dom)
                 #print("!" * 80 + "\n")
-                response_text = self._call_api_with_retry(prompt, max_tokens=16000, max_retries=3)
+                response_text = self._call_api_with_retry_multimodal(content, max_tokens=16000, system=system)
 
 
 
@@ -1339,7 +1276,7 @@ Use these field values when filling the form:
                 print(f"[AIHelper] Raw response:\n{response_text}")
                 raise AIParseError(f"JSON parse error: {e}")
 
-        except AIParseError:
+        except (AIParseError, AIRetryLater):
             raise
 
         except Exception as e:
@@ -1513,9 +1450,10 @@ Use these field values when filling matching fields:
 
             # ==================== BUILD THE PROMPT ====================
 
-            prompt = f"""You are a web automation expert generating Selenium WebDriver test steps.
+            # Static instructions (cached system prefix) - per-call data goes in dom_context / tail
+            instructions = f"""You are a web automation expert generating Selenium WebDriver test steps.
 
-{hints_section}## FIRST: CHECK FOR VALIDATION ERRORS
+## FIRST: CHECK FOR VALIDATION ERRORS
 
 Scan DOM and SCREENSHOT for validation errors (red boxes, error messages like "Please fill in", "required", "invalid", error classes).
 
@@ -1584,19 +1522,8 @@ CRITICAL: Use `force_regenerate_verify: true` here — NOT `force_regenerate: tr
 
 **If more fields/buttons exist:** Continue below to generate remaining steps.
 
-
-{screenshot_section}{critical_fields_section}{route_planning_section}
-{user_inputs_section}
-{retry_message_section}
-
 ## Current Context:
-
-{executed_context}
-
-## Current Page DOM:
-{dom_html}
-
-{test_cases_context}
+The Current Page DOM, the Steps Already Completed and the Test Cases are provided in the user message.
 
 ## Your Task:
 Generate the REMAINING steps to complete ONLY the test cases listed in "Test Cases" section above.
@@ -1903,26 +1830,28 @@ Return ONLY the following JSON object (no other text):
 
 """
 
+            dom_context = f"## Current Page DOM:\n{dom_html}\n"
+            tail = f"""{hints_section}{screenshot_section}{critical_fields_section}{route_planning_section}
+{user_inputs_section}
+{retry_message_section}
+
+## Current Context:
+
+{executed_context}
+
+{test_cases_context}
+
+Generate the REMAINING steps. Return ONLY the JSON object.
+"""
+            system, content = build_cached_request(instructions, dom_context, tail, screenshot_base64)
+            prompt = flatten_request(system, content)
+
             # Call Claude API with retry (with or without screenshot)
             result_logger_gui.info("[AIHelper] Sending regeneration request to Claude API...")
             #print(f"[AIHelper] DEBUG - Prompt starts with: {prompt[:1700]}")
             #print(f"[AIHelper] DEBUG - Prompt starts with: {prompt}")
 
             if screenshot_base64:
-                message_content = [
-                    {
-                        "type": "image",
-                        "source": {
-                            "type": "base64",
-                            "media_type": "image/png",
-                            "data": screenshot_base64
-                        }
-                    },
-                    {
-                        "type": "text",
-                        "text": prompt
-                    }
-                ]
                 #print("\n" + "!" * 80)
                 #print("!!!!!!!!!!! REGENERATE_STEPS - (WITH IMAGE) FINAL PROMPT TO AI !!!!")
                 #print("!" * 80)
@@ -1940,10 +1869,9 @@ Return ONLY the following JSON object (no other text):
                                             '## Current Page DOM:\n[DOM TRUNCATED]\n\n', prompt, flags=re.DOTALL)
                     self.session_logger.ai_call("regenerate_steps", prompt_size=len(prompt), prompt=prompt_for_log)
 
-                response_text = self._call_api_with_retry_multimodal(message_content, max_tokens=16000,
-                                                                     max_retries=3)
+                response_text = self._call_api_with_retry_multimodal(content, max_tokens=16000, system=system)
             else:
-                response_text = self._call_api_with_retry(prompt, max_tokens=16000, max_retries=3)
+                response_text = self._call_api_with_retry_multimodal(content, max_tokens=16000, system=system)
 
             if response_text is None:
                 print("[AIHelper] ❌ Failed to regenerate steps after retries")
@@ -2035,7 +1963,7 @@ Return ONLY the following JSON object (no other text):
             print(f"[AIHelper] JSON parse error: {e}")
             print(f"[AIHelper] Raw response:\n{response_text}")
 
-        except AIParseError:
+        except (AIParseError, AIRetryLater):
             raise
 
         except Exception as e:
@@ -2097,7 +2025,8 @@ Use the screenshot to understand the current page layout and identify where fiel
 
             # ==================== BUILD THE VERIFICATION PROMPT ====================
 
-            prompt = f"""You are a web automation expert generating Selenium WebDriver VERIFICATION test steps.
+            # Static instructions (cached system prefix) - per-call data goes in dom_context / tail
+            instructions = f"""You are a web automation expert generating Selenium WebDriver VERIFICATION test steps.
 
 ## FIRST: CHECK FOR VALIDATION ERRORS
 
@@ -2160,15 +2089,8 @@ After spinner disappears, you will be called to generate verify steps.
 You are now in VERIFICATION MODE. The form has been saved/submitted successfully.
 Your task is to add verification steps.
 
-{screenshot_section}
 ## Current Context:
-
-{executed_context}
-
-## Current Page DOM:
-{dom_html}
-
-{test_cases_context}
+The Current Page DOM, the Steps Already Completed and the Test Cases are provided in the user message.
 
 ## Your Task:
 Generate steps to VERIFY all fields that were filled during the test, plus any navigation needed to access view pages.
@@ -2382,24 +2304,23 @@ If ANY check fails → FIX the xpath before returning.
 Return ONLY the JSON object.
 """
 
+            dom_context = f"## Current Page DOM:\n{dom_html}\n"
+            tail = f"""{screenshot_section}
+## Current Context:
+
+{executed_context}
+
+{test_cases_context}
+
+Generate the VERIFICATION steps. Return ONLY the JSON object.
+"""
+            system, content = build_cached_request(instructions, dom_context, tail, screenshot_base64)
+            prompt = flatten_request(system, content)
+
             # Call Claude API with retry (with or without screenshot)
             result_logger_gui.info("[AIHelper] Sending verify regeneration request to Claude API...")
 
             if screenshot_base64:
-                message_content = [
-                    {
-                        "type": "image",
-                        "source": {
-                            "type": "base64",
-                            "media_type": "image/png",
-                            "data": screenshot_base64
-                        }
-                    },
-                    {
-                        "type": "text",
-                        "text": prompt
-                    }
-                ]
 
                 if self.session_logger and self.session_logger.debug_mode:
                     import re
@@ -2408,10 +2329,9 @@ Return ONLY the JSON object.
                     self.session_logger.ai_call("regenerate_verify_steps", prompt_size=len(prompt),
                                                 prompt=prompt_for_log)
 
-                response_text = self._call_api_with_retry_multimodal(message_content, max_tokens=16000,
-                                                                     max_retries=3)
+                response_text = self._call_api_with_retry_multimodal(content, max_tokens=16000, system=system)
             else:
-                response_text = self._call_api_with_retry(prompt, max_tokens=16000, max_retries=3)
+                response_text = self._call_api_with_retry_multimodal(content, max_tokens=16000, system=system)
 
             print(response_text)
 
@@ -2515,7 +2435,7 @@ Return ONLY the JSON object.
             print(f"[AIHelper] Raw response:\n{response_text}")
             raise AIParseError(f"JSON parse error: {e}")
 
-        except AIParseError:
+        except (AIParseError, AIRetryLater):
             raise
 
         except Exception as e:
@@ -2599,7 +2519,7 @@ Return ONLY the JSON object.
 
             logger.info("Sending discovery request to Claude API...")
 
-            response_text = self._call_api_with_retry(prompt, max_tokens=4096, max_retries=3)
+            response_text = self._call_api_with_retry(prompt, max_tokens=4096)
             
             if response_text is None:
                 logger.error("Failed to discover scenarios after retries")
@@ -2620,6 +2540,8 @@ Return ONLY the JSON object.
                 logger.warning("No JSON array found in discovery response")
                 return []
 
+        except AIRetryLater:
+            raise
         except Exception as e:
             logger.error(f"Error discovering scenarios: {e}")
             return []
@@ -2665,8 +2587,8 @@ Return ONLY the JSON object.
             # Read and encode screenshot
             screenshot_data = screenshot_base64
             
-            # Build the prompt
-            prompt = self._build_recovery_prompt(
+            # Build the prompt (cached instructions + cached DOM + per-failure tail)
+            instructions, dom_context, tail = self._build_recovery_prompt(
                 failed_step=failed_step,
                 executed_steps=executed_steps,
                 fresh_dom=fresh_dom,
@@ -2680,20 +2602,8 @@ Return ONLY the JSON object.
             # Call Claude with vision and retry logic
             result_logger_gui.info("[AIHelper] Sending failure recovery request to Claude API with vision...")
             
-            content = [
-                {
-                    "type": "image",
-                    "source": {
-                        "type": "base64",
-                        "media_type": "image/png",
-                        "data": screenshot_data
-                    }
-                },
-                {
-                    "type": "text",
-                    "text": prompt
-                }
-            ]
+            system, content = build_cached_request(instructions, dom_context, tail, screenshot_data)
+            prompt = flatten_request(system, content)
 
             #print("\n" + "!" * 80)
             #print("!!!!!!!! ANALYZE_FAILURE_AND_RECOVER - FINAL PROMPT TO AI !!!!")
@@ -2713,7 +2623,7 @@ Return ONLY the JSON object.
                 self.session_logger.ai_call("analyze_failure_and_recover", prompt_size=len(prompt),
                                             prompt=prompt_for_log)
 
-            response_text = self._call_api_with_retry_multimodal(content, max_tokens=16000, max_retries=3)
+            response_text = self._call_api_with_retry_multimodal(content, max_tokens=16000, system=system)
             #print(f"[DEBUG] Raw AI response: {response_text[:500]}...")
             
             if response_text is None:
@@ -2763,6 +2673,8 @@ Return ONLY the JSON object.
                 logger.warning("[AIHelper] No JSON array found in recovery response")
                 return []
                 
+        except AIRetryLater:
+            raise
         except Exception as e:
             print(f"[AIHelper] Error in failure recovery: {e}")
             print(f"[AIHelper] Raw response was: {response_text[:1000] if response_text else 'None'}")
@@ -2779,8 +2691,14 @@ Return ONLY the JSON object.
             attempt_number: int,
             recovery_failure_history: List[Dict] = None,
             error_message: str = None
-    ) -> str:
-        """Build the prompt for failure recovery analysis - ONLY fix steps, not remaining steps"""
+    ) -> Tuple[str, str, str]:
+        """
+        Build the prompt for failure recovery analysis - ONLY fix steps, not remaining steps
+
+        Returns:
+            (instructions, dom_context, tail) - static instructions for the cached system
+            prefix, the fresh DOM (cached context) and the failure details
+        """
 
         action = failed_step.get('action', 'unknown')
         selector = failed_step.get('selector', '')
@@ -2814,7 +2732,7 @@ Return ONLY the JSON object.
     If 4+ failures on same action, return EMPTY array [] to signal unrecoverable.
     """
 
-        prompt = f"""# STEP FAILURE RECOVERY
+        instructions = f"""# STEP FAILURE RECOVERY
 
     ## STEP 1: CHECK FOR VALIDATION ERRORS (MANDATORY)
 
@@ -2882,20 +2800,7 @@ Return ONLY the JSON object.
 
     **Task:** Fix the failed step. Return ONLY fix steps (1-5 max). Do NOT generate remaining form steps.
 
-    ## Failed Step (Attempt {attempt_number}/2):
-    - Action: {action}
-    - Selector: {selector}  
-    - Description: {description}
-    - Error: {error_message}
-    {f"- Expected Value: {expected_value}" if action == "verify" and expected_value else ""}
-    {f"- IS JUNCTION: This step is a junction - you MUST include is_junction: true and junction_info in your recovery step. junction_info: {json.dumps(junction_info)}" if is_junction else ""}
-    {f"- HAS force_regenerate: true - your recovery step MUST also include force_regenerate: true" if failed_step.get('force_regenerate') else ""}
-    {executed_context}
-    {failure_history_section}
-    ## Current DOM:
-    ```html
-    {fresh_dom}
-    ```
+    The Current DOM, the Failed Step and the Recent Executed Steps are provided in the user message.
 
     ---
     
@@ -3007,11 +2912,29 @@ Return ONLY the JSON object.
     
     ## Important - Junction Detection:
     **Case 1 - Failed step is a junction:**
-    If the failed step above shows "IS JUNCTION", your recovery step MUST also include `is_junction: true` and the same `junction_info`.
+    If the failed step shows "IS JUNCTION", your recovery step MUST also include `is_junction: true` and the same `junction_info`.
     
         """
+
+        dom_context = f"""## Current DOM:
+    ```html
+    {fresh_dom}
+    ```
+"""
+        tail = f"""## Failed Step (Attempt {attempt_number}/2):
+    - Action: {action}
+    - Selector: {selector}  
+    - Description: {description}
+    - Error: {error_message}
+    {f"- Expected Value: {expected_value}" if action == "verify" and expected_value else ""}
+    {f"- IS JUNCTION: This step is a junction - you MUST include is_junction: true and junction_info in your recovery step. junction_info: {json.dumps(junction_info)}" if is_junction else ""}
+    {f"- HAS force_regenerate: true - your recovery step MUST also include force_regenerate: true" if failed_step.get('force_regenerate') else ""}
+    {executed_context}
+    {failure_history_section}
+    Fix the failed step following the instructions. Return ONLY the fix steps.
+"""
         #print(prompt)
-        return prompt
+        return instructions, dom_context, tail
 
     def evaluate_paths(
             self,
@@ -3089,6 +3012,8 @@ Return ONLY the JSON object.
                 "tokens_used": 0,
                 "cost": 0
             }
+        except AIRetryLater:
+            raise
         except Exception as e:
             logger.error(f"[AIHelper] Path evaluation error: {e}")
             return {
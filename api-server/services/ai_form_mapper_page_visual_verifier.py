@@ -3,12 +3,10 @@
 # Verifies form field values on result pages (view page, list page)
 
 import json
-import time
 import logging
-import anthropic
-import random
 from typing import Dict, List, Optional
-from anthropic._exceptions import OverloadedError, APIError
+from anthropic._exceptions import APIError
+from services.ai_gateway import ai_gateway_client, AIRetryLater
 
 logger = logging.getLogger(__name__)
 
@@ -19,66 +17,40 @@ class PageVisualVerifier:
     def __init__(self, api_key: str, session_logger=None):
         if not api_key:
             raise ValueError("API key is required for AI functionality")
-        self.client = anthropic.Anthropic(api_key=api_key)
+        self.client = ai_gateway_client(api_key)
         #self.model = "claude-haiku-4-5-20251001"
         self.model = "claude-sonnet-4-5-20250929"
         self.session_logger = session_logger
 
-    def _call_api_with_retry_multimodal(self, content: list, max_tokens: int = 2048, max_retries: int = 3) -> Optional[
+    def _call_api_with_retry_multimodal(self, content: list, max_tokens: int = 2048) -> Optional[
         str]:
-        """Call Claude API with retry logic for multimodal content (images + text)"""
-        delay = 2
-
-        for attempt in range(max_retries):
-            try:
-                print(f"[PageVisualVerifier] Calling Claude API with vision (attempt {attempt + 1}/{max_retries})...")
-
-                message = self.client.messages.create(
-                    model=self.model,
-                    max_tokens=max_tokens,
-                    messages=[
-                        {
-                            "role": "user",
-                            "content": content
-                        }
-                    ]
-                )
-
-                response_text = message.content[0].text
-                print(f"[PageVisualVerifier] ✅ API call successful ({len(response_text)} chars)")
-                return response_text
-
-            except OverloadedError as e:
-                if attempt == max_retries - 1:
-                    print(f"[PageVisualVerifier] ❌ API Overloaded after {max_retries} attempts. Giving up.")
-                    logger.error(f"[PageVisualVerifier] API Overloaded after {max_retries} attempts: {e}")
-                    return None
-
-                jitter = random.uniform(0, delay * 0.5)
-                wait_time = delay + jitter
-
-                print(f"[PageVisualVerifier] ⚠️ API Overloaded. Retrying in {wait_time:.1f}s...")
-                logger.warning(f"[PageVisualVerifier] API Overloaded. Retry {attempt + 1}/{max_retries}")
-
-                time.sleep(wait_time)
-                delay *= 2
-
-            except APIError as e:
-                if attempt == max_retries - 1:
-                    print(f"[PageVisualVerifier] ❌ API Error after {max_retries} attempts: {e}")
-                    logger.error(f"[PageVisualVerifier] API Error after {max_retries} attempts: {e}")
-                    return None
-
-                print(f"[PageVisualVerifier] ⚠️ API Error: {e}. Retrying...")
-                time.sleep(delay)
-                delay *= 2
-
-            except Exception as e:
-                print(f"[PageVisualVerifier] ❌ Unexpected error: {e}")
-                logger.error(f"[PageVisualVerifier] Unexpected error: {e}")
-                return None
-
-        return None
+        """Call Claude API through the shared AI gateway (multimodal content)"""
+        try:
+            print(f"[PageVisualVerifier] Calling Claude API...")
+            message = self.client.messages.create(
+                model=self.model,
+                max_tokens=max_tokens,
+                messages=[{"role": "user", "content": content}]
+            )
+            response_text = message.content[0].text
+            print(f"[PageVisualVerifier] ✅ API call successful ({len(response_text)} chars)")
+            return response_text
+
+        except AIRetryLater as e:
+            # Overloaded / rate limited - the gateway re-queues the task, don't sleep here
+            print(f"[PageVisualVerifier] ⚠️ Claude API busy, deferring: {e}")
+            logger.warning(f"[PageVisualVerifier] Claude API busy, deferring: {e}")
+            raise
+
+        except APIError as e:
+            print(f"[PageVisualVerifier] ❌ API Error: {e}")
+            logger.error(f"[PageVisualVerifier] API Error: {e}")
+            return None
+
+        except Exception as e:
+            print(f"[PageVisualVerifier] ❌ Unexpected error: {e}")
+            logger.error(f"[PageVisualVerifier] Unexpected error: {e}")
+            return None
 
     def _log_bug(self, bug: Dict, field_name: str):
         """Log a bug found during verification"""
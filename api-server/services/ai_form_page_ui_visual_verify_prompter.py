@@ -2,11 +2,10 @@
 # AI-Powered UI Visual Verification using Claude API
 
 import json
-import time
 import logging
-import anthropic
 from typing import List, Optional
-from anthropic._exceptions import OverloadedError, APIError
+from anthropic._exceptions import APIError
+from services.ai_gateway import ai_gateway_client, AIRetryLater
 
 logger = logging.getLogger('init_logger.form_page_test')
 result_logger_gui = logging.getLogger('init_result_logger_gui.form_page_test')
@@ -18,62 +17,48 @@ class AIUIVisualVerifier:
     def __init__(self, api_key: str, session_logger=None):
         if not api_key:
             raise ValueError("API key is required for AI functionality")
-        self.client = anthropic.Anthropic(api_key=api_key)
+        self.client = ai_gateway_client(api_key)
         self.model = "claude-sonnet-4-5-20250929"
         self.session_logger = session_logger
     
-    def _call_api_with_retry_multimodal(self, content: list, max_tokens: int = 4000, max_retries: int = 3) -> Optional[str]:
+    def _call_api_with_retry_multimodal(self, content: list, max_tokens: int = 4000) -> Optional[str]:
         """
-        Call Claude API with multimodal content (images) with retry logic
+        Call Claude API with multimodal content (images) through the shared AI gateway
         
         Args:
             content: List of content blocks (text and images)
             max_tokens: Maximum tokens in response
-            max_retries: Number of retry attempts
             
         Returns:
             Response text or None if failed
         """
-        for attempt in range(max_retries):
-            try:
-                print(f"[AIUIVerifier] Calling Claude API with vision for visual verification (attempt {attempt + 1}/{max_retries})...")
-                
-                response = self.client.messages.create(
-                    model=self.model,
-                    max_tokens=max_tokens,
-                    messages=[
-                        {
-                            "role": "user",
-                            "content": content
-                        }
-                    ]
-                )
-                
-                response_text = response.content[0].text
-                print(f"[AIUIVerifier] ✅ API call successful ({len(response_text)} chars)")
-                return response_text
-                
-            except OverloadedError as e:
-                wait_time = (attempt + 1) * 30
-                print(f"[AIUIVerifier] ⚠️  API overloaded, waiting {wait_time}s (attempt {attempt + 1}/{max_retries})")
-                logger.warning(f"[AIUIVerifier] API overloaded, waiting {wait_time}s")
-                time.sleep(wait_time)
-                
-            except APIError as e:
-                print(f"[AIUIVerifier] ❌ API error: {e}")
-                logger.error(f"[AIUIVerifier] API error: {e}")
-                if attempt < max_retries - 1:
-                    time.sleep(5)
-                else:
-                    return None
-                    
-            except Exception as e:
-                print(f"[AIUIVerifier] ❌ Unexpected error: {e}")
-                logger.error(f"[AIUIVerifier] Unexpected error: {e}")
-                return None
-        
-        return None
-    
+        try:
+            print(f"[AIUIVerifier] Calling Claude API...")
+            message = self.client.messages.create(
+                model=self.model,
+                max_tokens=max_tokens,
+                messages=[{"role": "user", "content": content}]
+            )
+            response_text = message.content[0].text
+            print(f"[AIUIVerifier] ✅ API call successful ({len(response_text)} chars)")
+            return response_text
+
+        except AIRetryLater as e:
+            # Overloaded / rate limited - the gateway re-queues the task, don't sleep here
+            print(f"[AIUIVerifier] ⚠️ Claude API busy, deferring: {e}")
+            logger.warning(f"[AIUIVerifier] Claude API busy, deferring: {e}")
+            raise
+
+        except APIError as e:
+            print(f"[AIUIVerifier] ❌ API Error: {e}")
+            logger.error(f"[AIUIVerifier] API Error: {e}")
+            return None
+
+        except Exception as e:
+            print(f"[AIUIVerifier] ❌ Unexpected error: {e}")
+            logger.error(f"[AIUIVerifier] Unexpected error: {e}")
+            return None
+
     def verify_visual_ui(
             self,
             screenshot_base64: str,
@@ -186,7 +171,7 @@ Return ONLY the JSON object, no other text.
                 }
             ]
             
-            response_text = self._call_api_with_retry_multimodal(message_content, max_tokens=4000, max_retries=3)
+            response_text = self._call_api_with_retry_multimodal(message_content, max_tokens=4000)
             
             if response_text is None:
                 print("[AIUIVerifier] ❌ Failed to get response from API after retries")
@@ -220,6 +205,8 @@ Return ONLY the JSON object, no other text.
                 print(f"[AIUIVerifier] Response text: {response_text[:500]}")
                 return ""
             
+        except AIRetryLater:
+            raise
         except Exception as e:
             print(f"[AIUIVerifier] Error: {e}")
             import traceback
@@ -3,16 +3,16 @@
 # Used by FormsRunnerService for intelligent error recovery
 
 import json
-import anthropic
 import re
 from typing import Dict, List, Optional
+from services.ai_gateway import ai_gateway_client, AIRetryLater
 
 
 class AIFormPageRunError:
     """Analyze and handle errors during form page stage execution"""
     
     def __init__(self, api_key: str, session_logger=None):
-        self.client = anthropic.Anthropic(api_key=api_key)
+        self.client = ai_gateway_client(api_key)
         self.model = "claude-sonnet-4-5-20250929"
         self.session_logger = session_logger  # For debug mode logging
     
@@ -91,6 +91,8 @@ class AIFormPageRunError:
             else:
                 return {"decision": "general_error", "description": "Failed to parse AI response"}
                 
+        except AIRetryLater:
+            raise
         except Exception as e:
             return {"decision": "general_error", "description": f"AI call failed: {str(e)}"}
     
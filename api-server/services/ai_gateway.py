@@ -0,0 +1,473 @@
+# ai_gateway.py
+# Shared gateway for every Claude call made by the prompters
+# SCALABLE: one pooled Anthropic client per API key per process, a cluster-wide
+# concurrency cap and per-company token buckets in Redis. In deferrable scopes (Celery
+# tasks that re-queue themselves) overload / rate-limit responses never sleep in the
+# worker - they raise AIRetryLater so the task is re-queued with a countdown and the
+# worker slot is freed. Other callers wait briefly and retry inline before giving up.
+
+import os
+import time
+import uuid
+import random
+import hashlib
+import logging
+import threading
+import contextvars
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import anthropic
+import redis
+
+logger = logging.getLogger(__name__)
+
+# Max Claude requests in flight across all workers
+AI_GATEWAY_MAX_CONCURRENCY = int(os.getenv("AI_GATEWAY_MAX_CONCURRENCY", 32))
+# How long a non-deferrable caller may wait for a free slot before AIRetryLater
+AI_GATEWAY_QUEUE_WAIT = float(os.getenv("AI_GATEWAY_QUEUE_WAIT", 15))
+# Countdown suggested to deferrable callers that found the gateway saturated
+AI_GATEWAY_SATURATED_RETRY = float(os.getenv("AI_GATEWAY_SATURATED_RETRY", 5))
+# Inline retries on 429 / 529 / 5xx / connection errors for callers that can't defer
+AI_GATEWAY_INLINE_RETRIES = int(os.getenv("AI_GATEWAY_INLINE_RETRIES", 2))
+AI_GATEWAY_INLINE_RETRY_MAX_WAIT = float(os.getenv("AI_GATEWAY_INLINE_RETRY_MAX_WAIT", 8))
+AI_GATEWAY_REQUEST_TIMEOUT = float(os.getenv("AI_GATEWAY_REQUEST_TIMEOUT", 300))
+# Per-company token bucket (input + output tokens)
+AI_COMPANY_TOKENS_PER_MINUTE = int(os.getenv("AI_COMPANY_TOKENS_PER_MINUTE", 400000))
+# Non-deferrable callers wait out bucket shortfalls up to this many seconds
+AI_COMPANY_MAX_INLINE_WAIT = float(os.getenv("AI_COMPANY_MAX_INLINE_WAIT", 3))
+# Countdown for re-queued tasks when the API gives no retry-after
+AI_RETRY_BASE_DELAY = int(os.getenv("AI_RETRY_BASE_DELAY", 10))
+AI_RETRY_MAX_DELAY = int(os.getenv("AI_RETRY_MAX_DELAY", 300))
+# How many times a task may be re-queued for AIRetryLater before it fails normally
+AI_DEFER_MAX_RETRIES = int(os.getenv("AI_DEFER_MAX_RETRIES", 5))
+
+INFLIGHT_KEY = "ai_gateway_inflight"   # ZSET lease id -> lease expiry
+WAITING_KEY = "ai_gateway_waiting"     # callers waiting for a slot (queue depth)
+STATS_KEY = "ai_gateway_stats"         # HASH counters
+
+_LATENCY_BUCKETS_MS = (1000, 5000, 10000, 20000, 40000, 80000)
+_RETRYABLE_STATUS = (429, 500, 502, 503, 504, 529)
+_CLIENT_CACHE_SIZE = 64
+
+REDIS_URL = os.getenv('REDIS_URL', 'redis://redis:6379/0')
+_gateway_redis_pool = redis.ConnectionPool.from_url(REDIS_URL, max_connections=50)
+
+# Company the current task is working for (set once per task before any AI call)
+_company_scope = contextvars.ContextVar("ai_gateway_company", default=None)
+# Token usage the API reported for the current task's calls (reset with the company scope)
+_usage_scope = contextvars.ContextVar("ai_gateway_usage", default=None)
+# True when the caller re-queues itself on AIRetryLater (no sleeping in the gateway)
+_defer_scope = contextvars.ContextVar("ai_gateway_deferrable", default=False)
+
+USAGE_FIELDS = ("input_tokens", "output_tokens", "cache_creation_input_tokens", "cache_read_input_tokens")
+
+# Take a slot if fewer than ARGV[2] unexpired leases exist. Returns 1 on success.
+_ACQUIRE_SCRIPT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+if redis.call('ZCARD', KEYS[1]) < tonumber(ARGV[2]) then
+    redis.call('ZADD', KEYS[1], ARGV[3], ARGV[4])
+    return 1
+end
+return 0
+"""
+
+# Token bucket: refill, then take ARGV[4] tokens. Returns seconds to wait (0 = granted).
+_TAKE_TOKENS_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cost = math.min(tonumber(ARGV[4]), capacity)
+local data = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(data[1]) or capacity
+local ts = tonumber(data[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= cost then
+    tokens = tokens - cost
+else
+    wait = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 60)
+return tostring(wait)
+"""
+
+# Return tokens to a bucket that still exists (an expired bucket is full anyway)
+_SETTLE_TOKENS_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('HINCRBYFLOAT', KEYS[1], 'tokens', ARGV[1])
+end
+return 0
+"""
+
+
+class AIRetryLater(Exception):
+    """
+    The AI call could not be made now (API overloaded / rate limited, gateway saturated,
+    company over its token rate). Re-queue the task instead of sleeping.
+    retry_after is the suggested countdown in seconds (None = caller's backoff).
+    """
+
+    def __init__(self, reason: str, retry_after: Optional[float] = None):
+        self.reason = reason
+        self.retry_after = retry_after
+        super().__init__(reason)
+
+
+def set_ai_company(company_id: Optional[int], deferrable: bool = False) -> None:
+    """
+    Attribute subsequent AI calls on this thread/context to a company (token bucket).
+    deferrable=True when the caller catches AIRetryLater and re-queues itself - the
+    gateway then never sleeps; otherwise it waits and retries inline first.
+    """
+    _company_scope.set(company_id)
+    _usage_scope.set({})
+    _defer_scope.set(deferrable)
+
+
+def reset_ai_scope() -> None:
+    """Clear the company / usage / deferrable scope (Celery task_prerun - prefork reuses the context)"""
+    _company_scope.set(None)
+    _usage_scope.set(None)
+    _defer_scope.set(False)
+
+
+def take_ai_usage() -> Dict[str, int]:
+    """
+    Usage reported by the API (USAGE_FIELDS, summed) for the calls made since the last
+    set_ai_company() / take_ai_usage(). Empty dict when no call completed.
+    """
+    usage = _usage_scope.get() or {}
+    _usage_scope.set({})
+    return usage
+
+
+def retry_countdown(exc: AIRetryLater, retries: int) -> int:
+    """Countdown for re-queuing a task after AIRetryLater (exponential + jitter)."""
+    if exc.retry_after:
+        base = exc.retry_after
+    else:
+        base = AI_RETRY_BASE_DELAY * (2 ** retries)
+    return int(min(AI_RETRY_MAX_DELAY, base + random.uniform(0, base * 0.25)))
+
+
+def _estimate_content_tokens(content) -> int:
+    if isinstance(content, str):
+        return len(content) // 4
+    tokens = 0
+    for block in content or []:
+        if block.get("type") == "image":
+            tokens += 1600
+        else:
+            tokens += len(str(block.get("text") or "")) // 4
+    return tokens
+
+
+# Leading base64 characters of each image format the agent can send
+_IMAGE_SIGNATURES = (
+    ("iVBORw0KGgo", "image/png"),
+    ("/9j/", "image/jpeg"),
+    ("UklGR", "image/webp"),
+    ("R0lGOD", "image/gif"),
+)
+
+
+def _fix_image_media_types(kwargs: Dict) -> None:
+    """
+    Set each base64 image block's media_type from its bytes. Prompters label every
+    screenshot image/png; agent screenshot profiles may deliver JPEG or WebP.
+    """
+    for message in kwargs.get("messages") or []:
+        content = message.get("content")
+        if isinstance(content, str):
+            continue
+        for block in content or []:
+            source = block.get("source") if block.get("type") == "image" else None
+            if not source or source.get("type") != "base64":
+                continue
+            data = source.get("data") or ""
+            for prefix, media_type in _IMAGE_SIGNATURES:
+                if data.startswith(prefix):
+                    source["media_type"] = media_type
+                    break
+
+
+def _estimate_tokens(kwargs: Dict) -> int:
+    """Rough input size for the token bucket (~4 chars/token, ~1600 tokens per image)"""
+    tokens = _estimate_content_tokens(kwargs.get("system"))
+    for message in kwargs.get("messages") or []:
+        tokens += _estimate_content_tokens(message.get("content"))
+    return tokens + int(kwargs.get("max_tokens") or 0) // 4
+
+
+class _GatewayMessages:
+    """Stand-in for client.messages - lets prompters keep calling .messages.create()"""
+
+    def __init__(self, gateway: "AIGateway", api_key: str, company_id: Optional[int]):
+        self._gateway = gateway
+        self._api_key = api_key
+        self._company_id = company_id
+
+    def create(self, **kwargs):
+        return self._gateway.create_message(self._api_key, company_id=self._company_id, **kwargs)
+
+
+class GatewayClient:
+    """Drop-in replacement for anthropic.Anthropic(api_key=...) routed through the gateway"""
+
+    def __init__(self, gateway: "AIGateway", api_key: str, company_id: Optional[int] = None):
+        self.messages = _GatewayMessages(gateway, api_key, company_id)
+
+
+class AIGateway:
+    """
+    Per-process gateway. Requests share pooled Anthropic clients (one HTTP connection
+    pool per API key); admission (concurrency slot + company tokens) is decided in
+    Redis so limits hold across all Celery workers.
+    """
+
+    def __init__(self, redis_client=None):
+        self.redis = redis_client or redis.Redis(connection_pool=_gateway_redis_pool)
+        self._acquire = self.redis.register_script(_ACQUIRE_SCRIPT)
+        self._take_tokens = self.redis.register_script(_TAKE_TOKENS_SCRIPT)
+        self._settle_tokens = self.redis.register_script(_SETTLE_TOKENS_SCRIPT)
+        self._lock = threading.Lock()
+        self._clients_pid = None
+        self._clients = OrderedDict()  # api key hash -> anthropic.Anthropic
+
+    # ---------------------------------------------------------------- clients
+
+    def _client_for(self, api_key: str) -> anthropic.Anthropic:
+        key = hashlib.sha256(api_key.encode()).hexdigest()
+        with self._lock:
+            # Celery prefork: connections opened before fork must not be shared with the child
+            if self._clients_pid != os.getpid():
+                self._clients = OrderedDict()
+                self._clients_pid = os.getpid()
+            client = self._clients.get(key)
+            if client is None:
+                # Retries are the gateway's job (re-queue / inline backoff), not the SDK's
+                client = anthropic.Anthropic(api_key=api_key, max_retries=0,
+                                             timeout=AI_GATEWAY_REQUEST_TIMEOUT)
+                self._clients[key] = client
+                while len(self._clients) > _CLIENT_CACHE_SIZE:
+                    # Not closed here - another thread may still be using it; GC closes it
+                    self._clients.popitem(last=False)
+            else:
+                self._clients.move_to_end(key)
+            return client
+
+    # ---------------------------------------------------------------- admission
+
+    def _take_company_tokens(self, company_id: Optional[int], tokens: int, deferrable: bool) -> None:
+        if not company_id or AI_COMPANY_TOKENS_PER_MINUTE <= 0:
+            return
+        rate = AI_COMPANY_TOKENS_PER_MINUTE / 60.0
+        for attempt in range(2):
+            try:
+                wait = float(self._take_tokens(keys=[f"ai_bucket:{company_id}"],
+                                               args=[AI_COMPANY_TOKENS_PER_MINUTE, rate, time.time(), tokens]))
+            except redis.RedisError as e:
+                logger.warning(f"[AIGateway] Token bucket unavailable, allowing call: {e}")
+                return
+            if wait <= 0:
+                return
+            if deferrable or attempt or wait > AI_COMPANY_MAX_INLINE_WAIT:
+                break
+            # Short shortfall - wait for the refill once, then take again
+            time.sleep(wait)
+        self._count("throttled")
+        raise AIRetryLater(f"Company {company_id} over AI token rate", retry_after=wait)
+
+    def _settle_company_tokens(self, company_id: Optional[int], estimated: int, actual: int) -> None:
+        """Charge the difference between the estimate and what the API reports"""
+        if not company_id or AI_COMPANY_TOKENS_PER_MINUTE <= 0:
+            return
+        try:
+            self._settle_tokens(keys=[f"ai_bucket:{company_id}"], args=[estimated - actual])
+        except redis.RedisError:
+            pass
+
+    def _try_acquire(self, lease: str) -> bool:
+        now = time.time()
+        return bool(self._acquire(keys=[INFLIGHT_KEY],
+                                  args=[now, AI_GATEWAY_MAX_CONCURRENCY,
+                                        now + AI_GATEWAY_REQUEST_TIMEOUT + 30, lease]))
+
+    def _acquire_slot(self, deferrable: bool) -> Optional[str]:
+        lease = uuid.uuid4().hex
+        try:
+            if self._try_acquire(lease):
+                return lease
+        except redis.RedisError as e:
+            logger.warning(f"[AIGateway] Concurrency gate unavailable, allowing call: {e}")
+            return None
+        if deferrable:
+            # The task is re-queued instead of holding a worker while it polls
+            self._count("saturated")
+            raise AIRetryLater("AI gateway at max concurrency", retry_after=AI_GATEWAY_SATURATED_RETRY)
+
+        deadline = time.monotonic() + AI_GATEWAY_QUEUE_WAIT
+        delay = 0.05
+        self.redis.incr(WAITING_KEY)
+        try:
+            while time.monotonic() < deadline:
+                time.sleep(delay)
+                delay = min(delay * 2, 0.5)
+                try:
+                    if self._try_acquire(lease):
+                        return lease
+                except redis.RedisError as e:
+                    logger.warning(f"[AIGateway] Concurrency gate unavailable, allowing call: {e}")
+                    return None
+            self._count("saturated")
+            raise AIRetryLater("AI gateway at max concurrency")
+        finally:
+            self.redis.decr(WAITING_KEY)
+
+    def _release_slot(self, lease: Optional[str]) -> None:
+        if lease:
+            try:
+                self.redis.zrem(INFLIGHT_KEY, lease)
+            except redis.RedisError:
+                pass  # Lease expiry reclaims it
+
+    # ---------------------------------------------------------------- calls
+
+    def client(self, api_key: str, company_id: Optional[int] = None) -> GatewayClient:
+        return GatewayClient(self, api_key, company_id)
+
+    def create_message(self, api_key: str, company_id: Optional[int] = None, **kwargs):
+        """
+        Synchronous messages.create() through the gateway.
+        Raises AIRetryLater for transient conditions (after inline retries unless the
+        scope is deferrable); other API errors propagate unchanged.
+        """
+        company_id = company_id or _company_scope.get()
+        deferrable = _defer_scope.get()
+        _fix_image_media_types(kwargs)
+        estimated = _estimate_tokens(kwargs)
+        self._take_company_tokens(company_id, estimated, deferrable)
+
+        retries = 0 if deferrable else AI_GATEWAY_INLINE_RETRIES
+        for attempt in range(retries + 1):
+            try:
+                message = self._send(api_key, kwargs, deferrable)
+                break
+            except AIRetryLater as e:
+                if attempt >= retries:
+                    self._settle_company_tokens(company_id, estimated, 0)
+                    raise
+                delay = min(e.retry_after or 0.5 * (2 ** attempt), AI_GATEWAY_INLINE_RETRY_MAX_WAIT)
+                logger.info(f"[AIGateway] {e.reason} - retrying in {delay:.1f}s "
+                            f"(attempt {attempt + 1}/{retries})")
+                time.sleep(delay + random.uniform(0, delay * 0.25))
+
+        self._count("success")
+        usage = getattr(message, "usage", None)
+        if usage is not None:
+            actual = (getattr(usage, "input_tokens", 0) or 0) + (getattr(usage, "output_tokens", 0) or 0)
+            self._settle_company_tokens(company_id, estimated, actual)
+        self._track_usage(usage)
+        return message
+
+    def _send(self, api_key: str, kwargs: Dict, deferrable: bool):
+        """One request holding a concurrency slot; transient failures become AIRetryLater"""
+        lease = self._acquire_slot(deferrable)
+        started = time.monotonic()
+        try:
+            return self._client_for(api_key).messages.create(**kwargs)
+        except anthropic.APIStatusError as e:
+            if e.status_code in _RETRYABLE_STATUS:
+                self._count("overloaded" if e.status_code == 529 else "rate_limited" if e.status_code == 429
+                            else "server_errors")
+                retry_after = None
+                try:
+                    retry_after = float(e.response.headers.get("retry-after"))
+                except (TypeError, ValueError, AttributeError):
+                    pass
+                raise AIRetryLater(f"Claude API returned {e.status_code}", retry_after=retry_after) from e
+            self._count("errors")
+            raise
+        except anthropic.APIConnectionError as e:
+            self._count("connection_errors")
+            raise AIRetryLater(f"Claude API unreachable: {e}") from e
+        finally:
+            self._release_slot(lease)
+            self._observe_latency((time.monotonic() - started) * 1000)
+
+    # ---------------------------------------------------------------- metrics
+
+    def _track_usage(self, usage) -> None:
+        """Add a response's usage to the task ledger and the gateway-wide cache counters"""
+        if usage is None:
+            return
+        values = {field: int(getattr(usage, field, 0) or 0) for field in USAGE_FIELDS}
+        ledger = _usage_scope.get()
+        if ledger is None:
+            ledger = {}
+            _usage_scope.set(ledger)
+        for field, value in values.items():
+            ledger[field] = ledger.get(field, 0) + value
+        try:
+            pipe = self.redis.pipeline()
+            for field, value in values.items():
+                if value:
+                    pipe.hincrby(STATS_KEY, field, value)
+            if values["cache_read_input_tokens"]:
+                pipe.hincrby(STATS_KEY, "cache_hits", 1)
+            pipe.execute()
+        except redis.RedisError:
+            pass
+
+    def _count(self, counter: str, amount: int = 1) -> None:
+        try:
+            self.redis.hincrby(STATS_KEY, counter, amount)
+        except redis.RedisError:
+            pass
+
+    def _observe_latency(self, elapsed_ms: float) -> None:
+        bucket = next((f"latency_le_{b}" for b in _LATENCY_BUCKETS_MS if elapsed_ms <= b), "latency_le_inf")
+        try:
+            pipe = self.redis.pipeline()
+            pipe.hincrby(STATS_KEY, "requests", 1)
+            pipe.hincrby(STATS_KEY, "latency_ms_total", int(elapsed_ms))
+            pipe.hincrby(STATS_KEY, bucket, 1)
+            pipe.execute()
+        except redis.RedisError:
+            pass
+
+    def stats(self) -> Dict:
+        raw = self.redis.hgetall(STATS_KEY) or {}
+        stats = {(k.decode() if isinstance(k, bytes) else k): int(v) for k, v in raw.items()}
+        requests = stats.get("requests", 0)
+        stats["latency_ms_avg"] = round(stats.get("latency_ms_total", 0) / requests) if requests else 0
+        prompt_tokens = sum(stats.get(f, 0) for f in ("input_tokens", "cache_creation_input_tokens",
+                                                      "cache_read_input_tokens"))
+        stats["cache_read_ratio"] = (round(stats.get("cache_read_input_tokens", 0) / prompt_tokens, 4)
+                                     if prompt_tokens else 0.0)
+        stats["in_flight"] = int(self.redis.zcount(INFLIGHT_KEY, time.time(), "+inf") or 0)
+        stats["queue_depth"] = max(0, int(self.redis.get(WAITING_KEY) or 0))
+        stats["max_concurrency"] = AI_GATEWAY_MAX_CONCURRENCY
+        return stats
+
+
+_gateway: Optional[AIGateway] = None
+_gateway_lock = threading.Lock()
+
+
+def get_ai_gateway() -> AIGateway:
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = AIGateway()
+    return _gateway
+
+
+def ai_gateway_client(api_key: str, company_id: Optional[int] = None) -> GatewayClient:
+    """What prompters use instead of anthropic.Anthropic(api_key=api_key)"""
+    if not api_key:
+        raise ValueError("API key is required for AI functionality")
+    return get_ai_gateway().client(api_key, company_id)
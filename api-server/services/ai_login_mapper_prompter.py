@@ -4,13 +4,11 @@
 #   generate_test_steps, regenerate_remaining_steps, analyze_failure_and_recover
 
 import json
-import time
-import random
 import logging
 from typing import Dict, List, Optional, Any
 
-import anthropic
-from anthropic._exceptions import OverloadedError, APIError
+from anthropic._exceptions import APIError
+from services.ai_gateway import ai_gateway_client, AIRetryLater
 
 logger = logging.getLogger(__name__)
 
@@ -21,7 +19,7 @@ class LoginMapperAIHelper:
     def __init__(self, api_key: str, session_logger=None):
         if not api_key:
             raise ValueError("API key is required for AI functionality")
-        self.client = anthropic.Anthropic(api_key=api_key)
+        self.client = ai_gateway_client(api_key)
         #self.model = "claude-sonnet-4-5-20250929"
         self.model = "claude-haiku-4-5-20251001"
         self.session_logger = session_logger
@@ -31,50 +29,35 @@ class LoginMapperAIHelper:
     # ================================================================
 
     def _call_api_with_retry_multimodal(
-        self, content: list, max_tokens: int = 4000, max_retries: int = 3
+        self, content: list, max_tokens: int = 4000
     ) -> Optional[str]:
-        """Call Claude API with retry logic for multimodal content."""
-        delay = 2
-
-        for attempt in range(max_retries):
-            try:
-                print(f"[LoginMapperAI] Calling Claude API (attempt {attempt + 1}/{max_retries})...")
-
-                message = self.client.messages.create(
-                    model=self.model,
-                    max_tokens=max_tokens,
-                    messages=[{"role": "user", "content": content}]
-                )
-
-                response_text = message.content[0].text
-                print(f"[LoginMapperAI] ✅ API call successful ({len(response_text)} chars)")
-                return response_text
-
-            except OverloadedError:
-                if attempt == max_retries - 1:
-                    print(f"[LoginMapperAI] ❌ API Overloaded after {max_retries} attempts")
-                    return None
-                jitter = random.uniform(0, delay * 0.5)
-                wait_time = delay + jitter
-                print(f"[LoginMapperAI] ⚠️ API Overloaded. Retrying in {wait_time:.1f}s...")
-                time.sleep(wait_time)
-                delay *= 2
-
-            except APIError as e:
-                if attempt == max_retries - 1:
-                    print(f"[LoginMapperAI] ❌ API Error: {e}")
-                    logger.error(f"[LoginMapperAI] API Error: {e}")
-                    return None
-                print(f"[LoginMapperAI] ⚠️ API Error. Retrying...")
-                time.sleep(delay)
-                delay *= 2
-
-            except Exception as e:
-                print(f"[LoginMapperAI] ❌ Unexpected error: {e}")
-                logger.error(f"[LoginMapperAI] Unexpected error: {e}")
-                return None
-
-        return None
+        """Call Claude API through the shared AI gateway (multimodal content)."""
+        try:
+            print(f"[LoginMapperAI] Calling Claude API...")
+            message = self.client.messages.create(
+                model=self.model,
+                max_tokens=max_tokens,
+                messages=[{"role": "user", "content": content}]
+            )
+            response_text = message.content[0].text
+            print(f"[LoginMapperAI] ✅ API call successful ({len(response_text)} chars)")
+            return response_text
+
+        except AIRetryLater as e:
+            # Overloaded / rate limited - the gateway re-queues the task, don't sleep here
+            print(f"[LoginMapperAI] ⚠️ Claude API busy, deferring: {e}")
+            logger.warning(f"[LoginMapperAI] Claude API busy, deferring: {e}")
+            raise
+
+        except APIError as e:
+            print(f"[LoginMapperAI] ❌ API Error: {e}")
+            logger.error(f"[LoginMapperAI] API Error: {e}")
+            return None
+
+        except Exception as e:
+            print(f"[LoginMapperAI] ❌ Unexpected error: {e}")
+            logger.error(f"[LoginMapperAI] Unexpected error: {e}")
+            return None
 
     def _parse_response(self, response: str) -> Dict[str, Any]:
         """Parse JSON from AI response."""
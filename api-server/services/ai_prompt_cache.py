@@ -0,0 +1,73 @@
+# ai_prompt_cache.py
+# Request layout for Anthropic prompt caching
+# SCALABLE: the multi-KB instruction blocks are sent as a cached system prefix and the
+# page DOM as a cached context block, so the 5-20 calls a mapping session makes against
+# the same page pay full input price (and prefill time) only for the small per-call tail.
+
+import os
+from typing import List, Optional, Tuple
+
+AI_PROMPT_CACHE_ENABLED = os.getenv("AI_PROMPT_CACHE_ENABLED", "true").lower() == "true"
+# Also mark the DOM context block (on top of the static instructions)
+AI_PROMPT_CACHE_DOM = os.getenv("AI_PROMPT_CACHE_DOM", "true").lower() == "true"
+# Smaller DOMs aren't worth a cache write (the API also ignores prefixes under 1-2K tokens)
+AI_PROMPT_CACHE_MIN_DOM_CHARS = int(os.getenv("AI_PROMPT_CACHE_MIN_DOM_CHARS", 8000))
+
+_EPHEMERAL = {"type": "ephemeral"}
+
+
+def _text_block(text: str, cached: bool = False) -> dict:
+    block = {"type": "text", "text": text}
+    if cached and AI_PROMPT_CACHE_ENABLED:
+        block["cache_control"] = _EPHEMERAL
+    return block
+
+
+def build_cached_request(
+        instructions: str,
+        context: str = "",
+        tail: str = "",
+        screenshot_base64: Optional[str] = None,
+        media_type: str = "image/png"
+) -> Tuple[List[dict], List[dict]]:
+    """
+    Split one prompt into (system, content) for messages.create().
+
+    Order matters - the cache covers everything up to the last marked block:
+        system   static instructions (cached, identical for every call of a method)
+        content  [context (cached when large enough), screenshot, per-call tail]
+
+    Args:
+        instructions: Static instruction text - must not contain per-call data
+        context: Per-page context reused across calls, e.g. the form DOM
+        tail: Everything that changes per call (steps so far, test cases, hints...)
+        screenshot_base64: Optional screenshot, placed after the cached context
+
+    Returns:
+        (system blocks, user content blocks)
+    """
+    system = [_text_block(instructions, cached=True)]
+
+    content = []
+    if context:
+        cache_context = AI_PROMPT_CACHE_DOM and len(context) >= AI_PROMPT_CACHE_MIN_DOM_CHARS
+        content.append(_text_block(context, cached=cache_context))
+    if screenshot_base64:
+        content.append({
+            "type": "image",
+            "source": {
+                "type": "base64",
+                "media_type": media_type,
+                "data": screenshot_base64
+            }
+        })
+    if tail or not content:
+        content.append(_text_block(tail or "Follow the instructions above."))
+    return system, content
+
+
+def flatten_request(system: List[dict], content: List[dict]) -> str:
+    """Text of a cached request as one prompt (debug logs, prompt size)"""
+    parts = [b.get("text", "") for b in system]
+    parts += [b.get("text", "") if b.get("type") == "text" else "[SCREENSHOT]" for b in content]
+    return "\n\n".join(parts)
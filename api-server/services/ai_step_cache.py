@@ -0,0 +1,269 @@
+# ai_step_cache.py
+# Response cache for AI step generation (analyze_form_page / regenerate_steps)
+# SCALABLE: re-maps of an unchanged form reuse the previous AI answer instead of a
+# 10-40s Anthropic call. Keyed by a structural DOM fingerprint plus every prompt input,
+# bounded by TTL and an LRU index, with hit/miss counters in Redis.
+
+import os
+import json
+import time
+import hashlib
+import logging
+import importlib.util
+from html.parser import HTMLParser
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+AI_STEP_CACHE_ENABLED = os.getenv("AI_STEP_CACHE_ENABLED", "true").lower() == "true"
+AI_STEP_CACHE_TTL = int(os.getenv("AI_STEP_CACHE_TTL", 7 * 86400))  # 7 days
+AI_STEP_CACHE_MAX_ENTRIES = int(os.getenv("AI_STEP_CACHE_MAX_ENTRIES", 20000))
+# Bump to drop every cached answer without touching the prompter sources
+AI_STEP_CACHE_VERSION = os.getenv("AI_STEP_CACHE_VERSION", "1")
+
+CACHE_INDEX_KEY = "ai_step_cache_index"   # ZSET cache key -> last access (LRU order)
+CACHE_STATS_KEY = "ai_step_cache_stats"   # HASH counters
+
+OP_ANALYZE = "analyze"
+OP_REGENERATE = "regenerate"
+
+# Login/logout prompts carry decrypted credentials - never cache those
+UNCACHEABLE_MAPPING_TYPES = ("login_mapping", "logout_mapping")
+
+# Modules every prompt passes through (DOM reduction, cached prompt layout)
+_SHARED_PROMPT_MODULES = ("services.dom_reducer", "services.ai_prompt_cache")
+# Prompter modules whose source feeds the cache key, per mapping type
+_PROMPTER_MODULES = {
+    "dynamic_content": ("services.ai_dynamic_content_prompter",) + _SHARED_PROMPT_MODULES,
+    "form": ("services.ai_form_mapper_main_prompter", "services.form_mapper_ai_helpers") + _SHARED_PROMPT_MODULES,
+}
+
+# Attributes the prompters/selectors depend on. Everything else (style, nonce,
+# tracking ids, framework state) is dropped from the fingerprint.
+_STRUCTURAL_ATTRS = {
+    "id", "name", "type", "for", "role", "placeholder", "href", "action", "method",
+    "required", "disabled", "readonly", "multiple", "checked", "selected",
+    "contenteditable", "tabindex", "data-testid", "data-test", "data-qa", "label",
+}
+# Attribute values that are structural only on these tags (option lists, radio groups)
+_VALUE_TAGS = {"option", "button"}
+_VALUE_INPUT_TYPES = {"radio", "checkbox", "submit", "button"}
+_SKIPPED_TAGS = {"script", "style", "noscript", "template", "svg"}
+# Text the AI reads field meaning and choices from - hashed whitespace-normalized
+_TEXT_TAGS = {"label", "option", "legend"}
+
+
+class _StructureHasher(HTMLParser):
+    """
+    Streams the DOM into a sha256 of tags + structural attributes + label / option /
+    legend text (other text ignored).
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self._hash = hashlib.sha256()
+        self._skip_depth = 0
+        self._open_text_tags = []
+        self._text = []
+
+    def _flush_text(self):
+        text = " ".join("".join(self._text).split())
+        self._text = []
+        if text:
+            self._hash.update(f"#{text}".encode())
+
+    def handle_starttag(self, tag, attrs):
+        if self._skip_depth or tag in _SKIPPED_TAGS:
+            if tag in _SKIPPED_TAGS:
+                self._skip_depth += 1
+            return
+        self._flush_text()
+        if tag in _TEXT_TAGS:
+            if tag == "option" and "option" in self._open_text_tags:
+                # </option> is optional - the next option closes the previous one
+                del self._open_text_tags[self._open_text_tags.index("option"):]
+            self._open_text_tags.append(tag)
+        attr_map = {k.lower(): (v or "") for k, v in attrs}
+        kept = []
+        for name in sorted(attr_map):
+            if name in _STRUCTURAL_ATTRS or name.startswith("aria-"):
+                kept.append(f"{name}={attr_map[name]}")
+            elif name == "class":
+                kept.append("class=" + " ".join(sorted(attr_map[name].split())))
+            elif name == "value" and (tag in _VALUE_TAGS or
+                                      (tag == "input" and attr_map.get("type", "").lower() in _VALUE_INPUT_TYPES)):
+                kept.append(f"value={attr_map[name]}")
+        self._hash.update(f"<{tag} {'|'.join(kept)}>".encode())
+
+    def handle_endtag(self, tag):
+        if tag in _SKIPPED_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+            return
+        if not self._skip_depth:
+            self._flush_text()
+            closes = "option" if tag in ("select", "datalist") else tag
+            if closes in self._open_text_tags:
+                del self._open_text_tags[self._open_text_tags.index(closes):]
+            self._hash.update(f"</{tag}>".encode())
+
+    def handle_data(self, data):
+        if self._open_text_tags and not self._skip_depth:
+            self._text.append(data)
+
+    def hexdigest(self) -> str:
+        self._flush_text()
+        return self._hash.hexdigest()
+
+
+def dom_fingerprint(dom_html: str) -> str:
+    """
+    Structural hash of a DOM: tag tree + selector-relevant attributes (name, placeholder,
+    ...) + label / option / legend text. Other text nodes, input values, scripts and
+    inline styles don't affect it, so the same form re-captured with different
+    timestamps/CSRF tokens/typed values hashes equally, while a relabelled field or a
+    changed option list does not.
+    """
+    if not dom_html:
+        return ""
+    hasher = _StructureHasher()
+    try:
+        hasher.feed(dom_html)
+        hasher.close()
+    except Exception as e:
+        # Malformed markup - fall back to exact content (cache still correct, just fewer hits)
+        logger.debug(f"[AIStepCache] DOM parse failed, hashing raw content: {e}")
+        return hashlib.sha256(dom_html.encode()).hexdigest()
+    return hasher.hexdigest()
+
+
+_prompter_versions: Dict[str, str] = {}
+
+
+def prompter_version(mapping_type: str) -> str:
+    """
+    Hash of the prompter source (plus DOM reducer / prompt cache layout) for a mapping
+    type - any edit that changes the prompt invalidates the cache.
+    """
+    family = mapping_type if mapping_type in _PROMPTER_MODULES else "form"
+    if family not in _prompter_versions:
+        digest = hashlib.sha256(AI_STEP_CACHE_VERSION.encode())
+        for module_name in _PROMPTER_MODULES[family]:
+            try:
+                spec = importlib.util.find_spec(module_name)
+                with open(spec.origin, "rb") as f:
+                    digest.update(f.read())
+            except Exception as e:
+                logger.warning(f"[AIStepCache] Could not read {module_name} for versioning: {e}")
+                digest.update(module_name.encode())
+        _prompter_versions[family] = digest.hexdigest()[:16]
+    return _prompter_versions[family]
+
+
+def _step_signature(step: Dict) -> Dict:
+    """The parts of an executed step that shape the regenerate prompt"""
+    return {k: step.get(k) for k in ("action", "selector", "field_name", "value", "is_junction")}
+
+
+class AIStepCache:
+    """
+    Redis cache of AI step-generation responses.
+
+    Keys:
+        ai_step_cache:{op}:{sha256}   JSON response (TTL AI_STEP_CACHE_TTL)
+        ai_step_cache_index           ZSET key -> last hit/store time, trimmed to MAX_ENTRIES
+        ai_step_cache_stats           HASH hits / misses / stores / evictions (total and per op)
+
+    Entries are scoped per company - steps can carry user-provided values.
+    """
+
+    def __init__(self, redis_client):
+        self.redis = redis_client
+
+    @staticmethod
+    def cacheable(mapping_type: str) -> bool:
+        return AI_STEP_CACHE_ENABLED and mapping_type not in UNCACHEABLE_MAPPING_TYPES
+
+    @staticmethod
+    def build_key(op: str, company_id: int, mapping_type: str, dom_html: str, **inputs) -> str:
+        """Cache key for one AI call. `inputs` are the remaining prompt inputs (JSON-serializable)."""
+        if "executed_steps" in inputs:
+            inputs["executed_steps"] = [_step_signature(s) for s in (inputs["executed_steps"] or [])]
+        material = json.dumps({
+            "company_id": company_id,
+            "mapping_type": mapping_type,
+            "prompter": prompter_version(mapping_type),
+            "dom": dom_fingerprint(dom_html),
+            "inputs": inputs,
+        }, sort_keys=True, default=str)
+        return f"ai_step_cache:{op}:{hashlib.sha256(material.encode()).hexdigest()}"
+
+    def get(self, op: str, key: str) -> Optional[Dict]:
+        try:
+            raw = self.redis.get(key)
+        except Exception as e:
+            logger.warning(f"[AIStepCache] Read error: {e}")
+            return None
+        if raw is None:
+            self._count(op, "misses")
+            return None
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            self.redis.delete(key)
+            self._count(op, "misses")
+            return None
+        try:
+            pipe = self.redis.pipeline()
+            pipe.zadd(CACHE_INDEX_KEY, {key: time.time()})
+            pipe.expire(key, AI_STEP_CACHE_TTL)
+            pipe.execute()
+        except Exception:
+            pass
+        self._count(op, "hits")
+        return value
+
+    def put(self, op: str, key: str, ai_result: Dict) -> None:
+        """Store a successful AI response. Error/empty answers are not cached (often transient)."""
+        if not ai_result or not ai_result.get("steps"):
+            return
+        if ai_result.get("page_error_detected") or ai_result.get("login_failed"):
+            return
+        try:
+            now = time.time()
+            pipe = self.redis.pipeline()
+            pipe.setex(key, AI_STEP_CACHE_TTL, json.dumps(ai_result))
+            pipe.zadd(CACHE_INDEX_KEY, {key: now})
+            # Index entries whose key already expired
+            pipe.zremrangebyscore(CACHE_INDEX_KEY, "-inf", now - AI_STEP_CACHE_TTL)
+            pipe.zcard(CACHE_INDEX_KEY)
+            size = pipe.execute()[-1]
+            self._count(op, "stores")
+            if size > AI_STEP_CACHE_MAX_ENTRIES:
+                self._evict(int(size) - AI_STEP_CACHE_MAX_ENTRIES)
+        except Exception as e:
+            logger.warning(f"[AIStepCache] Write error: {e}")
+
+    def _evict(self, count: int) -> None:
+        """Drop the least recently used entries"""
+        evicted = self.redis.zpopmin(CACHE_INDEX_KEY, count)
+        keys = [k for k, _ in evicted]
+        if keys:
+            self.redis.delete(*keys)
+            self.redis.hincrby(CACHE_STATS_KEY, "evictions", len(keys))
+
+    def _count(self, op: str, counter: str) -> None:
+        try:
+            pipe = self.redis.pipeline()
+            pipe.hincrby(CACHE_STATS_KEY, counter, 1)
+            pipe.hincrby(CACHE_STATS_KEY, f"{op}:{counter}", 1)
+            pipe.execute()
+        except Exception:
+            pass
+
+    def stats(self) -> Dict:
+        raw = self.redis.hgetall(CACHE_STATS_KEY) or {}
+        stats = {(k.decode() if isinstance(k, bytes) else k): int(v) for k, v in raw.items()}
+        hits, misses = stats.get("hits", 0), stats.get("misses", 0)
+        stats["entries"] = int(self.redis.zcard(CACHE_INDEX_KEY) or 0)
+        stats["hit_rate"] = round(hits / (hits + misses), 4) if hits + misses else 0.0
+        return stats
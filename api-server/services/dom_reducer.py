@@ -0,0 +1,369 @@
+# dom_reducer.py
+# Server-side DOM reduction before a page is put into an AI prompt
+# SCALABLE: agents send the full documentElement.outerHTML (300KB+ on enterprise pages);
+# prompt tokens dominate AI latency and cost, so every prompter gets the DOM through
+# reduce_dom() which runs a pipeline of pluggable passes over a parsed tree.
+#
+# Passes never remove or rename id / name / class / data-test* / aria-* and never drop an
+# element that precedes a kept sibling of the same tag, so selectors and positional
+# XPaths the AI derives from the reduced DOM still match the live page.
+
+import os
+import re
+import time
+import logging
+from html import escape, unescape
+from html.parser import HTMLParser
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DOM_REDUCER_ENABLED = os.getenv("DOM_REDUCER_ENABLED", "true").lower() == "true"
+# Ordered pass names (see DOM_PASSES)
+DOM_REDUCER_PASSES = [p.strip() for p in os.getenv(
+    "DOM_REDUCER_PASSES",
+    "strip_non_content,prune_hidden_subtrees,prune_attributes,collapse_repeated_rows,truncate_text"
+).split(",") if p.strip()]
+# Similar sibling rows kept before the rest of a run is collapsed
+DOM_REDUCER_MAX_REPEATED_ROWS = int(os.getenv("DOM_REDUCER_MAX_REPEATED_ROWS", 25))
+# Longer text nodes / attribute values are truncated
+DOM_REDUCER_MAX_TEXT = int(os.getenv("DOM_REDUCER_MAX_TEXT", 300))
+DOM_REDUCER_MAX_ATTR = int(os.getenv("DOM_REDUCER_MAX_ATTR", 200))
+
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta",
+             "param", "source", "track", "wbr"}
+FORM_CONTROL_TAGS = {"input", "select", "textarea"}
+_NON_CONTENT_TAGS = {"script", "style", "noscript", "template", "link", "meta", "base"}
+_PRESERVE_WHITESPACE_TAGS = {"pre", "textarea"}
+# Raw text elements: contents are text, never markup (script/style are handled by HTMLParser)
+_RAW_TEXT_TAGS = {"textarea"}
+
+# Attributes the prompts and selectors rely on
+_KEPT_ATTRS = {
+    "id", "name", "class", "type", "role", "for", "href", "src", "alt", "title",
+    "placeholder", "value", "action", "method", "label", "hidden", "style",
+    "required", "disabled", "readonly", "checked", "selected", "multiple", "open",
+    "contenteditable", "tabindex", "maxlength", "minlength", "pattern", "min", "max",
+    "step", "accept", "autocomplete", "target", "colspan", "rowspan", "draggable",
+    "onclick",
+}
+# Never truncated - selectors are built from these verbatim
+_STABLE_ATTRS = {"id", "name", "class", "for", "role"}
+_FRAMEWORK_DATA_PREFIXES = ("data-v-", "data-reactid", "data-react-", "data-ng-", "data-emotion")
+_HIDDEN_STYLE = re.compile(r"display\s*:\s*none|visibility\s*:\s*hidden", re.I)
+_WHITESPACE = re.compile(r"\s+")
+
+# Sibling runs made of these are never collapsed (choices the AI must see in full)
+_UNCOLLAPSIBLE_ROLES = {"option", "menuitem", "tab", "treeitem", "radio", "checkbox"}
+_UNCOLLAPSIBLE_CONTAINERS = {"select", "datalist", "optgroup", "nav"}
+_UNCOLLAPSIBLE_CONTAINER_ROLES = {"listbox", "menu", "menubar", "tablist", "tree", "navigation", "radiogroup"}
+# Hidden subtrees holding these are kept (closed dropdowns the mapper opens later)
+_CHOICE_TAGS = {"select", "datalist", "option", "optgroup"}
+_CHOICE_ROLES = _UNCOLLAPSIBLE_ROLES | _UNCOLLAPSIBLE_CONTAINER_ROLES
+# Rows holding these are actions the AI may need on any row (Edit / Delete buttons)
+_ACTION_ROLES = {"button", "link"}
+
+
+class DomComment(str):
+    """Comment node (kept only for markers written by the passes)"""
+
+
+class DomNode:
+    """Element node: tag, ordered (name, value) attrs, children (DomNode / str / DomComment)"""
+
+    __slots__ = ("tag", "attrs", "children", "parent")
+
+    def __init__(self, tag: Optional[str], attrs: List[Tuple[str, Optional[str]]], parent: "DomNode" = None):
+        self.tag = tag
+        self.attrs = list(attrs)
+        self.children: List = []
+        self.parent = parent
+
+    def get(self, name: str, default=None):
+        for key, value in self.attrs:
+            if key == name:
+                return value if value is not None else ""
+        return default
+
+    def elements(self):
+        return [c for c in self.children if isinstance(c, DomNode)]
+
+    def iter(self):
+        """Depth-first walk over this node and all descendant elements"""
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed(node.elements()))
+
+    def has_form_control(self) -> bool:
+        return any(n.tag in FORM_CONTROL_TAGS for n in self.iter())
+
+    def has_choices(self) -> bool:
+        return any(n.tag in _CHOICE_TAGS or n.get("role") in _CHOICE_ROLES for n in self.iter())
+
+    def has_action(self) -> bool:
+        return any(n.tag == "button" or (n.tag == "a" and n.get("href") is not None)
+                   or n.get("onclick") is not None or n.get("role") in _ACTION_ROLES
+                   for n in self.iter())
+
+
+class _TreeBuilder(HTMLParser):
+    # Newer HTMLParser versions parse textarea as RCDATA themselves (and decode its entities)
+    _PARSER_RAW_TEXT = set(getattr(HTMLParser, "RCDATA_CONTENT_ELEMENTS", ()))
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = DomNode(None, [])
+        self._stack = [self.root]
+        self._in_raw_text = False
+
+    def handle_starttag(self, tag, attrs):
+        node = DomNode(tag, attrs, self._stack[-1])
+        self._stack[-1].children.append(node)
+        if tag not in VOID_TAGS:
+            self._stack.append(node)
+        if tag in _RAW_TEXT_TAGS and tag not in self._PARSER_RAW_TEXT:
+            # Text up to </textarea> is content, not tags
+            self.set_cdata_mode(tag)
+            self._in_raw_text = True
+
+    def handle_startendtag(self, tag, attrs):
+        self._stack[-1].children.append(DomNode(tag, attrs, self._stack[-1]))
+
+    def handle_endtag(self, tag):
+        self._in_raw_text = False
+        for i in range(len(self._stack) - 1, 0, -1):
+            if self._stack[i].tag == tag:
+                del self._stack[i:]
+                return
+        # Stray end tag - ignore
+
+    def handle_data(self, data):
+        if self._in_raw_text:
+            data = unescape(data)  # CDATA mode skips charref decoding; textarea is RCDATA
+        self._stack[-1].children.append(data)
+
+    def handle_comment(self, data):
+        self._stack[-1].children.append(DomComment(data))
+
+
+def parse_dom(dom_html: str) -> DomNode:
+    builder = _TreeBuilder()
+    builder.feed(dom_html)
+    builder.close()
+    return builder.root
+
+
+def serialize_dom(root: DomNode) -> str:
+    out: List[str] = []
+
+    def write(node: DomNode, preserve_ws: bool):
+        for child in node.children:
+            if isinstance(child, DomComment):
+                out.append(f"<!--{child}-->")
+            elif isinstance(child, str):
+                text = child if preserve_ws else _WHITESPACE.sub(" ", child)
+                if text.strip() or preserve_ws:
+                    out.append(escape(text, quote=False))
+            else:
+                attrs = "".join(f' {k}="{escape(v)}"' if v is not None else f" {k}" for k, v in child.attrs)
+                out.append(f"<{child.tag}{attrs}>")
+                if child.tag in VOID_TAGS:
+                    continue
+                write(child, preserve_ws or child.tag in _PRESERVE_WHITESPACE_TAGS)
+                out.append(f"</{child.tag}>")
+
+    write(root, False)
+    return "".join(out)
+
+
+# ============================================================
+# PASSES
+# ============================================================
+
+DOM_PASSES: Dict[str, Callable[[DomNode], None]] = {}
+
+
+def dom_pass(name: str):
+    """Register a reduction pass (enable it by listing its name in DOM_REDUCER_PASSES)"""
+    def register(fn: Callable[[DomNode], None]):
+        DOM_PASSES[name] = fn
+        return fn
+    return register
+
+
+def _is_hidden(node: DomNode) -> bool:
+    if node.get("hidden") is not None or node.get("aria-hidden") == "true":
+        return True
+    return bool(_HIDDEN_STYLE.search(node.get("style") or ""))
+
+
+@dom_pass("strip_non_content")
+def strip_non_content(root: DomNode) -> None:
+    """Drop scripts, styles, comments, meta/link tags and SVG drawing instructions"""
+    for node in root.iter():
+        node.children = [c for c in node.children
+                         if not isinstance(c, DomComment)
+                         and not (isinstance(c, DomNode) and c.tag in _NON_CONTENT_TAGS)]
+        if node.tag == "svg":
+            node.children = [c for c in node.children if isinstance(c, DomNode) and c.tag == "title"]
+
+
+@dom_pass("prune_hidden_subtrees")
+def prune_hidden_subtrees(root: DomNode) -> None:
+    """
+    Empty hidden subtrees that hold no form controls (tooltips, offscreen templates).
+    The element itself stays so sibling positions don't shift; hidden sections with
+    fields (tabs, junction branches) and closed choice lists (role=listbox / option
+    menus, select / datalist contents) are left alone - the mapper opens them later.
+    """
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if node.tag in _CHOICE_TAGS:
+            continue  # Options are kept whole, hidden or not
+        if node.tag and node.children and _is_hidden(node) \
+                and not node.has_form_control() and not node.has_choices():
+            node.children = [DomComment(" hidden content omitted ")]
+            continue
+        stack.extend(node.elements())
+
+
+@dom_pass("prune_attributes")
+def prune_attributes(root: DomNode) -> None:
+    """
+    Keep selector/semantic attributes only; drop handler code, framework state, inline
+    styles. onclick stays as a bare flag - it marks clickable elements.
+    """
+    for node in root.iter():
+        if not node.tag:
+            continue
+        is_hidden_input = node.tag == "input" and (node.get("type") or "").lower() == "hidden"
+        kept = []
+        for name, value in node.attrs:
+            name = name.lower()
+            if name.startswith("data-"):
+                if name.startswith(_FRAMEWORK_DATA_PREFIXES) or len(value or "") > 64:
+                    continue
+            elif not (name in _KEPT_ATTRS or name.startswith("aria-")):
+                continue
+            if name == "onclick":
+                value = None
+            elif name == "style":
+                # Only visibility matters to the AI
+                if not _HIDDEN_STYLE.search(value or ""):
+                    continue
+                value = "display:none"
+            elif name == "value" and is_hidden_input:
+                continue  # CSRF tokens / serialized state
+            elif name in ("src", "href") and (value or "").startswith("data:"):
+                value = value[:30] + "…"
+            elif value and name not in _STABLE_ATTRS and len(value) > DOM_REDUCER_MAX_ATTR:
+                value = value[:DOM_REDUCER_MAX_ATTR] + "…"
+            kept.append((name, value))
+        node.attrs = kept
+
+
+def _row_signature(node: DomNode) -> Tuple[str, str]:
+    return node.tag, " ".join(sorted((node.get("class") or "").split()))
+
+
+def _collapsible_container(node: DomNode) -> bool:
+    return node.tag not in _UNCOLLAPSIBLE_CONTAINERS and node.get("role") not in _UNCOLLAPSIBLE_CONTAINER_ROLES
+
+
+@dom_pass("collapse_repeated_rows")
+def collapse_repeated_rows(root: DomNode) -> None:
+    """
+    Long runs of look-alike siblings (table rows, list items, cards) keep their first
+    DOM_REDUCER_MAX_REPEATED_ROWS entries plus a marker. Runs containing form fields,
+    choice roles (options, menu items, tabs) or per-row actions (buttons, links, onclick),
+    and runs followed by a sibling of the same tag (a totals row after the data rows -
+    dropping rows would shift its position), are kept whole.
+    """
+    limit = DOM_REDUCER_MAX_REPEATED_ROWS
+    if limit <= 0:
+        return
+    for node in root.iter():
+        if len(node.children) <= limit or not _collapsible_container(node):
+            continue
+        last_of_tag: Dict[str, int] = {}
+        for i, child in enumerate(node.children):
+            if isinstance(child, DomNode):
+                last_of_tag[child.tag] = i
+        new_children = []
+        run: List[DomNode] = []
+        run_sig = None
+        run_end = -1
+
+        def flush():
+            if len(run) > limit and last_of_tag[run[0].tag] == run_end and \
+                    not any(r.get("role") in _UNCOLLAPSIBLE_ROLES or r.has_form_control() or r.has_action()
+                            for r in run):
+                new_children.extend(run[:limit])
+                new_children.append(DomComment(f" {len(run) - limit} more similar <{run[0].tag}> omitted "))
+            else:
+                new_children.extend(run)
+
+        for i, child in enumerate(node.children):
+            if isinstance(child, DomNode):
+                sig = _row_signature(child)
+                if sig == run_sig:
+                    run.append(child)
+                    run_end = i
+                    continue
+                flush()
+                run, run_sig, run_end = [child], sig, i
+            elif isinstance(child, str) and not child.strip():
+                continue  # Whitespace between rows
+            else:
+                flush()
+                run, run_sig = [], None
+                new_children.append(child)
+        flush()
+        node.children = new_children
+
+
+@dom_pass("truncate_text")
+def truncate_text(root: DomNode) -> None:
+    """Cut long static text (articles, legal copy, JSON blobs rendered into the page)"""
+    limit = DOM_REDUCER_MAX_TEXT
+    for node in root.iter():
+        if node.tag in _PRESERVE_WHITESPACE_TAGS:
+            continue
+        node.children = [c[:limit] + "…" if type(c) is str and len(c) > limit else c for c in node.children]
+
+
+# ============================================================
+# ENTRY POINT
+# ============================================================
+
+def reduce_dom(dom_html: str, label: str = "", passes: Optional[List[str]] = None) -> str:
+    """
+    Reduce a captured DOM for use in an AI prompt. Logs before/after size per call.
+    Returns the input unchanged when disabled, not HTML, or if reduction fails.
+    """
+    if not DOM_REDUCER_ENABLED or not dom_html or dom_html.lstrip()[:1] in ("{", "["):
+        return dom_html
+
+    started = time.monotonic()
+    try:
+        root = parse_dom(dom_html)
+        for name in passes or DOM_REDUCER_PASSES:
+            dom_pass_fn = DOM_PASSES.get(name)
+            if dom_pass_fn is None:
+                logger.warning(f"[DomReducer] Unknown pass '{name}' - skipped")
+                continue
+            dom_pass_fn(root)
+        reduced = serialize_dom(root)
+    except Exception as e:
+        logger.warning(f"[DomReducer] {label or 'dom'}: reduction failed, using original DOM: {e}")
+        return dom_html
+
+    before, after = len(dom_html), len(reduced)
+    logger.info(
+        f"[DomReducer] {label or 'dom'}: {before:,} -> {after:,} chars "
+        f"(-{(1 - after / before) * 100:.0f}%) in {(time.monotonic() - started) * 1000:.0f}ms"
+    )
+    return reduced
@@ -18,6 +18,13 @@ from services.path_evaluation_service import (
     PathEvaluationService, JunctionsState, create_path_evaluation_service
 )
 from services.session_logger import SessionLogger, get_session_logger, ActivityType, LogCategory
+from services.mapper_session_view import MapperSessionView
+from services.mapper_step_log import all_step_log_keys
+from services.mapper_blob_store import (
+    MapperBlobStore, SLOT_DOM, SLOT_SCREENSHOT, SLOT_SCREENSHOT_BEFORE
+)
+from services.screenshot_profiles import attach_screenshot_profile
+from services.agent_task_queue import push_agent_task, pushed_queue_name, flush_agent_tasks
 
 logger = logging.getLogger(__name__)
 
@@ -29,8 +36,13 @@ _orchestrator_redis_pool = redis_lib.ConnectionPool(
     max_connections=50
 )
 
-# TTL for session-scoped Redis keys (DOM, screenshots) — matches session lifetime
-MAPPER_KEY_TTL = 7200  # 2 hours
+# Agent-wait deadlines: ZSET member=session_id, score=unix time the agent must answer by.
+# detect_stuck_mapper_sessions only looks at entries whose score has passed.
+AGENT_DEADLINES_KEY = "mapper_agent_deadlines"
+AGENT_RESPONSE_TIMEOUT = 180  # 3 min — crash detection
+
+# States after which no agent response is expected
+TERMINAL_STATES = ("completed", "failed", "cancelled", "system_issue")
 
 class MapperState(str, Enum):
     """States in the form mapper state machine"""
@@ -107,6 +119,10 @@ class FormMapperOrchestrator:
         self.max_retries = 3
         self.max_paths = 50
         self._session_loggers = {}
+        # Per-request session views (field-level cache over mapper_session:{id})
+        self._session_views: Dict[str, MapperSessionView] = {}
+        # DOM / screenshots: content-addressed compressed blobs, sessions hold references
+        self.blobs = MapperBlobStore(self.redis)
 
         # Cache TTL for company config (5 minutes)
         COMPANY_CONFIG_CACHE_TTL = 300
@@ -134,6 +150,9 @@ class FormMapperOrchestrator:
     def _bump_session_version(self, session_id: str) -> int:
         """Increment session version — invalidates any in-flight Celery task results."""
         new_version = self.redis.hincrby(self._get_session_key(session_id), "session_version", 1)
+        view = self._session_views.get(session_id)
+        if view is not None:
+            view.set_raw("session_version", str(new_version))
         logger.info(f"[Orchestrator] Session {session_id} version bumped to {new_version}")
         return new_version
 
@@ -393,7 +412,7 @@ class FormMapperOrchestrator:
             "test_case_description": test_case_description or "",
             "mapping_hints": mapping_hints,
             "state": MapperState.INITIALIZING.value, "previous_state": "",
-            "current_step_index": 0, "all_steps": "[]", "executed_steps": "[]",
+            "current_step_index": 0, "all_steps": "[]",
             "current_dom_hash": "", "current_path": 1,
             "junctions_state": "{}",
             "junction_instructions": "{}", "total_paths": 1,
@@ -403,10 +422,9 @@ class FormMapperOrchestrator:
             "critical_fields_checklist": "{}", "field_requirements_for_recovery": "",
             "user_provided_inputs": json.dumps(user_provided_inputs) if user_provided_inputs else "{}",
             "pending_alert_info": "{}", "pending_validation_errors": "{}",
-            "pending_new_steps": "[]",
             "junction_pending_step_result": "{}",
             "visual_verify_results": "[]", "visual_verify_total_wait_seconds": 0, "visual_verify_failed_fields": "[]",
-            "final_steps": "[]", "last_error": "",
+            "last_error": "",
             "upload_urls": json.dumps(
                 self._generate_upload_urls(company_id or 0, project_id or 0, session_id, "mapping", form_route_id or 0)),
             "created_at": datetime.utcnow().isoformat(), "updated_at": datetime.utcnow().isoformat(),
@@ -418,13 +436,15 @@ class FormMapperOrchestrator:
         key = self._get_session_key(session_id)
         self.redis.hset(key, mapping=session_state)
         self.redis.expire(key, 86400)
+        # executed/pending/final steps are Redis lists (mapper_step_log) - start empty
+        self.redis.delete(*all_step_log_keys(session_id))
         # Structured logging
         log = self._get_logger(session_id)
         log.session_created(network_id=network_id, form_route_id=form_route_id)
         logger.info(f"[Orchestrator] Created session {session_id} with network_id={network_id}, form_route_id={form_route_id}")
 
         if user_id:
-            self.redis.delete(f"agent:{user_id}")
+            flush_agent_tasks(self.redis, user_id, session_id)
             logger.info(f"[Orchestrator] Flushed agent queue for user {user_id}")
 
             # Cancel previous sessions in DB (async)
@@ -436,46 +456,29 @@ class FormMapperOrchestrator:
             def __init__(self, sid, state): self.id = sid; self.status = state
         return SessionResult(session_id, MapperState.INITIALIZING.value)
     
-    def get_session(self, session_id: str) -> Optional[Dict]:
-        data = self.redis.hgetall(self._get_session_key(session_id))
-        if not data:
+    def get_session(self, session_id: str) -> Optional[MapperSessionView]:
+        """
+        Lazy view over the session hash. Fields are fetched with HMGET on first access
+        and decoded once; the view is reused for the rest of this orchestrator request.
+        """
+        view = self._session_views.get(session_id)
+        if view is not None:
+            return view
+        view = MapperSessionView(self.redis, self._get_session_key(session_id), session_id)
+        if not view.exists():
             return None
-        decoded = {}
-        json_fields = ["all_steps", "executed_steps", "test_cases",
-                      "final_steps", "config", "test_context",
-                      "recovery_failure_history", "pending_new_steps"]
-        dict_fields = ["critical_fields_checklist", "pending_alert_info", "pending_validation_errors", "user_provided_inputs"]
-        int_fields = ["current_step_index", "current_path", "user_id", "company_id",
-                     "network_id", "form_route_id", "product_id", "consecutive_failures"]
-
-        bool_fields = ["in_recovery_mode", "pending_validation_error_recovery", "no_more_paths"]
-
-        for k, v in data.items():
-            ks = k.decode() if isinstance(k, bytes) else k
-            vs = v.decode() if isinstance(v, bytes) else v
-            if ks in json_fields:
-                try: decoded[ks] = json.loads(vs) if vs else []
-                except: decoded[ks] = []
-            elif ks in dict_fields:
-                try: decoded[ks] = json.loads(vs) if vs else {}
-                except: decoded[ks] = {}
-            elif ks in int_fields:
-                try: decoded[ks] = int(vs) if vs else 0
-                except: decoded[ks] = 0
-            elif ks in bool_fields:
-                decoded[ks] = vs.lower() == "true" if vs else False
-            else:
-                decoded[ks] = vs
-        return decoded
-    
+        self._session_views[session_id] = view
+        return view
+
     def update_session(self, session_id: str, updates: Dict) -> None:
-        serialized = {}
-        for k, v in updates.items():
-            if isinstance(v, (list, dict)): serialized[k] = json.dumps(v)
-            elif v is None: serialized[k] = ""
-            else: serialized[k] = str(v)
-        serialized["updated_at"] = datetime.utcnow().isoformat()
-        self.redis.hset(self._get_session_key(session_id), mapping=serialized)
+        view = self._session_views.get(session_id)
+        if view is None:
+            view = MapperSessionView(self.redis, self._get_session_key(session_id), session_id)
+        view.set(updates)
+
+    def _reset_session_views(self) -> None:
+        """Drop cached session views - called at request boundaries (lock acquire)."""
+        self._session_views = {}
 
     def _sync_session_status_to_db(self, session_id: str, status: str, error: str = None) -> None:
         """Queue async task to sync session status to database (scalable)"""
@@ -488,13 +491,17 @@ class FormMapperOrchestrator:
     def transition_to(self, session_id: str, new_state: MapperState, **kwargs) -> None:
         session = self.get_session(session_id)
         if session:
-            updates = {"previous_state": session.get("state", ""), "state": new_state.value}
+            # Read before updating - the session view reflects the update right away
+            prev_state = session.get("state", "")
+            updates = {"previous_state": prev_state, "state": new_state.value}
             updates.update(kwargs)
             self.update_session(session_id, updates)
-            logger.info(f"[Orchestrator] {session_id}: {session.get('state')} -> {new_state.value}")
+            if new_state.value in TERMINAL_STATES:
+                self.redis.zrem(AGENT_DEADLINES_KEY, session_id)
+            logger.info(f"[Orchestrator] {session_id}: {prev_state} -> {new_state.value}")
             # Structured logging
             log = self._get_logger(session_id)
-            log.state_transition(session.get("state", ""), new_state.value)
+            log.state_transition(prev_state, new_state.value)
     
     def _push_agent_task(self, session_id: str, task_type: str, payload: Dict) -> Dict:
         session = self.get_session(session_id)
@@ -509,12 +516,16 @@ class FormMapperOrchestrator:
             logger.error(f"[Orchestrator] No user_id for session {session_id}, cannot push task")
             return {"skipped": True, "reason": "no_user_id"}
 
+        payload = attach_screenshot_profile(task_type, payload)
         task = {"task_id": f"mapper_{session_id}_{task_type}_{int(time.time()*1000)}",
                 "task_type": task_type, "session_id": session_id, "payload": payload}
-        self.redis.lpush(f"agent:{user_id}", json.dumps(task))
-        self.redis.setex(f"mapper_agent_active:{session_id}", 180, "1")  # 3 min TTL — crash detection
-        self.redis.ltrim(f"agent:{user_id}", 0, 49)  # Cap queue at 50 tasks
-        logger.info(f"[Orchestrator] Pushed {task_type} to agent:{user_id}")
+        pipe = self.redis.pipeline()
+        # Main queue, or the session's subqueue when a multi-session agent worker is bound to it
+        push_agent_task(self.redis, user_id, task, pipe=pipe)
+        if task_type != "form_mapper_close":
+            pipe.zadd(AGENT_DEADLINES_KEY, {session_id: time.time() + AGENT_RESPONSE_TIMEOUT})
+        queue_name = pushed_queue_name(pipe.execute()[0])
+        logger.info(f"[Orchestrator] Pushed {task_type} to {queue_name}")
         # Structured logging
         log = self._get_logger(session_id)
         log.agent_task_pushed(task_type)
@@ -717,7 +728,7 @@ class FormMapperOrchestrator:
         if not dom_html: return self._fail_session(session_id, "No DOM returned")
 
         dom_str = json.dumps(dom_html) if isinstance(dom_html, dict) else str(dom_html)
-        self.redis.setex(f"mapper_dom:{session_id}", MAPPER_KEY_TTL, dom_str)
+        self.blobs.put(session_id, SLOT_DOM, dom_str)
         dom_hash = hashlib.md5(dom_str.encode()).hexdigest()[:16]
         self.update_session(session_id, {"current_dom_hash": dom_hash})
         config = session.get("config", {})
@@ -738,7 +749,7 @@ class FormMapperOrchestrator:
         if not session: return {"success": False, "error": "Session not found"}
 
         screenshot_base64 = result.get("screenshot_base64", "") if result.get("success") else ""
-        self.redis.setex(f"mapper_screenshot:{session_id}", MAPPER_KEY_TTL, screenshot_base64 or "")
+        self.blobs.put(session_id, SLOT_SCREENSHOT, screenshot_base64 or "")
 
         config = session.get("config", {})
 
@@ -932,7 +943,7 @@ class FormMapperOrchestrator:
             return {"success": True, "state": "dynamic_verify_getting_screenshot", "agent_task": task}
 
         # If junction step, capture "before" screenshot first (unless already captured from before failure/recovery)
-        if step.get("is_junction") and not self.redis.get(f"mapper_screenshot_before:{session_id}"):
+        if step.get("is_junction") and not self.blobs.has(session_id, SLOT_SCREENSHOT_BEFORE):
             logger.info(f"[Orchestrator] Junction step detected, capturing before screenshot")
             log = self._get_logger(session_id)
             log.debug("Junction step - capturing before screenshot", category="junction")
@@ -962,6 +973,18 @@ class FormMapperOrchestrator:
         if step.get("is_basic_auth") and session.get("mapping_type") == "login_mapping":
             step = self._inject_basic_auth_url(session_id, dict(step))
 
+        # Run of plain steps ahead - ship them together, agent stops at the first event
+        batch = self._collect_step_batch(session, all_steps, current_index)
+        if len(batch) > 1:
+            task = self._push_agent_task(session_id, "form_mapper_exec_steps", {
+                "steps": batch, "start_index": current_index, "total_steps": len(all_steps),
+                "current_dom_hash": session.get("current_dom_hash", "")})
+            logger.info(f"[Orchestrator] Steps {current_index + 1}-{current_index + len(batch)}/{len(all_steps)} (batch)")
+            log = self._get_logger(session_id)
+            log.update_context(current_step=current_index + 1, total_steps=len(all_steps))
+            log.step_executing(current_index + 1, step.get('action'), step.get('selector'))
+            return {"success": True, "agent_task": task}
+
         task = self._push_agent_task(session_id, "form_mapper_exec_step", {
             "step": step, "step_index": current_index, "total_steps": len(all_steps),
             "current_dom_hash": session.get("current_dom_hash", "")})
@@ -972,13 +995,82 @@ class FormMapperOrchestrator:
         log.step_executing(current_index + 1, step.get('action'), step.get('selector'))
         return {"success": True, "agent_task": task}
 
+    # Actions that need the server between steps (AI field-assist / verification checkpoints)
+    _BATCH_STOP_ACTIONS = ("verify", "fill_autocomplete", "slider", "range_slider")
+
+    def _is_batchable_step(self, step: Dict) -> bool:
+        return not (step.get("is_junction") or step.get("junction_info")
+                    or step.get("force_regenerate") or step.get("force_regenerate_verify")
+                    or step.get("is_totp") or step.get("is_basic_auth")
+                    or step.get("action") in self._BATCH_STOP_ACTIONS)
+
+    def _collect_step_batch(self, session, all_steps: List[Dict], current_index: int) -> List[Dict]:
+        """
+        Consecutive plain steps starting at current_index (up to config exec_batch_size,
+        default 10; 1 disables batching). Stops before the next junction, verify,
+        AI-assisted or credential-injected step.
+        """
+        if session.get("exec_batch_unsupported") == "True":
+            return []
+        config = session.get("config", {})
+        max_batch = int(config.get("exec_batch_size", 10) or 1) if isinstance(config, dict) else 10
+        batch = []
+        for step in all_steps[current_index:current_index + max_batch]:
+            if not self._is_batchable_step(step):
+                break
+            batch.append(step)
+        return batch
+
+    def handle_step_batch_result(self, session_id: str, result: Dict) -> Dict:
+        """
+        Fold the per-step results of a form_mapper_exec_steps batch in one locked transition.
+        Plain successes (no alert, DOM unchanged) are recorded directly; the first result
+        that needs a decision (failure, alert, DOM change) - or the last one - goes through
+        handle_step_result exactly like a single-step result.
+        """
+        session = self.get_session(session_id)
+        if not session: return {"success": False, "error": "Session not found"}
+        step_results = result.get("step_results") or []
+        if not step_results and "Unknown task type" in (result.get("error") or ""):
+            # Older agent without batch support - fall back to one step per task
+            logger.info(f"[Orchestrator] Agent does not support step batches, using single steps")
+            self.update_session(session_id, {"exec_batch_unsupported": True})
+            return self._execute_next_step(session_id)
+        if not step_results:
+            return self.handle_step_result(session_id, {**result, "success": False,
+                                                        "error": result.get("error") or "Empty step batch"})
+
+        all_steps = session.get("all_steps", [])
+        current_index = session.get("current_step_index", 0)
+        current_hash = session.get("current_dom_hash", "")
+        log = self._get_logger(session_id)
+
+        for n, step_result in enumerate(step_results):
+            step_result = {**step_result, "task_type": "form_mapper_exec_step"}
+            new_hash = step_result.get("new_dom_hash", "")
+            plain_success = (step_result.get("success")
+                             and not (step_result.get("alert_present") or step_result.get("alert_detected"))
+                             and not (new_hash and new_hash != current_hash)
+                             and current_index < len(all_steps))
+            if n == len(step_results) - 1 or not plain_success:
+                if n:
+                    self.update_session(session_id, {"current_step_index": current_index,
+                                                     "consecutive_failures": 0})
+                return self.handle_step_result(session_id, step_result)
+
+            step = all_steps[current_index]
+            session.append_step(self._clean_executed_step(step, step_result))
+            log.debug(f"!!!! Batch step {current_index + 1} PASSED: action={step.get('action')}, "
+                      f"selector={step.get('selector', '')}", category="debug_trace")
+            current_index += 1
+
     def handle_junction_before_screenshot_result(self, session_id: str, result: Dict) -> Dict:
         """Handle before screenshot capture for junction step, then execute the step"""
         session = self.get_session(session_id)
         if not session: return {"success": False, "error": "Session not found"}
 
         screenshot_base64 = result.get("screenshot_base64", "") if result.get("success") else ""
-        self.redis.setex(f"mapper_screenshot_before:{session_id}", MAPPER_KEY_TTL, screenshot_base64 or "")
+        self.blobs.put(session_id, SLOT_SCREENSHOT_BEFORE, screenshot_base64 or "")
 
         logger.info(f"[Orchestrator] Junction before screenshot captured, executing step")
         log = self._get_logger(session_id)
@@ -1004,8 +1096,7 @@ class FormMapperOrchestrator:
         if not session: return {"success": False, "error": "Session not found"}
 
         after_screenshot = result.get("screenshot_base64", "") if result.get("success") else ""
-        before_raw = self.redis.get(f"mapper_screenshot_before:{session_id}")
-        before_screenshot = before_raw.decode() if isinstance(before_raw, bytes) else (before_raw or "")
+        has_before = self.blobs.has(session_id, SLOT_SCREENSHOT_BEFORE)
 
         all_steps = session.get("all_steps", [])
         current_index = session.get("current_step_index", 0)
@@ -1014,10 +1105,10 @@ class FormMapperOrchestrator:
         logger.info(f"[Orchestrator] Junction after screenshot captured, triggering AI verification")
         log = self._get_logger(session_id)
         log.debug("Junction after screenshot captured - triggering AI verification", category="junction",
-                  has_before=bool(before_screenshot), has_after=bool(after_screenshot))
+                  has_before=has_before, has_after=bool(after_screenshot))
 
         # Trigger Celery task for AI verification
-        self.redis.setex(f"mapper_screenshot:{session_id}", MAPPER_KEY_TTL, after_screenshot or "")
+        self.blobs.put(session_id, SLOT_SCREENSHOT, after_screenshot or "")
 
         self.transition_to(session_id, MapperState.JUNCTION_VERIFYING)
         return {
@@ -1100,8 +1191,8 @@ class FormMapperOrchestrator:
         step = all_steps[current_index] if current_index < len(all_steps) else {}
 
         # Clear junction state so recovery step captures fresh before screenshot
-        if self.redis.get(f"mapper_screenshot_before:{session_id}"):
-            self.redis.delete(f"mapper_screenshot_before:{session_id}")
+        if self.blobs.has(session_id, SLOT_SCREENSHOT_BEFORE):
+            self.blobs.release(session_id, SLOT_SCREENSHOT_BEFORE)
             self.update_session(session_id, {"junction_pending_step_result": "{}"})
 
         # Verification failure handling
@@ -1113,10 +1204,8 @@ class FormMapperOrchestrator:
             else:
                 # Content mismatch - just skip
                 logger.info(f"[Orchestrator] Verification content mismatch, skipping")
-                executed_steps = session.get("executed_steps", [])
-                executed_steps.append(step)
-                self.update_session(session_id, {"executed_steps": executed_steps,
-                                                 "current_step_index": current_index + 1,
+                session.append_step(dict(step))
+                self.update_session(session_id, {"current_step_index": current_index + 1,
                                                  "consecutive_failures": 0})
                 return self._execute_next_step(session_id)
         
@@ -1183,17 +1272,16 @@ class FormMapperOrchestrator:
         if not screenshot_base64:
             return self._fail_session(session_id, "Failed to capture screenshot for recovery")
         
-        self.redis.setex(f"mapper_dom:{session_id}", MAPPER_KEY_TTL, str(dom_html))
+        self.blobs.put(session_id, SLOT_DOM, str(dom_html))
         all_steps = session.get("all_steps", [])
         current_index = session.get("current_step_index", 0)
         failed_step = all_steps[current_index] if current_index < len(all_steps) else {}
 
-        self.redis.setex(f"mapper_screenshot:{session_id}", MAPPER_KEY_TTL, screenshot_base64 or "")
+        self.blobs.put(session_id, SLOT_SCREENSHOT, screenshot_base64 or "")
         self.transition_to(session_id, MapperState.STEP_FAILED_AI_RECOVERY)
         return {"success": True, "trigger_celery": True, "celery_task": "analyze_failure_and_recover",
                 "celery_args": {
                     "session_id": session_id, "failed_step": failed_step,
-                    "executed_steps": session.get("executed_steps", []),
                     "test_cases": session.get("test_cases", []),
                     "test_context": session.get("test_context", {}),
                     "attempt_number": session.get("consecutive_failures", 1),
@@ -1243,10 +1331,8 @@ class FormMapperOrchestrator:
                 log = self._get_logger(session_id)
                 log.info("Recovery: skipping verify step (0 recovery steps)", category="recovery")
                 print(f"[Orchestrator] ℹ️ AI returned 0 recovery steps for verify - skipping and continuing")
-                executed_steps = session.get("executed_steps", [])
-                executed_steps.append(failed_step)
+                session.append_step(dict(failed_step))
                 self.update_session(session_id, {
-                    "executed_steps": executed_steps,
                     "current_step_index": current_index + 1,
                     "consecutive_failures": 0
                 })
@@ -1302,17 +1388,9 @@ class FormMapperOrchestrator:
     # STEP SUCCESS HANDLING
     # ============================================================
     
-    def _handle_step_success(self, session_id: str, result: Dict) -> Dict:
-        session = self.get_session(session_id)
-        if not session: return {"success": False, "error": "Session not found"}
-        all_steps = session.get("all_steps", [])
-        current_index = session.get("current_step_index", 0)
-        step = all_steps[current_index] if current_index < len(all_steps) else {}
-        
-        # Reset failures, add to executed
-        executed_steps = session.get("executed_steps", [])
-
-        # Clean step for storage: update selector if fallback used, remove full_xpath
+    @staticmethod
+    def _clean_executed_step(step: Dict, result: Dict) -> Dict:
+        """Step as stored in executed_steps: effective selector if a fallback was used, no full_xpath"""
         clean_step = step.copy()
         if result.get("used_full_xpath") and result.get("effective_selector"):
             clean_step["selector"] = result.get("effective_selector")
@@ -1326,22 +1404,29 @@ class FormMapperOrchestrator:
 
         if step.get("action") in ("slider", "range_slider") and result.get("value"):
             clean_step["value"] = result.get("value")
+        return clean_step
 
-        executed_steps.append(clean_step)
-        self.update_session(session_id, {"executed_steps": executed_steps, "consecutive_failures": 0})
+    def _handle_step_success(self, session_id: str, result: Dict) -> Dict:
+        session = self.get_session(session_id)
+        if not session: return {"success": False, "error": "Session not found"}
+        all_steps = session.get("all_steps", [])
+        current_index = session.get("current_step_index", 0)
+        step = all_steps[current_index] if current_index < len(all_steps) else {}
+        
+        # Reset failures, add to executed (append-only - no rewrite of the executed list)
+        session.append_step(self._clean_executed_step(step, result))
+        self.update_session(session_id, {"consecutive_failures": 0})
         
         # Check for alert
         if result.get("alert_present") or result.get("alert_detected"):
             # Clean up junction state if we were in junction flow
-            if self.redis.get(f"mapper_screenshot_before:{session_id}"):
-                self.redis.delete(f"mapper_screenshot_before:{session_id}")
+            if self.blobs.has(session_id, SLOT_SCREENSHOT_BEFORE):
+                self.blobs.release(session_id, SLOT_SCREENSHOT_BEFORE)
                 self.update_session(session_id, {"junction_pending_step_result": "{}"})
             return self._handle_alert(session_id, result)
 
         # Check for junction verification needed
-        junction_before_raw = self.redis.get(f"mapper_screenshot_before:{session_id}")
-        junction_before = junction_before_raw.decode() if isinstance(junction_before_raw, bytes) else (
-                    junction_before_raw or "")
+        junction_before = self.blobs.has(session_id, SLOT_SCREENSHOT_BEFORE)
         if step.get("is_junction") and junction_before:
             logger.info(f"[Orchestrator] Junction step completed, triggering visual verification")
             log = self._get_logger(session_id)
@@ -1383,10 +1468,7 @@ class FormMapperOrchestrator:
 
         # DOM didn't change - if step has junction_info, strip it (not a real junction)
         if step.get("is_junction") or step.get("junction_info"):
-            if executed_steps:
-                executed_steps[-1].pop("is_junction", None)
-                executed_steps[-1].pop("junction_info", None)
-                self.update_session(session_id, {"executed_steps": executed_steps})
+            self._strip_last_executed_junction(session)
 
         # Move to next step
         self.update_session(session_id, {"current_step_index": current_index + 1})
@@ -1409,13 +1491,11 @@ class FormMapperOrchestrator:
                     alert_type=alert_type, alert_text=alert_text[:100])
 
         # Add accept_alert to executed
-        executed_steps = session.get("executed_steps", [])
-        executed_steps.append({"step_number": len(executed_steps) + 1, "action": "accept_alert",
-                              "selector": "", "value": "",
-                              "description": f"Accept {alert_type}: {alert_text[:50]}..."})
-        self.update_session(session_id, {"executed_steps": executed_steps,
-                                         "pending_alert_info": {"alert_type": alert_type, "alert_text": alert_text}})
-        self.redis.setex(f"mapper_screenshot:{session_id}", MAPPER_KEY_TTL, alert_screenshot or "")
+        session.append_step({"step_number": session.step_count() + 1, "action": "accept_alert",
+                             "selector": "", "value": "",
+                             "description": f"Accept {alert_type}: {alert_text[:50]}..."})
+        self.update_session(session_id, {"pending_alert_info": {"alert_type": alert_type, "alert_text": alert_text}})
+        self.blobs.put(session_id, SLOT_SCREENSHOT, alert_screenshot or "")
         self.transition_to(session_id, MapperState.ALERT_EXTRACTING_DOM)
         task = self._push_agent_task(session_id, "form_mapper_extract_dom_for_alert",
                                     {"alert_type": alert_type, "alert_text": alert_text})
@@ -1427,22 +1507,21 @@ class FormMapperOrchestrator:
         if not result.get("success"):
             return self._fail_session(session_id, "Failed to extract DOM after alert")
         dom_html = result.get("dom_html", "")
-        self.redis.setex(f"mapper_dom:{session_id}", MAPPER_KEY_TTL, str(dom_html))
+        self.blobs.put(session_id, SLOT_DOM, str(dom_html))
         pending = session.get("pending_alert_info", {})
         alert_info = {"success": True, "alert_present": True,
                      "alert_type": pending.get("alert_type", "alert"),
                      "alert_text": pending.get("alert_text", "")}
 
         if result.get("screenshot_base64"):
-            self.redis.setex(f"mapper_screenshot:{session_id}", MAPPER_KEY_TTL, result.get("screenshot_base64"))
+            self.blobs.put(session_id, SLOT_SCREENSHOT, result.get("screenshot_base64"))
         self.transition_to(session_id, MapperState.ALERT_AI_RECOVERY)
         return {"success": True, "trigger_celery": True, "celery_task": "handle_alert_recovery",
                 "celery_args": {
                     "session_id": session_id, "alert_info": alert_info,
-                    "executed_steps": session.get("executed_steps", []),
                 "test_cases": session.get("test_cases", []),
                     "test_context": session.get("test_context", {}),
-                    "step_where_alert_appeared": len(session.get("executed_steps", [])),
+                    "step_where_alert_appeared": session.step_count(),
                     "include_accept_step": False, "gathered_error_info": None}}
     
     def handle_alert_recovery_result(self, session_id: str, result: Dict) -> Dict:
@@ -1469,8 +1548,6 @@ class FormMapperOrchestrator:
         
         #if not alert_steps:
         #    return self._fail_session(session_id, "AI returned no alert recovery steps")
-        
-        executed_steps = session.get("executed_steps", [])
 
         if scenario == "A":
             # Scenario A: simple alert, get fresh DOM and regenerate
@@ -1511,7 +1588,7 @@ class FormMapperOrchestrator:
                 # Structured logging
                 log = self._get_logger(session_id)
                 log.warning("Alert recovery: no form URL, using steps directly", category="recovery")
-                self.redis.delete(f"mapper_screenshot_before:{session_id}")
+                self.blobs.release(session_id, SLOT_SCREENSHOT_BEFORE)
                 self.update_session(session_id, {"all_steps": alert_steps, "executed_steps": [],
                                                  "current_step_index": 0,
                                                  "junction_pending_step_result": "{}"})
@@ -1581,7 +1658,7 @@ class FormMapperOrchestrator:
             return self._fail_session(session_id, f"Failed to navigate back: {result.get('error', '')}")
 
         # Clear old steps and pending_new_steps - we'll generate fresh with critical_fields_checklist
-        self.redis.delete(f"mapper_screenshot_before:{session_id}")
+        self.blobs.release(session_id, SLOT_SCREENSHOT_BEFORE)
         self.update_session(session_id, {"all_steps": [], "executed_steps": [],
                                          "current_step_index": 0, "pending_new_steps": [],
                                          "junction_pending_step_result": "{}"})
@@ -1669,11 +1746,7 @@ class FormMapperOrchestrator:
                           trigger_reason=trigger_reason)
                 # Strip is_junction from executed_steps when fields didn't change (for AI path evaluation)
                 if step.get("is_junction") or step.get("junction_info"):
-                    executed_steps = session.get("executed_steps", [])
-                    if executed_steps:
-                        executed_steps[-1].pop("is_junction", None)
-                        executed_steps[-1].pop("junction_info", None)
-                        self.update_session(session_id, {"executed_steps": executed_steps})
+                    self._strip_last_executed_junction(session)
                 # OLD METHOD commented out - AI path evaluation uses executed_steps directly
                 # if (step.get("is_junction") or step.get("junction_info")) and config.get("enable_junction_discovery", True):
                 #     from services.path_evaluation_service import JunctionsState, create_path_evaluation_service
@@ -1807,7 +1880,7 @@ class FormMapperOrchestrator:
             log = self._get_logger(session_id)
             log.warning("Screenshot failed, skipping UI verification", category="milestone")
             return self._trigger_regenerate_steps(session_id)
-        self.redis.setex(f"mapper_screenshot:{session_id}", MAPPER_KEY_TTL, screenshot_base64 or "")
+        self.blobs.put(session_id, SLOT_SCREENSHOT, screenshot_base64 or "")
         self.transition_to(session_id, MapperState.DOM_CHANGE_UI_VERIFICATION)
         test_context = session.get("test_context", {})
         return {"success": True, "trigger_celery": True, "celery_task": "verify_ui_visual",
@@ -1847,9 +1920,7 @@ class FormMapperOrchestrator:
         step = all_steps[current_index] if current_index < len(all_steps) else {}
 
         if step.get("force_regenerate_verify"):
-            ss_raw = self.redis.get(f"mapper_screenshot:{session_id}")
-            screenshot_base64 = ss_raw.decode() if isinstance(ss_raw, bytes) else (ss_raw or "")
-            if screenshot_base64:
+            if self.blobs.has(session_id, SLOT_SCREENSHOT):
                 logger.info(
                     f"[Orchestrator] force_regenerate_verify step - triggering visual page verification")
                 log = self._get_logger(session_id)
@@ -1864,14 +1935,12 @@ class FormMapperOrchestrator:
                 })
 
                 self.transition_to(session_id, MapperState.VISUAL_PAGE_VERIFYING)
-                executed_steps = session.get("executed_steps", [])
                 return {
                     "success": True,
                     "trigger_celery": True,
                     "celery_task": "verify_page_visual",
                     "celery_args": {
                         "session_id": session_id,
-                        "executed_steps": executed_steps,
                         "already_verified_fields": [],
                         "retry_count": 0,
                         "total_wait_seconds": 0
@@ -1891,7 +1960,7 @@ class FormMapperOrchestrator:
         # Store fresh DOM in Redis
         dom_html = result.get("dom_html", "")
         if dom_html:
-            self.redis.setex(f"mapper_dom:{session_id}", MAPPER_KEY_TTL, str(dom_html))
+            self.blobs.put(session_id, SLOT_DOM, str(dom_html))
             logger.info(f"[Orchestrator] Fresh DOM stored for regeneration: {len(dom_html)} chars")
 
         # Check if this is a verify regeneration
@@ -1913,7 +1982,6 @@ class FormMapperOrchestrator:
         return {"success": True, "trigger_celery": True, "celery_task": "regenerate_steps",
                 "celery_args": {
                     "session_id": session_id,
-                    "executed_steps": session.get("executed_steps", []),
                     "test_cases": session.get("test_cases", []),
                     "test_context": session.get("test_context", {}),
                     "critical_fields_checklist": session.get("critical_fields_checklist", {}),
@@ -1931,7 +1999,6 @@ class FormMapperOrchestrator:
         return {"success": True, "trigger_celery": True, "celery_task": "regenerate_verify_steps",
                 "celery_args": {
                     "session_id": session_id,
-                    "executed_steps": session.get("executed_steps", []),
                     "test_cases": session.get("test_cases", []),
                     "test_context": session.get("test_context", {})}}
 
@@ -2068,14 +2135,14 @@ class FormMapperOrchestrator:
         new_steps = result.get("new_steps", [])
         no_more_paths = result.get("no_more_paths", False)
 
+        # Append new steps after executed steps
+        executed_steps = session.get("executed_steps", [])
+
         # Number steps correctly
-        start_step = len(session.get("executed_steps", [])) + 1
+        start_step = len(executed_steps) + 1
         for i, step in enumerate(new_steps):
             step["step_number"] = start_step + i
 
-        # Append new steps after executed steps
-        executed_steps = session.get("executed_steps", [])
-
         self.update_session(session_id, {
             "all_steps": executed_steps + new_steps,
             "current_step_index": len(executed_steps),
@@ -2113,10 +2180,10 @@ class FormMapperOrchestrator:
 
         # Store fresh DOM in Redis
         if dom_html:
-            self.redis.setex(f"mapper_dom:{session_id}", MAPPER_KEY_TTL, str(dom_html))
+            self.blobs.put(session_id, SLOT_DOM, str(dom_html))
 
         if screenshot_base64:
-            self.redis.setex(f"mapper_screenshot:{session_id}", MAPPER_KEY_TTL, screenshot_base64)
+            self.blobs.put(session_id, SLOT_SCREENSHOT, screenshot_base64)
 
         self.transition_to(session_id, MapperState.VALIDATION_ERROR_RECOVERY)
         return {
@@ -2125,7 +2192,6 @@ class FormMapperOrchestrator:
             "celery_task": "handle_validation_error_recovery",
             "celery_args": {
                 "session_id": session_id,
-                "executed_steps": session.get("executed_steps", []),
                 "test_cases": session.get("test_cases", []),
                 "test_context": session.get("test_context", {})
             }
@@ -2159,16 +2225,15 @@ class FormMapperOrchestrator:
                    "error_messages": validation_errors.get("error_messages", [])}
 
         if screenshot_base64:
-            self.redis.setex(f"mapper_screenshot:{session_id}", MAPPER_KEY_TTL, screenshot_base64)
+            self.blobs.put(session_id, SLOT_SCREENSHOT, screenshot_base64)
 
         self.transition_to(session_id, MapperState.HANDLING_VALIDATION_ERROR)
         return {"success": True, "trigger_celery": True, "celery_task": "handle_alert_recovery",
                 "celery_args": {
                     "session_id": session_id, "alert_info": validation_info,
-                    "executed_steps": session.get("executed_steps", []),
                     "test_cases": session.get("test_cases", []),
                     "test_context": session.get("test_context", {}),
-                    "step_where_alert_appeared": len(session.get("executed_steps", [])),
+                    "step_where_alert_appeared": session.step_count(),
                     "include_accept_step": False, "gathered_error_info": gathered}}
 
     # ============================================================
@@ -2178,11 +2243,11 @@ class FormMapperOrchestrator:
     def _handle_path_complete(self, session_id: str) -> Dict:
         session = self.get_session(session_id)
         if not session: return {"success": False, "error": "Session not found"}
-        executed_steps = session.get("executed_steps", [])
-        logger.info(f"[Orchestrator] Path complete: {len(executed_steps)} steps")
+        executed_count = session.step_count()
+        logger.info(f"[Orchestrator] Path complete: {executed_count} steps")
         # Structured logging
         log = self._get_logger(session_id)
-        log.info(f"Path complete: {len(executed_steps)} steps", category="milestone", steps_count=len(executed_steps))
+        log.info(f"Path complete: {executed_count} steps", category="milestone", steps_count=executed_count)
         self.update_session(session_id, {"critical_fields_checklist": {},
                                          "field_requirements_for_recovery": ""})
         self.transition_to(session_id, MapperState.PATH_COMPLETE)
@@ -2304,7 +2369,6 @@ class FormMapperOrchestrator:
                         "celery_task": "save_mapping_result",
                         "celery_args": {
                             "session_id": session_id,
-                            "stages": executed_steps,
                             "path_junctions": path_junctions
                         }
                     }
@@ -2325,7 +2389,6 @@ class FormMapperOrchestrator:
                         "celery_task": "save_mapping_result",
                         "celery_args": {
                             "session_id": session_id,
-                            "stages": executed_steps,
                             "path_junctions": path_junctions
                         }
                     }
@@ -2371,7 +2434,7 @@ class FormMapperOrchestrator:
             self.transition_to(session_id, MapperState.SAVING_RESULT)
             path_junctions = self._extract_path_junctions_from_steps(executed_steps)
             return {"success": True, "trigger_celery": True, "celery_task": "save_mapping_result",
-                    "celery_args": {"session_id": session_id, "stages": executed_steps,
+                    "celery_args": {"session_id": session_id,
                                     "path_junctions": path_junctions}}
 
     def _load_junction_paths_from_db(self, db, form_page_route_id: int, config: Dict) -> List[Dict]:
@@ -2416,7 +2479,7 @@ class FormMapperOrchestrator:
             log.info("Path saved, starting next path", category="milestone")
             current_path = session.get("current_path", 1)
             # Reset for next path
-            self.redis.delete(f"mapper_screenshot_before:{session_id}")
+            self.blobs.release(session_id, SLOT_SCREENSHOT_BEFORE)
             self.update_session(session_id, {
                 "executed_steps": "[]",
                 "all_steps": "[]",
@@ -2426,7 +2489,7 @@ class FormMapperOrchestrator:
             # Start new AI analysis with junction instructions
             return self._restart_for_next_path(session_id)
 
-        final_stages = result.get("stages", session.get("executed_steps", []))
+        final_stages = result["stages"] if "stages" in result else session.get("executed_steps", [])
 
         # Login/logout mapping: save steps to Network (not FormMapResult)
         mapping_type = session.get("mapping_type", "form")
@@ -2490,8 +2553,8 @@ class FormMapperOrchestrator:
 
         all_steps = session.get("all_steps", [])
         current_index = session.get("current_step_index", 0)
-        step = all_steps[current_index] if current_index < len(all_steps) else {}
-        executed_steps = session.get("executed_steps", [])
+        # Local copy - flags stripped below must not leak into the cached all_steps
+        step = dict(all_steps[current_index]) if current_index < len(all_steps) else {}
 
         # If AI says not a junction, strip the flag
         if not is_junction:
@@ -2499,13 +2562,10 @@ class FormMapperOrchestrator:
             step.pop("is_junction", None)
             step.pop("junction_info", None)
             # Also strip from executed_steps if already added
-            if executed_steps:
-                executed_steps[-1].pop("is_junction", None)
-                executed_steps[-1].pop("junction_info", None)
-                self.update_session(session_id, {"executed_steps": executed_steps})
+            self._strip_last_executed_junction(session)
 
         # Clean up junction screenshots
-        self.redis.delete(f"mapper_screenshot_before:{session_id}")
+        self.blobs.release(session_id, SLOT_SCREENSHOT_BEFORE)
 
         # Restore pending step result and continue normal flow
         pending_result_json = session.get("junction_pending_step_result", "{}")
@@ -2737,12 +2797,11 @@ class FormMapperOrchestrator:
             return self._fail_session(session_id, "No screenshot in agent result")
 
         # Update session with fresh screenshot
-        self.redis.setex(f"mapper_screenshot:{session_id}", MAPPER_KEY_TTL, screenshot_base64 or "")
+        self.blobs.put(session_id, SLOT_SCREENSHOT, screenshot_base64 or "")
 
         # Retrieve retry state from Redis session (stateless)
         retry_count = session.get("visual_verify_retry_count", 0)
         total_wait_seconds = session.get("visual_verify_total_wait_seconds", 0)
-        executed_steps = session.get("executed_steps", [])
         already_verified = json.loads(session.get("visual_verify_results", "[]"))
 
         logger.info(
@@ -2760,7 +2819,6 @@ class FormMapperOrchestrator:
             "celery_task": "verify_page_visual",
             "celery_args": {
                 "session_id": session_id,
-                "executed_steps": executed_steps,
                 "already_verified_fields": already_verified,
                 "retry_count": retry_count,
                 "total_wait_seconds": total_wait_seconds
@@ -2794,7 +2852,7 @@ class FormMapperOrchestrator:
         log.debug("Dynamic verify screenshot captured - triggering AI verification", category="milestone")
 
         # Trigger Celery task for AI verification
-        self.redis.setex(f"mapper_screenshot:{session_id}", MAPPER_KEY_TTL, screenshot_base64 or "")
+        self.blobs.put(session_id, SLOT_SCREENSHOT, screenshot_base64 or "")
         self.transition_to(session_id, MapperState.DYNAMIC_VERIFY_VISUAL)
         return {
             "success": True,
@@ -2837,17 +2895,15 @@ class FormMapperOrchestrator:
             })
 
         # Add step to executed (whether passed or failed)
-        executed_steps = session.get("executed_steps", [])
         step_with_result = step.copy()
         step_with_result["verify_result"] = {
             "success": result.get("success", True),
             "reason": result.get("reason", "")
         }
-        executed_steps.append(step_with_result)
+        session.append_step(step_with_result)
 
         # Move to next step
         self.update_session(session_id, {
-            "executed_steps": executed_steps,
             "current_step_index": current_index + 1,
             "consecutive_failures": 0
         })
@@ -2941,7 +2997,7 @@ class FormMapperOrchestrator:
             self.transition_to(session_id, MapperState.SAVING_RESULT)
             path_junctions = self._extract_path_junctions_from_steps(executed_steps)
             return {"success": True, "trigger_celery": True, "celery_task": "save_mapping_result",
-                    "celery_args": {"session_id": session_id, "stages": executed_steps,
+                    "celery_args": {"session_id": session_id,
                                     "path_junctions": path_junctions, "continue_to_next_path": True}}
 
         # All paths complete - save final state
@@ -2951,7 +3007,7 @@ class FormMapperOrchestrator:
         self.transition_to(session_id, MapperState.SAVING_RESULT)
         path_junctions = self._extract_path_junctions_from_steps(executed_steps)
         return {"success": True, "trigger_celery": True, "celery_task": "save_mapping_result",
-                "celery_args": {"session_id": session_id, "stages": executed_steps,
+                "celery_args": {"session_id": session_id,
                                 "path_junctions": path_junctions}}
 
     def handle_continue_mapping_evaluation_result(self, session_id: str, result: Dict) -> Dict:
@@ -3063,16 +3119,15 @@ class FormMapperOrchestrator:
                 logger.error(f"[Orchestrator] Discovery chain missing task_id or user_id: {discovery_chain}")
                 return
 
-            # Push the pre-created discovery task to agent queue
-            redis_message = json.dumps({
+            # Push the pre-created discovery task to agent queue. session_id = the login
+            # session - a multi-session agent runs discovery in that session's browser
+            queue_name = push_agent_task(self.redis, user_id, {
                 'task_id': task_id,
                 'task_type': 'discover_form_pages',
                 'company_id': company_id,
-                'user_id': user_id
-            })
-            queue_name = f"agent:{user_id}"
-            self.redis.rpush(queue_name, redis_message)
-            self.redis.ltrim(queue_name, 0, 49)
+                'user_id': user_id,
+                'session_id': session_id
+            }, tail=True)
 
             logger.info(f"[Orchestrator] Login mapping complete → pushed discovery task {task_id} to {queue_name}")
         except Exception as e:
@@ -3311,7 +3366,7 @@ class FormMapperOrchestrator:
         if session:
             user_id = session.get("user_id")
             if user_id:
-                self.redis.delete(f"agent:{user_id}")
+                flush_agent_tasks(self.redis, user_id, session_id)
                 logger.info(f"[Orchestrator] Flushed agent queue for user {user_id}")
                 self._push_agent_task(session_id, "form_mapper_close", {
                     "log_message": "⏹️ Mapping cancelled",
@@ -3333,7 +3388,7 @@ class FormMapperOrchestrator:
                 "phase": self._get_phase_from_state(state),
                 "current_step": session.get("current_step_index", 0),
                 "total_steps": len(session.get("all_steps", [])),
-                "executed_steps": len(session.get("executed_steps", [])),
+                "executed_steps": session.step_count(),
                 "last_error": session.get("last_error", ""),
                 "created_at": session.get("created_at"),
                 "updated_at": session.get("updated_at"),
@@ -3346,6 +3401,14 @@ class FormMapperOrchestrator:
                       MapperState.CANCELLED.value, MapperState.SYSTEM_ISSUE.value]: return "finished"
         return "mapping"
 
+    def _strip_last_executed_junction(self, session: MapperSessionView) -> None:
+        """Drop junction flags from the most recent executed step (LSET, no list rewrite)."""
+        last = session.last_step()
+        if last and ("is_junction" in last or "junction_info" in last):
+            last.pop("is_junction", None)
+            last.pop("junction_info", None)
+            session.set_last_step(last)
+
     def _extract_path_junctions_from_steps(self, executed_steps: List[Dict]) -> List[Dict]:
         """
         Extract junction choices from executed steps to save in path_junctions.
@@ -3368,13 +3431,17 @@ class FormMapperOrchestrator:
     # MAIN ROUTERS
     # ============================================================
     
-    def process_agent_result(self, session_id: str, result: Dict) -> Dict:
-        """Main router for agent results — distributed lock prevents race conditions"""
-        lock_id = self._acquire_session_lock(session_id)
+    def process_agent_result(self, session_id: str, result: Dict, lock_retries: int = 20) -> Dict:
+        """
+        Main router for agent results — distributed lock prevents race conditions.
+        lock_retries=1 for callers that retry a busy session themselves (event consumers).
+        """
+        lock_id = self._acquire_session_lock(session_id, retries=lock_retries)
         if not lock_id:
             logger.error(f"[process_agent_result] Could not acquire lock for {session_id}")
-            return {"status": "error", "error": "Session busy, try again"}
+            return {"status": "error", "error": "Session busy, try again", "busy": True}
         try:
+            self._reset_session_views()
             return self._process_agent_result_locked(session_id, result)
         finally:
             self._release_session_lock(session_id, lock_id)
@@ -3393,12 +3460,16 @@ class FormMapperOrchestrator:
         # Structured logging
         log = self._get_logger(session_id)
         log.agent_result_received(task_type, result.get("success", False))
-        
+        # Agent answered - clear its deadline (re-armed if the handler pushes another task)
+        self.redis.zrem(AGENT_DEADLINES_KEY, session_id)
+
         if state == MapperState.EXTRACTING_INITIAL_DOM.value:
             return self.handle_initial_dom_result(session_id, result)
         elif state == MapperState.GETTING_INITIAL_SCREENSHOT.value:
             return self.handle_initial_screenshot_result(session_id, result)
         elif state == MapperState.EXECUTING_STEP.value:
+            if task_type == "form_mapper_exec_steps":
+                return self.handle_step_batch_result(session_id, result)
             return self.handle_step_result(session_id, result)
         elif state == MapperState.STEP_FAILED_EXTRACTING_DOM.value:
             return self.handle_step_failure_dom_result(session_id, result)
@@ -3429,13 +3500,14 @@ class FormMapperOrchestrator:
             logger.warning(f"[Orchestrator] Unhandled state {state} for task {task_type}")
             return {"status": "ok", "message": f"Unhandled: {state}/{task_type}"}
     
-    def process_celery_result(self, session_id: str, task_name: str, result: Dict) -> Dict:
+    def process_celery_result(self, session_id: str, task_name: str, result: Dict, lock_retries: int = 20) -> Dict:
         """Router for Celery task results — distributed lock prevents race conditions"""
-        lock_id = self._acquire_session_lock(session_id)
+        lock_id = self._acquire_session_lock(session_id, retries=lock_retries)
         if not lock_id:
             logger.error(f"[process_celery_result] Could not acquire lock for {session_id}, task={task_name}")
-            return {"status": "error", "error": "Session busy"}
+            return {"status": "error", "error": "Session busy", "busy": True}
         try:
+            self._reset_session_views()
             return self._process_celery_result_locked(session_id, task_name, result)
         finally:
             self._release_session_lock(session_id, lock_id)
@@ -3513,6 +3585,7 @@ class FormMapperOrchestrator:
         if not lock_id:
             return None  # Status endpoint will poll again shortly
         try:
+            self._reset_session_views()
             # Check runner phase completion (login/navigate)
             completion = self.check_runner_phase_complete(session_id)
             if completion:
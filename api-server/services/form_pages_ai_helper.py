@@ -5,7 +5,8 @@ import os
 import json
 import re
 from typing import List, Dict, Any, Optional
-from anthropic import Anthropic
+from services.ai_gateway import ai_gateway_client
+from services.dom_reducer import reduce_dom
 
 # Configuration
 MODEL = "claude-3-5-haiku-20241022"
@@ -37,7 +38,7 @@ class FormPagesAIHelper:
                 "or pass api_key parameter."
             )
         
-        self.client = Anthropic(api_key=self.api_key)
+        self.client = ai_gateway_client(self.api_key)
         self.model = MODEL
         
         # Cost tracking
@@ -189,6 +190,7 @@ class FormPagesAIHelper:
             List of login steps to execute
         """
         print(f"[FormPagesAIHelper] Generating login steps...")
+        page_html = reduce_dom(page_html, label="form_pages_login")
         
         system_prompt = """You are an expert at analyzing web applications and generating automation steps.
 Your task is to identify the login form fields and generate steps to log in."""
@@ -251,6 +253,7 @@ HTML:
             List of logout steps to execute
         """
         print(f"[FormPagesAIHelper] Generating logout steps...")
+        page_html = reduce_dom(page_html, label="form_pages_logout")
         
         system_prompt = """You are an expert at analyzing web applications and generating automation steps.
 Your task is to identify the logout button/link and generate steps to log out of the application."""
@@ -402,6 +405,7 @@ Form name:"""
             List of parent reference field dictionaries
         """
         print(f"[FormPagesAIHelper] Extracting parent reference fields for: {form_name}")
+        page_html = reduce_dom(page_html, label="form_pages_parent_fields")
 
         system_prompt = """You are an expert at analyzing web forms to identify parent reference fields.
 You MUST analyze BOTH the screenshot AND the HTML DOM thoroughly. Do not skip any potential parent field."""
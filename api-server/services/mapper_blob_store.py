@@ -0,0 +1,199 @@
+# mapper_blob_store.py
+# Content-addressed, compressed storage for mapper DOM snapshots and screenshots
+# SCALABLE: identical captures are stored once (across all sessions), compressed,
+# and sessions hold only a short hash reference per slot. Screenshots the agent
+# uploaded to S3 are stored as a reference and downloaded on first read.
+
+import base64
+import binascii
+import hashlib
+import logging
+import zlib
+from typing import Dict, Optional
+
+from services.screenshot_refs import is_object_ref, parse_object_ref, resolve_screenshot
+
+logger = logging.getLogger(__name__)
+
+# Same lifetime as the old mapper_dom / mapper_screenshot keys
+BLOB_TTL = 7200  # 2 hours
+
+# Per-session slots (what used to be separate mapper_dom / mapper_screenshot* keys)
+SLOT_DOM = "dom"
+SLOT_SCREENSHOT = "screenshot"
+SLOT_SCREENSHOT_BEFORE = "screenshot_before"
+SCREENSHOT_SLOTS = (SLOT_SCREENSHOT, SLOT_SCREENSHOT_BEFORE)
+
+# Payload header byte - how the original string was packed
+_CODEC_TEXT = b"t"      # zlib(utf-8 text)
+_CODEC_BASE64 = b"b"    # zlib(base64-decoded bytes), re-encoded on read
+_CODEC_OBJECT = b"o"    # objref marker - bytes live in S3, fetched on read
+
+# Drop one reference; delete the blob when nobody points at it any more.
+# Atomic so a concurrent put() from another session can't lose its blob.
+_RELEASE_SCRIPT = """
+redis.call('SREM', KEYS[2], ARGV[1])
+if redis.call('SCARD', KEYS[2]) == 0 then
+    redis.call('DEL', KEYS[1], KEYS[2])
+    return 1
+end
+return 0
+"""
+
+
+def blob_key(ref: str) -> str:
+    return f"mapper_blob:{ref}"
+
+
+def blob_refs_key(ref: str) -> str:
+    return f"mapper_blob_refs:{ref}"
+
+
+def blob_slots_key(session_id: str) -> str:
+    return f"mapper_blob_slots:{session_id}"
+
+
+def blob_ref(data: str) -> str:
+    if is_object_ref(data):
+        # Content hash of the uploaded bytes - re-uploads of the same capture share a blob
+        return "o" + parse_object_ref(data)[0]
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def _pack(data: str, slot: str) -> bytes:
+    if is_object_ref(data):
+        return _CODEC_OBJECT + data.encode()
+    if slot in SCREENSHOT_SLOTS:
+        try:
+            raw = base64.b64decode(data, validate=True)
+            # Only if it round-trips exactly (canonical padding, no data URL prefix)
+            if base64.b64encode(raw).decode() == data:
+                # PNG/JPEG is already compressed - cheapest level just strips base64 overhead
+                return _CODEC_BASE64 + zlib.compress(raw, 1)
+        except (binascii.Error, ValueError):
+            pass
+    return _CODEC_TEXT + zlib.compress(data.encode(), 6)
+
+
+def _unpack(payload: bytes) -> str:
+    codec, body = payload[:1], payload[1:]
+    if codec == _CODEC_OBJECT:
+        return resolve_screenshot(body.decode())
+    raw = zlib.decompress(body)
+    if codec == _CODEC_BASE64:
+        return base64.b64encode(raw).decode()
+    return raw.decode()
+
+
+class MapperBlobStore:
+    """
+    Session-scoped blob slots backed by a global content-addressed store.
+
+    Keys:
+        mapper_blob:{sha256}        compressed payload
+        mapper_blob_refs:{sha256}   set of "{session_id}:{slot}" holders (refcount)
+        mapper_blob_slots:{sid}     hash slot -> sha256 for one session
+
+    Requires a Redis client WITHOUT decode_responses (payloads are binary).
+    """
+
+    def __init__(self, redis_client):
+        self.redis = redis_client
+        self._release = redis_client.register_script(_RELEASE_SCRIPT)
+
+    # ---------------------------------------------------------------- writes
+
+    def put(self, session_id: str, slot: str, data: Optional[str]) -> Optional[str]:
+        """
+        Point a session slot at `data`. Empty data clears the slot.
+        Returns the blob reference (sha256) or None when cleared.
+        """
+        if not data:
+            self.release(session_id, slot)
+            return None
+
+        ref = blob_ref(data)
+        slots_key = blob_slots_key(session_id)
+        old_ref = self.ref(session_id, slot)
+        member = f"{session_id}:{slot}"
+
+        # Blob already stored (same DOM as last capture, or shared with another session)?
+        # Refresh TTL instead of recompressing; fall through if it vanished meanwhile.
+        stored = False
+        if self.redis.exists(blob_key(ref)):
+            pipe = self.redis.pipeline()
+            pipe.expire(blob_key(ref), BLOB_TTL)
+            pipe.sadd(blob_refs_key(ref), member)
+            pipe.expire(blob_refs_key(ref), BLOB_TTL)
+            stored = bool(pipe.execute()[0])
+
+        if not stored:
+            pipe = self.redis.pipeline()
+            pipe.set(blob_key(ref), _pack(data, slot), ex=BLOB_TTL, nx=True)
+            pipe.expire(blob_key(ref), BLOB_TTL)
+            pipe.sadd(blob_refs_key(ref), member)
+            pipe.expire(blob_refs_key(ref), BLOB_TTL)
+            pipe.execute()
+
+        pipe = self.redis.pipeline()
+        pipe.hset(slots_key, slot, ref)
+        pipe.expire(slots_key, BLOB_TTL)
+        pipe.execute()
+
+        if old_ref and old_ref != ref:
+            self._drop(old_ref, member)
+        return ref
+
+    def release(self, session_id: str, slot: str) -> None:
+        """Clear one session slot, freeing the blob if no other holder remains."""
+        old_ref = self.ref(session_id, slot)
+        if not old_ref:
+            return
+        self.redis.hdel(blob_slots_key(session_id), slot)
+        self._drop(old_ref, f"{session_id}:{slot}")
+
+    def release_session(self, session_id: str) -> None:
+        """Clear every slot of a session - used by cleanup tasks."""
+        for slot, ref in self.refs(session_id).items():
+            self._drop(ref, f"{session_id}:{slot}")
+        self.redis.delete(blob_slots_key(session_id))
+
+    def _drop(self, ref: str, member: str) -> None:
+        try:
+            self._release(keys=[blob_key(ref), blob_refs_key(ref)], args=[member])
+        except Exception as e:
+            # TTL reclaims the blob anyway
+            logger.warning(f"[BlobStore] Release failed for {ref[:12]}: {e}")
+
+    # ---------------------------------------------------------------- reads
+
+    def ref(self, session_id: str, slot: str) -> Optional[str]:
+        raw = self.redis.hget(blob_slots_key(session_id), slot)
+        if raw is None:
+            return None
+        return raw.decode() if isinstance(raw, bytes) else raw
+
+    def refs(self, session_id: str) -> Dict[str, str]:
+        raw = self.redis.hgetall(blob_slots_key(session_id)) or {}
+        return {(k.decode() if isinstance(k, bytes) else k): (v.decode() if isinstance(v, bytes) else v)
+                for k, v in raw.items()}
+
+    def has(self, session_id: str, slot: str) -> bool:
+        return bool(self.redis.hexists(blob_slots_key(session_id), slot))
+
+    def fetch(self, ref: Optional[str]) -> str:
+        """Resolve a blob reference to its original string ("" if missing/expired)."""
+        if not ref:
+            return ""
+        payload = self.redis.get(blob_key(ref))
+        if not payload:
+            return ""
+        try:
+            return _unpack(payload)
+        except Exception as e:
+            logger.error(f"[BlobStore] Corrupt blob {ref[:12]}: {e}")
+            return ""
+
+    def get(self, session_id: str, slot: str) -> str:
+        """Current content of a session slot ("" if empty)."""
+        return self.fetch(self.ref(session_id, slot))
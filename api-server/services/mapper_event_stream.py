@@ -0,0 +1,302 @@
+# mapper_event_stream.py
+# Partitioned event processing for the form mapper state machine
+# SCALABLE: agent and Celery results are appended to a Redis stream partition chosen by
+# hashing the session id; one consumer per partition applies them in order. Callers
+# return immediately instead of spinning on mapper_lock:{sid}.
+#
+# Enable with MAPPER_EVENT_MODE=stream and run the consumers:
+#   python -m services.mapper_event_stream --partitions 0-15
+
+import os
+import json
+import time
+import zlib
+import socket
+import logging
+import argparse
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import redis as redis_lib
+
+logger = logging.getLogger(__name__)
+
+# "lock" (default): process inline under mapper_lock:{sid}. "stream": enqueue + partition consumers.
+MAPPER_EVENT_MODE = os.getenv("MAPPER_EVENT_MODE", "lock")
+MAPPER_EVENT_PARTITIONS = int(os.getenv("MAPPER_EVENT_PARTITIONS", 16))
+EVENT_GROUP = "mapper_orchestrator"
+EVENT_STREAM_MAXLEN = 10000  # Per partition, approximate trim
+
+# Session lock held elsewhere: the event stays pending and is retried after this delay
+EVENT_BUSY_RETRY_SECONDS = float(os.getenv("MAPPER_EVENT_BUSY_RETRY_SECONDS", 0.5))
+# Pending entries idle this long (consumer crashed / renamed) are claimed by the partition's consumer
+EVENT_CLAIM_IDLE_MS = int(os.getenv("MAPPER_EVENT_CLAIM_IDLE_MS", 60000))
+EVENT_CLAIM_INTERVAL = 30
+
+EVENT_AGENT_RESULT = "agent_result"
+EVENT_CELERY_RESULT = "celery_result"
+
+_event_redis_pool = redis_lib.ConnectionPool(
+    host=os.getenv("REDIS_HOST", "redis"),
+    port=int(os.getenv("REDIS_PORT", 6379)),
+    db=0,
+    max_connections=50
+)
+
+
+def stream_mode_enabled() -> bool:
+    return MAPPER_EVENT_MODE == "stream"
+
+
+def partition_for(session_id: str) -> int:
+    """Stable session -> partition mapping (same session always lands on the same consumer)"""
+    return zlib.crc32(str(session_id).encode()) % MAPPER_EVENT_PARTITIONS
+
+
+def partition_stream_key(partition: int) -> str:
+    return f"mapper_events:p{partition}"
+
+
+def enqueue_event(session_id: str, event_type: str, name: str, result: Dict, redis_client=None) -> str:
+    """Append an orchestrator event to its session's partition. Returns the stream entry id."""
+    r = redis_client or redis_lib.Redis(connection_pool=_event_redis_pool)
+    entry_id = r.xadd(partition_stream_key(partition_for(session_id)), {
+        "session_id": str(session_id),
+        "event_type": event_type,
+        "name": name or "",
+        "result": json.dumps(result),
+    }, maxlen=EVENT_STREAM_MAXLEN, approximate=True)
+    return entry_id.decode() if isinstance(entry_id, bytes) else entry_id
+
+
+# ============================================================
+# CONSUMER
+# ============================================================
+
+class MapperEventConsumer:
+    """
+    Applies the events of one partition serially.
+    Each partition must be owned by exactly one consumer process (split partitions
+    across processes with --partitions, never overlap them).
+
+    An event whose session lock is held elsewhere stays pending (un-acked) and is retried
+    shortly; later events of that session queue up behind it, other sessions go on.
+    Entries left pending by a crashed or renamed consumer are claimed after
+    EVENT_CLAIM_IDLE_MS.
+    """
+
+    def __init__(self, partition: int, block_ms: int = 5000, batch: int = 10):
+        self.partition = partition
+        self.stream = partition_stream_key(partition)
+        self.consumer_name = f"{socket.gethostname()}-p{partition}"
+        self.block_ms = block_ms
+        self.batch = batch
+        self.redis = redis_lib.Redis(connection_pool=_event_redis_pool)
+        self._running = True
+        # session_id -> its pending entries in stream order (head is the busy one)
+        self._deferred: "OrderedDict[str, List[Tuple]]" = OrderedDict()
+        self._deferred_ids = set()
+        self._retry_at: Dict[str, float] = {}
+        self._last_claim = float("-inf")
+
+    def _ensure_group(self) -> None:
+        try:
+            self.redis.xgroup_create(self.stream, EVENT_GROUP, id="0", mkstream=True)
+        except redis_lib.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    def stop(self) -> None:
+        self._running = False
+
+    def run(self) -> None:
+        self._ensure_group()
+        logger.info(f"[MapperEvents] Consumer started for {self.stream}")
+        # Own pending entries first (read but never acked - crash/restart), then new ones
+        backlog, read_id = True, "0"
+        while self._running:
+            if not backlog:
+                self._retry_deferred()
+                if time.monotonic() - self._last_claim >= EVENT_CLAIM_INTERVAL:
+                    self._claim_stale()
+            block = self.block_ms if not self._deferred else int(EVENT_BUSY_RETRY_SECONDS * 1000)
+            try:
+                replies = self.redis.xreadgroup(EVENT_GROUP, self.consumer_name, {self.stream: read_id},
+                                                count=self.batch, block=None if backlog else block)
+            except redis_lib.RedisError as e:
+                logger.error(f"[MapperEvents] Read failed on {self.stream}: {e}")
+                time.sleep(1)
+                continue
+
+            entries = replies[0][1] if replies else []
+            if backlog:
+                if not entries:
+                    backlog, read_id = False, ">"  # Backlog drained, switch to new entries
+                    continue
+                read_id = entries[-1][0]  # Deferred entries stay pending - read past them
+
+            for entry_id, fields in entries:
+                self._handle(entry_id, fields)
+
+    def _handle(self, entry_id, fields: Optional[Dict]) -> None:
+        if fields is None:  # Claimed entry that was deleted meanwhile
+            self._ack(entry_id)
+            return
+        data = _decode_fields(fields)
+        session_id = data.get("session_id", "")
+        if session_id in self._deferred:
+            self._defer(session_id, entry_id, data)  # Keep the session's order
+            return
+        if self._apply(entry_id, data):
+            self._ack(entry_id)
+        else:
+            self._defer(session_id, entry_id, data)
+
+    def _defer(self, session_id: str, entry_id, data: Dict) -> None:
+        if session_id not in self._deferred:
+            logger.info(f"[MapperEvents] Session {session_id} busy - {data.get('event_type')} retried shortly")
+            self._retry_at[session_id] = time.monotonic() + EVENT_BUSY_RETRY_SECONDS
+        self._deferred.setdefault(session_id, []).append((entry_id, data))
+        self._deferred_ids.add(entry_id)
+
+    def _retry_deferred(self) -> None:
+        now = time.monotonic()
+        for session_id in [sid for sid, at in self._retry_at.items() if at <= now]:
+            entries = self._deferred[session_id]
+            while entries:
+                entry_id, data = entries[0]
+                if not self._apply(entry_id, data):
+                    self._retry_at[session_id] = time.monotonic() + EVENT_BUSY_RETRY_SECONDS
+                    break
+                entries.pop(0)
+                self._deferred_ids.discard(entry_id)
+                self._ack(entry_id)
+            if not entries:
+                del self._deferred[session_id]
+                del self._retry_at[session_id]
+
+    def _claim_stale(self) -> None:
+        """Take over entries another (crashed / renamed) consumer read but never acked"""
+        self._last_claim = time.monotonic()
+        start = "0-0"
+        try:
+            while True:
+                reply = self.redis.xautoclaim(self.stream, EVENT_GROUP, self.consumer_name,
+                                              min_idle_time=EVENT_CLAIM_IDLE_MS, start_id=start, count=self.batch)
+                start, claimed = reply[0], reply[1]
+                claimed = [(entry_id, fields) for entry_id, fields in claimed if entry_id not in self._deferred_ids]
+                if claimed:
+                    logger.warning(f"[MapperEvents] Claimed {len(claimed)} stale pending entries on {self.stream}")
+                for entry_id, fields in claimed:
+                    self._handle(entry_id, fields)
+                if start in (b"0-0", "0-0"):
+                    break
+        except redis_lib.RedisError as e:
+            logger.error(f"[MapperEvents] Claiming stale entries on {self.stream} failed: {e}")
+
+    def _ack(self, entry_id) -> None:
+        # Events are single-use and can carry screenshots - drop them once applied
+        pipe = self.redis.pipeline()
+        pipe.xack(self.stream, EVENT_GROUP, entry_id)
+        pipe.xdel(self.stream, entry_id)
+        pipe.execute()
+
+    def _apply(self, entry_id, data: Dict) -> bool:
+        """Run one event. False when its session is busy (leave it pending, retry later)."""
+        session_id = data.get("session_id", "")
+        event_type = data.get("event_type", "")
+        name = data.get("name", "")
+        try:
+            result = json.loads(data.get("result") or "{}")
+        except ValueError:
+            result = {}
+        try:
+            response = apply_event(session_id, event_type, name, result)
+            return not response.get("busy")
+        except Exception as e:
+            # Never block the partition on one bad event - fail that session instead
+            logger.error(f"[MapperEvents] {event_type}/{name} for session {session_id} crashed: {e}", exc_info=True)
+            try:
+                from tasks.form_mapper_tasks import sync_mapper_session_status
+                sync_mapper_session_status.delay(session_id, "failed", f"Orchestrator error: {e}")
+            except Exception:
+                pass
+            return True
+
+
+def _decode_fields(fields: Dict) -> Dict:
+    return {(k.decode() if isinstance(k, bytes) else k): (v.decode() if isinstance(v, bytes) else v)
+            for k, v in fields.items()}
+
+
+def apply_event(session_id: str, event_type: str, name: str, result: Dict) -> Dict:
+    """
+    Run one event through the orchestrator and dispatch whatever it asks for next.
+    Events of a session are applied by a single consumer; the session lock taken by
+    process_*_result only guards the remaining non-event writers, so it is tried once -
+    a held lock returns {"busy": True} without spinning and the consumer retries later.
+    """
+    from models.database import SessionLocal
+    from services.form_mapper_orchestrator import FormMapperOrchestrator
+    from tasks.form_mapper_tasks import _trigger_celery_task
+
+    db = SessionLocal()
+    try:
+        orchestrator = FormMapperOrchestrator(redis_lib.Redis(connection_pool=_event_redis_pool), db)
+        if event_type == EVENT_AGENT_RESULT:
+            response = orchestrator.process_agent_result(session_id, result, lock_retries=1)
+        elif event_type == EVENT_CELERY_RESULT:
+            response = orchestrator.process_celery_result(session_id, name, result, lock_retries=1)
+        else:
+            logger.warning(f"[MapperEvents] Unknown event type {event_type} for session {session_id}")
+            return {"status": "error", "error": f"Unknown event type {event_type}"}
+
+        if response.get("busy"):
+            return response
+        if response.get("trigger_celery") and response.get("celery_task"):
+            _trigger_celery_task(response.get("celery_task"), response.get("celery_args", {}),
+                                 response.get("celery_countdown"))
+            logger.info(f"[MapperEvents] Triggered Celery task: {response.get('celery_task')}")
+        return response
+    finally:
+        db.close()
+
+
+def _parse_partitions(spec: str) -> List[int]:
+    if spec == "all":
+        return list(range(MAPPER_EVENT_PARTITIONS))
+    partitions = []
+    for part in spec.split(","):
+        if "-" in part:
+            start, end = part.split("-")
+            partitions.extend(range(int(start), int(end) + 1))
+        elif part:
+            partitions.append(int(part))
+    return partitions
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Form mapper partition event consumers")
+    parser.add_argument("--partitions", default="all",
+                        help="Partitions owned by this process, e.g. 'all', '0-7', '3,5'")
+    args = parser.parse_args(argv)
+
+    from utils.logging_config import configure_logging
+    configure_logging()
+
+    consumers = [MapperEventConsumer(p) for p in _parse_partitions(args.partitions)]
+    threads = [threading.Thread(target=c.run, name=f"mapper-events-p{c.partition}", daemon=True)
+               for c in consumers]
+    for t in threads:
+        t.start()
+    try:
+        while any(t.is_alive() for t in threads):
+            time.sleep(1)
+    except KeyboardInterrupt:
+        for c in consumers:
+            c.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+# mapper_session_view.py
+# Lazy, field-level access to the mapper_session:{id} Redis hash
+# SCALABLE: HMGET only the fields a handler touches, decode JSON once per request,
+# write back only fields whose serialized value actually changed
+
+import copy
+import json
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional
+
+from services.mapper_step_log import MapperStepLog, STEP_LOG_KEYS
+
+logger = logging.getLogger(__name__)
+
+
+# Field typing - must stay in sync with the session_state built in FormMapperOrchestrator.create_session
+JSON_LIST_FIELDS = ("all_steps", "executed_steps", "test_cases",
+                    "final_steps", "config", "test_context",
+                    "recovery_failure_history", "pending_new_steps")
+JSON_DICT_FIELDS = ("critical_fields_checklist", "pending_alert_info", "pending_validation_errors",
+                    "user_provided_inputs")
+INT_FIELDS = ("current_step_index", "current_path", "user_id", "company_id",
+              "network_id", "form_route_id", "product_id", "consecutive_failures")
+BOOL_FIELDS = ("in_recovery_mode", "pending_validation_error_recovery", "no_more_paths")
+
+# Small fields fetched together in one HMGET the first time a view is touched.
+# Large JSON blobs (steps, config, test_context, ...) are only fetched when read.
+SCALAR_FIELDS = (
+    "session_id", "state", "previous_state", "session_version",
+    "user_id", "company_id", "company_name", "product_id", "network_id", "project_id",
+    "form_route_id", "form_page_url", "form_name", "test_page_route_id", "test_scenario_id",
+    "mapping_type", "mapping_hints", "test_case_description", "single_path_mode",
+    "current_step_index", "current_path", "total_paths", "current_dom_hash",
+    "consecutive_failures", "in_recovery_mode", "in_verify_mode", "in_verify_recovery_mode",
+    "pending_validation_error_recovery", "no_more_paths",
+    "regenerate_retry_count", "regenerate_retry_message",
+    "visual_verify_retry_count", "visual_verify_total_wait_seconds",
+    "field_requirements_for_recovery", "base_url", "last_error",
+    "created_at", "updated_at", "completed_at",
+)
+
+# Sentinel for "field fetched but not present in the hash"
+_MISSING = object()
+
+
+def decode_field(field: str, raw: str) -> Any:
+    """Decode one raw hash value using the session field typing rules."""
+    if field in JSON_LIST_FIELDS:
+        try: return json.loads(raw) if raw else []
+        except: return []
+    if field in JSON_DICT_FIELDS:
+        try: return json.loads(raw) if raw else {}
+        except: return {}
+    if field in INT_FIELDS:
+        try: return int(raw) if raw else 0
+        except: return 0
+    if field in BOOL_FIELDS:
+        return raw.lower() == "true" if raw else False
+    return raw
+
+
+def encode_value(value: Any) -> str:
+    """Serialize a Python value the way it is stored in the session hash."""
+    if isinstance(value, (list, dict)): return json.dumps(value)
+    if value is None: return ""
+    return str(value)
+
+
+def _copied(value: Any) -> Any:
+    """Deep copy of mutable decoded values (scalars are returned as-is)."""
+    return copy.deepcopy(value) if isinstance(value, (list, dict)) else value
+
+
+class MapperSessionView:
+    """
+    Dict-like view over mapper_session:{id}.
+
+    Fields are fetched on first access (scalars in one batched HMGET, JSON blobs
+    individually), decoded once and cached for the lifetime of the view.
+    set() writes only fields whose serialized value differs from what is cached.
+
+    Step sequences (executed_steps, pending_new_steps, final_steps) live in their
+    own Redis lists (see mapper_step_log). get()/set() on them read or replace the
+    whole list; hot paths use append_step()/set_last_step()/step_count() instead.
+
+    The cache is private: get() hands out a deep copy of list/dict values and set()
+    caches a copy of what it is given, so mutating a returned value never changes
+    the view - write it back with set().
+    """
+
+    def __init__(self, redis_client, session_key: str, session_id: str = None):
+        self.redis = redis_client
+        self.key = session_key
+        self._raw: Dict[str, Any] = {}       # field -> str | _MISSING
+        self._decoded: Dict[str, Any] = {}   # field -> decoded value
+        self._scalars_loaded = False
+        self._step_logs: Dict[str, MapperStepLog] = {}
+        if session_id is not None:
+            self._step_logs = {field: MapperStepLog(redis_client, session_id, field) for field in STEP_LOG_KEYS}
+
+    # ---------------------------------------------------------------- loading
+
+    def load(self, *fields: str) -> "MapperSessionView":
+        """Fetch any of the given fields not already cached, in one HMGET."""
+        wanted = [f for f in fields if f not in self._raw]
+        if not wanted:
+            return self
+        values = self.redis.hmget(self.key, wanted)
+        for field, value in zip(wanted, values):
+            if value is None:
+                self._raw[field] = _MISSING
+            else:
+                self._raw[field] = value.decode() if isinstance(value, bytes) else value
+        return self
+
+    def _ensure_scalars(self) -> None:
+        if not self._scalars_loaded:
+            self.load(*SCALAR_FIELDS)
+            self._scalars_loaded = True
+
+    def exists(self) -> bool:
+        """True if the session hash exists (every session has a state field)."""
+        self._ensure_scalars()
+        return self._raw.get("state", _MISSING) is not _MISSING
+
+    def __bool__(self) -> bool:
+        return self.exists()
+
+    # ---------------------------------------------------------------- reading
+
+    def get(self, field: str, default: Any = None) -> Any:
+        if field in self._decoded:
+            return _copied(self._decoded[field])
+        if field in self._step_logs:
+            steps = self._step_logs[field].all()
+            self._decoded[field] = steps
+            return _copied(steps)
+        if field not in self._raw:
+            if field in SCALAR_FIELDS:
+                self._ensure_scalars()
+            if field not in self._raw:
+                self.load(field)
+        raw = self._raw[field]
+        if raw is _MISSING:
+            return default
+        value = decode_field(field, raw)
+        self._decoded[field] = value
+        return _copied(value)
+
+    def __getitem__(self, field: str) -> Any:
+        value = self.get(field, _MISSING)
+        if value is _MISSING:
+            raise KeyError(field)
+        return value
+
+    def __contains__(self, field: str) -> bool:
+        return self.get(field, _MISSING) is not _MISSING
+
+    # ---------------------------------------------------------------- writing
+
+    def set(self, updates: Dict[str, Any]) -> Dict[str, str]:
+        """
+        Write updates to Redis, skipping fields whose serialized value is unchanged.
+        Returns the mapping that was actually written.
+        """
+        changed = {}
+        for field, value in updates.items():
+            if field in self._step_logs:
+                self._replace_steps(field, value)
+                continue
+            serialized = encode_value(value)
+            if self._raw.get(field, _MISSING) != serialized:
+                changed[field] = serialized
+                self._raw[field] = serialized
+            # Keep a copy of the caller's object as the decoded value - no re-decode on next read
+            if isinstance(value, (list, dict)) and (field in JSON_LIST_FIELDS or field in JSON_DICT_FIELDS):
+                self._decoded[field] = copy.deepcopy(value)
+            else:
+                self._decoded.pop(field, None)
+        if changed:
+            changed["updated_at"] = datetime.utcnow().isoformat()
+            self._raw["updated_at"] = changed["updated_at"]
+            self._decoded.pop("updated_at", None)
+            self.redis.hset(self.key, mapping=changed)
+        return changed
+
+    # ---------------------------------------------------------------- step lists
+
+    def _replace_steps(self, field: str, value: Any) -> None:
+        if isinstance(value, str):
+            value = decode_field(field, value)
+        steps = copy.deepcopy(list(value or []))
+        self._step_logs[field].replace(steps)
+        self._decoded[field] = steps
+
+    def step_log(self, field: str = "executed_steps") -> MapperStepLog:
+        return self._step_logs[field]
+
+    def append_step(self, step: Dict, field: str = "executed_steps") -> int:
+        """RPUSH one step; keeps the cached list (if loaded) in sync. Returns new length."""
+        new_length = self._step_logs[field].append(step)
+        cached = self._decoded.get(field)
+        if cached is not None:
+            cached.append(copy.deepcopy(step))
+        return new_length
+
+    def set_last_step(self, step: Dict, field: str = "executed_steps") -> None:
+        """Overwrite the most recent step (LSET -1)."""
+        self._step_logs[field].set_last(step)
+        cached = self._decoded.get(field)
+        if cached:
+            cached[-1] = copy.deepcopy(step)
+
+    def last_step(self, field: str = "executed_steps") -> Optional[Dict]:
+        cached = self._decoded.get(field)
+        if cached is not None:
+            return copy.deepcopy(cached[-1]) if cached else None
+        return self._step_logs[field].last()
+
+    def step_count(self, field: str = "executed_steps") -> int:
+        cached = self._decoded.get(field)
+        if cached is not None:
+            return len(cached)
+        return self._step_logs[field].length()
+
+    def set_raw(self, field: str, raw: Optional[str]) -> None:
+        """Record a value written to Redis outside of set() (e.g. HINCRBY)."""
+        self._raw[field] = _MISSING if raw is None else raw
+        self._decoded.pop(field, None)
+
+    def to_dict(self, fields: Iterable[str] = None) -> Dict[str, Any]:
+        """Decoded snapshot of the given fields (defaults to the scalar set)."""
+        fields = tuple(fields) if fields is not None else SCALAR_FIELDS
+        self.load(*fields)
+        return {f: self.get(f) for f in fields if self._raw.get(f, _MISSING) is not _MISSING}
@@ -0,0 +1,128 @@
+# mapper_step_log.py
+# Append-only Redis list storage for mapper step sequences (executed / pending / final)
+# SCALABLE: RPUSH one step per agent result instead of rewriting the whole JSON array,
+# consumers LRANGE only the slice they need
+
+import os
+import json
+import logging
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Same lifetime as the mapper_session:{id} hash
+STEP_LOG_TTL = 86400
+# Most recent executed steps an AI prompt gets (bounds LRANGE + prompt size on very long runs)
+STEP_LOG_PROMPT_WINDOW = int(os.getenv("MAPPER_STEP_LOG_PROMPT_WINDOW", 200))
+
+# Session field name -> Redis list key prefix
+STEP_LOG_KEYS = {
+    "executed_steps": "mapper_steps_executed",
+    "pending_new_steps": "mapper_steps_pending",
+    "final_steps": "mapper_steps_final",
+}
+
+
+def step_log_key(field: str, session_id: str) -> str:
+    return f"{STEP_LOG_KEYS[field]}:{session_id}"
+
+
+def all_step_log_keys(session_id: str) -> List[str]:
+    """Every step list key for a session - used by cleanup tasks."""
+    return [step_log_key(field, session_id) for field in STEP_LOG_KEYS]
+
+
+class MapperStepLog:
+    """
+    One step sequence of a mapper session, stored as a Redis list of JSON steps.
+
+    Indices follow Redis list semantics (negative indices count from the end).
+    """
+
+    def __init__(self, redis_client, session_id: str, field: str = "executed_steps"):
+        self.redis = redis_client
+        self.session_id = session_id
+        self.field = field
+        self.key = step_log_key(field, session_id)
+
+    @staticmethod
+    def _decode(raw) -> Dict:
+        if isinstance(raw, bytes):
+            raw = raw.decode()
+        try:
+            return json.loads(raw) if raw else {}
+        except Exception:
+            return {}
+
+    # ---------------------------------------------------------------- reads
+
+    def length(self) -> int:
+        return int(self.redis.llen(self.key) or 0)
+
+    def range(self, start: int = 0, end: int = -1) -> List[Dict]:
+        """Steps in [start, end] inclusive (LRANGE semantics)."""
+        return [self._decode(raw) for raw in self.redis.lrange(self.key, start, end)]
+
+    def all(self) -> List[Dict]:
+        return self.range(0, -1)
+
+    def tail(self, count: int) -> List[Dict]:
+        """Last `count` steps, oldest first."""
+        if count <= 0:
+            return []
+        return self.range(-count, -1)
+
+    def last(self) -> Optional[Dict]:
+        raw = self.redis.lindex(self.key, -1)
+        return self._decode(raw) if raw is not None else None
+
+    # ---------------------------------------------------------------- writes
+
+    def append(self, step: Dict) -> int:
+        """RPUSH one step. Returns the new length."""
+        return self.extend([step])
+
+    def extend(self, steps: List[Dict]) -> int:
+        if not steps:
+            return self.length()
+        pipe = self.redis.pipeline()
+        pipe.rpush(self.key, *[json.dumps(s) for s in steps])
+        pipe.expire(self.key, STEP_LOG_TTL)
+        new_length, _ = pipe.execute()
+        return int(new_length)
+
+    def set_last(self, step: Dict) -> None:
+        """Overwrite the most recent step in place (LSET -1)."""
+        try:
+            self.redis.lset(self.key, -1, json.dumps(step))
+        except Exception as e:
+            # LSET on a missing/empty list raises - nothing to overwrite
+            logger.debug(f"[StepLog] set_last skipped for {self.key}: {e}")
+
+    def truncate(self, count: int) -> None:
+        """Keep only the first `count` steps (LTRIM)."""
+        if count <= 0:
+            self.clear()
+        else:
+            self.redis.ltrim(self.key, 0, count - 1)
+
+    def replace(self, steps: List[Dict]) -> None:
+        """Atomically replace the whole sequence (rare - path reset / completion)."""
+        pipe = self.redis.pipeline()
+        pipe.delete(self.key)
+        if steps:
+            pipe.rpush(self.key, *[json.dumps(s) for s in steps])
+            pipe.expire(self.key, STEP_LOG_TTL)
+        pipe.execute()
+
+    def clear(self) -> None:
+        self.redis.delete(self.key)
+
+
+def executed_step_log(redis_client, session_id: str) -> MapperStepLog:
+    return MapperStepLog(redis_client, session_id, "executed_steps")
+
+
+def prompt_executed_steps(redis_client, session_id: str, window: int = STEP_LOG_PROMPT_WINDOW) -> List[Dict]:
+    """The last `window` executed steps, oldest first - what the AI prompts are built from."""
+    return executed_step_log(redis_client, session_id).tail(window)
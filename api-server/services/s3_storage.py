@@ -9,13 +9,16 @@ S3_BUCKET = os.getenv("S3_BUCKET", "quattera-screenshots-2026")
 S3_REGION = os.getenv("AWS_REGION", "eu-west-1")
 AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
 AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
+# S3-compatible stand-in (e.g. MinIO) for local setups; unset = AWS
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL") or None
 
 # Initialize S3 client
 s3_client = boto3.client(
     's3',
     aws_access_key_id=AWS_ACCESS_KEY_ID,
     aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-    region_name=S3_REGION
+    region_name=S3_REGION,
+    endpoint_url=S3_ENDPOINT_URL
 ) if AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY else None
 
 def get_s3_client():
@@ -248,6 +251,18 @@ def get_s3_file_content(s3_key: str) -> bytes:
     response = s3_client.get_object(Bucket=S3_BUCKET, Key=s3_key)
     return response['Body'].read()
 
+
+def get_s3_file_stream(s3_key: str):
+    """
+    Open an S3 object for streaming reads (botocore StreamingBody).
+    Caller iterates body.iter_chunks() and closes it.
+    """
+    if not s3_client:
+        raise Exception("S3 client not configured")
+
+    response = s3_client.get_object(Bucket=S3_BUCKET, Key=s3_key)
+    return response['Body']
+
 def delete_s3_folder(prefix: str) -> int:
     """
     Delete all objects with given prefix (folder).
@@ -0,0 +1,116 @@
+# s3_zip_ingest.py
+# Expand an uploaded zip (screenshots / form files) from S3 into individual S3 objects
+# SCALABLE: the archive is streamed into a spooled temp file (RAM up to a cap, then disk)
+# and members are streamed back to S3 by a bounded thread pool, so a test-run zip with
+# hundreds of full-page PNGs no longer sits in worker memory or uploads one file at a time.
+
+import os
+import time
+import logging
+import tempfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, FIRST_EXCEPTION, wait
+from typing import Callable, Dict, List, Optional, Tuple
+
+from services.s3_storage import s3_client, S3_BUCKET
+
+logger = logging.getLogger(__name__)
+
+S3_ZIP_UPLOAD_WORKERS = int(os.getenv("S3_ZIP_UPLOAD_WORKERS", 8))
+# Archives up to this size stay in memory, larger ones spill to a temp file
+S3_ZIP_SPOOL_MAX_BYTES = int(os.getenv("S3_ZIP_SPOOL_MAX_BYTES", 16 * 1024 * 1024))
+
+_CONTENT_TYPES = {
+    ".pdf": "application/pdf",
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".txt": "text/plain",
+}
+
+
+def guess_content_type(filename: str) -> str:
+    return _CONTENT_TYPES.get(os.path.splitext(filename.lower())[1], "application/octet-stream")
+
+
+def _current_rss_mb() -> Optional[float]:
+    """Resident set size right now (ru_maxrss is the worker's lifetime peak - useless per task)"""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None  # Not Linux
+    return round(resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024), 1)
+
+
+def _upload_member(zip_file: zipfile.ZipFile, info: zipfile.ZipInfo, dest_key: str, content_type: str) -> Dict:
+    # ZipFile reads are safe across threads (shared file access is locked per read)
+    with zip_file.open(info) as member:
+        s3_client.upload_fileobj(member, S3_BUCKET, dest_key, ExtraArgs={"ContentType": content_type})
+    return {"filename": info.filename, "s3_key": dest_key, "file_size_bytes": info.file_size}
+
+
+def expand_zip_to_s3(
+        s3_key: str,
+        dest_prefix: str,
+        include: Callable[[str], bool],
+        content_type: Callable[[str], str] = guess_content_type
+) -> Tuple[List[Dict], Dict]:
+    """
+    Download a zip from S3 and upload each included member under dest_prefix.
+
+    Args:
+        s3_key: S3 key of the uploaded zip
+        dest_prefix: Final key prefix, e.g. "screenshots/1/5/606/" (member name is appended)
+        include: Member filter (directories are always skipped)
+        content_type: ContentType for a member name
+
+    Returns:
+        (uploaded files [{filename, s3_key, file_size_bytes}], stats)
+        Any failed upload raises after in-flight uploads finish.
+    """
+    if not s3_client:
+        raise Exception("S3 client not configured")
+
+    started = time.monotonic()
+    rss_start = _current_rss_mb()
+    with tempfile.SpooledTemporaryFile(max_size=S3_ZIP_SPOOL_MAX_BYTES) as spool:
+        s3_client.download_fileobj(S3_BUCKET, s3_key, spool)
+        zip_bytes = spool.tell()
+        spool.seek(0)
+        downloaded = time.monotonic()
+
+        with zipfile.ZipFile(spool, 'r') as zip_file:
+            members = [info for info in zip_file.infolist()
+                       if not info.is_dir() and include(info.filename)]
+
+            with ThreadPoolExecutor(max_workers=S3_ZIP_UPLOAD_WORKERS) as pool:
+                futures = [
+                    pool.submit(_upload_member, zip_file, info, f"{dest_prefix}{info.filename}",
+                                content_type(info.filename))
+                    for info in members
+                ]
+                done, pending = wait(futures, return_when=FIRST_EXCEPTION)
+                for future in pending:
+                    future.cancel()
+                uploaded = [f.result() for f in futures if f in done]
+
+    elapsed = time.monotonic() - started
+    upload_seconds = max(time.monotonic() - downloaded, 1e-6)
+    total_bytes = sum(f["file_size_bytes"] for f in uploaded)
+    rss_end = _current_rss_mb()
+    stats = {
+        "zip_bytes": zip_bytes,
+        "files": len(uploaded),
+        "bytes_uploaded": total_bytes,
+        "seconds": round(elapsed, 2),
+        "files_per_second": round(len(uploaded) / upload_seconds, 1),
+        "mb_per_second": round(total_bytes / upload_seconds / (1024 * 1024), 2),
+        "rss_start_mb": rss_start,
+        "rss_end_mb": rss_end,
+        "rss_delta_mb": round(rss_end - rss_start, 1) if rss_start is not None and rss_end is not None else None,
+    }
+    logger.info(f"[S3Zip] {s3_key}: {stats['files']} files, {total_bytes} bytes in {stats['seconds']}s "
+                f"({stats['files_per_second']} files/s, {stats['mb_per_second']} MB/s, "
+                f"{S3_ZIP_UPLOAD_WORKERS} workers, RSS {rss_start} -> {rss_end} MB)")
+    return uploaded, stats
@@ -0,0 +1,64 @@
+# screenshot_profiles.py
+# Encoding profiles for the screenshots the orchestrator asks the agent for
+# SCALABLE: each AI check gets the smallest image it can work with (downscaled, cropped
+# to the form, lossy where pixel-exactness doesn't matter) - smaller uploads, fewer
+# vision tokens and faster responses than full-resolution full-page PNGs.
+#
+# The profile travels in the agent task payload as "screenshot_profile". The agent
+# knows the same names, so a bare name works too; the full dict lets the server tune
+# profiles without an agent release.
+
+import os
+from typing import Dict, Optional
+
+MAPPER_SCREENSHOT_PROFILES_ENABLED = os.getenv("MAPPER_SCREENSHOT_PROFILES_ENABLED", "true").lower() == "true"
+
+# Claude downsizes images whose long edge exceeds ~1568px anyway - sending more only costs upload time
+_AI_MAX_DIMENSION = 1568
+
+SCREENSHOT_PROFILES: Dict[str, Dict] = {
+    # Legacy behaviour: full page, original resolution, PNG
+    "full": {"max_dimension": None, "crop_to_form": False, "format": "png"},
+    # Page-level UI checks need the whole layout, but not full resolution
+    "visual_verify": {"max_dimension": _AI_MAX_DIMENSION, "crop_to_form": False, "format": "webp", "quality": 85},
+    # Before/after comparison of one form's fields
+    "junction": {"max_dimension": 1280, "crop_to_form": True, "format": "jpeg", "quality": 75},
+    # Step recovery / alerts / regeneration: the form plus its error messages
+    "form_focus": {"max_dimension": _AI_MAX_DIMENSION, "crop_to_form": True, "format": "webp", "quality": 80},
+}
+
+# Screenshot scenario (as sent in the task payload) -> profile
+_SCENARIO_PROFILES = {
+    "initial_form_state": "visual_verify",
+    "visual_page_verify_retry": "visual_verify",
+    # Feed the page-level verify_ui_visual / verify_page_visual checks - banners, toasts
+    # and errors outside the form must stay in the picture
+    "force_regenerate_verify": "visual_verify",
+    "after_recovery": "visual_verify",
+    "out_of_steps_check": "visual_verify",
+    "after_skip_failed_step": "visual_verify",
+    "dynamic_verify_step": "visual_verify",
+    "junction_before": "junction",
+    "junction_after": "junction",
+}
+_DEFAULT_PROFILE = "form_focus"
+
+
+def profile_for_scenario(scenario: Optional[str]) -> Dict:
+    """Profile dict (with its name) for a screenshot request scenario"""
+    if not MAPPER_SCREENSHOT_PROFILES_ENABLED:
+        name = "full"
+    else:
+        name = _SCENARIO_PROFILES.get(scenario or "", _DEFAULT_PROFILE)
+    return {"name": name, **SCREENSHOT_PROFILES[name]}
+
+
+def attach_screenshot_profile(task_type: str, payload: Dict) -> Dict:
+    """Add screenshot_profile to agent payloads that return a screenshot for AI analysis"""
+    if "screenshot_profile" in payload:
+        return payload
+    wants_screenshot = task_type == "form_mapper_get_screenshot" or payload.get("capture_screenshot")
+    if not wants_screenshot:
+        return payload
+    scenario = payload.get("scenario") or payload.get("scenario_description")
+    return {**payload, "screenshot_profile": profile_for_scenario(scenario)}
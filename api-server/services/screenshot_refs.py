@@ -0,0 +1,97 @@
+# screenshot_refs.py
+# Object-store references for agent screenshots
+# SCALABLE: the agent PUTs screenshot bytes straight to S3 through presigned URLs and
+# task results carry only {s3_key, sha256}. The API and Redis keep a short marker string
+# in place of the base64; the bytes are fetched only by the task that actually needs them.
+
+import base64
+import hashlib
+import logging
+import os
+import uuid
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Agents upload here; expire the prefix with an S3 lifecycle rule (1 day is plenty -
+# the blob store only keeps references for BLOB_TTL)
+SCREENSHOT_UPLOAD_PREFIX = os.getenv("SCREENSHOT_UPLOAD_PREFIX", "mapper_screenshots_temp")
+SCREENSHOT_UPLOAD_URL_TTL = int(os.getenv("SCREENSHOT_UPLOAD_URL_TTL", 900))
+SCREENSHOT_UPLOAD_MAX_URLS = 50  # Per request
+
+# Marker stored in place of the base64 string: "objref:{sha256}:{s3_key}"
+OBJECT_REF_PREFIX = "objref:"
+
+# Result fields that carry screenshots: inline base64 field -> reference field
+SCREENSHOT_RESULT_FIELDS = {
+    "screenshot_base64": "screenshot_ref",
+    "alert_screenshot_base64": "alert_screenshot_ref",
+}
+
+
+def session_upload_prefix(company_id: int, session_id) -> str:
+    return f"{SCREENSHOT_UPLOAD_PREFIX}/{company_id}/{session_id}/"
+
+
+def make_object_ref(s3_key: str, sha256: str) -> str:
+    return f"{OBJECT_REF_PREFIX}{sha256}:{s3_key}"
+
+
+def is_object_ref(value) -> bool:
+    return isinstance(value, str) and value.startswith(OBJECT_REF_PREFIX)
+
+
+def parse_object_ref(value: str):
+    """(sha256, s3_key) of a marker"""
+    sha256, _, s3_key = value[len(OBJECT_REF_PREFIX):].partition(":")
+    return sha256, s3_key
+
+
+def issue_upload_urls(company_id: int, session_id, count: int, kms_key_arn: Optional[str] = None) -> List[Dict]:
+    """Presigned PUT URLs for a session's next `count` screenshots ([{s3_key, url}])"""
+    from services.s3_storage import generate_presigned_put_urls_batch
+
+    prefix = session_upload_prefix(company_id, session_id)
+    keys = [f"{prefix}{uuid.uuid4().hex}.png" for _ in range(max(1, min(count, SCREENSHOT_UPLOAD_MAX_URLS)))]
+    return generate_presigned_put_urls_batch(keys, content_type='image/png',
+                                             expiration=SCREENSHOT_UPLOAD_URL_TTL, kms_key_arn=kms_key_arn)
+
+
+def normalize_result_screenshots(result: Dict, company_id: int, session_id) -> Dict:
+    """
+    Turn uploaded-screenshot references in an agent result into markers under the
+    usual *_base64 field, so the orchestrator and blob store handle both forms alike.
+    References outside the session's upload prefix are dropped.
+    """
+    prefix = session_upload_prefix(company_id, session_id)
+    for inline_field, ref_field in SCREENSHOT_RESULT_FIELDS.items():
+        ref = result.pop(ref_field, None)
+        if not ref or result.get(inline_field):
+            continue
+        if not isinstance(ref, dict):
+            logger.warning(f"[ScreenshotRefs] Ignoring malformed {ref_field} for session {session_id}")
+            continue
+        s3_key, sha256 = ref.get("s3_key", ""), ref.get("sha256", "")
+        if not isinstance(s3_key, str) or not s3_key.startswith(prefix) or not sha256:
+            logger.warning(f"[ScreenshotRefs] Ignoring foreign screenshot ref for session {session_id}: {s3_key}")
+            continue
+        result[inline_field] = make_object_ref(s3_key, sha256)
+    return result
+
+
+def resolve_screenshot(value: Optional[str]) -> str:
+    """Base64 of a screenshot field value - downloads when it is an object reference"""
+    if not is_object_ref(value):
+        return value or ""
+    from services.s3_storage import get_s3_file_content
+
+    sha256, s3_key = parse_object_ref(value)
+    try:
+        data = get_s3_file_content(s3_key)
+    except Exception as e:
+        logger.error(f"[ScreenshotRefs] Could not fetch {s3_key}: {e}")
+        return ""
+    if hashlib.sha256(data).hexdigest() != sha256:
+        logger.error(f"[ScreenshotRefs] Hash mismatch for {s3_key}")
+        return ""
+    return base64.b64encode(data).decode()
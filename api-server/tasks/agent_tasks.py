@@ -0,0 +1,34 @@
+"""
+Celery tasks for agent presence (heartbeat) bookkeeping.
+"""
+import logging
+from celery import shared_task
+from models.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+def _get_db_session():
+    return SessionLocal()
+
+
+@shared_task(name="tasks.flush_agent_heartbeats")
+def flush_agent_heartbeats():
+    """
+    Periodic task: sync heartbeats recorded in Redis to the agents table
+    (last_heartbeat, status, current_task_id) in bulk. Runs every 30 seconds via Celery beat.
+    """
+    db = _get_db_session()
+    try:
+        from services.agent_presence import flush_heartbeats
+
+        flushed = flush_heartbeats(db)
+        if flushed:
+            logger.info(f"[AgentTasks] Flushed {flushed} agent heartbeats")
+        return {"flushed": flushed}
+    except Exception as e:
+        logger.error(f"[AgentTasks] Heartbeat flush failed: {e}")
+        db.rollback()
+        return {"error": str(e)}
+    finally:
+        db.close()
@@ -16,6 +16,12 @@ from typing import Dict, Optional, List
 from services.ai_form_mapper_main_prompter import AIParseError
 from services.session_logger import SessionLogger, get_session_logger, ActivityType
 from services.ai_budget_service import BudgetExceededError, AccessDeniedError
+from services.mapper_step_log import executed_step_log, prompt_executed_steps, all_step_log_keys
+from services.mapper_blob_store import MapperBlobStore, SLOT_DOM, SLOT_SCREENSHOT, SLOT_SCREENSHOT_BEFORE
+from services.dom_reducer import reduce_dom
+from services.ai_step_cache import AIStepCache, OP_ANALYZE, OP_REGENERATE
+from services.agent_task_queue import push_agent_task, flush_agent_tasks
+from services.ai_gateway import AIRetryLater, AI_DEFER_MAX_RETRIES, retry_countdown, set_ai_company, take_ai_usage
 logger = logging.getLogger(__name__)
 
 
@@ -43,6 +49,27 @@ def _get_redis_client():
     return redis.Redis(connection_pool=_redis_pool)
 
 
+# Remove a deadline entry only if it is still expired. Returns 1 if this caller claimed it.
+_CLAIM_DEADLINE_SCRIPT = """
+local score = redis.call('ZSCORE', KEYS[1], ARGV[1])
+if score and tonumber(score) <= tonumber(ARGV[2]) then
+    redis.call('ZREM', KEYS[1], ARGV[1])
+    return 1
+end
+return 0
+"""
+
+
+def _get_session_blob(redis_client, session_id: str, slot: str) -> str:
+    """Resolve a session's DOM/screenshot blob reference to its content ("" if none)"""
+    return MapperBlobStore(redis_client).get(session_id, slot)
+
+
+def _get_prompt_dom(redis_client, session_id: str, label: str) -> str:
+    """Session DOM run through the DOM reducer - what every AI prompt gets"""
+    return reduce_dom(_get_session_blob(redis_client, session_id, SLOT_DOM), label=f"{label} {session_id}")
+
+
 def _get_db_session():
     """Get database session"""
     from models.database import SessionLocal
@@ -56,6 +83,10 @@ def _check_budget_and_get_api_key(db, company_id: int, product_id: int) -> str:
     
     redis_client = _get_redis_client()
     budget_service = get_budget_service(redis_client)
+
+    # AI calls made by this task count against this company's gateway token bucket;
+    # every caller re-queues itself via _defer_if_ai_busy, so the gateway never sleeps
+    set_ai_company(company_id, deferrable=True)
     
     has_budget, remaining, total = budget_service.check_budget(db, company_id, product_id)
     
@@ -77,14 +108,31 @@ def _check_budget_and_get_api_key(db, company_id: int, product_id: int) -> str:
     return os.getenv("ANTHROPIC_API_KEY")
 
 
+def _defer_if_ai_busy(task, exc: Exception) -> None:
+    """Re-queue the task with a countdown when the AI gateway says retry later (never sleeps in the worker)"""
+    if isinstance(exc, AIRetryLater) and task.request.retries < AI_DEFER_MAX_RETRIES:
+        countdown = retry_countdown(exc, task.request.retries)
+        logger.warning(f"[FormMapperTask] {task.name}: {exc.reason} - retrying in {countdown}s")
+        raise task.retry(exc=exc, countdown=countdown, max_retries=AI_DEFER_MAX_RETRIES)
+
+
 def _record_usage(db, company_id: int, product_id: int, user_id: int, 
                   operation_type, input_tokens: int, output_tokens: int,
                   session_id: str = None):
-    """Record AI usage after successful call"""
+    """
+    Record AI usage after successful call.
+    input_tokens/output_tokens are size estimates - when the gateway saw the API's usage
+    for this task's calls, the real counts (including prompt cache reads/writes) win.
+    """
     from services.ai_budget_service import get_budget_service
     
     redis_client = _get_redis_client()
     budget_service = get_budget_service(redis_client)
+
+    usage = take_ai_usage()
+    if usage:
+        input_tokens = usage.get("input_tokens", 0)
+        output_tokens = usage.get("output_tokens", 0)
     
     return budget_service.record_usage(
         db=db,
@@ -94,23 +142,31 @@ def _record_usage(db, company_id: int, product_id: int, user_id: int,
         operation_type=operation_type,
         input_tokens=input_tokens,
         output_tokens=output_tokens,
-        session_id=session_id
+        session_id=session_id,
+        cache_creation_input_tokens=usage.get("cache_creation_input_tokens", 0),
+        cache_read_input_tokens=usage.get("cache_read_input_tokens", 0)
     )
 
 
+# Only the small context fields - never pull steps/config blobs into every Celery task
+_SESSION_CONTEXT_FIELDS = (
+    "company_id", "user_id", "product_id", "network_id", "form_route_id", "company_name",
+    "mapping_type", "test_case_description", "test_page_route_id", "test_scenario_id",
+)
+
+
 def _get_session_context(redis_client, session_id: str) -> Dict:
     """Get session context from Redis"""
     session_key = f"mapper_session:{session_id}"
-    session_data = redis_client.hgetall(session_key)
-    
-    if not session_data:
-        return {}
-    
+    values = redis_client.hmget(session_key, _SESSION_CONTEXT_FIELDS)
+
     decoded = {}
-    for k, v in session_data.items():
-        key_str = k.decode() if isinstance(k, bytes) else k
-        val_str = v.decode() if isinstance(v, bytes) else v
-        decoded[key_str] = val_str
+    for field, v in zip(_SESSION_CONTEXT_FIELDS, values):
+        if v is not None:
+            decoded[field] = v.decode() if isinstance(v, bytes) else v
+
+    if not decoded:
+        return {}
 
     # Get company_name from Redis (stored at session creation by orchestrator)
     company_name = decoded.get("company_name")
@@ -162,6 +218,12 @@ def _continue_orchestrator_chain(session_id: str, task_name: str, result: Dict):
         except Exception as e:
             logger.debug(f"[FormMapperTask] Version check skipped: {e}")
 
+        # Partitioned mode: the session's partition consumer applies it (no lock wait here)
+        from services.mapper_event_stream import stream_mode_enabled, enqueue_event, EVENT_CELERY_RESULT
+        if stream_mode_enabled():
+            enqueue_event(session_id, EVENT_CELERY_RESULT, task_name, result, redis_client)
+            return {"success": True, "queued": True}
+
         orchestrator = FormMapperOrchestrator(redis_client, db)
         response = orchestrator.process_celery_result(session_id, task_name, result)
         
@@ -296,12 +358,10 @@ def analyze_form_page(
     redis_client = _get_redis_client()
 
     # Fetch screenshot from Redis (removed from Celery kwargs — P0 scalability fix)
-    ss_raw = redis_client.get(f"mapper_screenshot:{session_id}")
-    screenshot_base64 = ss_raw.decode() if isinstance(ss_raw, bytes) else (ss_raw or "")
+    screenshot_base64 = _get_session_blob(redis_client, session_id, SLOT_SCREENSHOT)
 
     # Fetch DOM from Redis (removed from Celery kwargs — P0 scalability fix)
-    dom_raw = redis_client.get(f"mapper_dom:{session_id}")
-    dom_html = dom_raw.decode() if isinstance(dom_raw, bytes) else (dom_raw or "")
+    dom_html = _get_prompt_dom(redis_client, session_id, "analyze_form_page")
     
     try:
         ctx = _get_session_context(redis_client, session_id)
@@ -309,15 +369,35 @@ def analyze_form_page(
             result = {"success": False, "error": "Session not found"}
             _continue_orchestrator_chain(session_id, "analyze_form_page", result)
             return result
-        
-        api_key = _check_budget_and_get_api_key(db, ctx["company_id"], ctx["product_id"])
+
+        # Same form structure + same inputs as an earlier mapping -> reuse that AI answer
+        # (no Anthropic call, no budget charge)
+        mapping_type = ctx.get("mapping_type", "form")
+        step_cache = AIStepCache(redis_client)
+        cache_key = None
+        cached_ai_result = None
+        if step_cache.cacheable(mapping_type):
+            cache_key = step_cache.build_key(
+                OP_ANALYZE, ctx["company_id"], mapping_type, dom_html,
+                test_cases=test_cases,
+                critical_fields_checklist=critical_fields_checklist or {},
+                field_requirements=field_requirements or "",
+                junction_instructions=junction_instructions or {},
+                user_provided_inputs=user_provided_inputs or {},
+                mapping_hints=mapping_hints or "",
+                test_case_description=ctx.get("test_case_description", "")
+            )
+            cached_ai_result = step_cache.get(OP_ANALYZE, cache_key)
+
+        api_key = None if cached_ai_result is not None else \
+            _check_budget_and_get_api_key(db, ctx["company_id"], ctx["product_id"])
 
         # Structured logging
         log = get_session_logger(db_session=None, activity_type=ActivityType.MAPPING.value, session_id=session_id,
                                  company_id=ctx.get("company_id"), company_name=ctx.get("company_name"))
         log.info("Celery task: analyze_form_page started", category="celery_task")
 
-        if not api_key:
+        if cached_ai_result is None and not api_key:
             result = {"success": False, "error": "No API key available"}
             _continue_orchestrator_chain(session_id, "analyze_form_page", result)
             return result
@@ -357,7 +437,6 @@ def analyze_form_page(
 
         # Login mapping: load credentials from DB (SECURITY: never in Redis/Celery kwargs)
         login_credentials = None
-        mapping_type = ctx.get("mapping_type", "form")
         if mapping_type in ("login_mapping", "logout_mapping") and ctx.get("network_id"):
             try:
                 from models.database import Network
@@ -376,23 +455,31 @@ def analyze_form_page(
             except Exception as e:
                 logger.error(f"[FormMapperTask] Failed to load credentials: {e}")
 
-        ai_result = generate_steps_for_mapping(
-            mapping_type=mapping_type,
-            api_key=api_key,
-            session_logger=log,
-            dom_html=dom_html,
-            test_cases=test_cases,
-            screenshot_base64=screenshot_base64,
-            critical_fields_checklist=critical_fields_checklist or {},
-            field_requirements=field_requirements or "",
-            junction_instructions=_build_junction_instructions_text(
-                junction_instructions) if junction_instructions else None,
-            user_provided_inputs=user_provided_inputs or {},
-            is_first_iteration=True,
-            test_case_description=ctx.get("test_case_description", ""),
-            login_credentials=login_credentials,
-            mapping_hints=mapping_hints
-        )
+        if cached_ai_result is not None:
+            ai_result = cached_ai_result
+            msg = f"!!!! ♻️ AI step cache hit - reusing {len(ai_result.get('steps', []))} steps"
+            print(msg)
+            log.debug(msg, category="debug_trace")
+        else:
+            ai_result = generate_steps_for_mapping(
+                mapping_type=mapping_type,
+                api_key=api_key,
+                session_logger=log,
+                dom_html=dom_html,
+                test_cases=test_cases,
+                screenshot_base64=screenshot_base64,
+                critical_fields_checklist=critical_fields_checklist or {},
+                field_requirements=field_requirements or "",
+                junction_instructions=_build_junction_instructions_text(
+                    junction_instructions) if junction_instructions else None,
+                user_provided_inputs=user_provided_inputs or {},
+                is_first_iteration=True,
+                test_case_description=ctx.get("test_case_description", ""),
+                login_credentials=login_credentials,
+                mapping_hints=mapping_hints
+            )
+            if cache_key:
+                step_cache.put(OP_ANALYZE, cache_key, ai_result)
 
         # Server-side credential injection (AI may alter case/formatting)
         if mapping_type in ("login_mapping", "logout_mapping") and login_credentials and ai_result.get("steps"):
@@ -421,14 +508,15 @@ def analyze_form_page(
                 print(msg)
                 log.debug(msg, category="debug_trace")
         
-        input_tokens = len(dom_html) // 4 + (len(screenshot_base64) // 100 if screenshot_base64 else 0)
-        output_tokens = len(json.dumps(ai_result)) // 4 if ai_result else 0
-        
-        _record_usage(
-            db, ctx["company_id"], ctx["product_id"], ctx["user_id"],
-            AIOperationType.FORM_MAPPER_ANALYZE,
-            input_tokens, output_tokens, session_id
-        )
+        if cached_ai_result is None:
+            input_tokens = len(dom_html) // 4 + (len(screenshot_base64) // 100 if screenshot_base64 else 0)
+            output_tokens = len(json.dumps(ai_result)) // 4 if ai_result else 0
+
+            _record_usage(
+                db, ctx["company_id"], ctx["product_id"], ctx["user_id"],
+                AIOperationType.FORM_MAPPER_ANALYZE,
+                input_tokens, output_tokens, session_id
+            )
         
         result = {
             "success": True,
@@ -469,6 +557,7 @@ def analyze_form_page(
         return result
 
     except Exception as e:
+        _defer_if_ai_busy(self, e)
         msg = f"!!!! ❌ Analysis failed: {e}"
         print(msg)
         logger.error(f"[FormMapperTask] Analysis failed: {e}", exc_info=True)
@@ -488,11 +577,11 @@ def analyze_failure_and_recover(
     self,
     session_id: str,
     failed_step: Dict,
-    executed_steps: List[Dict],
     test_cases: List[Dict],
     test_context: Dict,
     attempt_number: int = 1,
-    recovery_failure_history: List[Dict] = None
+    recovery_failure_history: List[Dict] = None,
+    executed_steps: Optional[List[Dict]] = None
 ) -> Dict:
     """Celery task: AI analyzes step failure and generates recovery steps."""
     from services.ai_budget_service import AIOperationType, BudgetExceededError
@@ -502,13 +591,15 @@ def analyze_failure_and_recover(
     db = _get_db_session()
     redis_client = _get_redis_client()
 
+    # Executed steps come from the append-only step log (no longer shipped in Celery kwargs)
+    if executed_steps is None:
+        executed_steps = prompt_executed_steps(redis_client, session_id)
+
     # Fetch screenshot from Redis (removed from Celery kwargs — P0 scalability fix)
-    ss_raw = redis_client.get(f"mapper_screenshot:{session_id}")
-    screenshot_base64 = ss_raw.decode() if isinstance(ss_raw, bytes) else (ss_raw or "")
+    screenshot_base64 = _get_session_blob(redis_client, session_id, SLOT_SCREENSHOT)
 
     # Fetch DOM from Redis (removed from Celery kwargs — P0 scalability fix)
-    dom_raw = redis_client.get(f"mapper_dom:{session_id}")
-    fresh_dom = dom_raw.decode() if isinstance(dom_raw, bytes) else (dom_raw or "")
+    fresh_dom = _get_prompt_dom(redis_client, session_id, "recovery")
     
     try:
         ctx = _get_session_context(redis_client, session_id)
@@ -672,6 +763,7 @@ def analyze_failure_and_recover(
         return result
         
     except Exception as e:
+        _defer_if_ai_busy(self, e)
         msg = f"!!!! ❌ Failure analysis failed: {e}"
         print(msg)
         logger.error(f"[FormMapperTask] Failure analysis failed: {e}", exc_info=True)
@@ -691,12 +783,12 @@ def handle_alert_recovery(
     self,
     session_id: str,
     alert_info: Dict,
-    executed_steps: List[Dict],
     test_cases: List[Dict],
     test_context: Dict,
     step_where_alert_appeared: int,
     include_accept_step: bool = True,
-    gathered_error_info: Optional[Dict] = None
+    gathered_error_info: Optional[Dict] = None,
+    executed_steps: Optional[List[Dict]] = None
 ) -> Dict:
     """Celery task: Handle alert/error recovery with AI."""
     from services.ai_budget_service import AIOperationType, BudgetExceededError
@@ -706,13 +798,15 @@ def handle_alert_recovery(
     db = _get_db_session()
     redis_client = _get_redis_client()
 
+    # Executed steps come from the append-only step log (no longer shipped in Celery kwargs)
+    if executed_steps is None:
+        executed_steps = prompt_executed_steps(redis_client, session_id)
+
     # Fetch screenshot from Redis (removed from Celery kwargs — P0 scalability fix)
-    ss_raw = redis_client.get(f"mapper_screenshot:{session_id}")
-    screenshot_base64 = ss_raw.decode() if isinstance(ss_raw, bytes) else (ss_raw or "")
+    screenshot_base64 = _get_session_blob(redis_client, session_id, SLOT_SCREENSHOT)
 
     # Fetch DOM from Redis (removed from Celery kwargs — P0 scalability fix)
-    dom_raw = redis_client.get(f"mapper_dom:{session_id}")
-    dom_html = dom_raw.decode() if isinstance(dom_raw, bytes) else (dom_raw or "")
+    dom_html = _get_prompt_dom(redis_client, session_id, "alert_recovery")
     
     try:
         ctx = _get_session_context(redis_client, session_id)
@@ -808,6 +902,7 @@ def handle_alert_recovery(
         return result
         
     except Exception as e:
+        _defer_if_ai_busy(self, e)
         msg = f"!!!! ❌ Alert recovery failed: {e}"
         print(msg)
         logger.error(f"[FormMapperTask] Alert recovery failed: {e}", exc_info=True)
@@ -826,9 +921,9 @@ def handle_alert_recovery(
 def handle_validation_error_recovery(
         self,
         session_id: str,
-        executed_steps: List[Dict],
         test_cases: List[Dict],
-        test_context: Dict
+        test_context: Dict,
+        executed_steps: Optional[List[Dict]] = None
 ):
     """Analyze validation errors (red borders, error messages) and determine if real_issue or ai_issue"""
     from services.ai_budget_service import AIOperationType, BudgetExceededError
@@ -838,13 +933,15 @@ def handle_validation_error_recovery(
     db = _get_db_session()
     redis_client = _get_redis_client()
 
+    # Executed steps come from the append-only step log (no longer shipped in Celery kwargs)
+    if executed_steps is None:
+        executed_steps = prompt_executed_steps(redis_client, session_id)
+
     # Fetch screenshot from Redis (removed from Celery kwargs — P0 scalability fix)
-    ss_raw = redis_client.get(f"mapper_screenshot:{session_id}")
-    screenshot_base64 = ss_raw.decode() if isinstance(ss_raw, bytes) else (ss_raw or "")
+    screenshot_base64 = _get_session_blob(redis_client, session_id, SLOT_SCREENSHOT)
 
     # Fetch DOM from Redis (removed from Celery kwargs — P0 scalability fix)
-    dom_raw = redis_client.get(f"mapper_dom:{session_id}")
-    dom_html = dom_raw.decode() if isinstance(dom_raw, bytes) else (dom_raw or "")
+    dom_html = _get_prompt_dom(redis_client, session_id, "validation_error_recovery")
 
     try:
         ctx = _get_session_context(redis_client, session_id)
@@ -919,6 +1016,7 @@ def handle_validation_error_recovery(
         return result
 
     except Exception as e:
+        _defer_if_ai_busy(self, e)
         msg = f"!!!! ❌ Validation error recovery failed: {e}"
         print(msg)
         logger.error(f"[FormMapperTask] Validation error recovery failed: {e}", exc_info=True)
@@ -950,8 +1048,7 @@ def verify_ui_visual(
     redis_client = _get_redis_client()
 
     # Fetch screenshot from Redis (removed from Celery kwargs — P0 scalability fix)
-    ss_raw = redis_client.get(f"mapper_screenshot:{session_id}")
-    screenshot_base64 = ss_raw.decode() if isinstance(ss_raw, bytes) else (ss_raw or "")
+    screenshot_base64 = _get_session_blob(redis_client, session_id, SLOT_SCREENSHOT)
     
     try:
         ctx = _get_session_context(redis_client, session_id)
@@ -1013,6 +1110,7 @@ def verify_ui_visual(
         return result
         
     except Exception as e:
+        _defer_if_ai_busy(self, e)
         msg = f"!!!! ❌ UI verification failed: {e}"
         print(msg)
         logger.error(f"[FormMapperTask] UI verification failed: {e}", exc_info=True)
@@ -1031,7 +1129,6 @@ def verify_ui_visual(
 def regenerate_steps(
     self,
     session_id: str,
-    executed_steps: List[Dict],
     test_cases: List[Dict],
     test_context: Dict,
     critical_fields_checklist: Optional[Dict] = None,
@@ -1040,7 +1137,8 @@ def regenerate_steps(
     junction_instructions: str = None,
     user_provided_inputs: dict = None,
     regenerate_retry_message: str = "",
-    mapping_hints: str = ""
+    mapping_hints: str = "",
+    executed_steps: Optional[List[Dict]] = None
 ) -> Dict:
     """Celery task: Regenerate remaining steps after DOM change."""
     from services.ai_budget_service import AIOperationType, BudgetExceededError
@@ -1050,13 +1148,15 @@ def regenerate_steps(
     db = _get_db_session()
     redis_client = _get_redis_client()
 
+    # Executed steps come from the append-only step log (no longer shipped in Celery kwargs)
+    if executed_steps is None:
+        executed_steps = prompt_executed_steps(redis_client, session_id)
+
     # Fetch screenshot from Redis (removed from Celery kwargs — P0 scalability fix)
-    ss_raw = redis_client.get(f"mapper_screenshot:{session_id}")
-    screenshot_base64 = ss_raw.decode() if isinstance(ss_raw, bytes) else (ss_raw or "")
+    screenshot_base64 = _get_session_blob(redis_client, session_id, SLOT_SCREENSHOT)
 
     # Fetch DOM from Redis (removed from Celery kwargs — P0 scalability fix)
-    dom_raw = redis_client.get(f"mapper_dom:{session_id}")
-    dom_html = dom_raw.decode() if isinstance(dom_raw, bytes) else (dom_raw or "")
+    dom_html = _get_prompt_dom(redis_client, session_id, "regenerate_steps")
     
     try:
         ctx = _get_session_context(redis_client, session_id)
@@ -1064,15 +1164,36 @@ def regenerate_steps(
             result = {"success": False, "error": "Session not found"}
             _continue_orchestrator_chain(session_id, "regenerate_steps", result)
             return result
-        
-        api_key = _check_budget_and_get_api_key(db, ctx["company_id"], ctx["product_id"])
+
+        mapping_type = ctx.get("mapping_type", "form")
+        step_cache = AIStepCache(redis_client)
+        cache_key = None
+        cached_ai_result = None
+        if step_cache.cacheable(mapping_type):
+            cache_key = step_cache.build_key(
+                OP_REGENERATE, ctx["company_id"], mapping_type, dom_html,
+                executed_steps=executed_steps,
+                test_cases=test_cases,
+                test_context=test_context,
+                critical_fields_checklist=critical_fields_checklist or {},
+                field_requirements=field_requirements or "",
+                junction_instructions=junction_instructions or "",
+                user_provided_inputs=user_provided_inputs or {},
+                retry_message=regenerate_retry_message or "",
+                mapping_hints=mapping_hints or "",
+                test_case_description=ctx.get("test_case_description", "")
+            )
+            cached_ai_result = step_cache.get(OP_REGENERATE, cache_key)
+
+        api_key = None if cached_ai_result is not None else \
+            _check_budget_and_get_api_key(db, ctx["company_id"], ctx["product_id"])
 
         # Structured logging
         log = get_session_logger(db_session=None, activity_type=ActivityType.MAPPING.value, session_id=session_id,
                                  company_id=ctx.get("company_id"), company_name=ctx.get("company_name"))
         log.info("Celery task: regenerate_steps started", category="celery_task")
         
-        if not api_key:
+        if cached_ai_result is None and not api_key:
             result = {"success": False, "error": "No API key available"}
             _continue_orchestrator_chain(session_id, "regenerate_steps", result)
             return result
@@ -1129,7 +1250,6 @@ def regenerate_steps(
 
         # Login mapping: load credentials for regeneration (e.g., 2FA page appeared)
         login_credentials = None
-        mapping_type = ctx.get("mapping_type", "form")
         if mapping_type in ("login_mapping", "logout_mapping") and ctx.get("network_id"):
             try:
                 from models.database import Network
@@ -1145,24 +1265,32 @@ def regenerate_steps(
                 logger.error(f"[FormMapperTask] Failed to load credentials for regen: {e}")
 
 
-        ai_result = regenerate_steps_for_mapping(
-            mapping_type=mapping_type,
-            api_key=api_key,
-            session_logger=log,
-            dom_html=dom_html,
-            executed_steps=executed_steps,
-            screenshot_base64=screenshot_base64,
-            test_cases=test_cases,
-            test_context=test_context,
-            critical_fields_checklist=critical_fields_checklist,
-            field_requirements=field_requirements,
-            junction_instructions=_build_junction_instructions_text(junction_instructions),
-            user_provided_inputs=user_provided_inputs or {},
-            retry_message=regenerate_retry_message,
-            test_case_description=ctx.get("test_case_description", ""),
-            login_credentials=login_credentials,
-            mapping_hints=mapping_hints
-        )
+        if cached_ai_result is not None:
+            ai_result = cached_ai_result
+            msg = f"!!!! ♻️ AI step cache hit (regenerate) - reusing {len(ai_result.get('steps', []))} steps"
+            print(msg)
+            log.debug(msg, category="debug_trace")
+        else:
+            ai_result = regenerate_steps_for_mapping(
+                mapping_type=mapping_type,
+                api_key=api_key,
+                session_logger=log,
+                dom_html=dom_html,
+                executed_steps=executed_steps,
+                screenshot_base64=screenshot_base64,
+                test_cases=test_cases,
+                test_context=test_context,
+                critical_fields_checklist=critical_fields_checklist,
+                field_requirements=field_requirements,
+                junction_instructions=_build_junction_instructions_text(junction_instructions),
+                user_provided_inputs=user_provided_inputs or {},
+                retry_message=regenerate_retry_message,
+                test_case_description=ctx.get("test_case_description", ""),
+                login_credentials=login_credentials,
+                mapping_hints=mapping_hints
+            )
+            if cache_key:
+                step_cache.put(OP_REGENERATE, cache_key, ai_result)
 
         # Server-side credential injection (AI may alter case/formatting)
         if mapping_type in ("login_mapping", "logout_mapping") and login_credentials and ai_result.get("steps"):
@@ -1188,14 +1316,15 @@ def regenerate_steps(
                 print(msg)
                 log.debug(msg, category="debug_trace")
 
-        input_tokens = len(dom_html) // 4 + (len(screenshot_base64) // 100 if screenshot_base64 else 0)
-        output_tokens = len(json.dumps(ai_result)) // 4 if ai_result else 0
-        
-        _record_usage(
-            db, ctx["company_id"], ctx["product_id"], ctx["user_id"],
-            AIOperationType.FORM_MAPPER_REGENERATE,
-            input_tokens, output_tokens, session_id
-        )
+        if cached_ai_result is None:
+            input_tokens = len(dom_html) // 4 + (len(screenshot_base64) // 100 if screenshot_base64 else 0)
+            output_tokens = len(json.dumps(ai_result)) // 4 if ai_result else 0
+
+            _record_usage(
+                db, ctx["company_id"], ctx["product_id"], ctx["user_id"],
+                AIOperationType.FORM_MAPPER_REGENERATE,
+                input_tokens, output_tokens, session_id
+            )
 
         result = {
             "success": True,
@@ -1233,6 +1362,7 @@ def regenerate_steps(
         return result
 
     except Exception as e:
+        _defer_if_ai_busy(self, e)
         msg = f"!!!! ❌ Step regeneration failed: {e}"
         print(msg)
         logger.error(f"[FormMapperTask] Step regeneration failed: {e}", exc_info=True)
@@ -1251,9 +1381,9 @@ def regenerate_steps(
 def regenerate_verify_steps(
         self,
         session_id: str,
-        executed_steps: List[Dict],
         test_cases: List[Dict],
         test_context: Dict,
+        executed_steps: Optional[List[Dict]] = None,
 ) -> Dict:
     """Celery task: Regenerate verification steps after Save/Submit."""
     from services.ai_budget_service import AIOperationType, BudgetExceededError
@@ -1263,13 +1393,15 @@ def regenerate_verify_steps(
     db = _get_db_session()
     redis_client = _get_redis_client()
 
+    # Executed steps come from the append-only step log (no longer shipped in Celery kwargs)
+    if executed_steps is None:
+        executed_steps = prompt_executed_steps(redis_client, session_id)
+
     # Fetch screenshot from Redis (removed from Celery kwargs — P0 scalability fix)
-    ss_raw = redis_client.get(f"mapper_screenshot:{session_id}")
-    screenshot_base64 = ss_raw.decode() if isinstance(ss_raw, bytes) else (ss_raw or "")
+    screenshot_base64 = _get_session_blob(redis_client, session_id, SLOT_SCREENSHOT)
 
     # Fetch DOM from Redis (removed from Celery kwargs — P0 scalability fix)
-    dom_raw = redis_client.get(f"mapper_dom:{session_id}")
-    dom_html = dom_raw.decode() if isinstance(dom_raw, bytes) else (dom_raw or "")
+    dom_html = _get_prompt_dom(redis_client, session_id, "regenerate_verify_steps")
 
     try:
         ctx = _get_session_context(redis_client, session_id)
@@ -1377,6 +1509,7 @@ def regenerate_verify_steps(
         return result
 
     except Exception as e:
+        _defer_if_ai_busy(self, e)
         msg = f"!!!! ❌ Verify regeneration error: {e}"
         print(msg)
         logger.error(f"[FormMapperTask] Verify regeneration error: {e}", exc_info=True)
@@ -1404,10 +1537,8 @@ def verify_junction_visual(
     redis_client = _get_redis_client()
 
     # Fetch junction screenshots from Redis (removed from Celery kwargs — P0 scalability fix)
-    before_raw = redis_client.get(f"mapper_screenshot_before:{session_id}")
-    before_screenshot = before_raw.decode() if isinstance(before_raw, bytes) else (before_raw or "")
-    after_raw = redis_client.get(f"mapper_screenshot:{session_id}")
-    after_screenshot = after_raw.decode() if isinstance(after_raw, bytes) else (after_raw or "")
+    before_screenshot = _get_session_blob(redis_client, session_id, SLOT_SCREENSHOT_BEFORE)
+    after_screenshot = _get_session_blob(redis_client, session_id, SLOT_SCREENSHOT)
 
     try:
         ctx = _get_session_context(redis_client, session_id)
@@ -1474,6 +1605,7 @@ def verify_junction_visual(
         return result
 
     except Exception as e:
+        _defer_if_ai_busy(self, e)
         msg = f"!!!! ❌ Junction visual verification error: {e}"
         print(msg)
         logger.error(f"[FormMapperTask] Junction visual verification error: {e}")
@@ -1497,10 +1629,10 @@ def verify_junction_visual(
 def verify_page_visual(
         self,
         session_id: str,
-        executed_steps: List[Dict],
         already_verified_fields: List[Dict],
         retry_count: int = 0,
-        total_wait_seconds: int = 0
+        total_wait_seconds: int = 0,
+        executed_steps: Optional[List[Dict]] = None
 ) -> Dict:
     """Celery task: Use AI vision to verify form field values on result page (view/list page)."""
     logger.info(f"[FormMapperTask] Visual page verification for session {session_id}, retry={retry_count}")
@@ -1508,9 +1640,12 @@ def verify_page_visual(
     db = _get_db_session()
     redis_client = _get_redis_client()
 
+    # Executed steps come from the append-only step log (no longer shipped in Celery kwargs)
+    if executed_steps is None:
+        executed_steps = prompt_executed_steps(redis_client, session_id)
+
     # Fetch screenshot from Redis (removed from Celery kwargs — P0 scalability fix)
-    ss_raw = redis_client.get(f"mapper_screenshot:{session_id}")
-    screenshot_base64 = ss_raw.decode() if isinstance(ss_raw, bytes) else (ss_raw or "")
+    screenshot_base64 = _get_session_blob(redis_client, session_id, SLOT_SCREENSHOT)
 
     try:
         ctx = _get_session_context(redis_client, session_id)
@@ -1589,6 +1724,7 @@ def verify_page_visual(
         return result
 
     except Exception as e:
+        _defer_if_ai_busy(self, e)
         msg = f"!!!! ❌ Visual page verification error: {e}"
         print(msg)
         logger.error(f"[FormMapperTask] Visual page verification error: {e}")
@@ -1626,8 +1762,7 @@ def verify_dynamic_step_visual(
     redis_client = _get_redis_client()
 
     # Fetch screenshot from Redis (removed from Celery kwargs — P0 scalability fix)
-    ss_raw = redis_client.get(f"mapper_screenshot:{session_id}")
-    screenshot_base64 = ss_raw.decode() if isinstance(ss_raw, bytes) else (ss_raw or "")
+    screenshot_base64 = _get_session_blob(redis_client, session_id, SLOT_SCREENSHOT)
 
     try:
         ctx = _get_session_context(redis_client, session_id)
@@ -1728,6 +1863,7 @@ def verify_dynamic_step_visual(
         return result
 
     except Exception as e:
+        _defer_if_ai_busy(self, e)
         msg = f"!!!! ❌ Dynamic verify step error: {e}"
         print(msg)
         logger.error(f"[FormMapperTask] Dynamic verify step error: {e}")
@@ -1844,6 +1980,7 @@ def evaluate_paths_with_ai(
 
 
     except Exception as e:
+        _defer_if_ai_busy(self, e)
 
         msg = f"!!!! ❌ AI Path Evaluation error: {e}"
         print(msg)
@@ -1935,6 +2072,7 @@ def evaluate_existing_paths(
         return result
 
     except Exception as e:
+        _defer_if_ai_busy(self, e)
         msg = f"!!!! ❌ Evaluate Existing Paths error: {e}"
         print(msg)
         logger.error(f"[FormMapperTask] Evaluate existing paths error: {e}")
@@ -1949,7 +2087,8 @@ def evaluate_existing_paths(
         db.close()
 
 @shared_task(bind=True, max_retries=2)
-def save_mapping_result(self, session_id: str, stages: List[Dict], path_junctions: List[Dict], continue_to_next_path: bool = False):
+def save_mapping_result(self, session_id: str, path_junctions: List[Dict], continue_to_next_path: bool = False,
+                        stages: Optional[List[Dict]] = None):
     """Celery task: Organize stages and save FormMapResult to database."""
     from services.ai_budget_service import AIOperationType, BudgetExceededError
 
@@ -1958,6 +2097,10 @@ def save_mapping_result(self, session_id: str, stages: List[Dict], path_junction
     db = _get_db_session()
     redis_client = _get_redis_client()
 
+    # Path stages come from the append-only executed step log - the whole path is saved, so read every step
+    if stages is None:
+        stages = executed_step_log(redis_client, session_id).range(0, -1)
+
 
 
     try:
@@ -2072,6 +2215,7 @@ def save_mapping_result(self, session_id: str, stages: List[Dict], path_junction
         return result
 
     except Exception as e:
+        _defer_if_ai_busy(self, e)
         msg = f"!!!! ❌ Save mapping result failed: {e}"
         print(msg)
         logger.error(f"[FormMapperTask] Save mapping result failed: {e}", exc_info=True)
@@ -2166,6 +2310,7 @@ def field_assist_query(
         return {"success": False, "error": str(e), "access_denied": True}
 
     except Exception as e:
+        _defer_if_ai_busy(self, e)
         msg = f"!!!! ❌ Field assist query failed: {e}"
         print(msg)
         logger.error(f"[FormMapperTask] Field assist query failed: {e}", exc_info=True)
@@ -2229,8 +2374,8 @@ def sync_mapper_session_status(session_id: str, status: str, error: str = None):
                             "log_level": "error"
                         }
                     }
-                    _get_redis_client().lpush(f"agent:{user_id}", json.dumps(task))
-                    logger.info(f"[MapperTasks] Pushed form_mapper_close to agent:{user_id}")
+                    queue_name = push_agent_task(_get_redis_client(), user_id, task)
+                    logger.info(f"[MapperTasks] Pushed form_mapper_close to {queue_name}")
                 except Exception as close_err:
                     msg = f"!!!! ❌ Failed to push close task: {close_err}"
                     print(msg)
@@ -2288,6 +2433,7 @@ def log_mapping_activity(
     db = _get_db_session()
     try:
         from models.database import ActivityLogEntry
+        from services.activity_session_rollups import add_entries_to_session_rollup
         from datetime import datetime
 
         entry = ActivityLogEntry(
@@ -2303,6 +2449,7 @@ def log_mapping_activity(
             extra_data=extra_data
         )
         db.add(entry)
+        add_entries_to_session_rollup(db, "mapping", mapper_session_id, company_id, project_id, [entry])
         db.commit()
         logger.info(f"[MapperTasks] Logged activity: {message[:50]}...")
     except Exception as e:
@@ -2341,14 +2488,13 @@ def cleanup_stale_mapper_sessions(timeout_hours: int = 2):
             sid = str(session.id)
             redis_client.delete(
                 f"mapper_session:{sid}",
-                f"mapper_dom:{sid}",
-                f"mapper_screenshot:{sid}",
-                f"mapper_screenshot_before:{sid}",
                 f"mapper_lock:{sid}",
+                *all_step_log_keys(sid),
             )
+            MapperBlobStore(redis_client).release_session(sid)
             # Clean up agent queue if user_id available
             if session.user_id:
-                redis_client.delete(f"agent:{session.user_id}")
+                flush_agent_tasks(redis_client, session.user_id, sid)
             logger.info(f"[MapperTasks] Cleaned Redis keys for stale session {sid}")
 
         db.commit()
@@ -2361,18 +2507,42 @@ def cleanup_stale_mapper_sessions(timeout_hours: int = 2):
     finally:
         db.close()
 
+
+@shared_task(name="tasks.settle_ai_usage_ledger")
+def settle_ai_usage_ledger():
+    """
+    Periodic task: settle AI usage charged to the Redis ledger - bulk-insert api_usage
+    rows and add the spend to the subscription/company budget counters.
+    Runs every 30 seconds via Celery beat.
+    """
+    db = _get_db_session()
+    try:
+        from services.ai_budget_service import get_budget_service
+
+        settled = get_budget_service(_get_redis_client()).settle_usage_ledger(db)
+        if settled:
+            logger.info(f"[MapperTasks] Settled {settled} AI usage entries")
+        return {"settled": settled}
+    except Exception as e:
+        logger.error(f"[MapperTasks] AI usage settlement failed: {e}")
+        db.rollback()
+        return {"error": str(e)}
+    finally:
+        db.close()
+
 @shared_task(name="tasks.detect_stuck_mapper_sessions")
 def detect_stuck_mapper_sessions():
     """
     Periodic task: detect sessions stuck waiting for agent response.
-    If mapper_agent_active:{session_id} expired (agent hasn't responded in 3 min),
-    fail the session. Runs every 60 seconds via Celery beat.
+    The orchestrator records an agent-wait deadline (ZSET mapper_agent_deadlines) on every
+    agent task push and clears it when the agent answers - only expired entries are
+    examined here, so the sweep is O(stuck sessions). Runs every 60 seconds via Celery beat.
     """
     db = _get_db_session()
     redis_client = _get_redis_client()
     try:
-        from models.form_mapper_models import FormMapperSession
-        from datetime import datetime
+        import time
+        from services.form_mapper_orchestrator import AGENT_DEADLINES_KEY
 
         # Agent-waiting states — session expects an agent response
         agent_waiting_states = {
@@ -2386,46 +2556,53 @@ def detect_stuck_mapper_sessions():
             "visual_page_getting_screenshot", "dynamic_verify_getting_screenshot",
         }
 
-        # Get all running sessions from DB
-        running_sessions = db.query(FormMapperSession).filter(
-            FormMapperSession.status.in_(["running", "initializing", "pending"])
-        ).all()
-
-        failed_count = 0
-        for session in running_sessions:
-            sid = str(session.id)
-            # Check Redis session state
-            state_raw = redis_client.hget(f"mapper_session:{sid}", "state")
-            if not state_raw:
+        now = time.time()
+        expired = [m.decode() if isinstance(m, bytes) else m
+                   for m in redis_client.zrangebyscore(AGENT_DEADLINES_KEY, 0, now, start=0, num=500)]
+        if not expired:
+            return {"failed": 0, "checked": 0}
+
+        # Claim each entry only if its deadline is still expired (agent may have answered
+        # and a new task re-armed the deadline since the ZRANGEBYSCORE)
+        claim = redis_client.register_script(_CLAIM_DEADLINE_SCRIPT)
+        pipe = redis_client.pipeline()
+        for sid in expired:
+            claim(keys=[AGENT_DEADLINES_KEY], args=[sid, now], client=pipe)
+            pipe.hget(f"mapper_session:{sid}", "state")
+        replies = pipe.execute()
+
+        stuck = []
+        for i, sid in enumerate(expired):
+            claimed, state_raw = replies[2 * i], replies[2 * i + 1]
+            if not claimed or not state_raw:
                 continue
             state = state_raw.decode() if isinstance(state_raw, bytes) else state_raw
-
-            if state not in agent_waiting_states:
-                continue  # Session is waiting for Celery (AI), not agent
-
-            # Check if agent heartbeat key exists
-            if not redis_client.exists(f"mapper_agent_active:{sid}"):
-                # Agent hasn't responded in 3+ minutes — fail session via orchestrator
-                from services.form_mapper_orchestrator import FormMapperOrchestrator
-                orchestrator = FormMapperOrchestrator(redis_client, db)
+            if state in agent_waiting_states:
+                stuck.append(sid)  # Agent hasn't responded in 3+ minutes
+
+        if stuck:
+            # Fail sessions via orchestrator
+            from services.form_mapper_orchestrator import FormMapperOrchestrator
+            orchestrator = FormMapperOrchestrator(redis_client, db)
+            for sid in stuck:
                 orchestrator._fail_session(sid, "Agent unresponsive — no response for 3+ minutes")
-                failed_count += 1
 
-                # Clean up Redis keys immediately
-                redis_client.delete(
+            # Clean up Redis keys immediately
+            pipe = redis_client.pipeline()
+            for sid in stuck:
+                pipe.delete(
                     f"mapper_session:{sid}",
-                    f"mapper_dom:{sid}",
-                    f"mapper_screenshot:{sid}",
-                    f"mapper_screenshot_before:{sid}",
                     f"mapper_lock:{sid}",
-                    f"mapper_agent_active:{sid}",
+                    *all_step_log_keys(sid),
                 )
+            pipe.execute()
+            blobs = MapperBlobStore(redis_client)
+            for sid in stuck:
+                blobs.release_session(sid)
 
-
-        if failed_count:
             db.commit()
-            logger.info(f"[MapperTasks] Failed {failed_count} stuck sessions (agent unresponsive)")
-        return {"failed": failed_count, "checked": len(running_sessions)}
+            logger.info(f"[MapperTasks] Failed {len(stuck)} stuck sessions (agent unresponsive)")
+        return {"failed": len(stuck), "checked": len(expired)}
 
     except Exception as e:
         logger.error(f"[MapperTasks] Stuck session detection failed: {e}", exc_info=True)
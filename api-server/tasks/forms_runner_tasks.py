@@ -11,6 +11,10 @@ from celery_app import celery
 from celery import shared_task
 from typing import Dict, Optional, List
 from services.session_logger import get_session_logger, ActivityType
+from services.dom_reducer import reduce_dom
+from services.screenshot_refs import resolve_screenshot
+from services.agent_task_queue import push_agent_task
+from services.ai_gateway import AIRetryLater, AI_DEFER_MAX_RETRIES, retry_countdown, set_ai_company
 
 logger = logging.getLogger(__name__)
 
@@ -167,6 +171,9 @@ def _check_budget_and_get_api_key(db, company_id: int, product_id: int) -> str:
     
     redis_client = _get_redis_client()
     budget_service = get_budget_service(redis_client)
+
+    # Gateway token bucket for this company; the task re-queues itself on AIRetryLater
+    set_ai_company(company_id, deferrable=True)
     
     has_budget, remaining, total = budget_service.check_budget(db, company_id, product_id)
     
@@ -438,12 +445,9 @@ def _execute_step_via_agent(session_id: str, stage: Dict, user_id: int, log_mess
         logger.info(f"[FormsRunner] Session {session_id} is {state.get('status')}, skipping task push")
         return {"success": False, "error": f"Session {state.get('status')}", "skipped": True}
 
-    # Push to agent queue
-    agent_queue_key = f"agent:{user_id}"
-    logger.info(f"[FormsRunner] DEBUG: Pushing to queue {agent_queue_key}")
-    result = redis_client.lpush(agent_queue_key, json.dumps(task))
-    redis_client.ltrim(agent_queue_key, 0, 49)  # Cap queue at 50 tasks
-    logger.info(f"[FormsRunner] DEBUG: lpush result: {result}")
+    # Push to agent queue (session subqueue when a multi-session agent worker is bound to it)
+    queue_name = push_agent_task(redis_client, user_id, task)
+    logger.info(f"[FormsRunner] DEBUG: Pushed to queue {queue_name}")
     
     # Wait for result (with timeout)
     result_key = f"runner_step_result:{session_id}"
@@ -604,8 +608,10 @@ def analyze_runner_error(
     # Read large data from Redis (stored by _handle_step_failure)
     dom_raw = redis_client.get(f"runner_dom:{session_id}")
     dom_html = dom_raw.decode() if isinstance(dom_raw, bytes) else (dom_raw or "")
+    dom_html = reduce_dom(dom_html, label=f"runner_error {session_id}")
     screenshot_raw = redis_client.get(f"runner_screenshot:{session_id}")
     screenshot_base64 = screenshot_raw.decode() if isinstance(screenshot_raw, bytes) else (screenshot_raw or "")
+    screenshot_base64 = resolve_screenshot(screenshot_base64)
 
     db = _get_db_session()
 
@@ -669,6 +675,12 @@ def analyze_runner_error(
             "last_error": "AI budget exceeded"
         })
         return {"decision": "general_error", "description": "Budget exceeded", "budget_exceeded": True}
+
+    except AIRetryLater as e:
+        # Claude busy - re-queue with the gateway's countdown instead of the short autoretry backoff
+        countdown = retry_countdown(e, self.request.retries)
+        logger.warning(f"[FormsRunner] {e.reason} - retrying AI analysis in {countdown}s")
+        raise self.retry(exc=e, countdown=countdown, max_retries=AI_DEFER_MAX_RETRIES)
         
     except Exception as e:
         logger.error(f"[FormsRunner] AI analysis failed: {e}")
@@ -8,7 +8,7 @@ import json
 import logging
 import redis
 from celery import shared_task
-from anthropic import Anthropic
+from services.ai_gateway import ai_gateway_client, AIRetryLater, AI_DEFER_MAX_RETRIES, retry_countdown, set_ai_company
 from models.database import SessionLocal, CompanyProductSubscription
 from services.encryption_service import get_decrypted_api_key
 from services.ai_budget_service import get_budget_service, BudgetExceededError
@@ -79,7 +79,9 @@ def generate_pom(
         else:
             api_key = os.getenv("ANTHROPIC_API_KEY")
 
-        client = Anthropic(api_key=api_key)
+        # Re-queued below if Claude is busy, so the gateway must not sleep in this worker
+        set_ai_company(company_id, deferrable=True)
+        client = ai_gateway_client(api_key, company_id=company_id)
 
         response = client.messages.create(
             #model="claude-sonnet-4-20250514",
@@ -118,6 +120,11 @@ def generate_pom(
             'framework': framework
         }
 
+    except AIRetryLater as e:
+        countdown = retry_countdown(e, self.request.retries)
+        logger.warning(f"POM generation: {e.reason} - retrying in {countdown}s")
+        raise self.retry(exc=e, countdown=countdown, max_retries=AI_DEFER_MAX_RETRIES)
+
     except Exception as e:
         logger.error(f"POM generation failed: {str(e)}")
         self.update_state(state='FAILURE', meta={'error': str(e)})
@@ -6,17 +6,24 @@ Scalable: All heavy operations happen in Celery workers, not in API handlers.
 """
 
 import os
-import json
 import logging
+import redis
 from celery import shared_task
+from sqlalchemy.exc import SQLAlchemyError
 from typing import Dict, List, Optional
-from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
 # Log size threshold for S3 upload (50KB)
 LOG_SIZE_THRESHOLD_BYTES = 50 * 1024
 
+_redis_pool = redis.ConnectionPool(
+    host=os.getenv("REDIS_HOST", "redis"),
+    port=int(os.getenv("REDIS_PORT", 6379)),
+    db=0,
+    max_connections=20
+)
+
 
 def _get_db_session():
     """Get database session"""
@@ -56,50 +63,24 @@ def process_activity_logs_task(
         company_id: Company ID
         user_id: Optional user ID
     """
-    from models.database import ActivityLogEntry
+    from services.activity_log_ingest import ingest_activity_log_entries, iter_json_array
 
     db = _get_db_session()
 
     try:
-        entries = json.loads(entries_json)
-
-        # Determine session ID field
-        crawl_session_id = session_id if activity_type == "discovery" else None
-        mapper_session_id = session_id if activity_type == "mapping" else None
-        test_run_id = session_id if activity_type == "test_run" else None
-
-        entries_created = 0
-        for entry_data in entries:
-            # Parse timestamp
-            try:
-                timestamp = datetime.fromisoformat(entry_data['timestamp'].replace('Z', '+00:00'))
-            except:
-                timestamp = datetime.utcnow()
-
-            entry = ActivityLogEntry(
-                company_id=company_id,
-                project_id=project_id,
-                user_id=user_id,
-                activity_type=activity_type,
-                crawl_session_id=crawl_session_id,
-                mapper_session_id=mapper_session_id,
-                test_run_id=test_run_id,
-                timestamp=timestamp,
-                level=entry_data.get('level', 'info'),
-                category=entry_data.get('category', 'milestone'),
-                message=entry_data.get('message', ''),
-                extra_data=entry_data.get('extra_data')
-            )
-            db.add(entry)
-            entries_created += 1
-
+        stats = ingest_activity_log_entries(
+            db, iter_json_array([entries_json]), activity_type, session_id,
+            project_id, company_id, user_id
+        )
         db.commit()
+        entries_created = stats["entries_created"]
 
         logger.info(f"[LogTask] Inserted {entries_created} log entries for {activity_type} session {session_id}")
 
         return {
             "success": True,
             "entries_created": entries_created,
+            "rows_per_second": stats["rows_per_second"],
             "activity_type": activity_type,
             "session_id": session_id
         }
@@ -136,46 +117,19 @@ def process_activity_logs_from_s3_task(
         company_id: Company ID
         user_id: Optional user ID
     """
-    from models.database import ActivityLogEntry
-    from services.s3_storage import get_s3_file_content, delete_screenshot_from_s3
+    from services.activity_log_ingest import ingest_activity_log_entries, iter_s3_json_array
+    from services.s3_storage import delete_screenshot_from_s3
 
     db = _get_db_session()
 
     try:
-        # Read log file from S3
-        content = get_s3_file_content(s3_key)
-        entries = json.loads(content.decode('utf-8'))
-
-        # Determine session ID field
-        crawl_session_id = session_id if activity_type == "discovery" else None
-        mapper_session_id = session_id if activity_type == "mapping" else None
-        test_run_id = session_id if activity_type == "test_run" else None
-
-        entries_created = 0
-        for entry_data in entries:
-            try:
-                timestamp = datetime.fromisoformat(entry_data['timestamp'].replace('Z', '+00:00'))
-            except:
-                timestamp = datetime.utcnow()
-
-            entry = ActivityLogEntry(
-                company_id=company_id,
-                project_id=project_id,
-                user_id=user_id,
-                activity_type=activity_type,
-                crawl_session_id=crawl_session_id,
-                mapper_session_id=mapper_session_id,
-                test_run_id=test_run_id,
-                timestamp=timestamp,
-                level=entry_data.get('level', 'info'),
-                category=entry_data.get('category', 'milestone'),
-                message=entry_data.get('message', ''),
-                extra_data=entry_data.get('extra_data')
-            )
-            db.add(entry)
-            entries_created += 1
-
+        # Entries are decoded and COPY'd chunk by chunk while the S3 body downloads
+        stats = ingest_activity_log_entries(
+            db, iter_s3_json_array(s3_key), activity_type, session_id,
+            project_id, company_id, user_id
+        )
         db.commit()
+        entries_created = stats["entries_created"]
 
         # Delete temp log file from S3 after processing
         delete_screenshot_from_s3(s3_key)
@@ -186,6 +140,7 @@ def process_activity_logs_from_s3_task(
         return {
             "success": True,
             "entries_created": entries_created,
+            "rows_per_second": stats["rows_per_second"],
             "activity_type": activity_type,
             "session_id": session_id,
             "source": "s3"
@@ -202,10 +157,88 @@ def process_activity_logs_from_s3_task(
         db.close()
 
 
+# ============================================================================
+# Live Log Segment Tasks
+# ============================================================================
+
+# Live segments are retried by the agent until acked - remember which ones were ingested
+SEGMENT_DEDUPE_TTL = 7 * 86400
+# DB / Redis outages are retried with backoff; a bad segment (corrupt gzip, bad JSON) is not
+SEGMENT_RETRYABLE_ERRORS = (SQLAlchemyError, redis.RedisError)
+
+
+@shared_task(bind=True, name="tasks.process_activity_log_segment", max_retries=5,
+             autoretry_for=SEGMENT_RETRYABLE_ERRORS, retry_backoff=True, retry_backoff_max=300)
+def process_activity_log_segment_task(
+        self,
+        segment_b64: str,
+        activity_type: str,
+        session_id: int,
+        project_id: int,
+        company_id: int,
+        user_id: int = None,
+        stream_id: str = "",
+        seq: int = 0
+) -> Dict:
+    """
+    Ingest one gzip NDJSON log segment streamed by the agent while the session runs.
+
+    Args:
+        segment_b64: Base64 of the gzip-compressed NDJSON segment
+        activity_type: 'discovery', 'mapping', 'test_run'
+        session_id: Session ID
+        project_id: Project ID
+        company_id: Company ID
+        user_id: Optional user ID
+        stream_id: Agent-side id of the session's log stream
+        seq: Segment number within the stream (dedupe of agent retries)
+    """
+    import base64
+    from services.activity_log_ingest import ingest_activity_log_entries, iter_ndjson_gzip
+
+    r = redis.Redis(connection_pool=_redis_pool)
+    dedupe_key = f"activity_log_segment:{activity_type}:{session_id}:{stream_id}:{seq}"
+    if not r.set(dedupe_key, 1, nx=True, ex=SEGMENT_DEDUPE_TTL):
+        logger.info(f"[LogTask] Segment {seq} of {activity_type} session {session_id} already ingested")
+        return {"success": True, "duplicate": True, "seq": seq}
+
+    db = _get_db_session()
+
+    try:
+        stats = ingest_activity_log_entries(
+            db, iter_ndjson_gzip(base64.b64decode(segment_b64)), activity_type, session_id,
+            project_id, company_id, user_id
+        )
+        db.commit()
+
+        return {
+            "success": True,
+            "entries_created": stats["entries_created"],
+            "rows_per_second": stats["rows_per_second"],
+            "activity_type": activity_type,
+            "session_id": session_id,
+            "seq": seq
+        }
+
+    except Exception as e:
+        logger.error(f"[LogTask] Failed to process log segment {seq} for {activity_type} session {session_id}: {e}")
+        db.rollback()
+        r.delete(dedupe_key)
+        if isinstance(e, SEGMENT_RETRYABLE_ERRORS) and self.request.retries < self.max_retries:
+            raise  # autoretry_for re-queues with backoff
+        return {
+            "success": False,
+            "error": str(e)
+        }
+    finally:
+        db.close()
+
+
 # ============================================================================
 # Screenshot Record Tasks
 # ============================================================================
 
+
 @shared_task(name="tasks.record_screenshots_uploaded")
 def record_screenshots_uploaded_task(
         screenshots: List[Dict],
@@ -421,9 +454,9 @@ def process_screenshot_zip_task(
         project_id: Project ID
         company_id: Company ID
     """
-    import io
-    import zipfile
-    from services.s3_storage import get_s3_file_content, delete_screenshot_from_s3, s3_client, S3_BUCKET
+    from sqlalchemy import insert
+    from services.s3_storage import delete_screenshot_from_s3
+    from services.s3_zip_ingest import expand_zip_to_s3
     from models.database import ActivityScreenshot
 
     logger.info(f"[S3Task] Processing screenshot zip: {s3_key}")
@@ -431,55 +464,24 @@ def process_screenshot_zip_task(
     db = _get_db_session()
 
     try:
-        # Download zip from S3
-        logger.info(f"[S3Task] Downloading zip: {s3_key}")
-        zip_content = get_s3_file_content(s3_key)
-
-        if not zip_content:
-            logger.error(f"[S3Task] Failed to download zip: {s3_key}")
-            return {"success": False, "error": "Failed to download zip"}
-
-        logger.info(f"[S3Task] Downloaded zip: {len(zip_content)} bytes")
-
-        # Extract and re-upload each file
-        zip_buffer = io.BytesIO(zip_content)
-        records_created = 0
-
-        with zipfile.ZipFile(zip_buffer, 'r') as zip_file:
-            for filename in zip_file.namelist():
-                if not filename.lower().endswith('.png'):
-                    continue
-
-                # Extract file
-                file_content = zip_file.read(filename)
-                file_size = len(file_content)
-
-                # Upload to final location
-                final_s3_key = f"screenshots/{company_id}/{project_id}/{session_id}/{filename}"
-
-                logger.info(f"[S3Task] Uploading: {final_s3_key}")
-
-                s3_client.put_object(
-                    Bucket=S3_BUCKET,
-                    Key=final_s3_key,
-                    Body=file_content,
-                    ContentType='image/png'
-                )
-
-                # Record in DB
-                record = ActivityScreenshot(
-                    company_id=company_id,
-                    project_id=project_id,
-                    activity_type=activity_type,
-                    session_id=session_id,
-                    s3_key=final_s3_key,
-                    filename=filename,
-                    file_size_bytes=file_size
-                )
-                db.add(record)
-                records_created += 1
-
+        uploaded, stats = expand_zip_to_s3(
+            s3_key,
+            f"screenshots/{company_id}/{project_id}/{session_id}/",
+            include=lambda name: name.lower().endswith('.png')
+        )
+
+        if uploaded:
+            db.execute(insert(ActivityScreenshot), [{
+                "company_id": company_id,
+                "project_id": project_id,
+                "activity_type": activity_type,
+                "session_id": session_id,
+                "s3_key": f["s3_key"],
+                "filename": f["filename"],
+                "file_size_bytes": f["file_size_bytes"],
+            } for f in uploaded])
         db.commit()
+        records_created = len(uploaded)
 
         # Delete temp zip from S3
         logger.info(f"[S3Task] Deleting temp zip: {s3_key}")
@@ -490,7 +492,8 @@ def process_screenshot_zip_task(
         return {
             "success": True,
             "records_created": records_created,
-            "session_id": session_id
+            "session_id": session_id,
+            "stats": stats
         }
 
     except Exception as e:
@@ -527,9 +530,9 @@ def process_form_files_zip_task(
         company_id: Company ID
         form_page_route_id: Form page route ID
     """
-    import io
-    import zipfile
-    from services.s3_storage import get_s3_file_content, delete_screenshot_from_s3, s3_client, S3_BUCKET
+    from sqlalchemy import insert
+    from services.s3_storage import delete_screenshot_from_s3
+    from services.s3_zip_ingest import expand_zip_to_s3
     from models.database import FormUploadedFile
 
     logger.info(f"[S3Task] Processing form files zip: {s3_key}")
@@ -537,66 +540,23 @@ def process_form_files_zip_task(
     db = _get_db_session()
 
     try:
-        # Download zip from S3
-        logger.info(f"[S3Task] Downloading zip: {s3_key}")
-        zip_content = get_s3_file_content(s3_key)
-
-        if not zip_content:
-            logger.error(f"[S3Task] Failed to download zip: {s3_key}")
-            return {"success": False, "error": "Failed to download zip"}
-
-        logger.info(f"[S3Task] Downloaded zip: {len(zip_content)} bytes")
-
-        # Extract and re-upload each file
-        zip_buffer = io.BytesIO(zip_content)
-        records_created = 0
-
-        with zipfile.ZipFile(zip_buffer, 'r') as zip_file:
-            for filename in zip_file.namelist():
-                # Skip directories
-                if filename.endswith('/'):
-                    continue
-
-                # Extract file
-                file_content = zip_file.read(filename)
-                file_size = len(file_content)
-
-                # Determine content type
-                content_type = 'application/octet-stream'
-                if filename.lower().endswith('.pdf'):
-                    content_type = 'application/pdf'
-                elif filename.lower().endswith('.png'):
-                    content_type = 'image/png'
-                elif filename.lower().endswith('.jpg') or filename.lower().endswith('.jpeg'):
-                    content_type = 'image/jpeg'
-                elif filename.lower().endswith('.txt'):
-                    content_type = 'text/plain'
-
-                # Upload to final location
-                final_s3_key = f"form_files/{company_id}/{project_id}/{form_page_route_id}/{filename}"
-
-                logger.info(f"[S3Task] Uploading: {final_s3_key}")
-
-                s3_client.put_object(
-                    Bucket=S3_BUCKET,
-                    Key=final_s3_key,
-                    Body=file_content,
-                    ContentType=content_type
-                )
-
-                # Record in DB
-                record = FormUploadedFile(
-                    company_id=company_id,
-                    project_id=project_id,
-                    form_page_route_id=form_page_route_id,
-                    s3_key=final_s3_key,
-                    filename=filename,
-                    file_size_bytes=file_size
-                )
-                db.add(record)
-                records_created += 1
-
+        uploaded, stats = expand_zip_to_s3(
+            s3_key,
+            f"form_files/{company_id}/{project_id}/{form_page_route_id}/",
+            include=lambda name: True
+        )
+
+        if uploaded:
+            db.execute(insert(FormUploadedFile), [{
+                "company_id": company_id,
+                "project_id": project_id,
+                "form_page_route_id": form_page_route_id,
+                "s3_key": f["s3_key"],
+                "filename": f["filename"],
+                "file_size_bytes": f["file_size_bytes"],
+            } for f in uploaded])
         db.commit()
+        records_created = len(uploaded)
 
         # Delete temp zip from S3
         logger.info(f"[S3Task] Deleting temp zip: {s3_key}")
@@ -607,7 +567,8 @@ def process_form_files_zip_task(
         return {
             "success": True,
             "records_created": records_created,
-            "form_page_route_id": form_page_route_id
+            "form_page_route_id": form_page_route_id,
+            "stats": stats
         }
 
     except Exception as e:
@@ -11,6 +11,7 @@ import os
 from models.database import SessionLocal, CompanyProductSubscription
 from services.encryption_service import get_decrypted_api_key
 from services.ai_budget_service import get_budget_service, BudgetExceededError
+from services.ai_gateway import ai_gateway_client, AIRetryLater, AI_DEFER_MAX_RETRIES, retry_countdown, set_ai_company
 import redis
 
 logger = logging.getLogger(__name__)
@@ -74,14 +75,14 @@ def generate_spec_compliance(
         self.update_state(state='PROCESSING', meta={'progress': 30, 'message': 'Sending to AI...'})
 
         # Get API key (BYOK or system)
-        import anthropic
-
         if company_id:
             api_key = _get_api_key(company_id, product_id)
         else:
             api_key = os.getenv("ANTHROPIC_API_KEY")
 
-        client = anthropic.Anthropic(api_key=api_key)
+        # Re-queued below if Claude is busy, so the gateway must not sleep in this worker
+        set_ai_company(company_id, deferrable=True)
+        client = ai_gateway_client(api_key, company_id=company_id)
 
         response = client.messages.create(
             #model="claude-sonnet-4-20250514",
@@ -109,6 +110,11 @@ def generate_spec_compliance(
             'summary': summary
         }
 
+    except AIRetryLater as e:
+        countdown = retry_countdown(e, self.request.retries)
+        logger.warning(f"Spec compliance: {e.reason} - retrying in {countdown}s")
+        raise self.retry(exc=e, countdown=countdown, max_retries=AI_DEFER_MAX_RETRIES)
+
     except Exception as e:
         logger.error(f"Spec compliance generation failed: {str(e)}")
         return {
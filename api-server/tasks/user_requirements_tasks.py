@@ -89,6 +89,7 @@ def parse_user_inputs(
     Updates DB directly when done.
     """
     from services.ai_budget_service import AIOperationType, BudgetExceededError
+    from services.ai_gateway import AIRetryLater, AI_DEFER_MAX_RETRIES, retry_countdown, set_ai_company
     from models.database import FormPageRoute
 
     logger.info(f"[UserInputs] Parsing {file_type} content ({len(content)} chars) for form_page {form_page_route_id}")
@@ -127,8 +128,9 @@ def parse_user_inputs(
             db.commit()
             return {"success": False, "error": "No API key available"}
 
-        # Call AI to parse
-        inputs, input_tokens, output_tokens = _parse_with_ai(content, file_type, api_key)
+        # Call AI to parse (re-queued below if Claude is busy)
+        set_ai_company(company_id, deferrable=True)
+        inputs, input_tokens, output_tokens = _parse_with_ai(content, file_type, api_key, company_id)
 
         if inputs:
             # Record usage
@@ -162,6 +164,11 @@ def parse_user_inputs(
             pass
         return {"success": False, "error": "AI budget exceeded", "budget_exceeded": True}
 
+    except AIRetryLater as e:
+        countdown = retry_countdown(e, self.request.retries)
+        logger.warning(f"[UserInputs] {e.reason} - retrying in {countdown}s")
+        raise self.retry(exc=e, countdown=countdown, max_retries=AI_DEFER_MAX_RETRIES)
+
     except Exception as e:
         logger.error(f"[UserInputs] Error parsing: {e}", exc_info=True)
         try:
@@ -179,14 +186,14 @@ def parse_user_inputs(
         db.close()
 
 
-def _parse_with_ai(content: str, file_type: str, api_key: str) -> tuple:
+def _parse_with_ai(content: str, file_type: str, api_key: str, company_id: int = None) -> tuple:
     """
     Use Claude AI to parse inputs content.
     Returns: (parsed_inputs, input_tokens, output_tokens)
     """
-    import anthropic
+    from services.ai_gateway import ai_gateway_client, AIRetryLater
 
-    client = anthropic.Anthropic(api_key=api_key)
+    client = ai_gateway_client(api_key, company_id=company_id)
 
     prompt = f"""Parse this user-provided form input requirements into structured JSON.
 
@@ -239,6 +246,8 @@ def _parse_with_ai(content: str, file_type: str, api_key: str) -> tuple:
         logger.error("[UserInputs] No JSON found in AI response")
         return None, input_tokens, output_tokens
 
+    except AIRetryLater:
+        raise
     except Exception as e:
         logger.error(f"[UserInputs] AI parsing error: {e}")
         return None, 0, 0
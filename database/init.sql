@@ -248,6 +248,8 @@ CREATE TABLE api_usage (
     
     operation_type VARCHAR(100),  -- 'discover_pages', 'analyze_form', etc.
     tokens_used INTEGER NOT NULL,
+    cache_creation_tokens INTEGER DEFAULT 0,  -- prompt tokens written to the Anthropic cache
+    cache_read_tokens INTEGER DEFAULT 0,      -- prompt tokens served from the Anthropic cache
     api_cost DECIMAL(10,4) NOT NULL,
     
     created_at TIMESTAMP DEFAULT NOW()
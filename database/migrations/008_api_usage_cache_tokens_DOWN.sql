@@ -0,0 +1,6 @@
+-- Migration 008: Remove prompt cache token accounting from api_usage
+-- DOWN migration - Rollback
+-- Location: web_services_product/database/migrations/008_api_usage_cache_tokens_DOWN.sql
+
+ALTER TABLE api_usage DROP COLUMN IF EXISTS cache_read_tokens;
+ALTER TABLE api_usage DROP COLUMN IF EXISTS cache_creation_tokens;
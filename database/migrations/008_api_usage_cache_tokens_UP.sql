@@ -0,0 +1,12 @@
+-- Migration 008: Prompt cache token accounting on api_usage
+-- UP migration
+-- Location: web_services_product/database/migrations/008_api_usage_cache_tokens_UP.sql
+--
+-- tokens_used stays the total; these split out the prompt tokens written to /
+-- served from the Anthropic prompt cache (billed at 1.25x / 0.1x the input price).
+
+ALTER TABLE api_usage
+ADD COLUMN IF NOT EXISTS cache_creation_tokens INTEGER DEFAULT 0;
+
+ALTER TABLE api_usage
+ADD COLUMN IF NOT EXISTS cache_read_tokens INTEGER DEFAULT 0;
@@ -0,0 +1,6 @@
+-- Migration 009: Remove per-session activity log rollups
+-- DOWN migration - Rollback (removes table)
+-- Location: web_services_product/database/migrations/009_activity_session_rollups_DOWN.sql
+
+DROP INDEX IF EXISTS idx_crawl_sessions_project_created;
+DROP TABLE IF EXISTS activity_session_rollups CASCADE;
@@ -0,0 +1,42 @@
+-- Migration 009: Per-session activity log rollups
+-- UP migration - Creates table and backfills it
+-- Location: web_services_product/database/migrations/009_activity_session_rollups_UP.sql
+--
+-- Counters are maintained at ingestion time (process_activity_logs tasks) so the
+-- activity session listing no longer runs COUNT(*) on activity_log_entries per session.
+
+CREATE TABLE IF NOT EXISTS activity_session_rollups (
+    id SERIAL PRIMARY KEY,
+    activity_type VARCHAR(50) NOT NULL,      -- 'discovery', 'mapping', 'test_run'
+    session_id INTEGER NOT NULL,             -- crawl_session_id / mapper_session_id / test_run_id
+    company_id INTEGER NOT NULL REFERENCES companies(id),
+    project_id INTEGER NOT NULL REFERENCES projects(id),
+    entry_count INTEGER NOT NULL DEFAULT 0,
+    error_count INTEGER NOT NULL DEFAULT 0,
+    last_entry_at TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_activity_session_rollups_session
+ON activity_session_rollups(activity_type, session_id);
+
+-- Backfill from existing log entries
+INSERT INTO activity_session_rollups
+    (activity_type, session_id, company_id, project_id, entry_count, error_count, last_entry_at, updated_at)
+SELECT
+    activity_type,
+    COALESCE(crawl_session_id, mapper_session_id, test_run_id),
+    MIN(company_id),
+    MIN(project_id),
+    COUNT(*),
+    COUNT(*) FILTER (WHERE level = 'error'),
+    MAX(timestamp),
+    NOW()
+FROM activity_log_entries
+WHERE COALESCE(crawl_session_id, mapper_session_id, test_run_id) IS NOT NULL
+GROUP BY activity_type, COALESCE(crawl_session_id, mapper_session_id, test_run_id)
+ON CONFLICT (activity_type, session_id) DO NOTHING;
+
+-- Keyset listing of a project's discovery sessions
+CREATE INDEX IF NOT EXISTS idx_crawl_sessions_project_created
+ON crawl_sessions(project_id, created_at DESC);
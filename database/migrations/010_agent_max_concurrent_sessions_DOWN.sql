@@ -0,0 +1,5 @@
+-- Migration 010: Remove per-agent concurrency limit
+-- DOWN migration - Rollback (removes column)
+-- Location: web_services_product/database/migrations/010_agent_max_concurrent_sessions_DOWN.sql
+
+ALTER TABLE agents DROP COLUMN IF EXISTS max_concurrent_sessions;
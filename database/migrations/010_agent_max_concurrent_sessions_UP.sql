@@ -0,0 +1,9 @@
+-- Migration 010: Per-agent concurrency limit
+-- UP migration - Adds column
+-- Location: web_services_product/database/migrations/010_agent_max_concurrent_sessions_UP.sql
+--
+-- Number of sessions the agent runs at once (one browser worker each), as reported
+-- at registration. 1 = the classic single-session agent.
+
+ALTER TABLE agents
+ADD COLUMN IF NOT EXISTS max_concurrent_sessions INTEGER NOT NULL DEFAULT 1;